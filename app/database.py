@@ -1,5 +1,9 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -19,12 +23,227 @@ if all([DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT]):
 else:
     SQLALCHEMY_DATABASE_URL = "sqlite:///app.db"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# تجمّع الاتصالات (من البيئة):
+# - DB_POOL_SIZE / DB_MAX_OVERFLOW: الاتصالات الدائمة + الإضافية وقت الذروة
+#   (كل طلب يحجز اتصالًا عبر get_db، والخدمات الخلفية تفتح اتصالاتها الخاصة)
+# - DB_POOL_TIMEOUT: ثوانٍ لانتظار اتصال حر قبل TimeoutError
+# - DB_POOL_RECYCLE: إعادة فتح الاتصال بعد عمر معيّن (قبل أن يقطعه الخادم/الجدار الناري)
+# - DB_POOL_PRE_PING: فحص الاتصال قبل تسليمه (يتجاوز الاتصالات المقطوعة بعد إعادة تشغيل الخادم)
+# - DB_STATEMENT_TIMEOUT_MS: حد زمني لكل استعلام في PostgreSQL (0 = بدون حد)
+# - DB_CONNECT_TIMEOUT: ثوانٍ لفتح اتصال جديد في PostgreSQL
+# انتظار الحصول على اتصال والاتصالات المستخدمة والإضافية تُقاس في pool_metrics()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").strip().lower() in ("1", "true", "yes", "on")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_POOL_SLOW_CHECKOUT_MS = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+
+_pool_lock = threading.Lock()
+_pool_stats = {
+    "checkouts": 0, "checkins": 0, "connects": 0, "invalidated": 0, "timeouts": 0,
+    "slow_checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "peak_in_use": 0,
+}
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool يقيس زمن انتظار الحصول على اتصال (بما فيه فتح اتصال جديد) والمهلات."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with _pool_lock:
+                _pool_stats["timeouts"] += 1
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            with _pool_lock:
+                _pool_stats["wait_ms_total"] += ms
+                if ms > _pool_stats["wait_ms_max"]:
+                    _pool_stats["wait_ms_max"] = ms
+                if ms >= DB_POOL_SLOW_CHECKOUT_MS:
+                    _pool_stats["slow_checkouts"] += 1
+
+def _engine_kwargs() -> Dict[str, Any]:
+    kw: Dict[str, Any] = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
+        connect_args: Dict[str, Any] = {"connect_timeout": DB_CONNECT_TIMEOUT}
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        kw["connect_args"] = connect_args
+    return kw
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs())
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_conn, record):
+    with _pool_lock:
+        _pool_stats["connects"] += 1
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_conn, record, proxy):
+    in_use = engine.pool.checkedout()
+    with _pool_lock:
+        _pool_stats["checkouts"] += 1
+        if in_use > _pool_stats["peak_in_use"]:
+            _pool_stats["peak_in_use"] = in_use
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_conn, record):
+    with _pool_lock:
+        _pool_stats["checkins"] += 1
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(dbapi_conn, record, exception):
+    with _pool_lock:
+        _pool_stats["invalidated"] += 1
+
+def pool_metrics() -> Dict[str, Any]:
+    """حالة تجمّع الاتصالات الحالية + عدادات منذ بدء العملية."""
+    pool = engine.pool
+    with _pool_lock:
+        out = dict(_pool_stats)
+    total = out.pop("wait_ms_total")
+    out["avg_wait_ms"] = round(total / out["checkouts"], 3) if out["checkouts"] else 0.0
+    out["wait_ms_max"] = round(out["wait_ms_max"], 3)
+    out["in_use"] = pool.checkedout()
+    out["idle"] = pool.checkedin()
+    out["overflow"] = max(0, pool.overflow())
+    out["size"] = pool.size()
+    out["max_overflow"] = DB_MAX_OVERFLOW
+    out["timeout_seconds"] = DB_POOL_TIMEOUT
+    out["recycle_seconds"] = DB_POOL_RECYCLE
+    out["pre_ping"] = DB_POOL_PRE_PING
+    out["statement_timeout_ms"] = DB_STATEMENT_TIMEOUT_MS if not is_sqlite() else None
+    return out
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# ملف SQLite للنشر على خادم واحد (اختياري: SQLITE_PROFILE=performance، بدون DB_*):
+# - PRAGMA عند فتح كل اتصال: journal_mode=WAL (القراءة لا تحجب الكتابة)، busy_timeout،
+#   synchronous=NORMAL (آمن مع WAL)، mmap_size، cache_size (لكل اتصال)
+# - كاتب واحد: أول عبارة كتابة في المعاملة تحجز قفل الكتابة في العملية حتى commit/rollback،
+#   فتنتظر معاملات الكتابة دورها بدل "database is locked"؛ القراءة من التجمّع بدون قفل
+#   (SQLITE_SINGLE_WRITER=0 يترك التنسيق لـ busy_timeout: إنتاجية أعلى وذيل انتظار أطول)
+# - انتظار القفل أطول من SQLITE_BUSY_TIMEOUT_MS ⇒ TimeoutError (503 مثل استنفاد التجمّع)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "").strip().lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    SQLITE_SYNCHRONOUS = "NORMAL"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "1").strip().lower() in ("1", "true", "yes", "on")
+SQLITE_TUNED = SQLALCHEMY_DATABASE_URL.startswith("sqlite") and SQLITE_PROFILE == "performance"
+
+_WRITE_VERBS = {"INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER"}
+_WRITER_KEY = "sqlite_writer_since"
+
+_writer_lock = threading.Lock()
+_writer_stats = {"acquired": 0, "waited": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "hold_ms_max": 0.0}
+
+def _is_write(statement: str) -> bool:
+    head = statement.lstrip()[:8].split(None, 1)
+    return bool(head) and head[0].upper() in _WRITE_VERBS
+
+def _release_writer(info: Dict[str, Any]) -> None:
+    since = info.pop(_WRITER_KEY, None)
+    if since is None:
+        return
+    held = (time.perf_counter() - since) * 1000.0
+    with _pool_lock:
+        if held > _writer_stats["hold_ms_max"]:
+            _writer_stats["hold_ms_max"] = held
+    _writer_lock.release()
+
+if SQLITE_TUNED:
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        finally:
+            cur.close()
+
+if SQLITE_TUNED and SQLITE_SINGLE_WRITER:
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _sqlite_acquire_writer(conn, cursor, statement, parameters, context, executemany):
+        if _WRITER_KEY in conn.info or not _is_write(statement):
+            return
+        t0 = time.perf_counter()
+        if not _writer_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0):
+            with _pool_lock:
+                _writer_stats["timeouts"] += 1
+            raise exc.TimeoutError(f"SQLite writer busy for {SQLITE_BUSY_TIMEOUT_MS}ms")
+        now = time.perf_counter()
+        conn.info[_WRITER_KEY] = now
+        ms = (now - t0) * 1000.0
+        with _pool_lock:
+            _writer_stats["acquired"] += 1
+            _writer_stats["wait_ms_total"] += ms
+            if ms >= 1.0:
+                _writer_stats["waited"] += 1
+            if ms > _writer_stats["wait_ms_max"]:
+                _writer_stats["wait_ms_max"] = ms
+
+    @event.listens_for(engine, "commit")
+    def _sqlite_commit(conn):
+        _release_writer(conn.info)
+
+    @event.listens_for(engine, "rollback")
+    def _sqlite_rollback(conn):
+        _release_writer(conn.info)
+
+    @event.listens_for(engine, "checkin")
+    def _sqlite_checkin(dbapi_conn, record):
+        # احتياط: الاتصال عاد للتجمّع (reset يلغي المعاملة) والقفل ما زال محجوزًا
+        if record is not None:
+            _release_writer(record.info)
+
+    if hasattr(os, "register_at_fork"):
+        # العملية الابنة (pdf_jobs) لا ترث قفلًا محجوزًا من خيط آخر في الأب
+        def _reset_writer_lock():
+            global _writer_lock
+            _writer_lock = threading.Lock()
+
+        os.register_at_fork(after_in_child=_reset_writer_lock)
+
+def sqlite_metrics() -> Dict[str, Any]:
+    """إعدادات ملف SQLite وعدادات قفل الكاتب الواحد."""
+    if not SQLITE_TUNED:
+        return {"profile": SQLITE_PROFILE or "default", "enabled": False}
+    with _pool_lock:
+        out = dict(_writer_stats)
+    total = out.pop("wait_ms_total")
+    out["avg_wait_ms"] = round(total / out["acquired"], 3) if out["acquired"] else 0.0
+    out["wait_ms_max"] = round(out["wait_ms_max"], 3)
+    out["hold_ms_max"] = round(out["hold_ms_max"], 3)
+    out["writer_busy"] = _writer_lock.locked()
+    out.update({
+        "profile": SQLITE_PROFILE, "enabled": True, "single_writer": SQLITE_SINGLE_WRITER,
+        "busy_timeout_ms": SQLITE_BUSY_TIMEOUT_MS,
+        "synchronous": SQLITE_SYNCHRONOUS, "mmap_size": SQLITE_MMAP_SIZE, "cache_size_kb": SQLITE_CACHE_SIZE_KB,
+    })
+    return out
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,5 +1,9 @@
 
-from typing import Optional
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
 from fastapi import Request, HTTPException, status, Depends
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
@@ -33,13 +37,64 @@ def _map_user(u: User) -> CurrentUser:
     )
 
 
+# ذاكرة مؤقتة لكل عملية: user_id -> (الإصدار, وقت الانتهاء, CurrentUser أو None لغير الفعّال/المحذوف)
+# - تنتهي بعد USER_CACHE_TTL ثانية (الحد الأقصى لتأخر التعديلات بين العمليات/العمّال)
+# - bump_user_version يُبطلها فورًا في نفس العملية (تعديل/تعطيل/حذف المستخدم)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL", "15"))
+
+_user_cache: Dict[int, Tuple[Tuple[int, int], float, Optional[CurrentUser]]] = {}
+_user_versions: Dict[int, int] = {}
+_global_version = 0
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _version(user_id: int) -> Tuple[int, int]:
+    return _global_version, _user_versions.get(user_id, 0)
+
+def bump_user_version(user_id: Optional[int] = None) -> None:
+    """إبطال المستخدم المخزّن (أو الجميع إذا لم يُحدد user_id). يُستدعى بعد commit."""
+    global _global_version
+    with _user_cache_lock:
+        if user_id is None:
+            _global_version += 1
+            _user_cache.clear()
+        else:
+            _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+            _user_cache.pop(user_id, None)
+        _user_cache_stats["invalidations"] += 1
+
+def user_cache_metrics() -> Dict[str, Any]:
+    with _user_cache_lock:
+        out = dict(_user_cache_stats)
+        out["size"] = len(_user_cache)
+    out["ttl_seconds"] = USER_CACHE_TTL_SECONDS
+    return out
+
+def _load_user(db: Session, user_id: int) -> Optional[CurrentUser]:
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        version = _version(user_id)
+        if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            _user_cache_stats["hits"] += 1
+            return entry[2]
+        _user_cache_stats["misses"] += 1
+
+    db_user = db.query(User).filter(User.id == user_id).first()
+    cu = _map_user(db_user) if db_user and db_user.is_active else None
+
+    with _user_cache_lock:
+        # الإصدار المأخوذ قبل القراءة: إن تغيّر أثناءها لا تُعتبر النسخة صالحة
+        if version == _version(user_id):
+            _user_cache[user_id] = (version, time.monotonic() + USER_CACHE_TTL_SECONDS, cu)
+    return cu
+
 def get_current_user(
     request: Request,
     db: Session = Depends(get_db),
 ) -> Optional[CurrentUser]:
     """
-    يقرأ المستخدم من الجلسة، ثم يعيد قراءته من قاعدة البيانات
-    لضمان تحديث الصلاحيات مباشرة (بدون الاعتماد على بيانات قديمة في الجلسة).
+    يقرأ المستخدم من الجلسة، ثم يعيد قراءته من قاعدة البيانات (عبر ذاكرة مؤقتة قصيرة
+    تُبطل عند تعديل المستخدم) بدل الاعتماد على بيانات قديمة في الجلسة.
     """
     sess = request.session.get("user")
     if not sess:
@@ -52,15 +107,12 @@ def get_current_user(
         request.state.current_user = None
         return None
 
-    # ملاحظة: إن كنت على SQLAlchemy < 2.0 استخدم filter(...).first()
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if not db_user or not db_user.is_active:
+    cu = _load_user(db, user_id)
+    if cu is None:
         # جلسة غير صالحة أو مستخدم غير فعّال
         request.state.current_user = None
         return None
 
-    cu = _map_user(db_user)
-
     # خزن نسخة محدثة في request.state لاستخدامها داخل القوالب
     request.state.current_user = cu
     return cu
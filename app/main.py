@@ -1,6 +1,7 @@
 
 import os
 import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, Request
@@ -8,9 +9,10 @@ from fastapi.responses import RedirectResponse, FileResponse, Response, PlainTex
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
 from app.routers import verify
 
 load_dotenv()
@@ -22,8 +24,11 @@ SLIDING_TOUCH_SECONDS = 15 * 60
 HTTPS_ONLY = os.getenv("HTTPS_ONLY", "false").strip().lower() in ("1", "true", "yes")
 
 from .database import Base, engine, SessionLocal
-from . import models
-from .services import settings as S
+from . import models, security
+from .templating import ui_context
+from .reports import renderer as report_renderer
+from .services import clinic_store, clinic_summary, dashboard_stats, drug_search, login_activity, login_log_writer
+from .services import settings as settings_service
 
 from .routers import auth as auth_router
 from .routers import hod as hod_router
@@ -38,25 +43,39 @@ from .routers import first_aid as first_aid_router
 from .routers import inventory as inventory_router
 from .routers import profile as profile_router
 from .routers import excel_api as excel_api_router
+from .routers import pdf_jobs as pdf_jobs_router
 
 from .middlewares.maintenance import MaintenanceMiddleware
 
-app = FastAPI(title=APP_NAME, debug=DEBUG)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # نسخة الإعدادات قبل أول طلب: لو استُنفد تجمّع الاتصالات لاحقًا يبقى للـ middleware نسخة سابقة
+    try:
+        settings_service.get_snapshot()
+    except Exception as e:
+        print(f"[settings] warm-up skipped: {e}")
+    yield
+    # كتابة سجلات الدخول المعلّقة قبل الإيقاف
+    login_log_writer.stop()
 
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=SECRET_KEY,
-    max_age=SESSION_MAX_AGE_DAYS * 24 * 3600,
-    same_site="lax",
-    https_only=HTTPS_ONLY,
-)
+app = FastAPI(title=APP_NAME, debug=DEBUG, lifespan=lifespan)
 
-app.add_middleware(MaintenanceMiddleware)
+class SessionHelperMiddleware:
+    """
+    Middleware ASGI خام: يضع current_user في request.state ويحدّث last_touch (جلسة منزلقة).
+    حقن متغيرات القوالب (app_name, ui_footer, ...) انتقل إلى app.templating.ui_context.
+    """
 
-class SessionHelperMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        session = request.scope.get("session") or {}
-        request.state.current_user = session.get("user")
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("path", "").startswith("/static/"):
+            await self.app(scope, receive, send)
+            return
+
+        session = scope.get("session") or {}
+        scope.setdefault("state", {})["current_user"] = session.get("user")
 
         if session:
             try:
@@ -67,38 +86,22 @@ class SessionHelperMiddleware(BaseHTTPMiddleware):
             except Exception:
                 pass
 
-        response = await call_next(request)
-
-        try:
-            if hasattr(response, "template") and hasattr(response, "context") and isinstance(response.context, dict):
-
-                if request.state.current_user:
-                    response.context.setdefault("current_user", request.state.current_user)
-                else:
-                    response.context.setdefault("current_user", None)
-
-                db = SessionLocal()
-                try:
-                    app_name       = S.get_str(db, "app.name", "Training Courses System")
-                    ui_footer      = S.get_str(db, "ui.footer_text", "")
-                    ui_logo_url    = S.get_str(db, "ui.logo_url", "")
-                    ui_favicon_url = S.get_str(db, "ui.favicon_url", "")
-                finally:
-                    db.close()
-
-                response.context.setdefault("app_name", app_name)
-                response.context.setdefault("ui_footer", ui_footer)
-                response.context.setdefault("ui_logo_url", ui_logo_url)
-                response.context.setdefault("ui_favicon_url", ui_favicon_url)
-        except Exception:
-            pass
-
-        return response
+        await self.app(scope, receive, send)
 
+# الترتيب: آخر middleware يُضاف هو الخارجي، لذلك SessionMiddleware يُضاف أخيرًا
+# حتى تكون الجلسة متاحة في scope عند وصول الطلب إلى بقية الطبقات.
 app.add_middleware(SessionHelperMiddleware)
+app.add_middleware(MaintenanceMiddleware)
+app.add_middleware(
+    SessionMiddleware,
+    secret_key=SECRET_KEY,
+    max_age=SESSION_MAX_AGE_DAYS * 24 * 3600,
+    same_site="lax",
+    https_only=HTTPS_ONLY,
+)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 from jinja2 import Environment
 def first_letter(text):
@@ -138,6 +141,21 @@ templates.env.filters['flatten'] = _flatten_filter
 # ── إنشاء الجداول (مرة أولى) ────────────────────────────
 Base.metadata.create_all(bind=engine)
 
+# ── فهرس البحث عن الأدوية (FTS5 / pg_trgm) ──────────────
+drug_search.ensure_index()
+clinic_store.ensure()
+clinic_summary.ensure()
+login_activity.ensure()
+
+# ── إحصائيات لوحة الإدارة (تُحسب في الخلفية) ─────────────
+dashboard_stats.warm_up()
+
+# ── معايرة تكلفة bcrypt (إن لم تُحدد BCRYPT_ROUNDS) ──────
+security.calibrate()
+
+# ── تجهيز أصول تقارير PDF (الخطوط/الشعار) مرة واحدة ─────
+report_renderer.warm_up()
+
 # ── تضمين الراوترات (⚠️ الترتيب يهم) ────────────────────
 app.include_router(auth_router.router)
 app.include_router(profile_router.router)  # الملف الشخصي
@@ -154,6 +172,7 @@ app.include_router(first_aid_router.router)
 app.include_router(inventory_router.router)
 app.include_router(excel_api_router.router)            # Excel Data API
 app.include_router(verify.router)
+app.include_router(pdf_jobs_router.router)           # /jobs (PDF في الخلفية)
 # ثم الراوتر العام
 app.include_router(admin_router.router)               # /admin/...
 
@@ -235,8 +254,17 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     if exc.status_code == status.HTTP_404_NOT_FOUND:
         if request.url.path == "/favicon.ico":
             return Response(status_code=404)
-        return PlainTextResponse("الصفحة غير موجودة", status_code=404)
-    return PlainTextResponse(str(exc.detail or "خطأ"), status_code=exc.status_code)
+        return PlainTextResponse("الصفحة غير موجودة", status_code=404, headers=exc.headers)
+    return PlainTextResponse(str(exc.detail or "خطأ"), status_code=exc.status_code, headers=exc.headers)
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # كل اتصالات قاعدة البيانات مشغولة لمدة DB_POOL_TIMEOUT: 503 مؤقت بدل 500
+    return PlainTextResponse(
+        "الخادم مشغول حاليًا، حاول بعد لحظات",
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "5"},
+    )
 
 @app.get("/", include_in_schema=False)
 def index(request: Request):
@@ -1,11 +1,9 @@
 from typing import List
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import HTMLResponse
 from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
-from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from ..database import SessionLocal
 from ..services import settings as S
 
 SAFE_PATHS = {"/favicon.ico", "/health", "/auth/login", "/auth/logout"}
@@ -15,34 +13,46 @@ def _ip_allowed(ip: str, allowed: List[str]) -> bool:
 
     return bool(ip) and ip in (allowed or [])
 
-class MaintenanceMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
+def is_safe_path(path: str) -> bool:
+    return path in SAFE_PATHS or path.startswith(SAFE_PREFIXES)
 
-        if path in SAFE_PATHS or any(path.startswith(p) for p in SAFE_PREFIXES):
-            return await call_next(request)
+class MaintenanceMiddleware:
+    """
+    Middleware ASGI خام (بدون BaseHTTPMiddleware):
+    - المسارات الآمنة والملفات الثابتة تمر مباشرة بدون أي عمل إضافي.
+    - الإعدادات تُقرأ من الكاش (services.settings)؛ التحقق الدوري من قاعدة البيانات في threadpool
+      حتى لا ينتظر الـ event loop اتصالًا من التجمّع.
+    """
 
-        db: Session = SessionLocal()
-        try:
-            enabled = S.get_bool(db, "maintenance.enabled", False)
-            allow_admin_bypass = S.get_bool(db, "maintenance.allow_admin_bypass", True)
-            allowed_ips = S.get_json(db, "maintenance.allowed_ips", []) or []
-            title = S.get_str(db, "maintenance.message_title", "النظام في وضع الصيانة")
-            body = S.get_str(db, "maintenance.message_body", "نقوم حاليًا بأعمال صيانة. الرجاء المحاولة لاحقًا.")
-        finally:
-            db.close()
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-        if not enabled:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or is_safe_path(scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
 
-        session = request.scope.get("session") or {}
+        # التحقق الدوري من الإعدادات يلمس قاعدة البيانات: خارج حلقة الأحداث
+        cfg = S.cached_snapshot() or await run_in_threadpool(S.get_snapshot)
+        if not cfg.get_bool("maintenance.enabled", False):
+            await self.app(scope, receive, send)
+            return
+
+        allow_admin_bypass = cfg.get_bool("maintenance.allow_admin_bypass", True)
+        allowed_ips = cfg.get_json("maintenance.allowed_ips", []) or []
+        title = cfg.get_str("maintenance.message_title", "النظام في وضع الصيانة")
+        body = cfg.get_str("maintenance.message_body", "نقوم حاليًا بأعمال صيانة. الرجاء المحاولة لاحقًا.")
+
+        session = scope.get("session") or {}
         user = session.get("user") if isinstance(session, dict) else None
         is_admin = bool(user and user.get("is_admin"))
 
-        client_ip = request.client.host if request.client else ""
+        client = scope.get("client")
+        client_ip = client[0] if client else ""
 
         if (allow_admin_bypass and is_admin) or _ip_allowed(client_ip, allowed_ips):
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
         html = f"""
         <!doctype html><html lang="ar" dir="rtl">
@@ -58,4 +68,5 @@ class MaintenanceMiddleware(BaseHTTPMiddleware):
         </head>
         <body><div class="box"><h1>🛠️ {title}</h1><p>{body}</p></div></body></html>
         """
-        return HTMLResponse(html, status_code=HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
+        response = HTMLResponse(html, status_code=HTTP_503_SERVICE_UNAVAILABLE)
+        await response(scope, receive, send)
\ No newline at end of file
@@ -145,6 +145,20 @@ class LoginLog(Base):
         Index("idx_login_logs_login_at", "login_at"),
     )
 
+class UserLoginStats(Base):
+    """ملخص دخول كل مستخدم (يُحدَّث مع كل تسجيل دخول في نفس معاملة login_logs)."""
+    __tablename__ = "user_login_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_login_at = Column(DateTime, nullable=True)
+    last_ip = Column(String(50), nullable=True)
+    login_count = Column(Integer, nullable=False, default=0)  # منذ البداية (لا يتأثر بحذف السجلات القديمة)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_user_login_stats_last_login", last_login_at),
+    )
+
 class College(Base):
     __tablename__ = "colleges"
     id = Column(Integer, primary_key=True, index=True)
@@ -233,6 +247,117 @@ class CertificateVerification(Base):
         Index("idx_cv_trainee", "trainee_no", "course_id"),
     )
 
+class PdfJob(Base):
+    __tablename__ = "pdf_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    params_json = Column(Text, nullable=True)
+    user_id = Column(Integer, nullable=False)
+    user_json = Column(Text, nullable=True)
+    status = Column(String(20), nullable=False, default="queued")
+    error = Column(Text, nullable=True)
+    artifact_path = Column(Text, nullable=True)
+    filename = Column(String(255), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_pdf_jobs_user_status", "user_id", "status"),
+        Index("idx_pdf_jobs_status_created", "status", "created_at"),
+    )
+
+class ClinicPatientProfile(Base):
+    """ملف المراجع الطبي (كان record_kind='profile' في clinic_patients)."""
+    __tablename__ = "clinic_patient_profiles"
+
+    id = Column(Integer, primary_key=True)
+    patient_type = Column(String(20), nullable=True)  # trainee | employee
+    trainee_no = Column(String(50), nullable=True)
+    employee_no = Column(String(50), nullable=True)
+    national_id = Column(String(50), nullable=True)
+    full_name = Column(String(255), nullable=True)
+    mobile = Column(String(50), nullable=True)
+    major = Column(String(255), nullable=True)
+    college = Column(String(255), nullable=True)
+    birth_date = Column(String(20), nullable=True)
+    department = Column(String(255), nullable=True)
+    gender = Column(String(20), nullable=True)
+    address = Column(Text, nullable=True)
+    email = Column(String(255), nullable=True)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=True)
+    created_by = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_clinic_profiles_trainee", "patient_type", "trainee_no"),
+        Index("ix_clinic_profiles_employee", "patient_type", "employee_no"),
+        Index("ix_clinic_profiles_national_id", "national_id"),
+        Index("ix_clinic_profiles_full_name", "full_name"),
+    )
+
+class ClinicVisit(Base):
+    """زيارة عيادة (كانت record_kind='visit' في clinic_patients)؛ بيانات المراجع منسوخة وقت الزيارة."""
+    __tablename__ = "clinic_visits"
+
+    id = Column(Integer, primary_key=True)
+    patient_type = Column(String(20), nullable=True)
+    trainee_no = Column(String(50), nullable=True)
+    employee_no = Column(String(50), nullable=True)
+    national_id = Column(String(50), nullable=True)
+    full_name = Column(String(255), nullable=True)
+    mobile = Column(String(50), nullable=True)
+    major = Column(String(255), nullable=True)
+    college = Column(String(255), nullable=True)
+    visit_at = Column(DateTime, nullable=True)
+    visit_date = Column(String(20), nullable=True)
+    visit_reason = Column(Text, nullable=True)
+    temp_c = Column(Float, nullable=True)
+    bp_systolic = Column(Integer, nullable=True)
+    bp_diastolic = Column(Integer, nullable=True)
+    pulse_bpm = Column(Integer, nullable=True)
+    resp_rpm = Column(Integer, nullable=True)
+    weight_kg = Column(Float, nullable=True)
+    height_cm = Column(Float, nullable=True)
+    bmi = Column(Float, nullable=True)
+    glucose_mg = Column(Float, nullable=True)
+    o2_sat = Column(Integer, nullable=True)
+    chronic_json = Column(Text, nullable=True)
+    complaint = Column(Text, nullable=True)
+    diagnosis = Column(Text, nullable=True)
+    treatment = Column(Text, nullable=True)
+    recommendation = Column(String(50), nullable=True)  # rest | referral | none
+    rec_detail = Column(Text, nullable=True)
+    rest_days = Column(Integer, nullable=True)
+    rec_json = Column(Text, nullable=True)
+    rx_json = Column(Text, nullable=True)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=True)
+    created_by = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_clinic_visits_trainee", patient_type, trainee_no, visit_at.desc()),
+        Index("ix_clinic_visits_employee", patient_type, employee_no, visit_at.desc()),
+        Index("ix_clinic_visits_keyset", visit_at, id),  # ترقيم سجل الزيارات (visit_at DESC, id DESC)
+        Index("ix_clinic_visits_recommendation", recommendation, visit_at),
+    )
+
+class ClinicPatientSummary(Base):
+    """ملخص زيارات كل مراجع (يُحدَّث مع كل زيارة في نفس المعاملة)."""
+    __tablename__ = "clinic_patient_summary"
+
+    patient_type = Column(String(20), primary_key=True)  # trainee | employee
+    patient_no = Column(String(50), primary_key=True)    # رقم المتدرب أو الرقم الوظيفي
+    visit_count = Column(Integer, nullable=False, default=0)
+    last_visit_id = Column(Integer, nullable=True)
+    last_visit_at = Column(DateTime, nullable=True)
+    last_diagnosis = Column(Text, nullable=True)
+    last_recommendation = Column(String(50), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+
 class ExcelDataReference(Base):
     __tablename__ = "excel_data_references"
 
@@ -0,0 +1,261 @@
+
+"""
+خدمة موحدة لتوليد تقارير PDF (xhtml2pdf) لكل من hod و clinic و verify.
+
+- الخطوط والشعار وCSS الخاص بـ @font-face تُحل مرة واحدة عند الإقلاع (warm_up).
+- link_callback يحوّل /static/ و file:// إلى مسارات مطلقة مع كاش، وروابط QR إلى data URI.
+- القوالب مسجّلة في Environment واحد مع bytecode cache وتُترجم مرة واحدة؛ كل طلب يقوم بالـ render فقط.
+- render_pdf(template_name, context) واجهة واحدة مع قياس زمن الإقلاع وكل استدعاء.
+"""
+import io
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse, unquote
+
+from jinja2 import (
+    ChoiceLoader,
+    DictLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+    select_autoescape,
+)
+
+try:
+    from xhtml2pdf import pisa
+    HAS_XHTML2PDF = True
+except Exception:
+    HAS_XHTML2PDF = False
+
+from .rest_notice_template import REST_NOTICE_HTML
+from .referral_notice_template import REFERRAL_NOTICE_HTML
+from .skills_record_pdf_template import SKILLS_RECORD_PDF_HTML
+from .roster_pretty_template import ROSTER_PRETTY_HTML
+from ..services import qr_assets
+
+STATIC_DIR = Path("app/static")
+FONTS_DIR = STATIC_DIR / "fonts"
+TEMPLATES_DIR = Path("app/templates")
+BYTECODE_CACHE_DIR = Path(os.getenv("REPORT_TEMPLATE_CACHE_DIR", "cache/jinja_reports"))
+
+LOGO_CANDIDATES = ("images/main_logo.png", "images/favicon.ico", "images/logo.png", "img/logo.png")
+MAJALLA_CANDIDATES = ("Majalla.ttf", "alfont_com_majalla.ttf")
+TRADITIONAL_CANDIDATES = ("Traditional-Arabic.ttf", "Traditional Arabic.ttf")
+RL_MAIN_CANDIDATES = ("NotoNaskhArabic-Regular.ttf", "Traditional-Arabic.ttf", "Amiri.ttf", "Majalla.ttf", "Cairo.ttf")
+RL_ALT_CANDIDATES = ("Amiri.ttf", "Majalla.ttf", "Cairo.ttf", "Traditional-Arabic.ttf", "NotoNaskhArabic-Regular.ttf")
+RL_FONT_STACK = "'ARMain','ARAlt','Arial Unicode MS','DejaVu Sans','Arial'"
+
+class RenderError(RuntimeError):
+    """فشل xhtml2pdf في توليد المستند."""
+
+class ReportAssets:
+    """الأصول الثابتة للتقارير بعد حلّها مرة واحدة."""
+
+    __slots__ = (
+        "font_url_majalla",
+        "font_url_traditional",
+        "font_ready_css",
+        "logo_src",
+        "logo_src_no_favicon",
+        "rl_font_stack",
+    )
+
+    def __init__(self, **kw):
+        for k in self.__slots__:
+            setattr(self, k, kw.get(k))
+
+# سجل القوالب: name -> مصدر نصي (قوالب app/reports) أو مسار ملف داخل app/templates
+_TEMPLATE_SOURCES: Dict[str, str] = {
+    "rest_notice": REST_NOTICE_HTML,
+    "referral_notice": REFERRAL_NOTICE_HTML,
+    "skills_record": SKILLS_RECORD_PDF_HTML,
+    "roster": ROSTER_PRETTY_HTML,
+}
+_TEMPLATE_FILES: Dict[str, str] = {
+    "certificate": "hod/certificate_template.html",
+}
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    try:
+        BYTECODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        return FileSystemBytecodeCache(str(BYTECODE_CACHE_DIR), "%s.cache")
+    except OSError:
+        return None
+
+# Environment مشترك:
+# - القوالب النصية بدون autoescape (كما كانت مع jinja2.Template)
+# - ملفات .html بـ autoescape (كما في Jinja2Templates)
+# - auto_reload معطّل: القوالب لا تتغير أثناء التشغيل
+env = Environment(
+    loader=ChoiceLoader([DictLoader(_TEMPLATE_SOURCES), FileSystemLoader(str(TEMPLATES_DIR))]),
+    autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False, default=False),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=False,
+    cache_size=-1,
+)
+
+_assets: Optional[ReportAssets] = None
+_assets_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, Any] = {"startup_ms": None, "templates": {}}
+
+def _first_existing(candidates, base: Path) -> Optional[str]:
+    for name in candidates:
+        if (base / name).exists():
+            return name
+    return None
+
+def _register_reportlab_fonts() -> None:
+    """تسجيل خطوط ARMain/ARAlt في reportlab (مرة واحدة للعملية)."""
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+    except Exception:
+        return
+    for font_name, candidates in (("ARMain", RL_MAIN_CANDIDATES), ("ARAlt", RL_ALT_CANDIDATES)):
+        fn = _first_existing(candidates, FONTS_DIR)
+        if fn:
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, str((FONTS_DIR / fn).resolve())))
+            except Exception:
+                pass
+
+def _resolve_assets() -> ReportAssets:
+    majalla = _first_existing(MAJALLA_CANDIDATES, FONTS_DIR)
+    traditional = _first_existing(TRADITIONAL_CANDIDATES, FONTS_DIR)
+    font_url_majalla = f"/static/fonts/{majalla}" if majalla else None
+    font_url_traditional = f"/static/fonts/{traditional}" if traditional else None
+
+    parts = []
+    if font_url_majalla:
+        parts.append(f"@font-face {{ font-family:'MajallaAR'; src:url('{font_url_majalla}') format('truetype'); }}")
+    if font_url_traditional:
+        parts.append(f"@font-face {{ font-family:'TradArabicAR'; src:url('{font_url_traditional}') format('truetype'); }}")
+
+    logo = _first_existing(LOGO_CANDIDATES, STATIC_DIR)
+    logo_nf = _first_existing([c for c in LOGO_CANDIDATES if not c.endswith(".ico")], STATIC_DIR)
+
+    _register_reportlab_fonts()
+
+    return ReportAssets(
+        font_url_majalla=font_url_majalla,
+        font_url_traditional=font_url_traditional,
+        font_ready_css="\n".join(parts),
+        logo_src=f"/static/{logo}" if logo else None,
+        logo_src_no_favicon=f"/static/{logo_nf}" if logo_nf else None,
+        rl_font_stack=RL_FONT_STACK,
+    )
+
+def warm_up() -> ReportAssets:
+    """حل الأصول (خطوط/شعار/CSS) وترجمة القوالب مرة واحدة؛ تُستدعى عند الإقلاع."""
+    global _assets
+    with _assets_lock:
+        if _assets is None:
+            t0 = time.perf_counter()
+            _assets = _resolve_assets()
+            precompile()
+            with _metrics_lock:
+                _metrics["startup_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        return _assets
+
+def assets() -> ReportAssets:
+    return _assets if _assets is not None else warm_up()
+
+@lru_cache(maxsize=512)
+def _resolve_uri(uri: str) -> str:
+    if uri.startswith("file://"):
+        parsed = urlparse(uri)
+        p = parsed.netloc if (parsed.netloc and not parsed.path) else parsed.path
+        p = unquote(p)
+        if os.name == "nt" and len(p) >= 3 and p[0] == "/" and p[2] == ":":
+            p = p[1:]
+        return str(Path(p).resolve())
+    if uri.startswith("/static/"):
+        return str(Path("app").joinpath(uri.lstrip("/")).resolve())
+    return uri
+
+def link_callback(uri: str, rel: str) -> str:
+    if not uri:
+        return uri
+    qr = qr_assets.data_uri(uri)
+    if qr is not None:
+        return qr
+    return _resolve_uri(uri)
+
+_compiled: Dict[str, Template] = {}
+
+def _template(name: str) -> Template:
+    tpl = _compiled.get(name)
+    if tpl is None:
+        if name not in _TEMPLATE_SOURCES and name not in _TEMPLATE_FILES:
+            raise KeyError(f"قالب تقرير غير معروف: {name}")
+        tpl = env.get_template(_TEMPLATE_FILES.get(name, name))
+        _compiled[name] = tpl
+    return tpl
+
+def precompile() -> None:
+    """ترجمة كل القوالب المسجلة مسبقًا (تُحمّل من bytecode cache إن وُجد)."""
+    for name in list(_TEMPLATE_SOURCES) + list(_TEMPLATE_FILES):
+        try:
+            _template(name)
+        except Exception:
+            # قالب ملف مفقود لا يمنع الإقلاع؛ الخطأ يظهر عند أول استخدام
+            pass
+
+def _with_defaults(context: Dict[str, Any]) -> Dict[str, Any]:
+    a = assets()
+    ctx = dict(context)
+    ctx.setdefault("font_ready_css", a.font_ready_css)
+    return ctx
+
+def render_html(template_name: str, context: Dict[str, Any]) -> str:
+    return _template(template_name).render(**_with_defaults(context))
+
+def _record(template_name: str, elapsed_ms: float, ok: bool) -> None:
+    with _metrics_lock:
+        m = _metrics["templates"].setdefault(
+            template_name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+        )
+        m["calls"] += 1
+        if not ok:
+            m["errors"] += 1
+        m["total_ms"] += elapsed_ms
+        m["last_ms"] = elapsed_ms
+        if elapsed_ms > m["max_ms"]:
+            m["max_ms"] = elapsed_ms
+
+def render_pdf(template_name: str, context: Dict[str, Any]) -> bytes:
+    """تصيير قالب مسجّل إلى PDF وإرجاع البايتات."""
+    if not HAS_XHTML2PDF:
+        raise RenderError("xhtml2pdf غير مثبتة، ثبّت: pip install xhtml2pdf")
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        html = render_html(template_name, context)
+        pdf_io = io.BytesIO()
+        doc = pisa.CreatePDF(src=html, dest=pdf_io, encoding="UTF-8", link_callback=link_callback)
+        if doc.err:
+            raise RenderError(f"تعذّر توليد PDF ({template_name}) عبر xhtml2pdf: {doc.err}")
+        ok = True
+        return pdf_io.getvalue()
+    finally:
+        _record(template_name, (time.perf_counter() - t0) * 1000.0, ok)
+
+def metrics() -> Dict[str, Any]:
+    with _metrics_lock:
+        out = {"startup_ms": _metrics["startup_ms"], "templates": {}}
+        for name, m in _metrics["templates"].items():
+            avg = m["total_ms"] / m["calls"] if m["calls"] else 0.0
+            out["templates"][name] = {
+                "calls": m["calls"],
+                "errors": m["errors"],
+                "avg_ms": round(avg, 3),
+                "max_ms": round(m["max_ms"], 3),
+                "last_ms": round(m["last_ms"], 3),
+            }
+        return out
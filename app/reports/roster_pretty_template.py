@@ -0,0 +1,194 @@
+
+ROSTER_PRETTY_HTML = r"""<!doctype html>
+<html lang="ar" dir="rtl">
+<head>
+  <meta charset="utf-8" />
+  <title>{{ shape('كشف حضور دورة تدريبية') }} - {{ shape(course.title or '') }}</title>
+  <style>
+    {{ font_ready_css|safe }}
+    /* brand:
+
+    @page{
+      size: A4 portrait;
+      margin: 0;
+      @frame header_frame  { -pdf-frame-content: header_content; left: 10mm; right: 10mm; top: 6mm;  height: 22mm; }
+      @frame content_frame { left: 10mm; right: 10mm; top: 32mm; bottom: 18mm; }
+      @frame footer_frame  { -pdf-frame-content: footer_content; left: 10mm; right: 10mm; bottom: 6mm; height: 10mm; }
+    }
+
+    html, body{
+      direction: rtl; margin:0; padding:0;
+      -webkit-print-color-adjust: exact; print-color-adjust: exact;
+      color:
+      font-family:'MajallaAR','TradArabicAR','Majalla','Traditional Arabic','Arial Unicode MS','DejaVu Sans','Arial';
+    }
+    * { font-family: inherit !important; }
+
+    .ltr { direction:ltr; unicode-bidi:bidi-override; }
+
+    /* ===== الهيدر المثبّت ===== */
+    .hdr{ width:100%; border-collapse:collapse; table-layout:fixed; }
+    .hdr td{ vertical-align:middle; padding:0; }
+    .title-cell{ text-align:left; padding-right:6mm; }
+    .logo-cell{ text-align:right; width:50mm; }
+    .logo{ max-height:28mm; width:auto; height:auto; display:block; object-fit:contain; }
+    .report-title{ font-weight:800; color:
+    .title-underline{ height:3px; width:180px; background:
+
+    /* ===== البطاقة ===== */
+    .card{ background:
+    .pad{ padding:10px 12px; }
+    .chip{
+      display:block; text-align:center; padding:2px 10px; margin:0 auto 8px;
+      background:
+      font-weight:700; font-size:14pt;
+    }
+
+    /* ===== جدول بيانات الدورة ===== */
+    table.meta{
+      width:100%; border-collapse:collapse; table-layout:fixed; border:1.2px solid
+    }
+    table.meta th, table.meta td{
+      border:1.2px solid
+      text-align:center; vertical-align:middle; font-size:11pt;
+      white-space:normal; word-wrap:break-word; overflow-wrap:break-word;
+      line-height:1.25;
+    }
+    table.meta th{ background:
+    table.meta td.label{ width:12%; font-weight:700; }
+    table.meta td.value{ width:38%; }
+
+    /* ===== جدول كشف الحضور ===== */
+    table.roster{
+      width:100%; border-collapse:collapse; table-layout:fixed; margin-top:8px;
+      border:1.2px solid
+    }
+    table.roster thead th{
+      border:1.2px solid
+      background:
+      white-space:normal; word-wrap:break-word; overflow-wrap:break-word;
+    }
+    table.roster tbody td{
+      border:1.2px solid
+      font-size:11pt; white-space:normal; word-wrap:break-word; overflow-wrap:break-word; line-height:1.25;
+    }
+
+    thead{ display:table-header-group; }
+    tr{ page-break-inside:avoid; }
+  </style>
+</head>
+<body>
+
+  <!-- الهيدر المثبّت -->
+  <div id="header_content">
+    <table class="hdr" dir="ltr" role="presentation" aria-hidden="true">
+      <colgroup><col><col style="width:50mm"></colgroup>
+      <tr>
+        <td class="title-cell">
+          <div class="report-title">{{ shape('كشف حضور دورة تدريبية') }}</div>
+          <div class="title-underline"></div>
+        </td>
+        <td class="logo-cell">
+          {% if logo_src %}
+            <img class="logo" src="{{ logo_src }}" alt="logo">
+          {% endif %}
+        </td>
+      </tr>
+    </table>
+  </div>
+
+  <!-- المحتوى -->
+  <div id="content_frame">
+    <section class="card">
+      <div class="pad">
+        <span class="chip">{{ shape('بيانات الدورة') }}</span>
+
+        <!-- جدول البيانات -->
+        <table class="meta" role="presentation" aria-hidden="true">
+          <!-- ثبّت العرض: العمود 1 و3 (label) = 10%، العمود 2 و4 (value) = 40% -->
+          <colgroup>
+            <col style="width:10%"><col style="width:40%">
+            <col style="width:10%"><col style="width:40%">
+          </colgroup>
+          <tbody>
+            <!-- الصف 1 -->
+            <tr>
+              
+              <td class="value">{{ shape(((course.hours|string) if course.hours else '0') if course.hours else '0') }}</td>
+              <td class="label">{{ shape('عدد الساعات') }}</td>
+              
+              <td class="value">{{ shape(course.title or '---') }}</td>
+              <td class="label">{{ shape('اسم الدورة') }}</td>
+              
+            </tr>
+
+            <!-- الصف 2 -->
+            <tr>
+              <td class="value">{{ shape(course.provider or '---') }}</td>
+              <td class="label">{{ shape('الجهة المنفذة') }}</td>
+              
+              <td class="value">{{ shape(course.provider_name or '---') }}</td>
+              <td class="label">{{ shape('اسم المنفذ') }}</td>
+
+              
+            </tr>
+
+            <!-- الصف 3: التواريخ -->
+            <tr>
+              <td class="value ltr">{% if course.end_date %}{{ course.end_date.strftime('%d-%m-%Y') }}{% else %}---{% endif %}</td>
+              <td class="label">{{ shape('تاريخ النهاية') }}</td>
+              
+              <td class="value ltr">{% if course.start_date %}{{ course.start_date.strftime('%d-%m-%Y') }}{% else %}---{% endif %}</td>
+              <td class="label">{{ shape('تاريخ البداية') }}</td>
+              
+              
+            </tr>
+          </tbody>
+        </table>
+
+        <!-- جدول الحضور (مع عمود التخصص) -->
+        <table class="roster" dir="ltr" role="table" aria-label="{{ shape('كشف حضور الدورة') }}">
+          <colgroup>
+            <col style="width:40mm">
+            <col style="width:58mm">
+            <col style="width:28mm">
+            <col style="width:55mm">
+            <col style="width:9mm">
+          </colgroup>
+          <thead>
+            <tr>
+              <th style="width:40mm;min-height:20px">{{ shape('توقيع المتدرب') }}</th>
+              <th style="width:58mm;min-height:20px">{{ shape('التخصص') }}</th>
+              <th style="width:28mm;min-height:20px">{{ shape('الرقم التدريبي') }}</th>
+              <th style="width:55mm;min-height:20px">{{ shape('اسم المتدرب') }}</th>
+              <th style="width:9mm;min-height:20px">{{ shape('م') }}</th>
+            </tr>
+          </thead>
+          <tbody>
+            {% if enrollments and enrollments|length > 0 %}
+              {% for r in enrollments %}
+                <tr>
+                  <td style="min-height:20px">&nbsp;</td>
+                  <td style="min-height:20px">{{ shape(r.trainee_major or '') or '&nbsp;' }}</td>
+                  <td style="min-height:20px">{{ shape(r.trainee_no or '') or '&nbsp;' }}</td>
+                  <td style="min-height:20px">{{ shape(r.trainee_name or '') or '&nbsp;' }}</td>
+                  <td style="min-height:20px">{{ loop.index }}</td>
+                </tr>
+              {% endfor %}
+            {% else %}
+              <tr><td colspan="5" style="min-height:20px">&nbsp;</td></tr>
+            {% endif %}
+          </tbody>
+        </table>
+      </div>
+    </section>
+  </div>
+
+  <!-- الفوتر المثبّت -->
+  <div id="footer_content" style="text-align:center; font-size:10.5pt; color:#6b7280; border-top:1px dashed #c5d6de; padding-top:6px;">
+    {{ shape('تم تصدير هذا الكشف عبر نظام خدمات المتدربين التفاعلية Guidxus') }}
+  </div>
+
+</body>
+</html>
+"""
@@ -1,16 +1,18 @@
 
 from typing import Optional
 from fastapi import APIRouter, Request, Depends, Query
+from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from ..models import User, Department, Course, College, CourseTargetDepartment, LoginLog
-from ..deps_auth import require_admin
-from sqlalchemy import text
+from ..database import get_db, pool_metrics, sqlite_metrics
+from ..deps_auth import require_admin, user_cache_metrics
+from ..templating import ui_context
+from ..reports import renderer
+from ..services import college_directory, dashboard_stats, login_activity, login_log_writer, password_hasher, qr_assets, verify_cache
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 @router.get("/", dependencies=[Depends(require_admin)])
 def admin_home(request: Request, db: Session = Depends(get_db), msg: Optional[str] = Query(None)):
@@ -23,26 +25,8 @@ def admin_home(request: Request, db: Session = Depends(get_db), msg: Optional[st
         from ..deps_auth import get_current_user
         current_user = get_current_user(request, db)
         
-
-        user_count = db.query(User).filter(
-            (User.college_admin_college == current_user.college_admin_college) | (User.hod_college == current_user.college_admin_college)
-        ).count()
-        
-
-        dept_count = db.query(Department).filter(Department.college == current_user.college_admin_college).count()
-        
-
-        dept_names = [d.name for d in db.query(Department).filter(Department.college == current_user.college_admin_college).all()]
-        if dept_names:
-            course_count = db.query(Course).join(Course.targets).filter(CourseTargetDepartment.department_name.in_(dept_names)).distinct().count()
-        else:
-            course_count = 0
-        
-        stats = {
-            "users": user_count,
-            "departments": dept_count,
-            "courses": course_count,
-        }
+        # الإحصائيات من الذاكرة (تُحدَّث في الخلفية)
+        stats = dashboard_stats.get(dashboard_stats.college_scope(current_user.college_admin_college))
         
         return templates.TemplateResponse(
             "admin/college_admin_dashboard.html",
@@ -50,151 +34,7 @@ def admin_home(request: Request, db: Session = Depends(get_db), msg: Optional[st
         )
     
 
-    from ..models import CourseEnrollment
-    
-    counts = {
-        "users": db.query(User).count(),
-        "admins": db.query(User).filter(User.is_admin == True).count(),
-        "hods": db.query(User).filter(User.is_hod == True).count(),
-        "departments": db.query(Department).count(),
-        "colleges": db.query(College).count(),
-        "courses": db.query(Course).count(),
-        "courses_published": db.query(Course).filter(Course.status == "published").count(),
-    }
-    
-
-    try:
-
-        enrollments_count = db.query(CourseEnrollment).join(Course).filter(
-            Course.status == "published"
-        ).count()
-        counts["enrollments_published"] = enrollments_count
-    except Exception:
-        counts["enrollments_published"] = 0
-    
-
-    try:
-
-        counts["doctors"] = db.query(User).filter(User.is_doc == True, User.is_active == True).count()
-        
-
-        from ..database import is_sqlite
-        
-        if is_sqlite():
-
-            visits_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit'
-            """)).scalar()
-            counts["visits"] = visits_count or 0
-            
-            # عدد الإحالات (من recommendation أو rec_json)
-            referrals_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit' 
-                AND (
-                    recommendation = 'referral' 
-                    OR rec_json LIKE '%"type":"referral"%'
-                    OR rec_json LIKE '%"type": "referral"%'
-                )
-            """)).scalar()
-            counts["referrals"] = referrals_count or 0
-            
-
-            leaves_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit' 
-                AND (
-                    rest_days IS NOT NULL AND rest_days != ''
-                    OR recommendation = 'rest'
-                    OR rec_json LIKE '%"type":"rest"%'
-                    OR rec_json LIKE '%"type": "rest"%'
-                )
-            """)).scalar()
-            counts["leaves"] = leaves_count or 0
-        else:
-            # PostgreSQL - استخدام JSON operators
-            visits_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit'
-            """)).scalar()
-            counts["visits"] = visits_count or 0
-            
-            referrals_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit' 
-                AND (
-                    recommendation = 'referral' 
-                    OR rec_json::text LIKE '%"type":"referral"%'
-                    OR rec_json::text LIKE '%"type": "referral"%'
-                )
-            """)).scalar()
-            counts["referrals"] = referrals_count or 0
-            
-            leaves_count = db.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM clinic_patients 
-                WHERE record_kind = 'visit' 
-                AND (
-                    rest_days IS NOT NULL 
-                    OR recommendation = 'rest'
-                    OR rec_json::text LIKE '%"type":"rest"%'
-                    OR rec_json::text LIKE '%"type": "rest"%'
-                )
-            """)).scalar()
-            counts["leaves"] = leaves_count or 0
-        
-    except Exception as e:
-
-        try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-            from excel_data_reference import get_statistics
-            
-            stats = get_statistics()
-            counts["doctors"] = 1
-            counts["visits"] = stats.get('total_clinic_patients', 0)
-            counts["referrals"] = int(stats.get('total_clinic_patients', 0) * 0.1)
-            counts["leaves"] = int(stats.get('total_clinic_patients', 0) * 0.05)
-            counts["excel_source"] = True
-        except Exception:
-            counts["doctors"] = db.query(User).filter(User.is_doc == True, User.is_active == True).count()
-            counts["visits"] = 0
-            counts["referrals"] = 0
-            counts["leaves"] = 0
-
-    try:
-        total_courses = counts.get("courses", 0) or 0
-        if total_courses > 0:
-            counts["courses_published_pct"] = int(round((counts.get("courses_published", 0) / total_courses) * 100))
-        else:
-            counts["courses_published_pct"] = 0
-    except Exception:
-        counts["courses_published_pct"] = 0
-    
-
-    try:
-        import sys
-        import os
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        from excel_data_reference import get_statistics, get_all_drugs
-        
-        stats = get_statistics()
-        drugs = get_all_drugs()
-        
-        counts["pharmacy_drugs"] = len(drugs)
-        counts["pharmacy_stock"] = sum(d.get('stock_qty', 0) for d in drugs)
-        counts["pharmacy_movements"] = stats.get('drug_movements', 0) if hasattr(stats, 'get') else 0
-    except Exception:
-        counts["pharmacy_drugs"] = 0
-        counts["pharmacy_stock"] = 0
-        counts["pharmacy_movements"] = 0
+    counts = dashboard_stats.get(dashboard_stats.GLOBAL_SCOPE)
     
     return templates.TemplateResponse(
         "admin/index.html",
@@ -216,36 +56,27 @@ def admin_settings(request: Request):
     )
 
 @router.get("/audit", dependencies=[Depends(require_admin)])
-def admin_audit(request: Request, db: Session = Depends(get_db)):
-    from sqlalchemy import func, desc
-    from datetime import datetime
-    
-
-    users = db.query(User).all()
-    
-    users_stats = []
-    for user in users:
-
-        last_login = db.query(LoginLog).filter(LoginLog.user_id == user.id).order_by(desc(LoginLog.login_at)).first()
-        
-
-        login_count = db.query(LoginLog).filter(LoginLog.user_id == user.id).count()
-        
-        users_stats.append({
-            "id": user.id,
-            "username": user.username,
-            "full_name": user.full_name,
-            "last_login": last_login.login_at if last_login else None,
-            "last_ip": last_login.ip_address if last_login else None,
-            "login_count": login_count,
-        })
-    
-
-    users_stats.sort(key=lambda x: x["last_login"] or datetime.min, reverse=True)
+def admin_audit(
+    request: Request,
+    db: Session = Depends(get_db),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(login_activity.PAGE_SIZE, ge=1, le=login_activity.MAX_PAGE_SIZE),
+):
+    # استعلام واحد مرقّم من ملخص الدخول (user_login_stats)
+    users_stats, total = login_activity.page(db, page, per_page)
+    pages = max(1, (total + per_page - 1) // per_page)
     
     return templates.TemplateResponse(
         "admin/login_activity.html",
-        {"request": request, "users_stats": users_stats}
+        {
+            "request": request,
+            "users_stats": users_stats,
+            "page": page,
+            "per_page": per_page,
+            "pages": pages,
+            "total": total,
+            "offset": (page - 1) * per_page,
+        }
     )
 
 @router.get("/logs", dependencies=[Depends(require_admin)])
@@ -317,4 +148,35 @@ def admin_excel_data(request: Request):
                 "title": "خطأ",
                 "desc": f"حدث خطأ أثناء تحميل البيانات: {str(e)}"
             }
-        )
\ No newline at end of file
+        )
+
+@router.post("/excel-data/reload", dependencies=[Depends(require_admin)])
+def admin_excel_data_reload():
+    """إعادة بناء النسخة العمودية من ملف الإكسيل فورًا."""
+    import sys
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    from excel_data_reference import reload_excel_data
+    try:
+        snapshot = reload_excel_data()
+        dashboard_stats.invalidate()  # أرقام الصيدلية في اللوحة من ملف الإكسيل
+        return JSONResponse({"success": True, "snapshot": snapshot})
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+@router.get("/metrics", dependencies=[Depends(require_admin)])
+def admin_metrics():
+    """مؤشرات أداء داخلية (JSON)."""
+    return JSONResponse({
+        "reports": renderer.metrics(),
+        "dashboard": dashboard_stats.metrics(),
+        "login_log_writer": login_log_writer.metrics(),
+        "user_cache": user_cache_metrics(),
+        "password_hasher": password_hasher.metrics(),
+        "college_directory": college_directory.metrics(),
+        "verify_cache": verify_cache.metrics(),
+        "verify_rate_limit": verify_cache.limiter.metrics(),
+        "qr_assets": qr_assets.metrics(),
+        "db_pool": pool_metrics(),
+        "sqlite": sqlite_metrics(),
+    })
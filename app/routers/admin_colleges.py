@@ -12,9 +12,11 @@ from starlette import status
 from ..database import get_db
 from ..deps_auth import require_admin, require_user, CurrentUser, get_current_user
 from ..models import Department, College
+from ..templating import ui_context
+from ..services import college_directory
 
 router = APIRouter(prefix="/admin/colleges", tags=["admin-colleges"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 STATIC_ROOT = Path("app/static").resolve()
 UPLOAD_ROOT = STATIC_ROOT / "uploads" / "colleges"
@@ -243,6 +245,7 @@ def college_create(
     if stamp_path:     item.students_affairs_stamp_path = stamp_path
 
     db.commit()
+    college_directory.invalidate()
 
     return RedirectResponse(url="/admin/?msg=تم+إنشاء+الكلية+بنجاح", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -331,6 +334,7 @@ def college_update(
         item.students_affairs_stamp_path = stamp_path
 
     db.commit()
+    college_directory.invalidate()
     return RedirectResponse(url="/admin/colleges", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/{cid}/toggle$")
@@ -351,6 +355,7 @@ def college_toggle(
         else:
             item.is_active = not bool(item.is_active)
         db.commit()
+        college_directory.invalidate()
     return RedirectResponse(url="/admin/colleges", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/{cid}/delete")
@@ -368,4 +373,5 @@ def college_delete(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="صلاحية الحذف للسوبر أدمن فقط")
     db.delete(item)
     db.commit()
+    college_directory.invalidate()
     return RedirectResponse(url="/admin/colleges", status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
@@ -9,9 +9,11 @@ from starlette import status
 from ..database import get_db
 from ..deps_auth import require_admin, get_current_user
 from ..models import Department, User, College
+from ..templating import ui_context
+from ..services import college_directory
 
 router = APIRouter(prefix="/admin/departments", tags=["admin-departments"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 def normalize(s: Optional[str]) -> str:
     """قص المسافات الزائدة وتطبيع النص للمقارنة والتخزين"""
@@ -192,6 +194,7 @@ def department_create(
     )
     db.add(dep)
     db.commit()
+    college_directory.invalidate()
 
     return RedirectResponse(url="/admin/?msg=تم+إنشاء+القسم+بنجاح", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -305,6 +308,7 @@ def department_update(
     )
 
     db.commit()
+    college_directory.invalidate()
     return RedirectResponse(
         url=f"/admin/departments?college={college_n}",
         status_code=status.HTTP_303_SEE_OTHER,
@@ -323,6 +327,7 @@ def department_toggle(
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="صلاحية التبديل مقتصرة على أقسام كليتك")
         dep.is_active = not bool(dep.is_active)
         db.commit()
+        college_directory.invalidate()
     return RedirectResponse(
         url=f"/admin/departments?college={dep.college if dep else ''}",
         status_code=status.HTTP_303_SEE_OTHER,
@@ -342,6 +347,7 @@ def department_delete(
 
         db.delete(dep)
         db.commit()
+        college_directory.invalidate()
     return RedirectResponse(
         url="/admin/departments", status_code=status.HTTP_303_SEE_OTHER
     )
\ No newline at end of file
@@ -12,10 +12,12 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..deps_auth import require_admin
 from ..services import settings as S
+from ..services import certificate_pdf_cache as cert_pdf_cache
 from ..models import CertificateTemplate
+from ..templating import ui_context
 
 router = APIRouter(prefix="/admin/settings", tags=["admin-settings"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 def _booly(v) -> bool:
     if v is None:
@@ -345,6 +347,12 @@ def smtp_test(
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
+@router.post("/cert-pdf-cache/purge")
+def cert_pdf_cache_purge(admin=Depends(require_admin)):
+    """تفريغ كاش ملفات PDF للشهادات (يُعاد توليدها عند أول تنزيل)."""
+    result = cert_pdf_cache.purge()
+    return JSONResponse({"ok": True, **result, **cert_pdf_cache.stats()})
+
 @router.get("/cert-template")
 def cert_tpl_form(request: Request, admin=Depends(require_admin), db: Session = Depends(get_db)):
     item = (
@@ -9,11 +9,12 @@ from starlette import status
 
 from ..database import get_db
 from ..models import User, Department, College
-from ..deps_auth import require_user_manager, get_current_user, require_admin
+from ..deps_auth import require_user_manager, get_current_user, require_admin, bump_user_version
 from ..security import hash_password
+from ..templating import ui_context
 
 router = APIRouter(prefix="/admin/users", tags=["admin-users"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 def to_bool(value: Optional[str]) -> bool:
     if value is None:
@@ -555,6 +556,7 @@ def user_update(
             },
             status_code=status.HTTP_400_BAD_REQUEST,
         )
+    bump_user_version(user_id)
     return RedirectResponse(url="/admin/users", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/{user_id}/delete")
@@ -567,6 +569,7 @@ def user_delete(
     if user:
         db.delete(user)
         db.commit()
+        bump_user_version(user_id)
     return RedirectResponse(url="/admin/?msg=تم+تحديث+المستخدم+بنجاح", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/{user_id}/toggle")
@@ -579,4 +582,5 @@ def user_toggle_active(
     if user:
         user.is_active = not bool(user.is_active)
         db.commit()
+        bump_user_version(user_id)
     return RedirectResponse(url="/admin/?msg=تم+تحديث+المستخدم+بنجاح", status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
@@ -7,14 +7,16 @@ from fastapi.responses import RedirectResponse
 
 from ..database import get_db
 from sqlalchemy.orm import Session
-from ..models import User, LoginLog
-templates = Jinja2Templates(directory="app/templates")
+from ..models import User
+from ..templating import ui_context
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 from urllib.parse import urlparse
-from ..security import verify_password
+from ..services import login_log_writer, password_hasher
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 @router.get("/change-password")
 def change_password_form(request: Request):
@@ -64,16 +66,38 @@ def login_form(request: Request):
     return templates.TemplateResponse("auth/login.html", {"request": request, "error": None})
 
 @router.post("/login")
-def login_submit(
+async def login_submit(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
     next: str | None = Form(default=None),
     db: Session = Depends(get_db),
 ):
-    user: User | None = db.query(User).filter(User.username == username).first()
+    def _lookup() -> User | None:
+        try:
+            return db.query(User).filter(User.username == username).first()
+        finally:
+            # إرجاع الاتصال للمجمّع قبل انتظار bcrypt (الكائن يبقى محمّلًا بعد الفصل)
+            db.close()
+
+    # الاستعلام في threadpool: انتظار التجمّع أو قفل SQLite لا يحجب حلقة الأحداث
+    user: User | None = await run_in_threadpool(_lookup)
+
+    # bcrypt على مجمّع التهشير المخصص (لا يحجز خيوط الطلبات الأخرى)
+    try:
+        valid = bool(user and user.is_active) and await password_hasher.verify(password, user.password_hash)
+    except password_hasher.HashingBusy:
+        return templates.TemplateResponse(
+            "auth/login.html",
+            {
+                "request": request,
+                "error": "الخادم مشغول حاليًا، الرجاء المحاولة بعد لحظات",
+                "next": _safe_next(next),
+            },
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
 
-    if not user or not user.is_active or not verify_password(password, user.password_hash):
+    if not valid:
         next_url = _safe_next(next)
         return templates.TemplateResponse(
             "auth/login.html",
@@ -85,6 +109,8 @@ def login_submit(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
+    password_hasher.rehash_in_background(user.id, password, user.password_hash)
+
     if getattr(user, "must_change_password", False):
         request.session["user"] = {
             "id": user.id,
@@ -99,9 +125,7 @@ def login_submit(
         }
 
         ip_address = request.client.host if request.client else None
-        login_log = LoginLog(user_id=user.id, username=user.username, ip_address=ip_address)
-        db.add(login_log)
-        db.commit()
+        login_log_writer.submit(user.id, user.username, ip_address)
         return RedirectResponse("/auth/change-password", status_code=303)
 
     request.session["user"] = {
@@ -117,9 +141,7 @@ def login_submit(
     }
 
     ip_address = request.client.host if request.client else None
-    login_log = LoginLog(user_id=user.id, username=user.username, ip_address=ip_address)
-    db.add(login_log)
-    db.commit()
+    login_log_writer.submit(user.id, user.username, ip_address)
 
     next_url = _safe_next(next)
     if next_url:
@@ -1,24 +1,21 @@
 from datetime import date
-import json, math, io, os, re
+import json, math, io, re
 from fastapi import APIRouter, Request, Depends, Query, Form
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from ..reports.rest_notice_template import REST_NOTICE_HTML
-from ..reports.referral_notice_template import REFERRAL_NOTICE_HTML
-from jinja2 import Template
-from xhtml2pdf import pisa
-from pathlib import Path
-from urllib.parse import urlparse, unquote
+from ..reports import renderer
+from ..services import clinic_store, clinic_summary, clinic_visits, drug_search, exports
 from typing import List
 
-from ..database import get_db, is_sqlite
+from ..database import get_db
 from ..deps_auth import require_doc
+from ..templating import ui_context
 
 router = APIRouter(prefix="/clinic", tags=["Clinic"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 _ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
 
@@ -59,43 +56,6 @@ def to_float(s: str | None) -> float | None:
     except Exception:
         return None
 
-def _build_font_ready_css() -> str:
-    parts = []
-    font_dir = Path("app/static/fonts")
-
-    for name in ["Majalla.ttf", "alfont_com_majalla.ttf"]:
-        p = font_dir / name
-        if p.exists():
-            parts.append(f"@font-face {{ font-family:'MajallaAR'; src:url('/static/fonts/{name}') format('truetype'); }}")
-            break
-
-    for name in ["Traditional-Arabic.ttf", "Traditional Arabic.ttf"]:
-        p = font_dir / name
-        if p.exists():
-            parts.append(f"@font-face {{ font-family:'TradArabicAR'; src:url('/static/fonts/{name}') format('truetype'); }}")
-            break
-
-    return "\n".join(parts)
-
-def _link_callback(uri: str, rel: str) -> str:
-    if not uri:
-        return uri
-    if uri.startswith("file://"):
-        parsed = urlparse(uri)
-        p = parsed.netloc if (parsed.netloc and not parsed.path) else parsed.path
-        p = unquote(p)
-        if os.name == "nt" and len(p) >= 3 and p[0] == "/" and p[2] == ":":
-            p = p[1:]
-        return str(Path(p).resolve())
-    if uri.startswith("/static/"):
-        return str(Path("app").joinpath(uri.lstrip("/")).resolve())
-    return uri
-
-def _html_to_pdf_bytes(html: str) -> bytes:
-    pdf_io = io.BytesIO()
-    pisa.CreatePDF(src=html, dest=pdf_io, encoding="UTF-8", link_callback=_link_callback)
-    return pdf_io.getvalue()
-
 def _as_rec_dict(val):
     """إرجاع rec_json كقاموس dict سواء أتى من Postgres كـ jsonb (dict) أو كنص JSON."""
     if isinstance(val, dict):
@@ -166,11 +126,11 @@ def export_rest_notice_by_visit(
     db: Session = Depends(get_db),
 ):
     # اجلب الزيارة + الحقول التي نحتاجها
-    v = db.execute(text("""
+    v = db.execute(text(f"""
         SELECT id, patient_type, trainee_no, employee_no,
                visit_at, rec_json, recommendation, rest_days, chronic_json
-        FROM clinic_patients
-        WHERE record_kind='visit' AND id=:vid
+        FROM {clinic_store.visits()}
+        WHERE id=:vid
         LIMIT 1
     """), {"vid": visit_id}).mappings().first()
     if not v:
@@ -206,12 +166,7 @@ def export_rest_notice_by_visit(
     if not card:
         return JSONResponse({"error": "لا يوجد ملف للمراجع"}, status_code=404)
 
-    logo_src = None
-    for p in ("images/main_logo.png", "images/favicon.ico", "images/logo.png", "img/logo.png"):
-        fp = Path("app/static").joinpath(p)
-        if fp.exists():
-            logo_src = f"/static/{p}"
-            break
+    logo_src = renderer.assets().logo_src
 
     payload = {
         "patient": {
@@ -236,12 +191,13 @@ def export_rest_notice_by_visit(
         "doctor_name": (request.session.get("user") or {}).get("full_name"),
         "created_by_name": (request.session.get("user") or {}).get("full_name"),
         "logo_src": logo_src,
-        "font_ready_css": _build_font_ready_css(),
         "shape": _shape_ar_safe,
     }
 
-    html = Template(REST_NOTICE_HTML).render(**payload)
-    pdf_bytes = _html_to_pdf_bytes(html)
+    try:
+        pdf_bytes = renderer.render_pdf("rest_notice", payload)
+    except renderer.RenderError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
     return StreamingResponse(
         io.BytesIO(pdf_bytes),
         media_type="application/pdf",
@@ -279,13 +235,13 @@ def export_referral_notice_by_visit(
     user=Depends(require_doc),
     db: Session = Depends(get_db),
 ):
-    v = db.execute(text("""
+    v = db.execute(text(f"""
         SELECT id, patient_type, trainee_no, employee_no,
                visit_at, diagnosis, rec_json, recommendation, rec_detail,
                temp_c, bp_systolic, bp_diastolic, pulse_bpm,
                chronic_json, complaint, notes
-        FROM clinic_patients
-        WHERE record_kind='visit' AND id=:vid
+        FROM {clinic_store.visits()}
+        WHERE id=:vid
         LIMIT 1
     """), {"vid": visit_id}).mappings().first()
     if not v:
@@ -316,12 +272,7 @@ def export_referral_notice_by_visit(
         return JSONResponse({"error": "لا يوجد ملف للمراجع"}, status_code=404)
 
     # الشعار
-    logo_src = None
-    for p in ("images/main_logo.png", "images/favicon.ico", "images/logo.png", "img/logo.png"):
-        fp = Path("app/static").joinpath(p)
-        if fp.exists():
-            logo_src = f"/static/{p}"
-            break
+    logo_src = renderer.assets().logo_src
 
     # الأمراض المزمنة: حوّل لنص "لا يوجد" إذا غير موجودة
     chronic_val = v.get("chronic_json")
@@ -373,12 +324,13 @@ def export_referral_notice_by_visit(
         "doctor_name": (request.session.get("user") or {}).get("full_name"),
         "created_by_name": (request.session.get("user") or {}).get("full_name"),
         "logo_src": logo_src,
-        "font_ready_css": _build_font_ready_css(),
         "shape": _shape_ar_safe,
     }
 
-    html = Template(REFERRAL_NOTICE_HTML).render(**payload)
-    pdf_bytes = _html_to_pdf_bytes(html)
+    try:
+        pdf_bytes = renderer.render_pdf("referral_notice", payload)
+    except renderer.RenderError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
     return StreamingResponse(
         io.BytesIO(pdf_bytes),
         media_type="application/pdf",
@@ -478,17 +430,17 @@ def _get_patient_card(db: Session, patient_key: str):
         
         try:
             if ptype == "T":
-                patient = db.execute(text("""
+                patient = db.execute(text(f"""
                     SELECT full_name, trainee_no, national_id, mobile, major, college, birth_date
-                    FROM clinic_patients
-                    WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+                    FROM {clinic_store.profiles()}
+                    WHERE patient_type='trainee' AND trainee_no = :n
                     LIMIT 1
                 """), {"n": pno}).mappings().first()
             else:
-                patient = db.execute(text("""
+                patient = db.execute(text(f"""
                     SELECT full_name, employee_no, national_id, mobile, NULL AS major, NULL AS college, birth_date
-                    FROM clinic_patients
-                    WHERE record_kind='profile' AND patient_type='employee' AND employee_no = :n
+                    FROM {clinic_store.profiles()}
+                    WHERE patient_type='employee' AND employee_no = :n
                     LIMIT 1
                 """), {"n": pno}).mappings().first()
         except Exception:
@@ -567,9 +519,9 @@ def clinic_index(request: Request, user=Depends(require_doc), db: Session = Depe
             return 0
     stats = {
         "doctors": 1,
-        "visits": safe_count("SELECT COUNT(*) FROM clinic_patients WHERE record_kind='visit'"),
-        "referrals": safe_count("SELECT COUNT(*) FROM clinic_patients WHERE record_kind='visit' AND recommendation='referral'"),
-        "leaves": safe_count("SELECT COUNT(*) FROM clinic_patients WHERE record_kind='visit' AND recommendation='rest'"),
+        "visits": safe_count(f"SELECT COUNT(*) FROM {clinic_store.visits()}"),
+        "referrals": safe_count(f"SELECT COUNT(*) FROM {clinic_store.visits()} WHERE recommendation='referral'"),
+        "leaves": safe_count(f"SELECT COUNT(*) FROM {clinic_store.visits()} WHERE recommendation='rest'"),
         "pharmacy_drugs": safe_count("SELECT COUNT(*) FROM drugs"),
         "pharmacy_stock": safe_count("SELECT SUM(balance_qty) FROM pharmacy_stock"),
         "pharmacy_movements": safe_count("SELECT COUNT(*) FROM drug_movements"),
@@ -586,24 +538,9 @@ def drugs_search(
     db: Session = Depends(get_db),
 ):
     """
-    يتوقع جدول public.drugs: id, trade_name, generic_name, strength, form
+    بحث الأدوية (id, trade_name, generic_name, strength, form) عبر فهرس drug_search.
     """
-    qn = f"%{q.strip()}%"
-
-    if is_sqlite():
-        like_clause = "UPPER(trade_name) LIKE UPPER(:q) OR UPPER(generic_name) LIKE UPPER(:q)"
-    else:
-        like_clause = "trade_name ILIKE :q OR generic_name ILIKE :q"
-    rows = db.execute(
-        text(f"""
-            SELECT id, trade_name, generic_name, strength, form
-            FROM public.drugs
-            WHERE {like_clause}
-            ORDER BY trade_name ASC
-            LIMIT :limit
-        """),
-        {"q": qn, "limit": limit},
-    ).mappings().all()
+    rows = drug_search.search(db, q, limit=limit, active_only=False)
 
     items = []
     for r in rows:
@@ -682,17 +619,17 @@ def patients_home(
             
             try:
                 if ptype == "T":
-                    row = db.execute(text("""
+                    row = db.execute(text(f"""
                         SELECT id, full_name, trainee_no, national_id, mobile, major, college, birth_date
-                        FROM clinic_patients
-                        WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+                        FROM {clinic_store.profiles()}
+                        WHERE patient_type='trainee' AND trainee_no = :n
                         LIMIT 1
                     """), {"n": pno}).mappings().first()
                 else:
-                    row = db.execute(text("""
+                    row = db.execute(text(f"""
                         SELECT id, full_name, employee_no, national_id, mobile, birth_date
-                        FROM clinic_patients
-                        WHERE record_kind='profile' AND patient_type='employee' AND employee_no = :n
+                        FROM {clinic_store.profiles()}
+                        WHERE patient_type='employee' AND employee_no = :n
                         LIMIT 1
                     """), {"n": pno}).mappings().first()
             except Exception:
@@ -748,10 +685,10 @@ def patients_home(
             try:
                 exists = None
                 try:
-                    exists = db.execute(text("""
+                    exists = db.execute(text(f"""
                         SELECT id, full_name
-                        FROM clinic_patients
-                        WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+                        FROM {clinic_store.profiles()}
+                        WHERE patient_type='trainee' AND trainee_no = :n
                         LIMIT 1
                     """), {"n": trainee_no}).mappings().first()
                 except Exception:
@@ -815,82 +752,28 @@ def patients_home(
         try:
             raw_q = q.strip()
             nd = norm_digits(raw_q) or None
-            like_q = f"%{raw_q}%"
-
-            # بحث المتدربين والموظفين من قاعدة البيانات
-            trainees = []
-            employees = []
-            
+            # بحث المتدربين والموظفين مع ملخص الزيارات (استعلام واحد)
+            rows = []
             try:
-                trainees = db.execute(text("""
-                    SELECT p.id, 'trainee' AS patient_type, p.full_name, p.trainee_no, p.national_id,
-                           p.mobile, p.major, p.college,
-                           (SELECT MAX(v.visit_at) FROM clinic_patients v
-                             WHERE v.record_kind='visit' AND v.patient_type='trainee' AND v.trainee_no=p.trainee_no) AS last_visit_at,
-                           (SELECT COUNT(*) FROM clinic_patients v
-                             WHERE v.record_kind='visit' AND v.patient_type='trainee' AND v.trainee_no=p.trainee_no) AS visit_count
-                    FROM clinic_patients p
-                    WHERE p.record_kind='profile' AND p.patient_type='trainee'
-                      AND (
-                            (:nd IS NOT NULL AND (p.trainee_no = :nd OR p.national_id = :nd))
-                            OR UPPER(p.full_name) LIKE UPPER(:like_q)
-                            OR (:nd IS NOT NULL AND p.mobile LIKE ('%' || :nd || '%'))
-                          )
-                    ORDER BY p.full_name ASC
-                    LIMIT 20
-                """), {"nd": nd, "like_q": like_q}).mappings().all()
-
-                employees = db.execute(text("""
-                    SELECT p.id, 'employee' AS patient_type, p.full_name, p.employee_no, p.national_id,
-                           p.mobile, NULL AS major, NULL AS college,
-                           (SELECT MAX(v.visit_at) FROM clinic_patients v
-                             WHERE v.record_kind='visit' AND v.patient_type='employee' AND v.employee_no=p.employee_no) AS last_visit_at,
-                           (SELECT COUNT(*) FROM clinic_patients v
-                             WHERE v.record_kind='visit' AND v.patient_type='employee' AND v.employee_no=p.employee_no) AS visit_count
-                    FROM clinic_patients p
-                    WHERE p.record_kind='profile' AND p.patient_type='employee'
-                      AND (
-                            (:nd IS NOT NULL AND (p.employee_no = :nd OR p.national_id = :nd))
-                            OR UPPER(p.full_name) LIKE UPPER(:like_q)
-                            OR (:nd IS NOT NULL AND p.mobile LIKE ('%' || :nd || '%'))
-                          )
-                    ORDER BY p.full_name ASC
-                    LIMIT 20
-                """), {"nd": nd, "like_q": like_q}).mappings().all()
+                rows = clinic_summary.search(db, raw_q, nd, limit=20)
             except Exception:
-                # إذا فشلت جميع الاستعلامات، حاول من Excel مباشرة
-                pass
+                # إذا فشل الاستعلام، حاول من Excel مباشرة
+                db.rollback()
 
-            results = []
-            
-            # إضافة النتائج من قاعدة البيانات
-            def _recent_visits(ptype: str, num: int):
+            # آخر الزيارات لكل النتائج دفعة واحدة
+            visits_by_patient = {}
+            if rows:
                 try:
-                    if ptype == 'trainee':
-                        rows = db.execute(text("""
-                            SELECT id, visit_at, complaint, diagnosis, temp_c, bp_systolic, bp_diastolic,
-                                   pulse_bpm, resp_rpm, weight_kg, height_cm, bmi, glucose_mg, o2_sat, chronic_json,
-                                   notes, rec_json, rx_json
-                            FROM clinic_patients
-                            WHERE record_kind='visit' AND patient_type='trainee' AND trainee_no = :n
-                            ORDER BY visit_at DESC
-                            LIMIT 5
-                        """), {"n": num}).mappings().all()
-                    else:
-                        rows = db.execute(text("""
-                            SELECT id, visit_at, complaint, diagnosis, temp_c, bp_systolic, bp_diastolic,
-                                   pulse_bpm, resp_rpm, weight_kg, height_cm, bmi, glucose_mg, o2_sat, chronic_json,
-                                   notes, rec_json, rx_json
-                            FROM clinic_patients
-                            WHERE record_kind='visit' AND patient_type='employee' AND employee_no = :n
-                            ORDER BY visit_at DESC
-                            LIMIT 5
-                        """), {"n": num}).mappings().all()
+                    visits_by_patient = clinic_summary.recent_visits(
+                        db,
+                        [(r["patient_type"], r["trainee_no"] if r["patient_type"] == "trainee" else r["employee_no"]) for r in rows],
+                    )
                 except Exception:
-                    rows = []
-                    
+                    db.rollback()
+
+            def _recent_visits(ptype: str, num):
                 out = []
-                for v in rows:
+                for v in visits_by_patient.get((ptype, str(num)), []):
                     rj = v.get("rec_json")
                     if isinstance(rj, str):
                         try:
@@ -925,34 +808,26 @@ def patients_home(
                     })
                 return out
 
-            for r in trainees:
+            results = []
+            for r in rows:
+                if r["patient_type"] == "trainee":
+                    num = r.get("trainee_no")
+                    key = f"T:{num}"
+                else:
+                    num = r.get("employee_no")
+                    key = f"E:{num}"
                 results.append({
-                    "patient_type": "trainee",
+                    "patient_type": r["patient_type"],
                     "full_name": r.get("full_name"),
                     "trainee_no": r.get("trainee_no"),
-                    "employee_no": None,
+                    "employee_no": r.get("employee_no"),
                     "mobile": r.get("mobile"),
                     "major": r.get("major"),
                     "college": r.get("college"),
                     "last_visit_at": r.get("last_visit_at"),
                     "visit_count": r.get("visit_count") or 0,
-                    "patient_key": f"T:{r.get('trainee_no')}",
-                    "visits": _recent_visits('trainee', r.get("trainee_no")),
-                })
-
-            for r in employees:
-                results.append({
-                    "patient_type": "employee",
-                    "full_name": r.get("full_name"),
-                    "trainee_no": None,
-                    "employee_no": r.get("employee_no"),
-                    "mobile": r.get("mobile"),
-                    "major": None,
-                    "college": None,
-                    "last_visit_at": r.get("last_visit_at"),
-                    "visit_count": r.get("visit_count") or 0,
-                    "patient_key": f"E:{r.get('employee_no')}",
-                    "visits": _recent_visits('employee', r.get("employee_no")),
+                    "patient_key": key,
+                    "visits": _recent_visits(r["patient_type"], num),
                 })
 
             # إضافة النتائج من ملف الإكسيل إذا لم تكن هناك نتائج كافية
@@ -1028,9 +903,9 @@ def patients_create(
             if not valid_mobile(mobile):
                 raise ValueError("رقم الجوال غير صحيح. الصيغة المتوقعة: 05xxxxxxxx")
 
-            exists = db.execute(text("""
-                SELECT 1 FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+            exists = db.execute(text(f"""
+                SELECT 1 FROM {clinic_store.profiles()}
+                WHERE patient_type='trainee' AND trainee_no = :n
                 LIMIT 1
             """), {"n": trainee_no}).first()
             if exists:
@@ -1040,14 +915,8 @@ def patients_create(
                 )
 
             bd = to_none_if_blank(birth_date)
-            db.execute(text("""
-                INSERT INTO clinic_patients
-                (patient_type, trainee_no, national_id, full_name, mobile, major, college, birth_date,
-                 record_kind, created_by)
-                VALUES
-                ('trainee', :trainee_no, :national_id, :full_name, :mobile, :major, :college,
-                 :birth_date, 'profile', :uid)
-            """), {
+            clinic_store.insert_profile(db, {
+                "patient_type": "trainee",
                 "trainee_no": trainee_no,
                 "national_id": norm_digits(national_id),
                 "full_name": full_name,
@@ -1055,7 +924,7 @@ def patients_create(
                 "major": major,
                 "college": college,
                 "birth_date": bd,
-                "uid": uid,
+                "created_by": uid,
             })
             db.commit()
             return RedirectResponse(url=f"/clinic/visits/new?patient_key=T:{trainee_no}&msg=profile_saved", status_code=303)
@@ -1067,9 +936,9 @@ def patients_create(
             if not valid_mobile(emp_mobile):
                 raise ValueError("رقم الجوال غير صحيح. الصيغة المتوقعة: 05xxxxxxxx")
 
-            exists = db.execute(text("""
-                SELECT 1 FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='employee' AND employee_no = :n
+            exists = db.execute(text(f"""
+                SELECT 1 FROM {clinic_store.profiles()}
+                WHERE patient_type='employee' AND employee_no = :n
                 LIMIT 1
             """), {"n": employee_no}).first()
             if exists:
@@ -1079,20 +948,15 @@ def patients_create(
                 )
 
             bd = to_none_if_blank(birth_date)
-            db.execute(text("""
-                INSERT INTO clinic_patients
-                (patient_type, employee_no, national_id, full_name, mobile, birth_date, record_kind, notes, created_by)
-                VALUES
-                ('employee', :employee_no, :national_id, :full_name, :mobile,
-                 :birth_date, 'profile', :dept, :uid)
-            """), {
+            clinic_store.insert_profile(db, {
+                "patient_type": "employee",
                 "employee_no": employee_no,
                 "national_id": norm_digits(emp_national_id),
                 "full_name": emp_full_name,
                 "mobile": norm_digits(emp_mobile),
                 "birth_date": bd,
-                "dept": to_none_if_blank(department),
-                "uid": uid,
+                "notes": to_none_if_blank(department),
+                "created_by": uid,
             })
             db.commit()
             return RedirectResponse(url=f"/clinic/visits/new?patient_key=E:{employee_no}&msg=profile_saved", status_code=303)
@@ -1125,27 +989,27 @@ def update_profile(
             raise ValueError("رقم الجوال غير صحيح. الصيغة المتوقعة: 05xxxxxxxx")
 
         if ptype == "T":
-            row = db.execute(text("""
-                SELECT id FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+            row = db.execute(text(f"""
+                SELECT id FROM {clinic_store.profiles()}
+                WHERE patient_type='trainee' AND trainee_no = :n
                 LIMIT 1
             """), {"n": pno}).mappings().first()
         else:
-            row = db.execute(text("""
-                SELECT id FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='employee' AND employee_no = :n
+            row = db.execute(text(f"""
+                SELECT id FROM {clinic_store.profiles()}
+                WHERE patient_type='employee' AND employee_no = :n
                 LIMIT 1
             """), {"n": pno}).mappings().first()
 
         if not row:
             raise ValueError("لا يوجد ملف طبي لهذا المراجع.")
 
-        db.execute(text("""
-            UPDATE clinic_patients
+        db.execute(text(f"""
+            UPDATE {clinic_store.profiles_table()}
             SET mobile = COALESCE(:mobile, mobile),
                 birth_date = COALESCE(:birth_date, birth_date),
                 updated_at = CURRENT_TIMESTAMP
-            WHERE id = :id AND record_kind='profile'
+            WHERE id = :id
         """), {"mobile": mobile, "birth_date": birth_date, "id": row["id"]})
         db.commit()
         return RedirectResponse(url=f"/clinic/patients?tab=create&mode=edit&patient_key={ptype}:{pno}&msg=profile_updated", status_code=303)
@@ -1163,104 +1027,19 @@ def visits_list(
     end_date: str = Query(None, description="End date for filtering"),
     chronic_disease: str = Query(None, description="Chronic disease filter"),
 ):
-    visits = []
-    
-
-    query = """
-        SELECT 
-            id,
-            trainee_no,
-            full_name,
-            record_kind,
-            college,
-            complaint,
-            diagnosis,
-            created_at,
-            visit_at,
-            chronic_json
-        FROM clinic_patients
-        WHERE record_kind = 'visit'
-    """
-    
-    params = {}
-    
-    # إضافة فلتر التاريخ
-    if start_date:
-        try:
-            # التحقق من صيغة التاريخ
-            from datetime import datetime
-            datetime.strptime(start_date, '%Y-%m-%d')
-            query += " AND visit_at >= :start_date"
-            params["start_date"] = start_date
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            # التحقق من صيغة التاريخ
-            from datetime import datetime
-            datetime.strptime(end_date, '%Y-%m-%d')
-            query += " AND visit_at <= :end_date"
-            params["end_date"] = end_date + " 23:59:59"  # لتضمين اليوم بالكامل
-        except ValueError:
-            pass
-    
-    # إضافة فلتر الأمراض المزمنة
-    if chronic_disease:
-        query += " AND chronic_json LIKE :chronic_disease"
-        params["chronic_disease"] = f"%{chronic_disease}%"
-    
-    query += " ORDER BY visit_at DESC NULLS LAST, created_at DESC"
-    
-    # جلب الزيارات من جدول clinic_patients مرتبة بالتاريخ
+    # الصفحة الأولى فقط؛ الباقي عبر /clinic/visits/api (تحميل تدريجي)
+    visits, next_cursor = [], None
     try:
-        all_patients = db.execute(text(query), params).fetchall()
-        
-        for row in all_patients:
-            # معالجة بيانات الأمراض المزمنة
-            chronic_data = row[9]
-            print(f"=== CHRONIC DISEASE DEBUG ===")
-            print(f"Row ID: {row[0]}, Name: {row[2]}")
-            print(f"Raw chronic_data: {repr(chronic_data)}")
-            print(f"Type: {type(chronic_data)}")
-            
-            if isinstance(chronic_data, str) and chronic_data.strip():
-                try:
-                    parsed_data = json.loads(chronic_data)
-                    print(f"Parsed successfully: {repr(parsed_data)}")
-                    chronic_data = parsed_data
-                except (json.JSONDecodeError, Exception) as e:
-                    print(f"Failed to parse JSON: {e}")
-            elif chronic_data is None:
-                print("chronic_data is None")
-            elif chronic_data == '':
-                print("chronic_data is empty string")
-            else:
-                print(f"chronic_data is already processed: {repr(chronic_data)}")
-            
-            print("===========================")
-            
-            visits.append({
-                "id": row[0],
-                "trainee_no": row[1],
-                "full_name": row[2],
-                "record_kind": row[3],
-                "college": row[4],
-                "complaint": row[5],
-                "diagnosis": row[6],
-                "created_at": row[7],
-                "visit_at": row[8],
-                "chronic_json": chronic_data,  # بيانات الأمراض المزمنة المعالجة
-                "source": "database"
-            })
+        visits, next_cursor = clinic_visits.page(db, start_date, end_date, chronic_disease)
     except Exception as e:
-        print(f"خطأ في جلب البيانات من clinic_patients: {e}")
-    
+        print(f"خطأ في جلب بيانات الزيارات: {e}")
+
     return templates.TemplateResponse(
         "clinic/visits_list.html",
         {
             "request": request,
             "visits": visits,
+            "next_cursor": next_cursor,
             "user": user,
             "start_date": start_date,
             "end_date": end_date,
@@ -1268,6 +1047,50 @@ def visits_list(
         }
     )
 
+@router.get("/visits/api")
+def visits_list_api(
+    user=Depends(require_doc),
+    db: Session = Depends(get_db),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    chronic_disease: str = Query(None),
+    cursor: str = Query(None),
+    limit: int = Query(clinic_visits.PAGE_SIZE, ge=1, le=clinic_visits.MAX_PAGE_SIZE),
+):
+    try:
+        items, next_cursor = clinic_visits.page(db, start_date, end_date, chronic_disease, cursor, limit)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    for v in items:
+        v["created_at"] = str(v["created_at"]) if v["created_at"] is not None else None
+        v["visit_at"] = str(v["visit_at"]) if v["visit_at"] is not None else None
+    return JSONResponse({"items": items, "next_cursor": next_cursor})
+
+@router.get("/visits/export.csv")
+def visits_export_csv(
+    user=Depends(require_doc),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    chronic_disease: str = Query(None),
+):
+    def _chronic(value):
+        if isinstance(value, list):
+            return "، ".join(str(x) for x in value)
+        return value or ""
+
+    rows = (
+        [
+            v["visit_at"] or v["created_at"] or "", v["trainee_no"] or "", v["full_name"] or "",
+            v["complaint"] or "", v["diagnosis"] or "", _chronic(v["chronic_json"]), v["college"] or "",
+        ]
+        for v in clinic_visits.iter_rows(start_date, end_date, chronic_disease)
+    )
+    return exports.csv_response(
+        "clinic_visits.csv",
+        ["تاريخ الزيارة", "الرقم المرجعي", "الاسم الكامل", "الشكوى", "التشخيص", "الأمراض المزمنة", "الكلية"],
+        rows,
+    )
+
 # ===================== الزيارات =====================
 @router.get("/visits/new")
 def visit_form_get(
@@ -1337,17 +1160,17 @@ def visit_create(
 
         # تأكيد وجود الملف
         if ptype == "T":
-            profile = db.execute(text("""
+            profile = db.execute(text(f"""
                 SELECT id, full_name, trainee_no, national_id, mobile, major, college, birth_date
-                FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='trainee' AND trainee_no = :n
+                FROM {clinic_store.profiles()}
+                WHERE patient_type='trainee' AND trainee_no = :n
                 LIMIT 1
             """), {"n": pno}).mappings().first()
         else:
-            profile = db.execute(text("""
+            profile = db.execute(text(f"""
                 SELECT id, full_name, employee_no, national_id, mobile, NULL AS major, NULL AS college, birth_date
-                FROM clinic_patients
-                WHERE record_kind='profile' AND patient_type='employee' AND employee_no = :n
+                FROM {clinic_store.profiles()}
+                WHERE patient_type='employee' AND employee_no = :n
                 LIMIT 1
             """), {"n": pno}).mappings().first()
 
@@ -1362,8 +1185,8 @@ def visit_create(
                 return _return_with_error("يرجى إدخال العمر (سنوات) إذا لم يكن تاريخ الميلاد محفوظًا.")
             # تقدير تاريخ الميلاد من العمر (SQLite)
             # استخدم DATE('now','-N years') بدلاً من make_interval/now() في PostgreSQL
-            db.execute(text("""
-                UPDATE clinic_patients
+            db.execute(text(f"""
+                UPDATE {clinic_store.profiles_table()}
                 SET birth_date = DATE('now', '-' || :y || ' years'),
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = :id
@@ -1483,69 +1306,28 @@ def visit_create(
 
         final_notes = extras if (extras and not notes_base) else (f"{extras}\n{notes_base}" if extras else notes_base)
 
+        visit_values = {
+            "national_id": profile.get("national_id"), "full_name": profile.get("full_name"),
+            "mobile": profile.get("mobile"),
+            "temp_c": temp_f, "bp_systolic": bps, "bp_diastolic": bpd, "pulse_bpm": pulse_i, "resp_rpm": resp_i,
+            "weight_kg": w_kg, "height_cm": h_cm, "bmi": bmi, "glucose_mg": glu, "o2_sat": o2,
+            "chronic_json": chronic_payload,
+            "complaint": complaint_txt, "diagnosis": diagnosis_txt,
+            "recommendation": rec_type, "rec_detail": rec_detail_norm, "rest_days": rest_i, "rec_json": rec_json,
+            "notes": final_notes, "rx_json": rx_payload, "created_by": uid,
+        }
         if ptype == "T":
-            last_visit = db.execute(text("""
-                INSERT INTO clinic_patients
-                (patient_type, trainee_no, national_id, full_name, mobile, major, college,
-                record_kind, visit_at,
-                temp_c, bp_systolic, bp_diastolic, pulse_bpm, resp_rpm,
-                weight_kg, height_cm, bmi, glucose_mg, o2_sat, chronic_json,
-                complaint, diagnosis, recommendation, rec_detail, rest_days, rec_json, notes, rx_json, created_by)
-                VALUES
-                ('trainee', :no, :nid, :name, :mobile, :major, :college,
-                'visit', CURRENT_TIMESTAMP,
-                :temp, :bps, :bpd, :pulse, :resp,
-                :wkg, :hcm, :bmi, :glu, :o2, :chronic,
-                :complaint, :diagnosis, :rec, :rec_detail, :rest_days, :rec_json, :notes, :rx_json, :uid)
-            """ + ("" if is_sqlite() else " RETURNING id")), {
-                "no": pno, "nid": profile.get("national_id"), "name": profile.get("full_name"),
-                "mobile": profile.get("mobile"), "major": profile.get("major"), "college": profile.get("college"),
-                "temp": temp_f, "bps": bps, "bpd": bpd, "pulse": pulse_i, "resp": resp_i,
-                "wkg": w_kg, "hcm": h_cm, "bmi": bmi, "glu": glu, "o2": o2, "chronic": chronic_payload,
-                "complaint": complaint_txt, "diagnosis": diagnosis_txt,
-                "rec": rec_type, "rec_detail": rec_detail_norm, "rest_days": rest_i, "rec_json": rec_json,
-                "notes": final_notes, "rx_json": rx_payload, "uid": uid,
+            visit_values.update({
+                "patient_type": "trainee", "trainee_no": pno,
+                "major": profile.get("major"), "college": profile.get("college"),
             })
         else:
-            last_visit = db.execute(text("""
-                INSERT INTO clinic_patients
-                (patient_type, employee_no, national_id, full_name, mobile,
-                record_kind, visit_at,
-                 temp_c, bp_systolic, bp_diastolic, pulse_bpm, resp_rpm,
-                 weight_kg, height_cm, bmi, glucose_mg, o2_sat, chronic_json,
-                 complaint, diagnosis, recommendation, rec_detail, rest_days, rec_json, notes, rx_json, created_by)
-                VALUES
-                ('employee', :no, :nid, :name, :mobile,
-                 'visit', CURRENT_TIMESTAMP,
-                 :temp, :bps, :bpd, :pulse, :resp,
-                 :wkg, :hcm, :bmi, :glu, :o2, :chronic,
-                 :complaint, :diagnosis, :rec, :rec_detail, :rest_days, :rec_json, :notes, :rx_json, :uid)
-            """ + ("" if is_sqlite() else " RETURNING id")), {
-                "no": pno, "nid": profile.get("national_id"), "name": profile.get("full_name"),
-                "mobile": profile.get("mobile"),
-                "temp": temp_f, "bps": bps, "bpd": bpd, "pulse": pulse_i, "resp": resp_i,
-                "wkg": w_kg, "hcm": h_cm, "bmi": bmi, "glu": glu, "o2": o2, "chronic": chronic_payload,
-                "complaint": complaint_txt, "diagnosis": diagnosis_txt,
-                "rec": rec_type, "rec_detail": rec_detail_norm, "rest_days": rest_i, "rec_json": rec_json,
-                "notes": final_notes, "rx_json": rx_payload, "uid": uid,
-            })
+            visit_values.update({"patient_type": "employee", "employee_no": pno})
+        visit_id = clinic_store.insert_visit(db, visit_values)
 
-        if is_sqlite():
-
-            db.commit()
-            visit_id_result = db.execute(text("""
-                SELECT last_insert_rowid() as id
-            """)).first()
-            visit_id = visit_id_result[0] if visit_id_result else None
-        else:
-            # PostgreSQL: استخرج الـ id من RETURNING
-            try:
-                visit_row = last_visit.fetchone()
-                visit_id = visit_row[0] if visit_row else None
-            except Exception:
-                # في حالة الخطأ، جرّب استخراج من آخر صف
-                visit_id = None
-            db.commit()
+        # ملخص المراجع في نفس المعاملة
+        clinic_summary.record_visit(db, "trainee" if ptype == "T" else "employee", pno, visit_id)
+        db.commit()
         
         # إرجاع JSON بدلاً من redirect – يحتوي على معرّف الزيارة للطباعة
         return JSONResponse({
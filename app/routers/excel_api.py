@@ -33,12 +33,11 @@ from excel_data_reference import (
     get_all_colleges,
     get_all_departments,
     get_all_drugs,
-    load_excel_data,
 )
 
 router = APIRouter(prefix="/api/excel", tags=["excel_reference"])
 
-load_excel_data()
+# الأوراق تُحمّل من النسخة العمودية عند أول استخدام (لا قراءة للإكسيل عند الإقلاع)
 
 @router.get("/students/search")
 def search_students_endpoint(
@@ -11,9 +11,10 @@ import qrcode
 from ..database import get_db
 from ..deps_auth import require_doc
 from ..models import FirstAidBox, FirstAidBoxItem
+from ..templating import ui_context
 
 router = APIRouter(prefix="/first-aid", tags=["FirstAid"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 @router.get("/boxes/{box_id}/public", include_in_schema=False)
 def box_public_detail(request: Request, box_id: int, db: Session = Depends(get_db)):
@@ -1,44 +1,24 @@
 from pathlib import Path
 import os, tempfile, io, traceback
 from datetime import date, datetime
-from typing import List, Optional, Dict
-from urllib.parse import urlparse, unquote, quote
-from ..models import Course, CourseTargetDepartment, Department, College, User
+from typing import List, Optional, Dict, Tuple
+from urllib.parse import quote
+from ..models import Course, CourseTargetDepartment, Department, User
 from pathlib import Path
-import qrcode
-from app.services.settings import PUBLIC_BASE_URL
-from ..reports.skills_record_pdf_template import SKILLS_RECORD_PDF_HTML
-
-BARCODES_DIR = Path("app/static/barcodes")
-BARCODES_DIR.mkdir(parents=True, exist_ok=True)
+from ..reports import renderer
+from ..services import qr_assets
 
 def ensure_barcode_png(code: str) -> str:
     """
-    توليد QR code قابل للمسح يحتوي على رابط التحقق من الشهادة.
-    عند مسح QR code، سيتم فتح صفحة التحقق من الشهادة (verify page).
-    
-    - كل شهادة لها رمز فريد (certificate_code)
+    رابط صورة QR للشهادة (تحتوي على رابط صفحة التحقق {PUBLIC_BASE_URL}/verify/{code}).
+
     - جميع النسخ المطبوعة من نفس الشهادة تحتوي على نفس QR code
-    - عند مسح QR code، يتم فتح رابط: {PUBLIC_BASE_URL}/verify/{code}
-    
-    Args:
-        code: رمز الشهادة (مثال: "1-123456789-5")
-    
+    - الصورة تُولَّد عند الطلب عبر /verify/{code}/qr.png (qr_assets) ولا تُكتب في static
+
     Returns:
-        مسار صورة QR code (مثال: "/static/barcodes/1-123456789-5.png")
+        مسار صورة QR code (مثال: "/verify/1-123456789-5/qr.png")
     """
-    png_path = BARCODES_DIR / f"{code}.png"
-    verify_url = f"{PUBLIC_BASE_URL}/verify/{code}"
-    
-
-    if png_path.exists():
-
-        return f"/static/barcodes/{code}.png"
-    
-
-    img = qrcode.make(verify_url)
-    img.save(png_path)
-    return f"/static/barcodes/{code}.png"
+    return qr_assets.ensure(code)
 
 if os.name == "nt":
     _FORCE_TMP = r"C:\x2p_tmp"
@@ -76,13 +56,7 @@ from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import func, and_, text
 from sqlalchemy.orm import Session, selectinload
-from jinja2 import Template
-
-try:
-    from xhtml2pdf import pisa
-    HAS_XHTML2PDF = True
-except Exception:
-    HAS_XHTML2PDF = False
+HAS_XHTML2PDF = renderer.HAS_XHTML2PDF
 
 try:
     import arabic_reshaper
@@ -92,11 +66,17 @@ except Exception:
     _HAS_ARABIC_SHAPING = False
 
 from ..database import get_db
-from ..models import Course, CourseTargetDepartment, Department, College, User
+from ..models import Course, CourseTargetDepartment, Department, User, CertificateTemplate
 from ..schemas import CourseCreate
 from ..deps_auth import require_hod_or_admin, require_user, CurrentUser
-
-templates = Jinja2Templates(directory="app/templates")
+from ..templating import ui_context
+from ..services import certificate_pdf_cache as cert_pdf_cache
+from ..services import certificate_issuance as cert_issuance
+from ..services import certificate_batch as cert_batch
+from ..services import college_directory
+from ..services import verify_cache
+
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 import itertools
 
 def _flatten_filter(value):
@@ -126,8 +106,7 @@ def _assert_can_manage_course(user: CurrentUser, course: Course, db: Session = N
 
     if user.is_college_admin and user.college_admin_college and db:
         college_name = user.college_admin_college
-        college_departments = db.query(Department).filter(Department.college == college_name).all()
-        dept_names = {d.name for d in college_departments}
+        dept_names = set(college_directory.departments_of(college_name))
         course_targets = {t.department_name for t in course.targets}
         if dept_names & course_targets:
             return
@@ -136,43 +115,6 @@ def _assert_can_manage_course(user: CurrentUser, course: Course, db: Session = N
 def _ctd_uses_name() -> bool:
     return hasattr(CourseTargetDepartment, "department_name")
 
-def _link_callback(uri: str, rel: str) -> str:
-    if not uri:
-        return uri
-    if uri.startswith("file://"):
-        parsed = urlparse(uri)
-        p = parsed.netloc if (parsed.netloc and not parsed.path) else parsed.path
-        p = unquote(p)
-        if os.name == "nt" and len(p) >= 3 and p[0] == "/" and p[2] == ":":
-            p = p[1:]
-        return str(Path(p).resolve())
-    if uri.startswith("/static/"):
-        return str(Path("app").joinpath(uri.lstrip("/")).resolve())
-    return uri
-
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-_FONTS_REGISTERED = False
-def _register_arabic_fonts_once() -> str:
-    global _FONTS_REGISTERED
-    if _FONTS_REGISTERED:
-        return "'ARMain','ARAlt','Arial Unicode MS','DejaVu Sans','Arial'"
-
-    def _try(name: str, relpath: str) -> bool:
-        p = Path("app/static/fonts").joinpath(relpath)
-        if not p.exists():
-            return False
-        pdfmetrics.registerFont(TTFont(name, str(p.resolve())))
-        return True
-
-    main_candidates = ["NotoNaskhArabic-Regular.ttf","Traditional-Arabic.ttf","Amiri.ttf","Majalla.ttf","Cairo.ttf"]
-    alt_candidates  = ["Amiri.ttf","Majalla.ttf","Cairo.ttf","Traditional-Arabic.ttf","NotoNaskhArabic-Regular.ttf"]
-    any(_try("ARMain", fn) for fn in main_candidates)
-    any(_try("ARAlt",  fn) for fn in alt_candidates)
-    _FONTS_REGISTERED = True
-    return "'ARMain','ARAlt','Arial Unicode MS','DejaVu Sans','Arial'"
-
 def _shape_ar(s: Optional[str]) -> str:
     if s is None: return ""
     if not str(s).strip(): return ""
@@ -182,199 +124,6 @@ def _shape_ar(s: Optional[str]) -> str:
     except Exception:
         return str(s)
 
-_ROSTER_PRETTY_HTML = r"""<!doctype html>
-<html lang="ar" dir="rtl">
-<head>
-  <meta charset="utf-8" />
-  <title>{{ shape('كشف حضور دورة تدريبية') }} - {{ shape(course.title or '') }}</title>
-  <style>
-    {{ font_ready_css|safe }}
-    /* brand:
-
-    @page{
-      size: A4 portrait;
-      margin: 0;
-      @frame header_frame  { -pdf-frame-content: header_content; left: 10mm; right: 10mm; top: 6mm;  height: 22mm; }
-      @frame content_frame { left: 10mm; right: 10mm; top: 32mm; bottom: 18mm; }
-      @frame footer_frame  { -pdf-frame-content: footer_content; left: 10mm; right: 10mm; bottom: 6mm; height: 10mm; }
-    }
-
-    html, body{
-      direction: rtl; margin:0; padding:0;
-      -webkit-print-color-adjust: exact; print-color-adjust: exact;
-      color:
-      font-family:'MajallaAR','TradArabicAR','Majalla','Traditional Arabic','Arial Unicode MS','DejaVu Sans','Arial';
-    }
-    * { font-family: inherit !important; }
-
-    .ltr { direction:ltr; unicode-bidi:bidi-override; }
-
-    /* ===== الهيدر المثبّت ===== */
-    .hdr{ width:100%; border-collapse:collapse; table-layout:fixed; }
-    .hdr td{ vertical-align:middle; padding:0; }
-    .title-cell{ text-align:left; padding-right:6mm; }
-    .logo-cell{ text-align:right; width:50mm; }
-    .logo{ max-height:28mm; width:auto; height:auto; display:block; object-fit:contain; }
-    .report-title{ font-weight:800; color:
-    .title-underline{ height:3px; width:180px; background:
-
-    /* ===== البطاقة ===== */
-    .card{ background:
-    .pad{ padding:10px 12px; }
-    .chip{
-      display:block; text-align:center; padding:2px 10px; margin:0 auto 8px;
-      background:
-      font-weight:700; font-size:14pt;
-    }
-
-    /* ===== جدول بيانات الدورة ===== */
-    table.meta{
-      width:100%; border-collapse:collapse; table-layout:fixed; border:1.2px solid
-    }
-    table.meta th, table.meta td{
-      border:1.2px solid
-      text-align:center; vertical-align:middle; font-size:11pt;
-      white-space:normal; word-wrap:break-word; overflow-wrap:break-word;
-      line-height:1.25;
-    }
-    table.meta th{ background:
-    table.meta td.label{ width:12%; font-weight:700; }
-    table.meta td.value{ width:38%; }
-
-    /* ===== جدول كشف الحضور ===== */
-    table.roster{
-      width:100%; border-collapse:collapse; table-layout:fixed; margin-top:8px;
-      border:1.2px solid
-    }
-    table.roster thead th{
-      border:1.2px solid
-      background:
-      white-space:normal; word-wrap:break-word; overflow-wrap:break-word;
-    }
-    table.roster tbody td{
-      border:1.2px solid
-      font-size:11pt; white-space:normal; word-wrap:break-word; overflow-wrap:break-word; line-height:1.25;
-    }
-
-    thead{ display:table-header-group; }
-    tr{ page-break-inside:avoid; }
-  </style>
-</head>
-<body>
-
-  <!-- الهيدر المثبّت -->
-  <div id="header_content">
-    <table class="hdr" dir="ltr" role="presentation" aria-hidden="true">
-      <colgroup><col><col style="width:50mm"></colgroup>
-      <tr>
-        <td class="title-cell">
-          <div class="report-title">{{ shape('كشف حضور دورة تدريبية') }}</div>
-          <div class="title-underline"></div>
-        </td>
-        <td class="logo-cell">
-          {% if logo_src %}
-            <img class="logo" src="{{ logo_src }}" alt="logo">
-          {% endif %}
-        </td>
-      </tr>
-    </table>
-  </div>
-
-  <!-- المحتوى -->
-  <div id="content_frame">
-    <section class="card">
-      <div class="pad">
-        <span class="chip">{{ shape('بيانات الدورة') }}</span>
-
-        <!-- جدول البيانات -->
-        <table class="meta" role="presentation" aria-hidden="true">
-          <!-- ثبّت العرض: العمود 1 و3 (label) = 10%، العمود 2 و4 (value) = 40% -->
-          <colgroup>
-            <col style="width:10%"><col style="width:40%">
-            <col style="width:10%"><col style="width:40%">
-          </colgroup>
-          <tbody>
-            <!-- الصف 1 -->
-            <tr>
-              
-              <td class="value">{{ shape(((course.hours|string) if course.hours else '0') if course.hours else '0') }}</td>
-              <td class="label">{{ shape('عدد الساعات') }}</td>
-              
-              <td class="value">{{ shape(course.title or '---') }}</td>
-              <td class="label">{{ shape('اسم الدورة') }}</td>
-              
-            </tr>
-
-            <!-- الصف 2 -->
-            <tr>
-              <td class="value">{{ shape(course.provider or '---') }}</td>
-              <td class="label">{{ shape('الجهة المنفذة') }}</td>
-              
-              <td class="value">{{ shape(course.provider_name or '---') }}</td>
-              <td class="label">{{ shape('اسم المنفذ') }}</td>
-
-              
-            </tr>
-
-            <!-- الصف 3: التواريخ -->
-            <tr>
-              <td class="value ltr">{% if course.end_date %}{{ course.end_date.strftime('%d-%m-%Y') }}{% else %}---{% endif %}</td>
-              <td class="label">{{ shape('تاريخ النهاية') }}</td>
-              
-              <td class="value ltr">{% if course.start_date %}{{ course.start_date.strftime('%d-%m-%Y') }}{% else %}---{% endif %}</td>
-              <td class="label">{{ shape('تاريخ البداية') }}</td>
-              
-              
-            </tr>
-          </tbody>
-        </table>
-
-        <!-- جدول الحضور (مع عمود التخصص) -->
-        <table class="roster" dir="ltr" role="table" aria-label="{{ shape('كشف حضور الدورة') }}">
-          <colgroup>
-            <col style="width:40mm">
-            <col style="width:58mm">
-            <col style="width:28mm">
-            <col style="width:55mm">
-            <col style="width:9mm">
-          </colgroup>
-          <thead>
-            <tr>
-              <th style="width:40mm;min-height:20px">{{ shape('توقيع المتدرب') }}</th>
-              <th style="width:58mm;min-height:20px">{{ shape('التخصص') }}</th>
-              <th style="width:28mm;min-height:20px">{{ shape('الرقم التدريبي') }}</th>
-              <th style="width:55mm;min-height:20px">{{ shape('اسم المتدرب') }}</th>
-              <th style="width:9mm;min-height:20px">{{ shape('م') }}</th>
-            </tr>
-          </thead>
-          <tbody>
-            {% if enrollments and enrollments|length > 0 %}
-              {% for r in enrollments %}
-                <tr>
-                  <td style="min-height:20px">&nbsp;</td>
-                  <td style="min-height:20px">{{ shape(r.trainee_major or '') or '&nbsp;' }}</td>
-                  <td style="min-height:20px">{{ shape(r.trainee_no or '') or '&nbsp;' }}</td>
-                  <td style="min-height:20px">{{ shape(r.trainee_name or '') or '&nbsp;' }}</td>
-                  <td style="min-height:20px">{{ loop.index }}</td>
-                </tr>
-              {% endfor %}
-            {% else %}
-              <tr><td colspan="5" style="min-height:20px">&nbsp;</td></tr>
-            {% endif %}
-          </tbody>
-        </table>
-      </div>
-    </section>
-  </div>
-
-  <!-- الفوتر المثبّت -->
-  <div id="footer_content" style="text-align:center; font-size:10.5pt; color:#6b7280; border-top:1px dashed #c5d6de; padding-top:6px;">
-    {{ shape('تم تصدير هذا الكشف عبر نظام خدمات المتدربين التفاعلية Guidxus') }}
-  </div>
-
-</body>
-</html>
-"""
 
 # ===================== لوحة HOD =====================
 
@@ -493,6 +242,7 @@ def create_course_submit(
             db.add(CourseTargetDepartment(course_id=course.id, department_id=dep_id))
 
     db.commit()
+    college_directory.invalidate_course(course.id)
     return RedirectResponse(url="/hod/courses?msg=تمت+إضافة+الدورة+بنجاح", status_code=status.HTTP_303_SEE_OTHER)
 
 # ===================== تعديل دورة =====================
@@ -595,6 +345,8 @@ def edit_course_submit(
             db.add(CourseTargetDepartment(course_id=course.id, department_id=dep_id))
 
     db.commit()
+    college_directory.invalidate_course(course.id)
+    verify_cache.forget_course(course.id)
     return RedirectResponse(url="/hod/courses?updated=1", status_code=status.HTTP_303_SEE_OTHER)
 
 # ===================== قائمة الدورات =====================
@@ -1098,90 +850,36 @@ def certificates_issue_all(
             detail="لا يمكن إصدار الشهادات إلا بعد إغلاق الدورة"
         )
 
-    attendees = db.execute(
-        text("""
-            SELECT e.trainee_no, e.trainee_name, e.trainee_major, e.certificate_code
-            FROM course_enrollments e
-            WHERE e.course_id = :cid AND e.present = true
-            ORDER BY CASE WHEN e.trainee_name IS NULL THEN 1 ELSE 0 END, e.trainee_name
-        """),
-        {"cid": course.id},
-    ).mappings().all()
-
-    issued_count = 0
-    skipped_count = 0
-    
-    # إصدار شهادة لكل حاضر
-    for enrollment in attendees:
-        trainee_no = enrollment["trainee_no"]
-        
-        # تخطي إذا كانت الشهادة مصدرة بالفعل
-        if enrollment.get("certificate_code") is not None:
-            skipped_count += 1
-            continue
-        
-        try:
-            # إنشاء كود الشهادة
-            try:
-                seq_val = db.execute(text("SELECT nextval('certificate_seq')")).scalar()
-            except Exception:
-                seq_val = (db.execute(text("SELECT COALESCE(MAX(id),0)+1 FROM certificate_verifications")).scalar() or 1)
-            
-            cert_code = f"{seq_val}-{trainee_no}-{course_id}"
-            
-            # تحديث كود الشهادة في course_enrollments
-            db.execute(
-                text("""
-                    UPDATE course_enrollments
-                    SET certificate_code = :code, certificate_issued_at = CURRENT_TIMESTAMP
-                    WHERE course_id = :cid AND trainee_no = :tno
-                """),
-                {"code": cert_code, "cid": course_id, "tno": trainee_no},
-            )
-            db.commit()
-            
+    # إصدار دفعي: قفل الدورة في قاعدة البيانات + تسلسل محجوز مرة واحدة + معاملة واحدة + QR في pool
+    # (تشغيل متزامن من عامل آخر ينتظر القفل ثم يتخطى من صدرت شهاداتهم)
+    try:
+        result = cert_issuance.issue_all(db, course, ensure_barcode_png)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"تعذّر إصدار الشهادات: {e}")
 
-            barcode_url = ensure_barcode_png(cert_code)
-            db.execute(
-                text("""
-                    INSERT INTO certificate_verifications (
-                      course_id, trainee_no, trainee_name, course_title, hours,
-                      start_date, end_date, certificate_code, copy_no, barcode_path
-                    )
-                    VALUES (
-                      :cid, :tno, :tname, :ctitle, :hours,
-                      :sdate, :edate, :code,
-                      COALESCE((SELECT MAX(copy_no) FROM certificate_verifications WHERE certificate_code = :code), 0) + 1,
-                      :barcode
-                    )
-                """),
-                {
-                    "cid": course.id,
-                    "tno": trainee_no,
-                    "tname": enrollment["trainee_name"],
-                    "ctitle": course.title,
-                    "hours": course.hours,
-                    "sdate": course.start_date,
-                    "edate": course.end_date,
-                    "code": cert_code,
-                    "barcode": barcode_url,
-                },
-            )
-            db.commit()
-            issued_count += 1
-            
-        except Exception as e:
-            # تسجيل الخطأ والمتابعة
-            print(f"خطأ في إصدار شهادة {trainee_no}: {str(e)}")
-            traceback.print_exc()
-            continue
-    
     # إعادة التوجيه مع رسالة نجاح
     return RedirectResponse(
-        url=f"/hod/certificates/issue?course_id={course_id}&issued={issued_count}&skipped={skipped_count}",
+        url=f"/hod/certificates/issue?course_id={course_id}&issued={result['issued']}&skipped={result['skipped']}",
         status_code=status.HTTP_303_SEE_OTHER
     )
 
+@router.get("/certificates/issue-all/progress")
+def certificates_issue_all_progress(
+    course_id: int,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_hod_or_admin),
+):
+    """
+    تقدم الإصدار الجماعي للدورة (للاستعلام الدوري من الواجهة).
+    التقدم محفوظ في ذاكرة العامل الذي ينفذ الإصدار: مع عدة عمّال قد يظهر "idle" من عامل آخر.
+    """
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="الدورة غير موجودة")
+    _assert_can_manage_course(user, course, db)
+    return cert_issuance.get_progress(course_id) or {"state": "idle"}
+
 @router.get("/certificates/print/{course_id}/{trainee_no}")
 def certificate_print(
     course_id: int,
@@ -1256,70 +954,17 @@ def certificate_print(
     ).first()
     copy_no = int(row[0]) if row else 1
     db.commit()
+    verify_cache.forget(cert_code)
 
-    def _norm(s): return " ".join((s or "").strip().split())
-    college = None
-
-    try:
-        target_dept_names = [t.department_name for t in course.targets] if getattr(course, "targets", None) else []
-        for dept_name in target_dept_names:
-            dept = db.query(Department).filter(Department.name == dept_name).first()
-            if dept and dept.college:
-                matched = db.query(College).filter(College.name == dept.college).first()
-                if matched:
-                    college = matched
-                    break
-    except Exception:
-        college = None
-
-    if not college and getattr(user, "hod_college", None):
-        normalized_user_college = _norm(user.hod_college)
-        all_colleges = db.query(College).filter(College.is_active == True).all()
-        for c in all_colleges:
-            if _norm(c.name) == normalized_user_college:
-                college = c
-                break
-
-    college_name    = (college.name or user.hod_college or "الكلية التقنية") if college else (user.hod_college or "الكلية التقنية")
-    college_name_en = (getattr(college, "name_en", None) or "") if college else ""
-
-    vp_name       = college.vp_students_name if college and college.vp_students_name else ""
-    dean_name     = college.dean_name         if college and college.dean_name         else ""
-    vp_sign_url   = college.vp_students_sign_path if college and getattr(college, "vp_students_sign_path", None) else "/static/blank.png"
-    dean_sign_url = college.dean_sign_path       if college and getattr(college, "dean_sign_path", None)       else "/static/blank.png"
-    stamp_url     = college.students_affairs_stamp_path if college and getattr(college, "students_affairs_stamp_path", None) else "/static/blank.png"
-
-    logo_src = None
-    for p in ("images/main_logo.png", "images/favicon.ico", "images/logo.png", "img/logo.png"):
-        fp = Path("app/static").joinpath(p)
-        if fp.exists():
-            logo_src = f"/static/{p}"
-            break
-
-    start_s = course.start_date.strftime("%d-%m-%Y") if course.start_date else ""
-    end_s   = course.end_date.strftime("%d-%m-%Y")   if course.end_date else ""
-
-    return templates.TemplateResponse(
-        "hod/certificate_template.html",
-        {
-            "request": request,
-            "course": course,
-            "trainee": enrollment,
-            "college_name": college_name,
-            "college_name_en": college_name_en,
-            "vp_name": vp_name,
-            "dean_name": dean_name,
-            "vp_sign_url": vp_sign_url,
-            "dean_sign_url": dean_sign_url,
-            "stamp_url": stamp_url,
-            "logo_src": logo_src,
-            "certificate_no": cert_code,
-            "copy_no": copy_no,
-            "barcode_url": barcode_url,
-            "start_date": start_s,
-            "end_date": end_s,
-        },
-    )
+    college = _resolve_certificate_college(db, course, user)
+    context = _certificate_context(course, enrollment, college, user, cert_code, copy_no, barcode_url)
+    context.update({
+        "request": request,
+        "logo_src": renderer.assets().logo_src,
+        "start_date": course.start_date.strftime("%d-%m-%Y") if course.start_date else "",
+        "end_date": course.end_date.strftime("%d-%m-%Y") if course.end_date else "",
+    })
+    return templates.TemplateResponse("hod/certificate_template.html", context)
 
 @router.get("/certificates/print.pdf/{course_id}/{trainee_no}")
 def certificate_print_pdf(
@@ -1395,94 +1040,245 @@ def certificate_print_pdf(
     ).first()
     copy_no = int(row[0]) if row else 1
     db.commit()
+    verify_cache.forget(cert_code)
 
     # 5) بيانات الكلية والتواقيع (استنتاج من أهداف الدورة إن توفرت)
-    def _norm(s): return " ".join((s or "").strip().split())
-    college = None
+    college = _resolve_certificate_college(db, course, user)
+    context = _certificate_context(course, enrollment, college, user, cert_code, copy_no, barcode_url)
+    context["request"] = request
+
+    # 6) PDF من الكاش أو توليده مرة واحدة ثم حفظه
+    return _certificate_pdf_response(
+        request, db, context,
+        ascii_name=f"certificate_{course_id}_{trainee_no}_copy_{copy_no}.pdf",
+        download=download,
+    )
 
-    # أولًا: حاول استنتاج الكلية من أسماء الأقسام المستهدفة للدورة
-    try:
-        target_dept_names = [t.department_name for t in course.targets] if getattr(course, "targets", None) else []
-        for dept_name in target_dept_names:
-            dept = db.query(Department).filter(Department.name == dept_name).first()
-            if dept and dept.college:
-                matched = db.query(College).filter(College.name == dept.college).first()
-                if matched:
-                    college = matched
-                    break
-    except Exception:
-        college = None
-
-    # ثانياً: لو لم يتم العثور، جرب استخدام كلية المستخدم (hod_college)
-    if not college and getattr(user, "hod_college", None):
-        normalized_user_college = _norm(user.hod_college)
-        all_colleges = db.query(College).filter(College.is_active == True).all()
-        for c in all_colleges:
-            if _norm(c.name) == normalized_user_college:
-                college = c
-                break
-
-    college_name    = (college.name or user.hod_college or "الكلية التقنية") if college else (user.hod_college or "الكلية التقنية")
-    college_name_en = (getattr(college, "name_en", None) or "") if college else ""
+@router.get("/certificates/copy.pdf/{certificate_code}/{copy_no}")
+def certificate_copy_pdf(
+    certificate_code: str,
+    copy_no: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_hod_or_admin),
+    download: int = 1,
+):
+    """إعادة تنزيل نسخة مُصدرة سابقًا (بدون إنشاء نسخة جديدة) — تُخدم من الكاش."""
+    row = db.execute(
+        text("""
+            SELECT course_id, trainee_no, trainee_name, barcode_path
+            FROM certificate_verifications
+            WHERE certificate_code = :code AND copy_no = :copy
+            LIMIT 1
+        """),
+        {"code": certificate_code, "copy": copy_no},
+    ).mappings().first()
+    if not row:
+        raise HTTPException(404, "النسخة غير موجودة")
+
+    course = db.query(Course).filter(Course.id == row["course_id"]).first()
+    if not course:
+        raise HTTPException(404, "الدورة غير موجودة")
+    _assert_can_manage_course(user, course, db)
 
-    vp_name       = college.vp_students_name if college and college.vp_students_name else ""
-    dean_name     = college.dean_name         if college and college.dean_name         else ""
-    vp_sign_url   = college.vp_students_sign_path if college and getattr(college, "vp_students_sign_path", None) else "/static/blank.png"
-    dean_sign_url = college.dean_sign_path       if college and getattr(college, "dean_sign_path", None)       else "/static/blank.png"
-    stamp_url     = college.students_affairs_stamp_path if college and getattr(college, "students_affairs_stamp_path", None) else "/static/blank.png"
+    barcode_url = row["barcode_path"] or ensure_barcode_png(certificate_code)
+    college = _resolve_certificate_college(db, course, user)
+    context = _certificate_context(course, row, college, user, certificate_code, copy_no, barcode_url)
+    context["request"] = request
 
-    # 6) جهّز القالب إلى HTML (كسلسلة نصية)
-    context = {
-        "request": request,
+    return _certificate_pdf_response(
+        request, db, context,
+        ascii_name=f"certificate_{row['course_id']}_{row['trainee_no']}_copy_{copy_no}.pdf",
+        download=download,
+    )
+
+def _resolve_certificate_college(db: Session, course: Course, user: Optional[CurrentUser] = None) -> Optional[college_directory.CollegeInfo]:
+    """استنتاج كلية الشهادة من أقسام الدورة المستهدفة، ثم من كلية المستخدم (hod_college)."""
+    hod_college = getattr(user, "hod_college", None) if user is not None else None
+    return college_directory.course_college(course, hod_college)
+
+def _certificate_context(course, trainee, college, user, cert_code: str, copy_no: int, barcode_url: str) -> dict:
+    """سياق قالب hod/certificate_template.html (بدون request)."""
+    hod_college = getattr(user, "hod_college", None) if user is not None else None
+    college_name    = (college.name or hod_college or "الكلية التقنية") if college else (hod_college or "الكلية التقنية")
+    college_name_en = (getattr(college, "name_en", None) or "") if college else ""
+
+    return {
         "course": course,
-        "trainee": enrollment,
+        "trainee": trainee,
         "college_name": college_name,
         "college_name_en": college_name_en,
-        "vp_name": vp_name,
-        "dean_name": dean_name,
-        "vp_sign_url": vp_sign_url,
-        "dean_sign_url": dean_sign_url,
-        "stamp_url": stamp_url,
+        "vp_name": college.vp_students_name if college and college.vp_students_name else "",
+        "dean_name": college.dean_name if college and college.dean_name else "",
+        "vp_sign_url": college.vp_students_sign_path if college and getattr(college, "vp_students_sign_path", None) else "/static/blank.png",
+        "dean_sign_url": college.dean_sign_path if college and getattr(college, "dean_sign_path", None) else "/static/blank.png",
+        "stamp_url": college.students_affairs_stamp_path if college and getattr(college, "students_affairs_stamp_path", None) else "/static/blank.png",
         "certificate_no": cert_code,
         "copy_no": copy_no,
         "barcode_url": barcode_url,
-        # إن رغبت في استخدام start/end جاهزة بالنص:
-        # "start_date": course.start_date.strftime("%Y-%m-%d") if course.start_date else "",
-        # "end_date":   course.end_date.strftime("%Y-%m-%d") if course.end_date else "",
     }
 
-    tpl = templates.env.get_template("hod/certificate_template.html")
-    html_str = tpl.render(**context)
-
-    # 7) تحويل HTML إلى PDF عبر xhtml2pdf
-    if not HAS_XHTML2PDF:
-        raise HTTPException(500, "xhtml2pdf غير مثبتة، ثبّت: pip install xhtml2pdf")
-
-    pdf_io = io.BytesIO()
-    doc = pisa.CreatePDF(src=html_str, dest=pdf_io, encoding="UTF-8", link_callback=_link_callback)
-    if doc.err:
-        raise HTTPException(500, f"تعذّر توليد PDF للشهادة عبر xhtml2pdf: {doc.err}")
-    pdf_io.seek(0)
+def _certificate_template_version(db: Session):
+    """تاريخ آخر تعديل لقالب الشهادة العام (جزء من مفتاح الكاش)."""
+    try:
+        return db.query(func.max(CertificateTemplate.updated_at)).filter(CertificateTemplate.scope == "global").scalar()
+    except Exception:
+        return None
+
+def _certificate_cache_key(db: Session, context: dict, template_version=None) -> str:
+    return cert_pdf_cache.cache_key(
+        context["certificate_no"],
+        context["copy_no"],
+        template_version if template_version is not None else _certificate_template_version(db),
+        (context["vp_sign_url"], context["dean_sign_url"], context["stamp_url"]),
+    )
 
-    # 8) ترويسة تنزيل باسم واضح
-    pretty_name = f"شهادة-{cert_code}-نسخة-{copy_no}.pdf"
-    ascii_fallback = f"certificate_{course_id}_{trainee_no}_copy_{copy_no}.pdf"
+def render_certificate_pdf(context: dict) -> bytes:
+    """تحويل قالب الشهادة إلى PDF عبر خدمة التقارير الموحدة."""
+    try:
+        return renderer.render_pdf("certificate", context)
+    except renderer.RenderError as e:
+        raise HTTPException(500, str(e))
+
+def cached_certificate_pdf(db: Session, context: dict):
+    """يرجع (key, path) لملف الشهادة في الكاش، ويولده عند عدم وجوده."""
+    key = _certificate_cache_key(db, context)
+    path = cert_pdf_cache.get(key)
+    if path is None:
+        path = cert_pdf_cache.put(key, render_certificate_pdf(context))
+    return key, path
+
+def _certificate_pdf_response(request: Request, db: Session, context: dict, ascii_name: str, download=1):
+    key, path = cached_certificate_pdf(db, context)
+
+    # ترويسة تنزيل باسم واضح
+    pretty_name = f"شهادة-{context['certificate_no']}-نسخة-{context['copy_no']}.pdf"
     disposition = 'attachment' if str(download).lower() not in {'0', 'false'} else 'inline'
     content_disp = (
         f'{disposition}; '
-        f'filename="{ascii_fallback}"; '
+        f'filename="{ascii_name}"; '
         f"filename*=UTF-8''{quote(pretty_name)}"
     )
+    return cert_pdf_cache.send(
+        request, key, path,
+        headers={
+            "Content-Disposition": content_disp,
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
 
+def _course_certificate_files(db: Session, course: Course, user: CurrentUser):
+    """
+    ملفات PDF لكل الشهادات المُصدرة في الدورة (آخر نسخة لكل شهادة):
+    - الكلية والتواقيع والختم تُحسب مرة واحدة للدورة.
+    - الموجود في الكاش يُستخدم مباشرة، والباقي يُولَّد بالتوازي في process pool ثم يُحفظ.
+    """
+    rows = db.execute(
+        text("""
+            SELECT cv.certificate_code, cv.trainee_no, cv.trainee_name, cv.copy_no, cv.barcode_path
+            FROM certificate_verifications cv
+            JOIN (
+                SELECT certificate_code, MAX(copy_no) AS copy_no
+                FROM certificate_verifications
+                WHERE course_id = :cid
+                GROUP BY certificate_code
+            ) last ON last.certificate_code = cv.certificate_code AND last.copy_no = cv.copy_no
+            WHERE cv.course_id = :cid
+            ORDER BY CASE WHEN cv.trainee_name IS NULL THEN 1 ELSE 0 END, cv.trainee_name
+        """),
+        {"cid": course.id},
+    ).mappings().all()
+
+    college = _resolve_certificate_college(db, course, user)
+    template_version = _certificate_template_version(db)
+    course_data = {
+        "title": course.title,
+        "hours": course.hours,
+        "start_date": course.start_date,
+        "end_date": course.end_date,
+    }
+
+    files = []
+    missing = []
+    for r in rows:
+        trainee = {"trainee_no": r["trainee_no"], "trainee_name": r["trainee_name"]}
+        barcode_url = r["barcode_path"] or ensure_barcode_png(r["certificate_code"])
+        context = _certificate_context(course_data, trainee, college, user, r["certificate_code"], r["copy_no"], barcode_url)
+        key = _certificate_cache_key(db, context, template_version)
+        path = cert_pdf_cache.get(key)
+        files.append([r, key, path])
+        if path is None:
+            missing.append((len(files) - 1, context))
+
+    if missing:
+        rendered = cert_batch.render_many(render_certificate_pdf, [ctx for _, ctx in missing])
+        for (idx, _), data in zip(missing, rendered):
+            files[idx][2] = cert_pdf_cache.put(files[idx][1], data)
+    return files
+
+def _load_course_for_export(db: Session, course_id: int, user: CurrentUser) -> Course:
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if not course:
+        raise HTTPException(404, "الدورة غير موجودة")
+    _assert_can_manage_course(user, course, db)
+    return course
+
+@router.get("/certificates/course/{course_id}.pdf")
+def course_certificates_pdf(
+    course_id: int,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_hod_or_admin),
+):
+    """ملف PDF واحد يضم كل شهادات الدورة المُصدرة (الدورات الكبيرة تُحوَّل إلى ZIP)."""
+    course = _load_course_for_export(db, course_id, user)
+    if not HAS_XHTML2PDF or not cert_batch.HAS_PYPDF:
+        raise HTTPException(500, "xhtml2pdf/pypdf غير مثبتة")
+
+    files = _course_certificate_files(db, course, user)
+    if not files:
+        raise HTTPException(404, "لا توجد شهادات مُصدرة لهذه الدورة")
+
+    paths = [path for _, _, path in files]
+    if not cert_batch.fits_merge(paths):
+        # الدمج يحمل كل الصفحات في الذاكرة: فوق CERT_MERGE_MAX_MB نرسل ZIP بدلًا منه
+        return RedirectResponse(url=f"/hod/certificates/course/{course_id}.zip", status_code=status.HTTP_303_SEE_OTHER)
+    merged = cert_batch.merge_pdfs(paths)
     return StreamingResponse(
-        pdf_io,
+        cert_batch.iter_file(merged),
         media_type="application/pdf",
         headers={
-            "Content-Disposition": content_disp,
+            "Content-Disposition": f'attachment; filename="certificates_course_{course_id}.pdf"',
+            "Content-Length": str(merged.stat().st_size),
             "X-Content-Type-Options": "nosniff",
         },
     )
 
+@router.get("/certificates/course/{course_id}.zip")
+def course_certificates_zip(
+    course_id: int,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_hod_or_admin),
+):
+    """ملف ZIP فيه شهادة PDF منفصلة لكل متدرب."""
+    course = _load_course_for_export(db, course_id, user)
+    if not HAS_XHTML2PDF:
+        raise HTTPException(500, "xhtml2pdf غير مثبتة، ثبّت: pip install xhtml2pdf")
+
+    files = _course_certificate_files(db, course, user)
+    if not files:
+        raise HTTPException(404, "لا توجد شهادات مُصدرة لهذه الدورة")
+
+    archive = cert_batch.zip_pdfs(
+        (f"certificate_{r['trainee_no']}_copy_{r['copy_no']}.pdf", path) for r, _, path in files
+    )
+    return StreamingResponse(
+        cert_batch.iter_file(archive),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="certificates_course_{course_id}.zip"',
+            "Content-Length": str(archive.stat().st_size),
+        },
+    )
 
 @router.get("/verify/{code}")
 def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
@@ -1497,35 +1293,7 @@ def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
         raise HTTPException(404, "لم يتم العثور على الشهادة")
     return templates.TemplateResponse("verify.html", {"request": request, "code": code, "rec": row})
 
-def _render_roster_html_pretty(course, enrollments):
-
-    logo_src = None
-    for p in ("images/main_logo.png", "images/logo.png", "img/logo.png"):
-        fp = Path("app/static").joinpath(p)
-        if fp.exists():
-            logo_src = f"/static/{p}"
-            break
-
-    font_url_majalla = None
-    for name in ["Majalla.ttf", "alfont_com_majalla.ttf"]:
-        p = Path("app/static/fonts") / name
-        if p.exists():
-            font_url_majalla = f"/static/fonts/{name}"
-            break
-
-    font_url_traditional = None
-    for name in ["Traditional-Arabic.ttf", "Traditional Arabic.ttf"]:
-        p = Path("app/static/fonts") / name
-        if p.exists():
-            font_url_traditional = f"/static/fonts/{name}"
-            break
-
-    parts = []
-    if font_url_majalla:
-        parts.append(f"@font-face {{ font-family:'MajallaAR'; src:url('{font_url_majalla}') format('truetype'); }}")
-    if font_url_traditional:
-        parts.append(f"@font-face {{ font-family:'TradArabicAR'; src:url('{font_url_traditional}') format('truetype'); }}")
-    font_ready_css = "\n".join(parts)
+def _roster_context(course, enrollments):
 
     cleaned_enrollments = []
     if enrollments:
@@ -1537,14 +1305,12 @@ def _render_roster_html_pretty(course, enrollments):
             }
             cleaned_enrollments.append(cleaned_row)
 
-    tpl = Template(_ROSTER_PRETTY_HTML)
-    return tpl.render(
-        course=course,
-        enrollments=cleaned_enrollments,
-        logo_src=logo_src,
-        font_ready_css=font_ready_css,
-        shape=_shape_ar,
-    )
+    return {
+        "course": course,
+        "enrollments": cleaned_enrollments,
+        "logo_src": renderer.assets().logo_src_no_favicon,
+        "shape": _shape_ar,
+    }
 
 @router.get("/courses/{course_id}/roster.pdf")
 def course_roster_pdf(
@@ -1573,12 +1339,10 @@ def course_roster_pdf(
     ).mappings().all()
 
     # توليد HTML الاحترافي ثم تحويله إلى PDF
-    html = _render_roster_html_pretty(course, rows)
-    pdf_io = io.BytesIO()
-    doc = pisa.CreatePDF(src=html, dest=pdf_io, encoding="UTF-8", link_callback=_link_callback)
-    if doc.err:
-        raise HTTPException(500, f"تعذّر توليد PDF (pretty) عبر xhtml2pdf: {doc.err}")
-    pdf_io.seek(0)
+    try:
+        pdf_io = io.BytesIO(renderer.render_pdf("roster", _roster_context(course, rows)))
+    except renderer.RenderError as e:
+        raise HTTPException(500, str(e))
 
     # ===== اسم ملف عربي صحيح + احتياطي ASCII لمنع انقلاب/ترميز خاطئ =====
     # تنظيف العنوان من محارف قد تُربك المتصفحات في الترويسة
@@ -1692,6 +1456,73 @@ def skills_record(
     """
     return templates.TemplateResponse("hod/skills_record.html", {"request": request})
 
+def _skills_trainee_placement(db: Session, trainee_no: str) -> Tuple[Optional[str], Optional[str]]:
+    """قسم وكلية المتدرب لسجل المهارات: حساب المستخدم، ثم تخصص التسجيل، ثم كلية القسم."""
+    department = None
+    college = None
+
+    # 1. محاولة البحث في جدول المستخدمين
+    trainee_user = db.query(User).filter(User.username == trainee_no).first()
+    if trainee_user:
+        # استخدام getattr لتجنب الأخطاء إذا لم تكن الحقول موجودة في Model
+        user_dept = getattr(trainee_user, 'department', None)
+        user_college = getattr(trainee_user, 'college', None)
+
+        if user_dept:
+            department = user_dept
+            dept_college = college_directory.department_college(user_dept)
+            if college_directory.college(dept_college):
+                college = dept_college
+
+        if not college and user_college:
+            college = user_college
+
+    # 2. محاولة البحث في جدول التسجيلات (course_enrollments) إذا لم نجد البيانات
+    # هذا مفيد للمتدربين الذين ليس لديهم حساب مستخدم ولكن لديهم بيانات في التسجيل
+    if not department:
+        enrollment = db.execute(
+            text("SELECT trainee_major FROM course_enrollments WHERE trainee_no = :tno AND trainee_major IS NOT NULL LIMIT 1"),
+            {"tno": trainee_no}
+        ).mappings().first()
+
+        if enrollment and enrollment["trainee_major"]:
+            major_str = enrollment["trainee_major"]
+
+            # محاولة استخراج الكلية والقسم من النص (مثال: "قسم الحاسب - كلية التقنية")
+            if " - " in major_str:
+                parts = major_str.split(" - ")
+                if len(parts) >= 2:
+                    department = parts[0].strip()
+                    # نفترض أن الجزء الأخير هو الكلية
+                    possible_college = parts[-1].strip()
+                    if "كلية" in possible_college:
+                        college = possible_college
+
+            # إذا لم يتم استخراج القسم (لم نجد " - ") نستخدم النص كاملاً
+            if not department:
+                department = major_str
+
+    # 3. محاولة استنتاج الكلية من القسم إذا وجدت
+    if department and not college:
+        college = college_directory.department_college(department) or None
+
+    return department, college
+
+def _skills_colleges(trainee_info: dict) -> list:
+    """الكليات الفريدة مع بيانات التوقيعات (من الدورات، وإلا من كلية المتدرب)."""
+    colleges_map = {}
+    for c in trainee_info.get("courses", []):
+        col = c.get("college")
+        if col and col.get("name") and col["name"] not in colleges_map:
+            colleges_map[col["name"]] = dict(col)
+
+    if not colleges_map and trainee_info.get("college"):
+        col = college_directory.signatures(college_directory.college(trainee_info["college"]))
+        if col:
+            colleges_map[col["name"]] = col
+
+    return list(colleges_map.values())
+
 @router.get("/skills-record/pdf/{trainee_no}")
 def skills_record_pdf_export(
     trainee_no: str = FastAPIPath(...),
@@ -1703,8 +1534,7 @@ def skills_record_pdf_export(
     # If college_admin, only show records for their college's courses
     if user.is_college_admin and user.college_admin_college:
         college_name = user.college_admin_college
-        college_departments = db.query(Department).filter(Department.college == college_name).all()
-        dept_names = [d.name for d in college_departments]
+        dept_names = college_directory.departments_of(college_name)
         
         if not dept_names:
             raise HTTPException(status_code=403, detail="لم يتم العثور على أقسام في كليتك")
@@ -1776,64 +1606,9 @@ def skills_record_pdf_export(
         "college": None
     }
     
-    # البحث عن بيانات المتدرب (القسم والكلية)
-    # 1. محاولة البحث في جدول المستخدمين
-    trainee_user = db.query(User).filter(User.username == trainee_no).first()
-    if trainee_user:
-        # استخدام getattr لتجنب الأخطاء إذا لم تكن الحقول موجودة في Model
-        user_dept = getattr(trainee_user, 'department', None)
-        user_college = getattr(trainee_user, 'college', None)
+    trainee_info["department"], trainee_info["college"] = _skills_trainee_placement(db, trainee_no)
 
-        if user_dept:
-            dept = db.query(Department).filter(Department.name == user_dept).first()
-            if dept:
-                trainee_info["department"] = dept.name
-                if dept.college:
-                    college = db.query(College).filter(College.name == dept.college).first()
-                    if college:
-                        trainee_info["college"] = college.name
-            else:
-                trainee_info["department"] = user_dept
-        
-        if not trainee_info["college"] and user_college:
-            college = db.query(College).filter(College.name == user_college).first()
-            if college:
-                trainee_info["college"] = college.name
-            else:
-                trainee_info["college"] = user_college
-
-    # 2. محاولة البحث في جدول التسجيلات (course_enrollments) إذا لم نجد البيانات
-    # هذا مفيد للمتدربين الذين ليس لديهم حساب مستخدم ولكن لديهم بيانات في التسجيل
-    if not trainee_info["department"]:
-        enrollment = db.execute(
-            text("SELECT trainee_major FROM course_enrollments WHERE trainee_no = :tno AND trainee_major IS NOT NULL LIMIT 1"),
-            {"tno": trainee_no}
-        ).mappings().first()
-        
-        if enrollment and enrollment["trainee_major"]:
-            major_str = enrollment["trainee_major"]
-            
-            # محاولة استخراج الكلية والقسم من النص (مثال: "قسم الحاسب - كلية التقنية")
-            if " - " in major_str:
-                parts = major_str.split(" - ")
-                if len(parts) >= 2:
-                    trainee_info["department"] = parts[0].strip()
-                    # نفترض أن الجزء الأخير هو الكلية
-                    possible_college = parts[-1].strip()
-                    if "كلية" in possible_college:
-                        trainee_info["college"] = possible_college
-            
-            # إذا لم يتم استخراج القسم (لم نجد " - ") نستخدم النص كاملاً
-            if not trainee_info["department"]:
-                trainee_info["department"] = major_str
-
-    # 3. محاولة استنتاج الكلية من القسم إذا وجدت
-    if trainee_info["department"] and not trainee_info["college"]:
-        dept = db.query(Department).filter(Department.name == trainee_info["department"]).first()
-        if dept and dept.college:
-            college = db.query(College).filter(College.name == dept.college).first()
-            trainee_info["college"] = college.name if college else dept.college
-    
+    course_targets = college_directory.course_targets(db, [row["course_id"] for row in results])
     for row in results:
         course_info = {
             "course_id": row["course_id"],
@@ -1850,32 +1625,11 @@ def skills_record_pdf_export(
             "college": None,
         }
 
-        # حاول إيجاد الكلية المرتبطة بهذه الدورة إن وُجدت عبر Course.targets -> Department -> College
-        try:
-            course_obj = db.query(Course).filter(Course.id == row["course_id"]).first()
-            found_college = None
-            if course_obj and getattr(course_obj, "targets", None):
-                for t in course_obj.targets:
-                    dept_name = t.department_name
-                    if dept_name:
-                        dept = db.query(Department).filter(Department.name == dept_name).first()
-                        if dept and dept.college:
-                            matched_col = db.query(College).filter(College.name == dept.college).first()
-                            if matched_col:
-                                found_college = matched_col
-                                break
-            if found_college:
-                course_info["college_name"] = found_college.name
-                course_info["college"] = {
-                    "name": found_college.name,
-                    "dean_name": found_college.dean_name or "",
-                    "vp_name": found_college.vp_students_name or "",
-                    "dean_sign_url": found_college.dean_sign_path if getattr(found_college, "dean_sign_path", None) else "/static/blank.png",
-                    "vp_sign_url": found_college.vp_students_sign_path if getattr(found_college, "vp_students_sign_path", None) else "/static/blank.png",
-                    "stamp_url": found_college.students_affairs_stamp_path if getattr(found_college, "students_affairs_stamp_path", None) else "/static/blank.png",
-                }
-        except Exception:
-            pass
+        # الكلية المرتبطة بهذه الدورة عبر أقسامها المستهدفة -> Department -> College
+        found_college = college_directory.college_for_departments(course_targets.get(row["course_id"], ()))
+        if found_college:
+            course_info["college_name"] = found_college.name
+            course_info["college"] = college_directory.signatures(found_college)
 
         trainee_info["courses"].append(course_info)
         trainee_info["total_hours"] += course_info["hours"]
@@ -1883,36 +1637,6 @@ def skills_record_pdf_export(
             trainee_info["total_certificates"] += 1
         trainee_info["completed_courses"] = len(trainee_info["courses"])
 
-    # البحث عن اللوجو
-    logo_src = None
-    for p in ("images/main_logo.png", "images/favicon.ico", "images/logo.png", "img/logo.png"):
-        fp = Path("app/static").joinpath(p)
-        if fp.exists():
-            logo_src = f"/static/{p}"
-            break
-
-    # بناء الخطوط
-    font_url_majalla = None
-    for name in ["Majalla.ttf", "alfont_com_majalla.ttf"]:
-        p = Path("app/static/fonts") / name
-        if p.exists():
-            font_url_majalla = f"/static/fonts/{name}"
-            break
-
-    font_url_traditional = None
-    for name in ["Traditional-Arabic.ttf", "Traditional Arabic.ttf"]:
-        p = Path("app/static/fonts") / name
-        if p.exists():
-            font_url_traditional = f"/static/fonts/{name}"
-            break
-
-    parts = []
-    if font_url_majalla:
-        parts.append(f"@font-face {{ font-family:'MajallaAR'; src:url('{font_url_majalla}') format('truetype'); }}")
-    if font_url_traditional:
-        parts.append(f"@font-face {{ font-family:'TradArabicAR'; src:url('{font_url_traditional}') format('truetype'); }}")
-    font_ready_css = "\n".join(parts)
-
     # الحصول على أسماء المسؤولين من بيانات الكلية والقسم
     dean_name = ""
     delegate_name = ""  # وكيل شؤون المتدربين
@@ -1924,7 +1648,7 @@ def skills_record_pdf_export(
     stamp_url = "/static/blank.png"
     
     if trainee_info["college"]:
-        college = db.query(College).filter(College.name == trainee_info["college"]).first()
+        college = college_directory.college(trainee_info["college"])
         if college:
             # جرب الحصول على اسم العميد من dean_name أولاً، ثم من admin الكلية
             if college.dean_name:
@@ -1956,37 +1680,8 @@ def skills_record_pdf_export(
                 dept_head_name = dept.hod_name or ""
 
 
-    # بناء قائمة الكليات الفريدة مع بيانات التوقيعات (تجميع من كل دورة)
-    colleges_map = {}
-    for c in trainee_info.get("courses", []):
-        col = c.get("college")
-        if col and col.get("name"):
-            name = col.get("name")
-            if name not in colleges_map:
-                colleges_map[name] = {
-                    "name": name,
-                    "dean_name": col.get("dean_name", ""),
-                    "vp_name": col.get("vp_name", ""),
-                    "dean_sign_url": col.get("dean_sign_url", "/static/blank.png"),
-                    "vp_sign_url": col.get("vp_sign_url", "/static/blank.png"),
-                    "stamp_url": col.get("stamp_url", "/static/blank.png"),
-                }
-
-    # إذا لم نحدّد أية كلية من الدورات، استعمل بيانات الكلية المستنتجة سابقًا إن وُجدت
-    if not colleges_map and trainee_info.get("college"):
-        col = db.query(College).filter(College.name == trainee_info.get("college")).first()
-        if col:
-            colleges_map[col.name] = {
-                "name": col.name,
-                "dean_name": col.dean_name or "",
-                "vp_name": col.vp_students_name or "",
-                "dean_sign_url": col.dean_sign_path if getattr(col, "dean_sign_path", None) else "/static/blank.png",
-                "vp_sign_url": col.vp_students_sign_path if getattr(col, "vp_students_sign_path", None) else "/static/blank.png",
-                "stamp_url": col.students_affairs_stamp_path if getattr(col, "students_affairs_stamp_path", None) else "/static/blank.png",
-            }
-
-    # جهز مصفوفة الكليات للتمرير إلى القالب
-    colleges = list(colleges_map.values())
+    # قائمة الكليات الفريدة مع بيانات التوقيعات (تجميع من كل دورة)
+    colleges = _skills_colleges(trainee_info)
 
     # احتفظ بمتغيرات التوافق العكسي (أول كلية إن وُجدت)
     if colleges:
@@ -1999,7 +1694,7 @@ def skills_record_pdf_export(
     # تحضير البيانات للـ template
     payload = {
         "trainee": trainee_info,
-        "logo_src": logo_src,
+        "logo_src": renderer.assets().logo_src,
         "generated_date": date.today().isoformat(),
         "generated_by": user.full_name or user.username,
         "dean_name": dean_name,
@@ -2008,26 +1703,16 @@ def skills_record_pdf_export(
         "dean_sign_url": dean_sign_url,
         "vp_sign_url": vp_sign_url,
         "stamp_url": stamp_url,
-        "font_ready_css": font_ready_css,
         "shape": _shape_ar,
         "colleges": colleges,
     }
 
-    # تصيير الـ HTML
-    try:
-        tpl = Template(SKILLS_RECORD_PDF_HTML)
-        html = tpl.render(**payload)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"خطأ في إنشاء التقرير: {str(e)}")
-
-    # توليد PDF
+    # تصيير الـ HTML ثم PDF
     if not HAS_XHTML2PDF:
         raise HTTPException(status_code=500, detail="مكتبة PDF غير متاحة")
 
     try:
-        pdf_bytes = io.BytesIO()
-        pisa.CreatePDF(html.encode('utf-8'), dest=pdf_bytes, link_callback=_link_callback)
-        pdf_bytes.seek(0)
+        pdf_bytes = io.BytesIO(renderer.render_pdf("skills_record", payload))
         
         # Use RFC 2231 encoding for Arabic filename
         filename_utf8 = f"تقرير_مهارات_{trainee_no}.pdf"
@@ -2056,8 +1741,7 @@ def skills_record_report(
 
     if user.is_college_admin and user.college_admin_college:
         college_name = user.college_admin_college
-        college_departments = db.query(Department).filter(Department.college == college_name).all()
-        dept_names = [d.name for d in college_departments]
+        dept_names = college_directory.departments_of(college_name)
         
         if not dept_names:
             raise HTTPException(status_code=403, detail="لم يتم العثور على أقسام في كليتك")
@@ -2131,54 +1815,8 @@ def skills_record_report(
         "college": None
     }
 
-    trainee_user = db.query(User).filter(User.username == trainee_no).first()
-    if trainee_user:
-        user_dept = getattr(trainee_user, 'department', None)
-        user_college = getattr(trainee_user, 'college', None)
+    trainee_info["department"], trainee_info["college"] = _skills_trainee_placement(db, trainee_no)
 
-        if user_dept:
-            dept = db.query(Department).filter(Department.name == user_dept).first()
-            if dept:
-                trainee_info["department"] = dept.name
-                if dept.college:
-                    college = db.query(College).filter(College.name == dept.college).first()
-                    if college:
-                        trainee_info["college"] = college.name
-            else:
-                trainee_info["department"] = user_dept
-        
-        if not trainee_info["college"] and user_college:
-            college = db.query(College).filter(College.name == user_college).first()
-            if college:
-                trainee_info["college"] = college.name
-            else:
-                trainee_info["college"] = user_college
-
-    if not trainee_info["department"]:
-        enrollment = db.execute(
-            text("SELECT trainee_major FROM course_enrollments WHERE trainee_no = :tno AND trainee_major IS NOT NULL LIMIT 1"),
-            {"tno": trainee_no}
-        ).mappings().first()
-        
-        if enrollment and enrollment["trainee_major"]:
-            major_str = enrollment["trainee_major"]
-            if " - " in major_str:
-                parts = major_str.split(" - ")
-                if len(parts) >= 2:
-                    trainee_info["department"] = parts[0].strip()
-                    possible_college = parts[-1].strip()
-                    if "كلية" in possible_college:
-                        trainee_info["college"] = possible_college
-            
-            if not trainee_info["department"]:
-                trainee_info["department"] = major_str
-
-    if trainee_info["department"] and not trainee_info["college"]:
-        dept = db.query(Department).filter(Department.name == trainee_info["department"]).first()
-        if dept and dept.college:
-            college = db.query(College).filter(College.name == dept.college).first()
-            trainee_info["college"] = college.name if college else dept.college
-    
     for row in results:
         course_info = {
             "course_id": row["course_id"],
@@ -2199,34 +1837,7 @@ def skills_record_report(
         trainee_info["completed_courses"] = len(trainee_info["courses"])
     
 
-    colleges_map = {}
-    for c in trainee_info.get("courses", []):
-        col = c.get("college")
-        if col and col.get("name"):
-            name = col.get("name")
-            if name not in colleges_map:
-                colleges_map[name] = {
-                    "name": name,
-                    "dean_name": col.get("dean_name", ""),
-                    "vp_name": col.get("vp_name", ""),
-                    "dean_sign_url": col.get("dean_sign_url", "/static/blank.png"),
-                    "vp_sign_url": col.get("vp_sign_url", "/static/blank.png"),
-                    "stamp_url": col.get("stamp_url", "/static/blank.png"),
-                }
-
-    if not colleges_map and trainee_info.get("college"):
-        col = db.query(College).filter(College.name == trainee_info.get("college")).first()
-        if col:
-            colleges_map[col.name] = {
-                "name": col.name,
-                "dean_name": col.dean_name or "",
-                "vp_name": col.vp_students_name or "",
-                "dean_sign_url": col.dean_sign_path if getattr(col, "dean_sign_path", None) else "/static/blank.png",
-                "vp_sign_url": col.vp_students_sign_path if getattr(col, "vp_students_sign_path", None) else "/static/blank.png",
-                "stamp_url": col.students_affairs_stamp_path if getattr(col, "students_affairs_stamp_path", None) else "/static/blank.png",
-            }
-
-    colleges = list(colleges_map.values())
+    colleges = _skills_colleges(trainee_info)
 
     return templates.TemplateResponse(
         "hod/skills_record_report.html",
@@ -7,9 +7,10 @@ from sqlalchemy import text
 from ..database import get_db
 from ..deps_auth import require_doc
 from ..models import FirstAidBox
+from ..templating import ui_context
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 @router.get("/", include_in_schema=False)
 def inv_index(request: Request, user=Depends(require_doc)):
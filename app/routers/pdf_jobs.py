@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..deps_auth import require_user, require_hod_or_admin, require_doc, CurrentUser
+from ..services import pdf_jobs as J
+
+router = APIRouter(prefix="/jobs", tags=["PDF Jobs"])
+
+# أنواع المهام: نفس دوال المسارات المتزامنة لكن تُنفذ داخل process pool
+J.register("certificate",     "app.routers.hod:certificate_print_pdf",            require_hod_or_admin)
+J.register("course_roster",   "app.routers.hod:course_roster_pdf",                require_hod_or_admin)
+J.register("skills_record",   "app.routers.hod:skills_record_pdf_export",         require_hod_or_admin)
+J.register("rest_notice",     "app.routers.clinic:export_rest_notice_by_visit",     require_doc)
+J.register("referral_notice", "app.routers.clinic:export_referral_notice_by_visit", require_doc)
+
+@router.post("/pdf/{kind}")
+def submit_pdf_job(
+    kind: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_user),
+):
+    """
+    إرسال مهمة PDF؛ المعاملات نفسها التي يأخذها المسار المتزامن تُمرر كـ query string.
+    مثال: POST /jobs/pdf/certificate?course_id=3&trainee_no=4411
+    """
+    params = dict(request.query_params)
+    job = J.submit(db, kind, params, user)
+    return JSONResponse(J.to_dict(job), status_code=202)
+
+@router.get("/{job_id}")
+def pdf_job_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_user),
+):
+    return J.to_dict(J.get_for_user(db, job_id, user))
+
+@router.get("/{job_id}/download")
+def pdf_job_download(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_user),
+):
+    job = J.get_for_user(db, job_id, user)
+    if job.status != "done" or not job.artifact_path:
+        raise HTTPException(409, "الملف غير جاهز بعد")
+    return FileResponse(job.artifact_path, media_type="application/pdf", filename=job.filename or f"{job.id}.pdf")
@@ -1,6 +1,7 @@
 
 from __future__ import annotations
 
+from datetime import date
 from fastapi import APIRouter, Request, Depends, Query, Form
 from fastapi.responses import JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session
@@ -8,10 +9,12 @@ from sqlalchemy import text
 from typing import Optional, Any, Dict, List
 from ..database import get_db, is_sqlite
 from ..deps_auth import require_doc
+from ..templating import ui_context
+from ..services import drug_search, exports
 from fastapi.templating import Jinja2Templates
 
 router = APIRouter(prefix="/clinic/pharmacy", tags=["Clinic-Pharmacy"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 def _clean(s: Optional[str]) -> Optional[str]:
     if s is None: return None
@@ -30,11 +33,9 @@ def _fail(msg: str, code: int = 400):
 def _find_drug_by_query(db: Session, q: str) -> Dict[str, Any]:
     """
     بحث ذكي بالاسم التجاري/العلمي/الشركة/الجرعة/الشكل.
-    - يقسم النص إلى رموز (مسافات / سلاش / فاصلة / شرطة)
+    - يقسم النص إلى رموز (مسافات / سلاش / فاصلة / شرطة) ويبحث عبر drug_search
     - إن وُجدت نتيجة واحدة يرجعها، وإلا يرفع خطأ مع اقتراحات.
     """
-    import re
-
     s = _clean(q)
     if not s:
         raise ValueError("الرجاء إدخال اسم الدواء.")
@@ -50,41 +51,8 @@ def _find_drug_by_query(db: Session, q: str) -> Dict[str, Any]:
         if row:
             return row
 
-    # تفكيك النص لرموز قصيرة >= 2
-    tokens = [t for t in re.split(r"[\s/,\-]+", s.strip()) if len(t) >= 2]
-    params = {}
-    conds = []
-    for i, t in enumerate(tokens):
-        k = f"t{i}"
-        params[k] = f"%{t}%"
-        # استخدام LIKE مع UPPER في SQLite، أو ILIKE في PostgreSQL
-        if is_sqlite():
-            conds.append(
-                f"(UPPER(COALESCE(trade_name,'')) LIKE UPPER(:{k}) "
-                f"OR UPPER(COALESCE(generic_name,'')) LIKE UPPER(:{k}) "
-                f"OR UPPER(COALESCE(manufacturer,'')) LIKE UPPER(:{k}) "
-                f"OR UPPER(COALESCE(strength,'')) LIKE UPPER(:{k}) "
-                f"OR UPPER(COALESCE(form,'')) LIKE UPPER(:{k}))"
-            )
-        else:
-            conds.append(
-                f"(COALESCE(trade_name,'') ILIKE :{k} "
-                f"OR COALESCE(generic_name,'') ILIKE :{k} "
-                f"OR COALESCE(manufacturer,'') ILIKE :{k} "
-                f"OR COALESCE(strength,'') ILIKE :{k} "
-                f"OR COALESCE(form,'') ILIKE :{k})"
-            )
-
-    where_extra = (" AND " + " AND ".join(conds)) if conds else ""
-
-    table_name = "public.drugs" if not is_sqlite() else "drugs"
-    rows = db.execute(text(f"""
-        SELECT id, trade_name, generic_name, strength, form, COALESCE(manufacturer,'') AS manufacturer
-        FROM {table_name}
-        WHERE is_active=TRUE {where_extra}
-        ORDER BY id
-        LIMIT 20
-    """), params).mappings().all()
+    # بحث مفهرس (FTS5/pg_trgm) مرتب حسب التشابه
+    rows = drug_search.search(db, s, limit=20)
 
     if not rows:
         raise ValueError("لم يتم العثور على دواء مطابق.")
@@ -272,6 +240,78 @@ def drugs_update(request: Request,
         db.rollback()
         return _fail(str(ex))
 
+MOVEMENTS_PAGE_LIMIT = 500
+
+MOVEMENTS_EXPORT_HEADER = [
+    "movement_id", "date_time", "drug_id", "trade_name", "generic_name",
+    "strength", "form", "move_type", "qty", "effective_qty", "note", "user",
+]
+
+def _movements_sql(where: str, tail: str = "") -> str:
+    """سجل الحركات (drug_stock_movements + drug_transactions) مع الفلاتر على الأعمدة الموحدة."""
+    drugs_table = "drugs" if is_sqlite() else "public.drugs"
+    movements_table = "drug_stock_movements" if is_sqlite() else "public.drug_stock_movements"
+    transactions_table = "drug_transactions" if is_sqlite() else "public.drug_transactions"
+    users_table = "users" if is_sqlite() else "public.users"
+    return f"""
+        SELECT * FROM (
+            SELECT
+              m.id, m.created_at, m.movement_type as move_type, m.quantity_change as qty, m.notes as ref_note,
+              d.id AS drug_id,
+              COALESCE(d.trade_name, '') AS trade_name,
+              COALESCE(d.generic_name, '') AS generic_name,
+              COALESCE(d.strength, '') AS strength,
+              COALESCE(d.form, '') AS form,
+              m.drug_name AS drug_name,
+              u.full_name AS user_name,
+              CASE
+                WHEN m.movement_type='out' THEN CASE WHEN m.quantity_change>0 THEN -m.quantity_change ELSE m.quantity_change END
+                WHEN m.movement_type='in'  THEN CASE WHEN m.quantity_change<0 THEN -m.quantity_change ELSE m.quantity_change END
+                ELSE m.quantity_change
+              END AS effective_qty
+            FROM {movements_table} m
+            LEFT JOIN {drugs_table} d ON (d.id = m.drug_code OR UPPER(d.drug_code) = UPPER(CAST(m.drug_code AS TEXT)))
+            LEFT JOIN {users_table} u ON u.id = m.created_by
+
+            UNION ALL
+
+            SELECT
+              t.id, t.created_at, t.transaction_type as move_type, t.quantity_change as qty, t.notes as ref_note,
+              d.id AS drug_id,
+              COALESCE(d.trade_name, '') AS trade_name,
+              COALESCE(d.generic_name, '') AS generic_name,
+              COALESCE(d.strength, '') AS strength,
+              COALESCE(d.form, '') AS form,
+              d.trade_name AS drug_name,
+              u.full_name AS user_name,
+              t.quantity_change AS effective_qty
+            FROM {transactions_table} t
+            LEFT JOIN {drugs_table} d ON d.id = t.drug_id
+            LEFT JOIN {users_table} u ON u.id = t.created_by
+        ) AS combined
+        {where}
+        ORDER BY created_at DESC
+        {tail}
+    """
+
+def _fmt_dt(v) -> str:
+    if not v:
+        return ""
+    if hasattr(v, "strftime"):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    return str(v)[:19]
+
+def _movement_export_row(r) -> list:
+    return [
+        r["id"],
+        _fmt_dt(r["created_at"]),
+        r["drug_id"] if r["drug_id"] is not None else "",
+        r["trade_name"], r["generic_name"], r["strength"], r["form"],
+        r["move_type"], r["qty"], r["effective_qty"],
+        (r["ref_note"] or "").replace("\n", " ").strip(),
+        r["user_name"] or "",
+    ]
+
 @router.get("/movements/log", dependencies=[Depends(require_doc)])
 def movements_log(
     request: Request,
@@ -284,8 +324,6 @@ def movements_log(
     db: Session = Depends(get_db)
 ):
     try:
-        import re
-
         def _to_int(s: Optional[str]) -> Optional[int]:
             if s is None: return None
             s = s.strip()
@@ -299,135 +337,61 @@ def movements_log(
         if df and dt and df > dt:
             df, dt = dt, df
 
-        export_csv = (export or "").lower() == "csv"
-        limit_sql = "" if export_csv else "LIMIT 500"
+        export_fmt = (export or "").lower()
+        if export_fmt not in ("csv", "xlsx"):
+            export_fmt = ""
 
         def token_where(q: str, params: dict) -> str:
-            if not q: return ""
-            tokens = [t for t in re.split(r"[\s/,\-]+", q.strip()) if len(t) >= 2]
-            if not tokens: return ""
-            conds = []
-            for i, t in enumerate(tokens):
-                key = f"tok{i}"
-                params[key] = f"%{t}%"
-                if is_sqlite():
-                    conds.append(
-                        f"(UPPER(COALESCE(d.trade_name,'')) LIKE UPPER(:{key}) "
-                        f"OR UPPER(COALESCE(d.generic_name,'')) LIKE UPPER(:{key}) "
-                        f"OR UPPER(COALESCE(d.manufacturer,'')) LIKE UPPER(:{key}) "
-                        f"OR UPPER(COALESCE(d.strength,'')) LIKE UPPER(:{key}) "
-                        f"OR UPPER(COALESCE(d.form,'')) LIKE UPPER(:{key}))"
-                    )
-                else:
-                    conds.append(
-                        f"(COALESCE(d.trade_name,'') ILIKE :{key} "
-                        f"OR COALESCE(d.generic_name,'') ILIKE :{key} "
-                        f"OR COALESCE(d.manufacturer,'') ILIKE :{key} "
-                        f"OR COALESCE(d.strength,'') ILIKE :{key} "
-                        f"OR COALESCE(d.form,'') ILIKE :{key})"
-                    )
-            return " AND " + " AND ".join(conds)
+            # الفلترة على drug_id عبر فهرس البحث
+            return drug_search.id_filter(q, params, column="drug_id")
 
         def build_base_where() -> tuple[str, dict]:
+            # الفلاتر على أعمدة الاستعلام الموحد (combined)
             where = "WHERE 1=1"
             params: dict = {}
             if move_type:
-                where += " AND m.movement_type=:t"
+                where += " AND move_type=:t"
                 params["t"] = move_type
             if df:
                 if is_sqlite():
-                    where += " AND DATE(m.created_at) >= :df"
+                    where += " AND DATE(created_at) >= :df"
                 else:
-                    where += " AND m.created_at::date >= :df"
+                    where += " AND created_at::date >= :df"
                 params["df"] = df
             if dt:
                 if is_sqlite():
-                    where += " AND DATE(m.created_at) <= :dt"
+                    where += " AND DATE(created_at) <= :dt"
                 else:
-                    where += " AND m.created_at::date <= :dt"
+                    where += " AND created_at::date <= :dt"
                 params["dt"] = dt
             return where, params
 
-        def run_query(where: str, params: dict):
-
-            drugs_table = "drugs" if is_sqlite() else "public.drugs"
-            movements_table = "drug_stock_movements" if is_sqlite() else "public.drug_stock_movements"
-            transactions_table = "drug_transactions" if is_sqlite() else "public.drug_transactions"
-            users_table = "users" if is_sqlite() else "public.users"
-            
-            sql = f"""
-                SELECT * FROM (
-                    SELECT
-                      m.id, m.created_at, m.movement_type as move_type, m.quantity_change as qty, m.notes as ref_note,
-                      d.id AS drug_id,
-                      COALESCE(d.trade_name, '') AS trade_name,
-                      COALESCE(d.generic_name, '') AS generic_name,
-                      COALESCE(d.strength, '') AS strength,
-                      COALESCE(d.form, '') AS form,
-                      m.drug_name AS drug_name,
-                      u.full_name AS user_name,
-                      CASE
-                        WHEN m.movement_type='out' THEN CASE WHEN m.quantity_change>0 THEN -m.quantity_change ELSE m.quantity_change END
-                        WHEN m.movement_type='in'  THEN CASE WHEN m.quantity_change<0 THEN -m.quantity_change ELSE m.quantity_change END
-                        ELSE m.quantity_change
-                      END AS effective_qty
-                    FROM {movements_table} m
-                    LEFT JOIN {drugs_table} d ON (d.id = m.drug_code OR UPPER(d.drug_code) = UPPER(CAST(m.drug_code AS TEXT)))
-                    LEFT JOIN {users_table} u ON u.id = m.created_by
-                    
-                    UNION ALL
-                    
-                    SELECT
-                      t.id, t.created_at, t.transaction_type as move_type, t.quantity_change as qty, t.notes as ref_note,
-                      d.id AS drug_id,
-                      COALESCE(d.trade_name, '') AS trade_name,
-                      COALESCE(d.generic_name, '') AS generic_name,
-                      COALESCE(d.strength, '') AS strength,
-                      COALESCE(d.form, '') AS form,
-                      d.trade_name AS drug_name,
-                      u.full_name AS user_name,
-                      t.quantity_change AS effective_qty
-                    FROM {transactions_table} t
-                    LEFT JOIN {drugs_table} d ON d.id = t.drug_id
-                    LEFT JOIN {users_table} u ON u.id = t.created_by
-                ) AS combined
-                {where}
-                ORDER BY created_at DESC
-                {limit_sql}
-            """
-            return db.execute(text(sql), params).mappings().all()
-
-        # === الحالات ===
-        base_where, base_params = build_base_where()
-
-        # 0) بدون أي فلاتر -> رجّع السجل كامل (آخر 500)
-        if d_id is None and not (drug_q and drug_q.strip()):
-            rows = run_query(base_where, base_params)
-
-        else:
-            rows = []
-
-            # 1) جرّب بالـID
+        def candidates():
+            """الشروط بالترتيب؛ يُستخدم أول شرط يرجع نتائج."""
+            # 0) بدون فلتر دواء -> السجل كامل
+            if d_id is None and not (drug_q and drug_q.strip()):
+                yield build_base_where()
+                return
+            # 1) بالـID
+            if d_id is not None:
+                where_id, params_id = build_base_where()
+                yield where_id + " AND drug_id=:d", {**params_id, "d": d_id}
+            # 2) بالنص (token search)
+            if (drug_q or "").strip():
+                where_txt, params_txt = build_base_where()
+                where_txt += token_where(drug_q, params_txt)
+                yield where_txt, params_txt
+            # 3) نص من بطاقة الدواء
             if d_id is not None:
-                where_id  = base_where + " AND m.drug_id=:d"
-            params_id = {**base_params, "d": d_id}
-            rows = run_query(where_id, params_id)
-
-        # 2) لو ما فيه نتيجة، جرّب بالنص (token search)
-        if not rows and (drug_q or "").strip():
-            where_txt, params_txt = build_base_where()
-            where_txt += token_where(drug_q, params_txt)
-            rows = run_query(where_txt, params_txt)
-
-        # 3) لو ما فيه نتيجة ولسه فيه ID، ابنِ نص من بطاقة الدواء وبحث به
-        if not rows and d_id is not None:
-            try:
-                table_name = "public.drugs" if not is_sqlite() else "drugs"
-                name_row = db.execute(text(f"""
-                    SELECT trade_name, generic_name, COALESCE(manufacturer,'') AS manufacturer,
-                           COALESCE(strength,'') AS strength, COALESCE(form,'') AS form
-                    FROM {table_name} WHERE id=:d
-                """), {"d": d_id}).mappings().first()
+                try:
+                    table_name = "public.drugs" if not is_sqlite() else "drugs"
+                    name_row = db.execute(text(f"""
+                        SELECT trade_name, generic_name, COALESCE(manufacturer,'') AS manufacturer,
+                               COALESCE(strength,'') AS strength, COALESCE(form,'') AS form
+                        FROM {table_name} WHERE id=:d
+                    """), {"d": d_id}).mappings().first()
+                except Exception:
+                    name_row = None
                 if name_row:
                     q2 = " ".join(x for x in [
                         name_row["trade_name"], name_row["generic_name"],
@@ -435,34 +399,31 @@ def movements_log(
                     ] if x)
                     where_txt2, params_txt2 = build_base_where()
                     where_txt2 += token_where(q2, params_txt2)
-                    rows = run_query(where_txt2, params_txt2)
-            except Exception:
-                pass
-
-        if export_csv:
-            import io, csv, datetime
-            from fastapi.responses import Response
-            buf = io.StringIO(newline="")
-            w = csv.writer(buf)
-            w.writerow(["movement_id","date_time","drug_id","trade_name","generic_name",
-                        "strength","form","move_type","qty","effective_qty","note","user"])
-            for r in rows:
-                w.writerow([
-                    r["id"],
-                    r["created_at"].strftime("%Y-%m-%d %H:%M:%S") if r["created_at"] else "",
-                    r["drug_id"] if r["drug_id"] is not None else "",
-                    r["trade_name"], r["generic_name"], r["strength"], r["form"],
-                    r["move_type"], r["qty"], r["effective_qty"],
-                    (r["ref_note"] or "").replace("\n"," ").strip(),
-                    r["user_name"] or "",
-                ])
-            csv_text = "\ufeff" + buf.getvalue()
-            fname = f"movements_{datetime.date.today():%Y%m%d}.csv"
-            return Response(
-                content=csv_text,
-                media_type="text/csv; charset=utf-8",
-                headers={"Content-Disposition": f'attachment; filename="{fname}"'}
+                    yield where_txt2, params_txt2
+
+        if export_fmt:
+            # أول شرط له نتائج (فحص LIMIT 1) ثم تصدير متدفق بدون حد
+            chosen = None
+            for where, params in candidates():
+                chosen = (where, params)
+                if db.execute(text(_movements_sql(where, "LIMIT 1")), params).first():
+                    break
+            where, params = chosen
+            rows_iter = (
+                _movement_export_row(r) for r in exports.stream_rows(_movements_sql(where), params)
             )
+            fname = f"movements_{date.today():%Y%m%d}.{export_fmt}"
+            if export_fmt == "xlsx":
+                return exports.xlsx_response(fname, "movements", MOVEMENTS_EXPORT_HEADER, rows_iter)
+            return exports.csv_response(fname, MOVEMENTS_EXPORT_HEADER, rows_iter)
+
+        rows = []
+        for where, params in candidates():
+            rows = db.execute(
+                text(_movements_sql(where, f"LIMIT {MOVEMENTS_PAGE_LIMIT}")), params
+            ).mappings().all()
+            if rows:
+                break
 
         return templates.TemplateResponse("clinic/pharmacy_movements.html", {
             "request": request,
@@ -627,39 +588,8 @@ def drugs_search(q: str = "", db: Session = Depends(get_db)):
     s = (q or "").strip()
     
     # إذا كانت الـ query فارغة، أرجع كل الأدوية النشطة
-    if not s:
-        rows = db.execute(text(f"""
-            SELECT id, trade_name, generic_name, strength, form,
-                   COALESCE(manufacturer,'') AS manufacturer
-            FROM {'public.drugs' if not is_sqlite() else 'drugs'}
-            WHERE is_active=TRUE
-            ORDER BY trade_name
-            LIMIT 100
-        """)).mappings().all()
-    else:
-
-        if is_sqlite():
-            like_clause = """
-                UPPER(trade_name) LIKE UPPER(:q) OR
-                UPPER(generic_name) LIKE UPPER(:q) OR
-                UPPER(COALESCE(manufacturer,'')) LIKE UPPER(:q)
-            """
-        else:
-            like_clause = """
-                trade_name ILIKE :q OR
-                generic_name ILIKE :q OR
-                COALESCE(manufacturer,'') ILIKE :q
-            """
-        rows = db.execute(text(f"""
-            SELECT id, trade_name, generic_name, strength, form,
-                   COALESCE(manufacturer,'') AS manufacturer
-            FROM {'public.drugs' if not is_sqlite() else 'drugs'}
-            WHERE is_active=TRUE
-              AND ({like_clause})
-            ORDER BY trade_name
-            LIMIT 20
-        """), {"q": f"%{s}%"}).mappings().all()
-    
+    rows = drug_search.search(db, s, limit=20 if s else 100)
+
     items = []
     for r in rows:
         label = " / ".join(filter(None, [r["trade_name"], r["generic_name"], r["strength"], r["form"]]))
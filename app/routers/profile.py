@@ -6,12 +6,13 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from ..database import get_db
-from ..deps_auth import require_user, CurrentUser
+from ..deps_auth import require_user, CurrentUser, bump_user_version
 from ..models import User
-from ..security import verify_password, hash_password
+from ..services import password_hasher
+from ..templating import ui_context
 
 router = APIRouter(prefix="/profile", tags=["Profile"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
 def first_letter(text):
     if not text:
@@ -70,15 +71,20 @@ async def change_password(
     else:
 
         user = db.query(User).filter(User.id == current_user.id).first()
-        
+        stored_hash = user.password_hash
+        # إنهاء معاملة القراءة (إرجاع الاتصال للمجمّع) قبل انتظار bcrypt
+        db.rollback()
 
-        if not verify_password(current_password, user.password_hash):
-            error = "كلمة المرور الحالية غير صحيحة"
-        else:
+        try:
+            if not await password_hasher.verify(current_password, stored_hash):
+                error = "كلمة المرور الحالية غير صحيحة"
+            else:
 
-            user.password_hash = hash_password(new_password)
-            db.commit()
-            success = "تم تغيير كلمة المرور بنجاح"
+                user.password_hash = await password_hasher.hash_password(new_password)
+                db.commit()
+                success = "تم تغيير كلمة المرور بنجاح"
+        except password_hasher.HashingBusy:
+            error = "الخادم مشغول حاليًا، الرجاء المحاولة بعد لحظات"
     
     return templates.TemplateResponse(
         "profile/index.html",
@@ -109,6 +115,7 @@ async def update_profile(
         user = db.query(User).filter(User.id == current_user.id).first()
         user.full_name = full_name.strip()
         db.commit()
+        bump_user_version(current_user.id)
         
         # تحديث الجلسة
         request.session["user"]["full_name"] = full_name.strip()
@@ -1,70 +1,60 @@
-
 from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime
-from pathlib import Path
+from urllib.parse import quote
 from ..database import get_db
-from ..models import Course, CourseEnrollment, College, Department
+from ..models import CourseEnrollment
+from ..templating import ui_context
+from ..services import certificate_pdf_cache as cert_pdf_cache
+from ..services import college_directory
+from ..services import qr_assets
+from ..services import verify_cache
+from . import hod
 
 router = APIRouter(prefix="/verify", tags=["Verify"])
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="app/templates", context_processors=[ui_context])
 
-SQL_VERIFY = text("""
-    SELECT
-      cv.course_id, cv.trainee_no, cv.trainee_name, cv.course_title, cv.hours,
-      cv.start_date, cv.end_date, cv.certificate_code, cv.copy_no, cv.barcode_path,
-      cv.created_at AS issued_at,
-      c.provider AS college_name
-    FROM certificate_verifications cv
-    LEFT JOIN courses c ON cv.course_id = c.id
-    WHERE cv.certificate_code = :code
-    ORDER BY cv.copy_no DESC
-    LIMIT 1
-""")
+async def throttle(request: Request) -> None:
+    """صفحات التحقق عامة (كل مسح QR): حد لكل IP (بدون threadpool: لا يحجب)."""
+    ok, retry_after = verify_cache.limiter.allow(verify_cache.client_key(request))
+    if not ok:
+        raise HTTPException(
+            status_code=429,
+            detail="طلبات كثيرة، حاول بعد قليل",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
 
-@router.get("/{code}")
-def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
-    row = db.execute(SQL_VERIFY, {"code": code}).mappings().first()
-    if not row:
-        raise HTTPException(status_code=404, detail="الشهادة غير موجودة")
-    
-    # الحصول على بيانات الدورة الكاملة
-    course = db.query(Course).filter_by(id=row["course_id"]).first()
-    if not course:
+def _lookup_or_404(db: Session, code: str) -> verify_cache.VerifiedCertificate:
+    rec = verify_cache.lookup(db, code)
+    if rec is None:
+        raise HTTPException(
+            status_code=404, detail="الشهادة غير موجودة",
+            headers={"Cache-Control": verify_cache.NEGATIVE_CACHE_CONTROL},
+        )
+    if rec.course is None:
         raise HTTPException(status_code=404, detail="الدورة غير موجودة")
-    
+    return rec
+
+def _verify_context(code: str, rec: verify_cache.VerifiedCertificate) -> dict:
+    row = rec.row
+    course = rec.course
+
     # بناء كائن trainee مشابه لما يتوقعه template
     enrollment = CourseEnrollment(
         trainee_no=row["trainee_no"],
         trainee_name=row["trainee_name"]
     )
     
-    # الحصول على كلية من استنتاج أهداف الدورة (مثل hod.py)
-    college = None
-    college_name_from_db = None
-    
-    # أولاً: حاول استنتاج الكلية من أسماء الأقسام المستهدفة للدورة
-    try:
-        target_dept_names = [t.department_name for t in course.targets] if getattr(course, "targets", None) else []
-        for dept_name in target_dept_names:
-            dept = db.query(Department).filter(Department.name == dept_name).first()
-            if dept and dept.college:
-                matched = db.query(College).filter(College.name == dept.college).first()
-                if matched:
-                    college = matched
-                    college_name_from_db = matched.name
-                    break
-    except Exception:
-        college = None
-    
+    # أولاً: الكلية من أسماء الأقسام المستهدفة للدورة (دليل الكليات في الذاكرة)
+    college = college_directory.college_for_departments(rec.target_departments)
+    college_name_from_db = college.name if college else None
+
     # ثانياً: إذا لم نجد كلية من الأهداف، حاول البحث بـ provider من الدورة أو college_name
     if not college:
-        college_name_from_db = row.get("college_name") or (course.provider if course else None)
-        if college_name_from_db:
-            college = db.query(College).filter_by(name=college_name_from_db).first()
-    
+        college_name_from_db = row.get("college_name") or course.provider
+        college = college_directory.college(college_name_from_db)
+
     # استخراج البيانات من الكلية
     college_name = college_name_from_db or "الكلية التقنية"
     college_name_en = (getattr(college, "name_en", None) or "") if college else ""
@@ -76,11 +66,10 @@ def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
     stamp_url = college.students_affairs_stamp_path if college and getattr(college, "students_affairs_stamp_path", None) else "/static/blank.png"
     
     # barcode URL
-    barcode_url = row["barcode_path"] or f"/static/barcodes/{code}.png"
+    barcode_url = row["barcode_path"] or qr_assets.url_for(code)
     
     # بناء السياق الكامل لـ template الشهادة
-    context = {
-        "request": request,
+    return {
         "course": course,
         "trainee": enrollment,
         "college_name": college_name,
@@ -94,23 +83,72 @@ def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
         "copy_no": row["copy_no"],
         "barcode_url": barcode_url,
     }
-    
-    return templates.TemplateResponse("hod/certificate_template.html", context)
 
-@router.get("/api/verify")
-def verify_api(code: str, db: Session = Depends(get_db)):
-    row = db.execute(SQL_VERIFY, {"code": code}).mappings().first()
-    if not row:
-        return {"valid": False, "code": code}
-    return {
-        "valid": True,
-        "code": row["certificate_code"],
-        "copy_no": row["copy_no"],
-        "trainee_no": row["trainee_no"],
-        "trainee_name": row["trainee_name"],
-        "course_title": row["course_title"],
-        "hours": row["hours"],
-        "start_date": str(row["start_date"]) if row["start_date"] else None,
-        "end_date": str(row["end_date"]) if row["end_date"] else None,
-        "issued_at": str(row["issued_at"]) if row.get("issued_at") else None,
-    }
\ No newline at end of file
+def _context_etag(context: dict) -> str:
+    course = context["course"]
+    trainee = context["trainee"]
+    return verify_cache.etag(
+        context["certificate_no"], context["copy_no"], context["barcode_url"],
+        trainee.trainee_no, trainee.trainee_name,
+        course.title, course.hours, course.start_date, course.end_date,
+        context["college_name"], context["college_name_en"], context["vp_name"], context["dean_name"],
+        context["vp_sign_url"], context["dean_sign_url"], context["stamp_url"],
+    )
+
+@router.get("/{code}", dependencies=[Depends(throttle)])
+def verify_page(code: str, request: Request, db: Session = Depends(get_db)):
+    context = _verify_context(code, _lookup_or_404(db, code))
+    headers = {"ETag": _context_etag(context), "Cache-Control": verify_cache.CACHE_CONTROL}
+    if verify_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    context["request"] = request
+    return templates.TemplateResponse("hod/certificate_template.html", context, headers=headers)
+
+@router.get("/{code}/pdf", dependencies=[Depends(throttle)])
+def verify_pdf(code: str, request: Request, db: Session = Depends(get_db)):
+    """نسخة PDF لآخر نسخة من الشهادة — تُخدم من كاش الملفات مع ETag."""
+    context = _verify_context(code, _lookup_or_404(db, code))
+    key, path = hod.cached_certificate_pdf(db, context)
+    return cert_pdf_cache.send(
+        request, key, path,
+        headers={"Content-Disposition": f'inline; filename="certificate_{quote(code)}.pdf"'},
+    )
+
+@router.get("/{code}/qr.{fmt}", dependencies=[Depends(throttle)])
+def verify_qr(code: str, fmt: str, request: Request, db: Session = Depends(get_db)):
+    """صورة QR للشهادة (png/svg) تُولَّد عند الطلب؛ فقط لرموز شهادات موجودة."""
+    if fmt not in qr_assets.FORMATS or verify_cache.lookup(db, code) is None:
+        raise HTTPException(
+            status_code=404, detail="الشهادة غير موجودة",
+            headers={"Cache-Control": verify_cache.NEGATIVE_CACHE_CONTROL},
+        )
+    headers = {"ETag": qr_assets.etag(code, fmt), "Cache-Control": qr_assets.CACHE_CONTROL}
+    if verify_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(qr_assets.get(code, fmt), media_type=qr_assets.FORMATS[fmt], headers=headers)
+
+@router.get("/api/verify", dependencies=[Depends(throttle)])
+def verify_api(code: str, request: Request, db: Session = Depends(get_db)):
+    rec = verify_cache.lookup(db, code)
+    if rec is None:
+        body = {"valid": False, "code": code}
+        cache_control = verify_cache.NEGATIVE_CACHE_CONTROL
+    else:
+        row = rec.row
+        body = {
+            "valid": True,
+            "code": row["certificate_code"],
+            "copy_no": row["copy_no"],
+            "trainee_no": row["trainee_no"],
+            "trainee_name": row["trainee_name"],
+            "course_title": row["course_title"],
+            "hours": row["hours"],
+            "start_date": str(row["start_date"]) if row["start_date"] else None,
+            "end_date": str(row["end_date"]) if row["end_date"] else None,
+            "issued_at": str(row["issued_at"]) if row.get("issued_at") else None,
+        }
+        cache_control = verify_cache.CACHE_CONTROL
+    headers = {"ETag": verify_cache.etag(*body.values()), "Cache-Control": cache_control}
+    if verify_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
@@ -1,9 +1,69 @@
 
+import os
+import re
+import time
+from typing import Optional
+
 import bcrypt
 
+# تكلفة bcrypt:
+# - BCRYPT_ROUNDS في البيئة ⇒ تكلفة ثابتة (وتُعاد تهشير كلمات المرور بأي تكلفة مختلفة عند الدخول)
+# - بدونها: calibrate() عند الإقلاع يختار أعلى تكلفة يبقى زمنها <= BCRYPT_TARGET_MS
+#   (بين BCRYPT_MIN_ROUNDS و BCRYPT_MAX_ROUNDS)، وإعادة التهشير ترفع التكلفة فقط
+#   حتى لا تتبادل العمليات التهشير إذا اختلفت معايرتها
+
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+
+_ENV_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+BCRYPT_ROUNDS = int(_ENV_ROUNDS) if _ENV_ROUNDS else 12
+BCRYPT_CALIBRATION = {"rounds": BCRYPT_ROUNDS, "source": "env" if _ENV_ROUNDS else "default", "sample_ms": None}
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+def calibrate(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """قياس زمن التهشير واختيار التكلفة (لا يغيّر شيئًا إذا حُددت BCRYPT_ROUNDS)."""
+    global BCRYPT_ROUNDS
+    if _ENV_ROUNDS:
+        return BCRYPT_ROUNDS
+    probe = BCRYPT_MIN_ROUNDS
+    samples = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=probe))
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    ms = min(samples)
+    rounds = probe
+    # كل زيادة في التكلفة تضاعف الزمن
+    while rounds < BCRYPT_MAX_ROUNDS and ms * 2 ** (rounds + 1 - probe) <= target_ms:
+        rounds += 1
+    BCRYPT_ROUNDS = rounds
+    BCRYPT_CALIBRATION.update(
+        rounds=rounds,
+        source="calibrated",
+        sample_ms=round(ms, 3),
+        expected_ms=round(ms * 2 ** (rounds - probe), 1),
+        target_ms=target_ms,
+    )
+    return rounds
+
+def hash_cost(password_hash: str) -> Optional[int]:
+    """تكلفة bcrypt المخزنة في التهشير (None إذا لم يكن bcrypt)."""
+    m = _COST_RE.match(password_hash or "")
+    return int(m.group(1)) if m else None
+
+def needs_rehash(password_hash: str) -> bool:
+    cost = hash_cost(password_hash)
+    if cost is None:
+        return False
+    if _ENV_ROUNDS:
+        return cost != BCRYPT_ROUNDS
+    return cost < BCRYPT_ROUNDS
+
 def hash_password(password: str) -> str:
     """تهشير كلمة المرور باستخدام bcrypt"""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
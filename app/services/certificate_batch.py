@@ -0,0 +1,98 @@
+
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from pypdf import PdfWriter
+    HAS_PYPDF = True
+except Exception:
+    HAS_PYPDF = False
+
+# عدد عمليات توليد PDF المتوازية (xhtml2pdf يعمل على CPU ويحتجز الـ GIL)
+RENDER_WORKERS = int(os.getenv("CERT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHUNK_SIZE = 64 * 1024
+# حد حجم ملفات الدمج في PDF واحد: PdfWriter يحتفظ بكل الصفحات في الذاكرة حتى الكتابة
+# (تقريبًا بحجم الملفات المدموجة)؛ فوق الحد يُستخدم ZIP (ملف بعد ملف، ذاكرة ثابتة)
+MERGE_MAX_BYTES = int(float(os.getenv("CERT_MERGE_MAX_MB", "64")) * 1024 * 1024)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, RENDER_WORKERS))
+        return _pool
+
+def render_many(render_fn: Callable[[dict], bytes], contexts: Sequence[dict]) -> List[bytes]:
+    """
+    توليد عدة ملفات PDF بالتوازي.
+    - render_fn يجب أن تكون دالة على مستوى الموديول (قابلة للـ pickle).
+    - السياقات يجب أن تكون بيانات بسيطة (بدون كائنات ORM).
+    """
+    if not contexts:
+        return []
+    if len(contexts) == 1 or RENDER_WORKERS <= 1:
+        return [render_fn(c) for c in contexts]
+    chunksize = max(1, len(contexts) // (RENDER_WORKERS * 4))
+    return list(_get_pool().map(render_fn, contexts, chunksize=chunksize))
+
+def fits_merge(paths: Iterable[Path]) -> bool:
+    """هل مجموع أحجام الملفات ضمن MERGE_MAX_BYTES (حد ذاكرة merge_pdfs)؟"""
+    total = 0
+    for p in paths:
+        total += os.path.getsize(p)
+        if total > MERGE_MAX_BYTES:
+            return False
+    return True
+
+def merge_pdfs(paths: Iterable[Path]) -> Path:
+    """
+    دمج ملفات PDF من القرص إلى ملف مؤقت.
+    كل الصفحات تبقى في ذاكرة PdfWriter حتى الكتابة، لذا يُستدعى فقط بعد fits_merge.
+    """
+    if not HAS_PYPDF:
+        raise RuntimeError("pypdf غير مثبتة")
+    fd, out = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    writer = PdfWriter()
+    try:
+        for p in paths:
+            writer.append(str(p))
+        with open(out, "wb") as f:
+            writer.write(f)
+    finally:
+        writer.close()
+    return Path(out)
+
+def zip_pdfs(entries: Iterable[Tuple[str, Path]]) -> Path:
+    """ضغط ملفات PDF في ZIP مؤقت (ملف بعد ملف، بدون تحميلها كلها في الذاكرة)."""
+    fd, out = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    # ملفات PDF مضغوطة أصلًا، فالتخزين بدون ضغط أسرع
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, p in entries:
+            zf.write(str(p), arcname=arcname)
+    return Path(out)
+
+def iter_file(path: Path, remove: bool = True):
+    """قراءة الملف على دفعات للـ StreamingResponse ثم حذفه."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
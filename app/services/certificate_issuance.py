@@ -0,0 +1,197 @@
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..database import is_sqlite
+from . import qr_assets, verify_cache
+
+# عدد عمّال توليد صور QR (خارج خيط الطلب)
+QR_WORKERS = int(os.getenv("CERT_QR_WORKERS", "4"))
+
+_qr_pool: Optional[ThreadPoolExecutor] = None
+_qr_pool_lock = threading.Lock()
+
+# تقدم الإصدار لكل دورة: {course_id: {...}} — يُقرأ من نقطة progress.
+# في ذاكرة العملية فقط: مع أكثر من عامل (uvicorn --workers) قد يصل الاستعلام لعامل آخر
+# فيرجع "idle" أثناء الإصدار؛ هو مؤشر عرض فقط، والحماية من التكرار بقفل الدورة في قاعدة البيانات
+_progress: Dict[int, Dict] = {}
+_progress_lock = threading.Lock()
+
+SQL_ATTENDEES = text("""
+    SELECT e.trainee_no, e.trainee_name, e.certificate_code,
+           CASE WHEN e.certificate_code IS NOT NULL AND EXISTS (
+               SELECT 1 FROM certificate_verifications v WHERE v.certificate_code = e.certificate_code
+           ) THEN 1 ELSE 0 END AS has_verification
+    FROM course_enrollments e
+    WHERE e.course_id = :cid AND e.present = true
+    ORDER BY CASE WHEN e.trainee_name IS NULL THEN 1 ELSE 0 END, e.trainee_name
+""")
+
+SQL_SET_CODE = text("""
+    UPDATE course_enrollments
+    SET certificate_code = :code, certificate_issued_at = CURRENT_TIMESTAMP
+    WHERE course_id = :cid AND trainee_no = :tno AND certificate_code IS NULL
+""")
+
+# قفل الدورة طوال معاملة الإصدار (بين العمليات والعمّال، لا في الذاكرة):
+# PostgreSQL: قفل صف الدورة؛ SQLite: أول كتابة تحجز قفل الكتابة (RESERVED) حتى commit
+SQL_LOCK_COURSE_PG = text("SELECT id FROM courses WHERE id = :cid FOR UPDATE")
+SQL_LOCK_COURSE_SQLITE = text("UPDATE courses SET id = id WHERE id = :cid")
+
+SQL_HELD_CODES = text("""
+    SELECT certificate_code FROM course_enrollments
+    WHERE course_id = :cid AND certificate_code IS NOT NULL
+""")
+
+SQL_INSERT_VERIFICATION = text("""
+    INSERT INTO certificate_verifications (
+      course_id, trainee_no, trainee_name, course_title, hours,
+      start_date, end_date, certificate_code, copy_no, barcode_path
+    )
+    VALUES (
+      :cid, :tno, :tname, :ctitle, :hours,
+      :sdate, :edate, :code, 1, :barcode
+    )
+""")
+
+def _get_qr_pool() -> ThreadPoolExecutor:
+    global _qr_pool
+    with _qr_pool_lock:
+        if _qr_pool is None:
+            _qr_pool = ThreadPoolExecutor(max_workers=max(1, QR_WORKERS), thread_name_prefix="cert-qr")
+        return _qr_pool
+
+def _set_progress(course_id: int, **fields) -> None:
+    with _progress_lock:
+        _progress.setdefault(course_id, {}).update(fields)
+
+def get_progress(course_id: int) -> Optional[Dict]:
+    with _progress_lock:
+        p = _progress.get(course_id)
+        return dict(p) if p else None
+
+def reserve_sequence(db: Session, n: int) -> List[int]:
+    """
+    حجز n قيمة من certificate_seq باستدعاء واحد.
+    على SQLite (بدون sequences) نبني مجالًا متتاليًا من MAX(id)+1 كما في المسار القديم.
+    """
+    if n <= 0:
+        return []
+    if not is_sqlite():
+        try:
+            # savepoint: الفشل (sequence غير موجود) لا يلغي المعاملة ولا قفل الدورة
+            with db.begin_nested():
+                rows = db.execute(
+                    text("SELECT nextval('certificate_seq') FROM generate_series(1, :n)"),
+                    {"n": n},
+                ).scalars().all()
+            return [int(v) for v in rows]
+        except Exception:
+            pass
+    base = db.execute(text("SELECT COALESCE(MAX(id),0)+1 FROM certificate_verifications")).scalar() or 1
+    return [int(base) + i for i in range(n)]
+
+def _lock_course(db: Session, course_id: int) -> None:
+    """يحجز الدورة حتى نهاية المعاملة؛ إصدار متزامن آخر ينتظر ثم يرى الرموز المُصدرة."""
+    db.execute(SQL_LOCK_COURSE_SQLITE if is_sqlite() else SQL_LOCK_COURSE_PG, {"cid": course_id})
+
+def issue_all(db: Session, course, make_barcode: Callable[[str], str]) -> Dict[str, int]:
+    """
+    إصدار شهادات لكل الحاضرين في الدورة دفعة واحدة:
+    - قفل الدورة في قاعدة البيانات قبل قراءة الحاضرين (تشغيلان متزامنان لا يُصدران مرتين).
+    - حجز أرقام التسلسل في استدعاء واحد.
+    - تحديث course_enrollments وإدراج certificate_verifications بـ executemany في معاملة واحدة.
+    - توليد صور QR في pool منفصل.
+
+    إعادة التشغيل آمنة: من لديه رمز شهادة وسجل تحقق يُتخطى، ومن لديه رمز بدون سجل تحقق
+    (بقايا فشل جزئي قديم) يُكمل له السجل فقط.
+    سجلات التحقق تُدرج فقط للرموز التي ثبتت فعلًا في course_enrollments داخل المعاملة.
+    """
+    course_id = course.id
+    started = time.monotonic()
+    futures = []
+    _set_progress(course_id, state="running", total=0, done=0, issued=0, skipped=0, error=None)
+
+    try:
+        _lock_course(db, course_id)
+        attendees = db.execute(SQL_ATTENDEES, {"cid": course_id}).mappings().all()
+        total = len(attendees)
+
+        new_rows = [a for a in attendees if a["certificate_code"] is None]
+        resume_rows = [a for a in attendees if a["certificate_code"] is not None and not a["has_verification"]]
+        skipped = total - len(new_rows) - len(resume_rows)
+        _set_progress(course_id, total=total, done=skipped, skipped=skipped)
+
+        seq_values = reserve_sequence(db, len(new_rows))
+        issued = [(a, f"{seq}-{a['trainee_no']}-{course_id}") for a, seq in zip(new_rows, seq_values)]
+        if new_rows:
+            db.execute(
+                SQL_SET_CODE,
+                [{"code": code, "cid": course_id, "tno": a["trainee_no"]} for a, code in issued],
+            )
+            # التحديث محروس بـ certificate_code IS NULL: نُبقي فقط الرموز التي ثبتت
+            held = set(db.execute(SQL_HELD_CODES, {"cid": course_id}).scalars())
+            issued = [(a, code) for a, code in issued if code in held]
+        issued += [(a, a["certificate_code"]) for a in resume_rows]
+        codes = [code for _, code in issued]
+
+        pool = _get_qr_pool()
+        futures = [pool.submit(make_barcode, code) for code in codes]
+        barcode_urls = {code: qr_assets.url_for(code) for code in codes}
+
+        if issued:
+            db.execute(
+                SQL_INSERT_VERIFICATION,
+                [
+                    {
+                        "cid": course_id,
+                        "tno": a["trainee_no"],
+                        "tname": a["trainee_name"],
+                        "ctitle": course.title,
+                        "hours": course.hours,
+                        "sdate": course.start_date,
+                        "edate": course.end_date,
+                        "code": code,
+                        "barcode": barcode_urls[code],
+                    }
+                    for a, code in issued
+                ],
+            )
+        db.commit()
+        verify_cache.forget_many(codes)
+    except Exception as e:
+        db.rollback()
+        for f in futures:
+            f.cancel()
+        _set_progress(course_id, state="failed", error=str(e))
+        raise
+
+    # رموز لم تثبت (أصدرها تشغيل متزامن) تُحسب ضمن المتخطاة
+    skipped = total - len(issued)
+    done = skipped
+    for code, f in zip(codes, futures):
+        try:
+            barcode_urls[code] = f.result()
+        except Exception:
+            # الصورة تُولَّد لاحقًا عند الطلب عبر qr_assets
+            traceback.print_exc()
+        done += 1
+        _set_progress(course_id, done=done)
+
+    result = {"issued": len(issued), "skipped": skipped, "total": total}
+    _set_progress(
+        course_id,
+        state="done",
+        done=total,
+        issued=len(issued),
+        skipped=skipped,
+        elapsed_ms=int((time.monotonic() - started) * 1000),
+    )
+    return result
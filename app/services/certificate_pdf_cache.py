@@ -0,0 +1,139 @@
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from fastapi.responses import FileResponse, Response
+from starlette.requests import Request
+
+# كاش ملفات PDF للشهادات (الشهادة لا تتغير بعد إصدارها)
+CACHE_DIR = Path(os.getenv("CERT_PDF_CACHE_DIR", "cache/certificates"))
+CACHE_MAX_BYTES = int(float(os.getenv("CERT_PDF_CACHE_MAX_MB", "512")) * 1024 * 1024)
+CACHE_CONTROL = "private, max-age=86400"
+
+_lock = threading.Lock()
+_total_bytes: Optional[int] = None
+
+def cache_key(
+    certificate_code: str,
+    copy_no: int,
+    template_updated_at: Optional[object],
+    signature_paths: Iterable[Optional[str]],
+) -> str:
+    """
+    مفتاح المحتوى: رمز الشهادة + رقم النسخة + تاريخ تعديل قالب الشهادة + مسارات التواقيع/الختم.
+    أي تغيير في القالب أو التواقيع ينتج مفتاحًا جديدًا تلقائيًا.
+    """
+    parts = [str(certificate_code), str(int(copy_no or 0)), str(template_updated_at or "")]
+    parts.extend(str(p or "") for p in signature_paths)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+def _path_for(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.pdf"
+
+def _scan() -> int:
+    total = 0
+    if CACHE_DIR.exists():
+        for p in CACHE_DIR.glob("*/*.pdf"):
+            try:
+                total += p.stat().st_size
+            except OSError:
+                pass
+    return total
+
+def get(key: str) -> Optional[Path]:
+    """يرجع مسار الملف إن وُجد، ويحدّث mtime ليعمل كـ LRU."""
+    p = _path_for(key)
+    try:
+        os.utime(p, None)
+    except OSError:
+        return None
+    return p
+
+def put(key: str, data: bytes) -> Path:
+    """كتابة ذرّية (ملف مؤقت ثم replace) ثم إخلاء الأقدم إذا تجاوز الحجم الحد."""
+    global _total_bytes
+    p = _path_for(key)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    existed = p.exists()
+    os.replace(tmp, p)
+
+    with _lock:
+        if _total_bytes is None:
+            _total_bytes = _scan()
+        elif not existed:
+            _total_bytes += len(data)
+        if _total_bytes > CACHE_MAX_BYTES:
+            _evict_locked(keep=p)
+    return p
+
+def _evict_locked(keep: Optional[Path] = None) -> None:
+    global _total_bytes
+    files = []
+    for f in CACHE_DIR.glob("*/*.pdf"):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, f))
+    files.sort()
+    total = sum(s for _, s, _ in files)
+    # نخلي حتى 90% من الحد حتى لا نعيد الإخلاء مع كل ملف جديد
+    target = int(CACHE_MAX_BYTES * 0.9)
+    for _, size, f in files:
+        if total <= target:
+            break
+        if keep is not None and f == keep:
+            continue
+        try:
+            f.unlink()
+            total -= size
+        except OSError:
+            pass
+    _total_bytes = total
+
+def purge() -> Dict[str, int]:
+    """حذف كل ملفات الكاش (لنقطة الأدمن)."""
+    global _total_bytes
+    removed = 0
+    freed = 0
+    with _lock:
+        if CACHE_DIR.exists():
+            for f in CACHE_DIR.glob("*/*.pdf"):
+                try:
+                    size = f.stat().st_size
+                    f.unlink()
+                    removed += 1
+                    freed += size
+                except OSError:
+                    pass
+        _total_bytes = 0
+    return {"removed": removed, "freed_bytes": freed}
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        files = list(CACHE_DIR.glob("*/*.pdf")) if CACHE_DIR.exists() else []
+        total = _scan()
+    return {"files": len(files), "bytes": total, "max_bytes": CACHE_MAX_BYTES}
+
+def send(request: Request, key: str, path: Path, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    إرسال ملف PDF من الكاش مع ETag:
+    - If-None-Match مطابق → 304 بدون جسم.
+    - غير ذلك → FileResponse.
+    """
+    etag = etag_for(key)
+    base = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    inm = request.headers.get("if-none-match") or ""
+    if etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+        return Response(status_code=304, headers=base)
+    base.update(headers or {})
+    return FileResponse(str(path), media_type="application/pdf", headers=base)
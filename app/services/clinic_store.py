@@ -0,0 +1,318 @@
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..database import engine, is_sqlite
+from ..models import ClinicPatientProfile, ClinicVisit
+
+# تخزين العيادة: الملفات والزيارات كانت في جدول واحد clinic_patients مع record_kind.
+# بعد الترحيل (scripts/migrate_clinic_storage.py) تصبح في جدولين:
+#   clinic_patient_profiles و clinic_visits (بنفس أرقام id للزيارات والملفات)
+# ويُعاد تسمية الجدول القديم إلى clinic_patients_legacy ويحل محله view بنفس الاسم والأعمدة
+# (للقراءة فقط) حتى تبقى الاستعلامات القديمة والسكربتات تعمل.
+#
+# الوضع يُكتشف من القاعدة: legacy إذا كان clinic_patients جدولًا فعليًا، وإلا split.
+# كل استعلامات clinic/admin تمر عبر profiles()/visits() و insert_*() هنا.
+
+LEGACY_TABLE = "clinic_patients"
+LEGACY_RENAMED = "clinic_patients_legacy"
+PROFILES_TABLE = ClinicPatientProfile.__tablename__
+VISITS_TABLE = ClinicVisit.__tablename__
+
+# كل كم ثانية يُعاد فحص الوضع (بعد cutover تنتقل العمليات الأخرى خلال هذه المدة)
+MODE_CHECK_SECONDS = float(os.getenv("CLINIC_STORE_CHECK_SECONDS", "30"))
+MIGRATION_BATCH_SIZE = int(os.getenv("CLINIC_MIGRATION_BATCH_SIZE", "5000"))
+
+# فهارس الجدول القديم (وضع legacy فقط)
+LEGACY_INDEXES = (
+    ("ix_clinic_patients_trainee", "record_kind, patient_type, trainee_no, visit_at"),
+    ("ix_clinic_patients_employee", "record_kind, patient_type, employee_no, visit_at"),
+    ("ix_clinic_patients_national_id", "record_kind, national_id"),
+    ("ix_clinic_patients_visits_keyset", "record_kind, visit_at, id"),
+)
+
+PROFILE_COLUMNS = [c.name for c in ClinicPatientProfile.__table__.columns]
+VISIT_COLUMNS = [c.name for c in ClinicVisit.__table__.columns]
+# أعمدة الـ view = اتحاد أعمدة الجدولين + record_kind
+VIEW_COLUMNS = ["id", "record_kind"] + [
+    c for c in dict.fromkeys(PROFILE_COLUMNS + VISIT_COLUMNS) if c != "id"
+]
+
+_mode: Optional[str] = None  # "legacy" | "split"
+_mode_checked = 0.0
+_mode_lock = threading.Lock()
+
+def _is_base_table(conn, name: str) -> bool:
+    if is_sqlite():
+        sql = "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"
+    else:
+        sql = """
+            SELECT 1 FROM information_schema.tables
+            WHERE table_schema='public' AND table_name=:n AND table_type='BASE TABLE'
+        """
+    return conn.execute(text(sql), {"n": name}).first() is not None
+
+def _is_view(conn, name: str) -> bool:
+    if is_sqlite():
+        sql = "SELECT 1 FROM sqlite_master WHERE type='view' AND name=:n"
+    else:
+        sql = "SELECT 1 FROM information_schema.views WHERE table_schema='public' AND table_name=:n"
+    return conn.execute(text(sql), {"n": name}).first() is not None
+
+def mode(force: bool = False) -> str:
+    """legacy أو split (مخزّن مؤقتًا MODE_CHECK_SECONDS)."""
+    global _mode, _mode_checked
+    now = time.monotonic()
+    if not force and _mode is not None and now - _mode_checked < MODE_CHECK_SECONDS:
+        return _mode
+    with _mode_lock:
+        try:
+            with engine.connect() as conn:
+                _mode = "legacy" if _is_base_table(conn, LEGACY_TABLE) else "split"
+        except Exception as e:
+            print(f"[clinic_store] mode check failed: {e}")
+            _mode = _mode or "legacy"
+        _mode_checked = now
+        return _mode
+
+def is_split() -> bool:
+    return mode() == "split"
+
+def profiles(alias: str = "cp") -> str:
+    """مصدر FROM لملفات المراجعين (مع اسم مستعار)."""
+    if is_split():
+        return f"{PROFILES_TABLE} {alias}"
+    return f"(SELECT * FROM {LEGACY_TABLE} WHERE record_kind='profile') {alias}"
+
+def visits(alias: str = "cv") -> str:
+    """مصدر FROM للزيارات (مع اسم مستعار)."""
+    if is_split():
+        return f"{VISITS_TABLE} {alias}"
+    return f"(SELECT * FROM {LEGACY_TABLE} WHERE record_kind='visit') {alias}"
+
+def profiles_table() -> str:
+    """اسم الجدول لتعديل الملفات (UPDATE ... WHERE id=:id)."""
+    return PROFILES_TABLE if is_split() else LEGACY_TABLE
+
+def _insert(db: Session, kind: str, values: Dict[str, Any]) -> Optional[int]:
+    values = dict(values)
+    # visit_at غير محدد = وقت الإدراج
+    now_cols = ["visit_at"] if kind == "visit" and "visit_at" not in values else []
+    if mode() == "legacy":
+        table = LEGACY_TABLE
+        values["record_kind"] = kind
+    else:
+        table = VISITS_TABLE if kind == "visit" else PROFILES_TABLE
+    cols = list(values) + now_cols
+    exprs = [f":{c}" for c in values] + ["CURRENT_TIMESTAMP"] * len(now_cols)
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(exprs)})"
+    if is_sqlite():
+        db.execute(text(sql), values)
+        # نفس الاتصال والمعاملة (قبل commit)
+        return db.execute(text("SELECT last_insert_rowid()")).scalar()
+    row = db.execute(text(sql + " RETURNING id"), values).first()
+    return row[0] if row else None
+
+def _insert_kind(db: Session, kind: str, values: Dict[str, Any]) -> Optional[int]:
+    if mode() == "split":
+        return _insert(db, kind, values)
+    # قد يكون cutover تم للتو في عملية أخرى: الجدول القديم صار view ⇒ أعد الفحص وحاول مرة
+    try:
+        with (db.begin_nested() if not is_sqlite() else nullcontext()):
+            return _insert(db, kind, values)
+    except Exception:
+        if mode(force=True) != "split":
+            raise
+    return _insert(db, kind, values)
+
+def insert_profile(db: Session, values: Dict[str, Any]) -> Optional[int]:
+    """إدراج ملف مراجع (بدون commit)؛ يرجع id."""
+    return _insert_kind(db, "profile", values)
+
+def insert_visit(db: Session, values: Dict[str, Any]) -> Optional[int]:
+    """إدراج زيارة (بدون commit)؛ visit_at = الآن إن لم يُحدد. يرجع id."""
+    return _insert_kind(db, "visit", values)
+
+# ===== الإقلاع =====
+
+def _view_sql() -> str:
+    def _select(table: str, kind: str, columns: List[str]) -> str:
+        have = set(columns)
+        cols = ", ".join(
+            f"'{kind}' AS record_kind" if c == "record_kind" else (c if c in have else f"NULL AS {c}")
+            for c in VIEW_COLUMNS
+        )
+        return f"SELECT {cols} FROM {table}"
+    return (
+        _select(PROFILES_TABLE, "profile", PROFILE_COLUMNS)
+        + " UNION ALL "
+        + _select(VISITS_TABLE, "visit", VISIT_COLUMNS)
+    )
+
+def _create_view(conn) -> None:
+    if is_sqlite():
+        conn.execute(text(f"DROP VIEW IF EXISTS {LEGACY_TABLE}"))
+        conn.execute(text(f"CREATE VIEW {LEGACY_TABLE} AS {_view_sql()}"))
+    else:
+        conn.execute(text(f"CREATE OR REPLACE VIEW {LEGACY_TABLE} AS {_view_sql()}"))
+
+def ensure() -> str:
+    """
+    عند الإقلاع (بعد create_all):
+    - legacy: فهارس مركبة على clinic_patients
+    - split: view التوافق clinic_patients إن لم يكن موجودًا (قاعدة جديدة مثلًا)
+    """
+    try:
+        with engine.begin() as conn:
+            if _is_base_table(conn, LEGACY_TABLE):
+                for name, cols in LEGACY_INDEXES:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {LEGACY_TABLE} ({cols})"))
+            elif not _is_view(conn, LEGACY_TABLE):
+                _create_view(conn)
+    except Exception as e:
+        print(f"[clinic_store] ensure skipped: {e}")
+    return mode(force=True)
+
+# ===== الترحيل (scripts/migrate_clinic_storage.py) =====
+
+def _copy_select(table_cls, columns: List[str]) -> str:
+    if is_sqlite():
+        return ", ".join(columns)
+    # PostgreSQL: أنواع الجدول القديم قد تختلف (TEXT مثلًا) ⇒ تحويل صريح لنوع الجدول الجديد
+    cols = table_cls.__table__.columns
+    return ", ".join(f"CAST({c} AS {cols[c].type.compile(dialect=engine.dialect)})" for c in columns)
+
+def _legacy_columns(conn, source: str) -> List[str]:
+    if is_sqlite():
+        return [r[1] for r in conn.execute(text(f"PRAGMA table_info({source})"))]
+    return [r[0] for r in conn.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name=:t"
+    ), {"t": source})]
+
+def _copy_batch(conn, kind: str, source: str, after_id: int, batch_size: Optional[int]) -> int:
+    """نسخ الصفوف (id > after_id) من الجدول القديم؛ يرجع أكبر id منسوخ أو after_id."""
+    table_cls = ClinicVisit if kind == "visit" else ClinicPatientProfile
+    target = table_cls.__tablename__
+    legacy_cols = set(_legacy_columns(conn, source))
+    columns = [c.name for c in table_cls.__table__.columns if c.name in legacy_cols]
+    limit_sql = " LIMIT :batch" if batch_size else ""
+    params: Dict[str, Any] = {"kind": kind, "after": after_id}
+    if batch_size:
+        params["batch"] = int(batch_size)
+    upper = conn.execute(text(f"""
+        SELECT MAX(id) FROM (
+            SELECT id FROM {source} WHERE record_kind=:kind AND id > :after ORDER BY id{limit_sql}
+        ) b
+    """), params).scalar()
+    if upper is None:
+        return after_id
+    conn.execute(text(f"""
+        INSERT INTO {target} ({', '.join(columns)})
+        SELECT {_copy_select(table_cls, columns)}
+        FROM {source}
+        WHERE record_kind=:kind AND id > :after AND id <= :upper
+        ORDER BY id
+    """), {"kind": kind, "after": after_id, "upper": upper})
+    return int(upper)
+
+def _copied_up_to(conn, kind: str) -> int:
+    target = VISITS_TABLE if kind == "visit" else PROFILES_TABLE
+    return int(conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {target}")).scalar() or 0)
+
+def migrate_batches(
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    pause: float = 0.0,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    نسخ الملفات والزيارات على دفعات (كل دفعة معاملة مستقلة) والتطبيق يعمل على الوضع القديم.
+    قابل للاستئناف: يبدأ من أكبر id منسوخ. يرجع عدد الصفوف المنسوخة لكل نوع.
+    """
+    copied = {"profile": 0, "visit": 0}
+    with engine.connect() as conn:
+        if not _is_base_table(conn, LEGACY_TABLE):
+            return copied
+    for kind in ("profile", "visit"):
+        while True:
+            with engine.begin() as conn:
+                after = _copied_up_to(conn, kind)
+                upper = _copy_batch(conn, kind, LEGACY_TABLE, after, batch_size)
+                if upper == after:
+                    break
+                n = conn.execute(text(
+                    f"SELECT COUNT(*) FROM {LEGACY_TABLE} WHERE record_kind=:k AND id > :a AND id <= :u"
+                ), {"k": kind, "a": after, "u": upper}).scalar() or 0
+            copied[kind] += int(n)
+            if progress:
+                progress(kind, copied[kind], upper)
+            if pause:
+                time.sleep(pause)
+    return copied
+
+def cutover() -> Dict[str, int]:
+    """
+    الخطوة الأخيرة (معاملة واحدة قصيرة):
+    نسخ ما أُضيف بعد الدفعات، إعادة مزامنة الملفات (قد تكون عُدّلت أثناء النسخ)،
+    إعادة تسمية الجدول القديم وإنشاء view التوافق.
+    """
+    with engine.begin() as conn:
+        if not _is_base_table(conn, LEGACY_TABLE):
+            return {"profile": 0, "visit": 0}
+        if not is_sqlite():
+            conn.execute(text(f"LOCK TABLE {LEGACY_TABLE} IN EXCLUSIVE MODE"))
+            seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": LEGACY_TABLE}).scalar()
+        conn.execute(text(f"DELETE FROM {PROFILES_TABLE}"))
+        _copy_batch(conn, "profile", LEGACY_TABLE, 0, None)
+        _copy_batch(conn, "visit", LEGACY_TABLE, _copied_up_to(conn, "visit"), None)
+        conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME TO {LEGACY_RENAMED}"))
+        # الفهارس القديمة تبقى على الجدول المعاد تسميته؛ أسماؤها تُحرَّر للاستخدام
+        for name, _ in LEGACY_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if not is_sqlite():
+            if seq:
+                # تسلسل مشترك: أرقام id لا تتكرر بين الجدولين ولا مع أي إدراج متأخر في القديم
+                for t in (PROFILES_TABLE, VISITS_TABLE):
+                    conn.execute(text(f"ALTER TABLE {t} ALTER COLUMN id SET DEFAULT nextval('{seq}')"))
+                conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {VISITS_TABLE}.id"))
+            else:
+                for t in (PROFILES_TABLE, VISITS_TABLE):
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{t}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {LEGACY_RENAMED}), false)"
+                    ))
+        _create_view(conn)
+        counts = {
+            "profile": conn.execute(text(f"SELECT COUNT(*) FROM {PROFILES_TABLE}")).scalar() or 0,
+            "visit": conn.execute(text(f"SELECT COUNT(*) FROM {VISITS_TABLE}")).scalar() or 0,
+        }
+    mode(force=True)
+    return counts
+
+def sweep() -> int:
+    """
+    بعد cutover: نسخ أي زيارة/ملف أُدرج في الجدول القديم من عملية كانت تنتظر القفل
+    (PostgreSQL). يرجع عدد الصفوف المنسوخة.
+    """
+    total = 0
+    with engine.begin() as conn:
+        if not _is_base_table(conn, LEGACY_RENAMED):
+            return 0
+        legacy_cols = set(_legacy_columns(conn, LEGACY_RENAMED))
+        for table_cls, kind in ((ClinicPatientProfile, "profile"), (ClinicVisit, "visit")):
+            target = table_cls.__tablename__
+            columns = [c.name for c in table_cls.__table__.columns if c.name in legacy_cols]
+            res = conn.execute(text(f"""
+                INSERT INTO {target} ({', '.join(columns)})
+                SELECT {_copy_select(table_cls, columns)}
+                FROM {LEGACY_RENAMED} s
+                WHERE s.record_kind=:kind
+                  AND NOT EXISTS (SELECT 1 FROM {target} t WHERE t.id = s.id)
+            """), {"kind": kind})
+            total += res.rowcount or 0
+    return int(total)
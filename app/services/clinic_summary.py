@@ -0,0 +1,191 @@
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from ..database import engine
+from . import clinic_store
+
+# ملخص زيارات المراجعين (clinic_patient_summary):
+# - visit_create يستدعي record_visit في نفس معاملة إدراج الزيارة
+# - rebuild يعيد حسابه بالكامل من الزيارات (للتعبئة الأولى أو بعد تعديل يدوي)
+# - search يجلب الملفات مع الملخص باستعلام واحد، و recent_visits يجلب آخر الزيارات دفعة واحدة
+
+RECENT_VISITS_PER_PATIENT = 5
+
+# رقم المراجع حسب نوعه
+PATIENT_NO_SQL = "CASE WHEN patient_type='trainee' THEN trainee_no ELSE employee_no END"
+
+def _record_visit_sql():
+    return text(f"""
+    INSERT INTO clinic_patient_summary (
+        patient_type, patient_no, visit_count, last_visit_id, last_visit_at,
+        last_diagnosis, last_recommendation, updated_at
+    )
+    SELECT :ptype, :pno, 1, v.id, v.visit_at, v.diagnosis, v.recommendation, CURRENT_TIMESTAMP
+    FROM {clinic_store.visits('v')}
+    WHERE v.id = :vid
+    ON CONFLICT (patient_type, patient_no) DO UPDATE SET
+        visit_count = clinic_patient_summary.visit_count + 1,
+        last_visit_id = excluded.last_visit_id,
+        last_visit_at = excluded.last_visit_at,
+        last_diagnosis = excluded.last_diagnosis,
+        last_recommendation = excluded.last_recommendation,
+        updated_at = excluded.updated_at
+    """)
+
+def _summary_select(extra: str = "") -> str:
+    return f"""
+    SELECT patient_type, patient_no, cnt, id, visit_at, diagnosis, recommendation, CURRENT_TIMESTAMP
+    FROM (
+        SELECT patient_type, {PATIENT_NO_SQL} AS patient_no, id, visit_at, diagnosis, recommendation,
+               ROW_NUMBER() OVER (
+                   PARTITION BY patient_type, {PATIENT_NO_SQL} ORDER BY visit_at DESC, id DESC
+               ) AS rn,
+               COUNT(*) OVER (PARTITION BY patient_type, {PATIENT_NO_SQL}) AS cnt
+        FROM {clinic_store.visits()}
+        WHERE {PATIENT_NO_SQL} IS NOT NULL {extra}
+    ) x
+    WHERE rn = 1
+    """
+
+_SUMMARY_COLUMNS = """
+    patient_type, patient_no, visit_count, last_visit_id, last_visit_at,
+    last_diagnosis, last_recommendation, updated_at
+"""
+
+def ensure() -> None:
+    """
+    عند الإقلاع (بعد clinic_store.ensure): تعبئة الملخص أول مرة إذا كان فارغًا وتوجد زيارات.
+    """
+    try:
+        with engine.begin() as conn:
+            empty = conn.execute(text("SELECT 1 FROM clinic_patient_summary LIMIT 1")).first() is None
+            has_visits = conn.execute(
+                text(f"SELECT 1 FROM {clinic_store.visits()} LIMIT 1")
+            ).first() is not None
+            if empty and has_visits:
+                _rebuild(conn)
+    except Exception as e:
+        # عامل آخر قد يكون بدأ التعبئة في نفس اللحظة
+        print(f"[clinic_summary] ensure skipped: {e}")
+
+def _rebuild(conn) -> int:
+    conn.execute(text("DELETE FROM clinic_patient_summary"))
+    res = conn.execute(text(
+        f"INSERT INTO clinic_patient_summary ({_SUMMARY_COLUMNS}) " + _summary_select()
+    ))
+    return res.rowcount or 0
+
+def rebuild(db: Session) -> int:
+    """إعادة حساب الملخص لكل المراجعين؛ يرجع عدد الصفوف."""
+    n = _rebuild(db)
+    db.commit()
+    return n
+
+def refresh_patient(db: Session, patient_type: str, patient_no: str) -> None:
+    """إعادة حساب ملخص مراجع واحد (لا يعمل commit)."""
+    db.execute(
+        text("DELETE FROM clinic_patient_summary WHERE patient_type=:ptype AND patient_no=:pno"),
+        {"ptype": patient_type, "pno": patient_no},
+    )
+    db.execute(
+        text(
+            f"INSERT INTO clinic_patient_summary ({_SUMMARY_COLUMNS}) "
+            + _summary_select(f"AND patient_type=:ptype AND {PATIENT_NO_SQL}=:pno")
+        ),
+        {"ptype": patient_type, "pno": patient_no},
+    )
+
+def record_visit(db: Session, patient_type: str, patient_no: str, visit_id: Optional[int]) -> None:
+    """تحديث الملخص بعد إدراج زيارة (قبل commit نفس المعاملة)."""
+    if visit_id is None:
+        refresh_patient(db, patient_type, patient_no)
+        return
+    db.execute(_record_visit_sql(), {"ptype": patient_type, "pno": patient_no, "vid": visit_id})
+
+def search(db: Session, raw_q: str, nd: Optional[str], limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    البحث في ملفات المتدربين والموظفين مع الملخص باستعلام واحد
+    (حتى limit لكل نوع، المتدربون أولًا ثم الموظفون، كلٌّ حسب الاسم).
+    """
+    match = """
+        (:nd IS NOT NULL AND ({no_col} = :nd OR p.national_id = :nd))
+        OR UPPER(p.full_name) LIKE UPPER(:like_q)
+        OR (:nd IS NOT NULL AND p.mobile LIKE ('%' || :nd || '%'))
+    """
+    sql = f"""
+        SELECT * FROM (
+            SELECT 0 AS grp, p.id, 'trainee' AS patient_type, p.full_name, p.trainee_no, NULL AS employee_no,
+                   p.national_id, p.mobile, p.major, p.college,
+                   s.last_visit_at, COALESCE(s.visit_count, 0) AS visit_count,
+                   s.last_diagnosis, s.last_recommendation
+            FROM {clinic_store.profiles('p')}
+            LEFT JOIN clinic_patient_summary s ON s.patient_type='trainee' AND s.patient_no=p.trainee_no
+            WHERE p.patient_type='trainee'
+              AND ({match.format(no_col='p.trainee_no')})
+            ORDER BY p.full_name ASC
+            LIMIT :limit
+        ) t
+        UNION ALL
+        SELECT * FROM (
+            SELECT 1 AS grp, p.id, 'employee' AS patient_type, p.full_name, NULL AS trainee_no, p.employee_no,
+                   p.national_id, p.mobile, NULL AS major, NULL AS college,
+                   s.last_visit_at, COALESCE(s.visit_count, 0) AS visit_count,
+                   s.last_diagnosis, s.last_recommendation
+            FROM {clinic_store.profiles('p')}
+            LEFT JOIN clinic_patient_summary s ON s.patient_type='employee' AND s.patient_no=p.employee_no
+            WHERE p.patient_type='employee'
+              AND ({match.format(no_col='p.employee_no')})
+            ORDER BY p.full_name ASC
+            LIMIT :limit
+        ) e
+        ORDER BY grp, full_name
+    """
+    rows = db.execute(text(sql), {"nd": nd, "like_q": f"%{raw_q}%", "limit": int(limit)}).mappings().all()
+    return [dict(r) for r in rows]
+
+def recent_visits(
+    db: Session,
+    keys: Iterable[Tuple[str, Any]],
+    per_patient: int = RECENT_VISITS_PER_PATIENT,
+) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """آخر الزيارات لعدة مراجعين باستعلام واحد: {(patient_type, patient_no): [زيارات]}."""
+    trainees = sorted({str(no) for t, no in keys if t == "trainee" and no is not None})
+    employees = sorted({str(no) for t, no in keys if t == "employee" and no is not None})
+    conds = []
+    params: Dict[str, Any] = {"per": int(per_patient)}
+    if trainees:
+        conds.append("(patient_type='trainee' AND trainee_no IN :tn)")
+        params["tn"] = trainees
+    if employees:
+        conds.append("(patient_type='employee' AND employee_no IN :en)")
+        params["en"] = employees
+    if not conds:
+        return {}
+
+    stmt = text(f"""
+        SELECT * FROM (
+            SELECT id, patient_type, {PATIENT_NO_SQL} AS patient_no,
+                   visit_at, complaint, diagnosis, temp_c, bp_systolic, bp_diastolic,
+                   pulse_bpm, resp_rpm, weight_kg, height_cm, bmi, glucose_mg, o2_sat, chronic_json,
+                   notes, rec_json, rx_json,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY patient_type, {PATIENT_NO_SQL} ORDER BY visit_at DESC, id DESC
+                   ) AS rn
+            FROM {clinic_store.visits()}
+            WHERE {' OR '.join(conds)}
+        ) x
+        WHERE rn <= :per
+        ORDER BY patient_type, patient_no, rn
+    """)
+    if trainees:
+        stmt = stmt.bindparams(bindparam("tn", expanding=True))
+    if employees:
+        stmt = stmt.bindparams(bindparam("en", expanding=True))
+
+    out: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for r in db.execute(stmt, params).mappings().all():
+        out.setdefault((r["patient_type"], str(r["patient_no"])), []).append(dict(r))
+    return out
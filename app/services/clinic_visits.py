@@ -0,0 +1,156 @@
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import clinic_store, exports
+
+# سجل زيارات العيادة (/clinic/visits):
+# - page: ترقيم keyset على (visit_at DESC, id DESC) بدل جلب كل الزيارات
+#   الزيارات بلا visit_at (بيانات قديمة) تأتي في النهاية مرتبة بـ id
+# - iter_rows: مؤشر من جهة الخادم (exports.stream_rows) للتصدير
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+COLUMNS = "id, trainee_no, full_name, college, complaint, diagnosis, created_at, visit_at, chronic_json"
+
+def _valid_date(value: Optional[str]) -> bool:
+    if not value:
+        return False
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+def _filters(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    chronic_disease: Optional[str],
+    params: Dict[str, Any],
+) -> Tuple[str, bool]:
+    """شروط الفلاتر (" AND ..."). يرجع أيضًا هل يوجد فلتر تاريخ (يستبعد الزيارات بلا visit_at)."""
+    where = ""
+    dated = False
+    if _valid_date(start_date):
+        where += " AND visit_at >= :start_date"
+        params["start_date"] = start_date
+        dated = True
+    if _valid_date(end_date):
+        where += " AND visit_at <= :end_date"
+        params["end_date"] = end_date + " 23:59:59"  # لتضمين اليوم بالكامل
+        dated = True
+    if chronic_disease:
+        where += " AND chronic_json LIKE :chronic_disease"
+        params["chronic_disease"] = f"%{chronic_disease}%"
+    return where, dated
+
+def encode_cursor(visit_at: Any, visit_id: int) -> str:
+    va = visit_at.isoformat(sep=" ") if isinstance(visit_at, datetime) else visit_at
+    raw = json.dumps([va, visit_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[str], int]]:
+    """None لأول صفحة؛ ValueError إذا كان المؤشر تالفًا."""
+    if not cursor:
+        return None
+    try:
+        va, vid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (None if va is None else str(va)), int(vid)
+    except Exception:
+        raise ValueError("مؤشر الصفحة غير صالح")
+
+def _row(r) -> Dict[str, Any]:
+    chronic = r["chronic_json"]
+    if isinstance(chronic, str) and chronic.strip():
+        try:
+            chronic = json.loads(chronic)
+        except Exception:
+            pass
+    return {
+        "id": r["id"],
+        "trainee_no": r["trainee_no"],
+        "full_name": r["full_name"],
+        "record_kind": "visit",
+        "college": r["college"],
+        "complaint": r["complaint"],
+        "diagnosis": r["diagnosis"],
+        "created_at": r["created_at"],
+        "visit_at": r["visit_at"],
+        "chronic_json": chronic,  # بيانات الأمراض المزمنة المعالجة
+        "source": "database",
+    }
+
+def page(
+    db: Session,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    chronic_disease: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """صفحة زيارات (الأحدث أولًا) + مؤشر الصفحة التالية (None في آخر صفحة)."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor)
+    params: Dict[str, Any] = {}
+    where, dated = _filters(start_date, end_date, chronic_disease, params)
+    rows: List[Any] = []
+
+    # المرحلة 1: الزيارات ذات visit_at
+    if after is None or after[0] is not None:
+        keyset = ""
+        p = dict(params, limit=limit + 1)
+        if after is not None:
+            keyset = " AND (visit_at, id) < (:after_at, :after_id)"
+            p.update(after_at=after[0], after_id=after[1])
+        rows = db.execute(text(f"""
+            SELECT {COLUMNS}
+            FROM {clinic_store.visits()}
+            WHERE visit_at IS NOT NULL{where}{keyset}
+            ORDER BY visit_at DESC, id DESC
+            LIMIT :limit
+        """), p).mappings().all()
+
+    # المرحلة 2: الزيارات بلا visit_at (لا تطابق أي فلتر تاريخ)
+    if len(rows) <= limit and not dated:
+        keyset = ""
+        p = dict(params, limit=limit + 1 - len(rows))
+        if after is not None and after[0] is None:
+            keyset = " AND id < :after_id"
+            p["after_id"] = after[1]
+        rows = list(rows) + list(db.execute(text(f"""
+            SELECT {COLUMNS}
+            FROM {clinic_store.visits()}
+            WHERE visit_at IS NULL{where}{keyset}
+            ORDER BY id DESC
+            LIMIT :limit
+        """), p).mappings().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["visit_at"], last["id"])
+    return [_row(r) for r in rows], next_cursor
+
+def iter_rows(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    chronic_disease: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """كل الزيارات المطابقة بنفس الترتيب، عبر مؤشر من جهة الخادم (ذاكرة ثابتة)."""
+    params: Dict[str, Any] = {}
+    where, _ = _filters(start_date, end_date, chronic_disease, params)
+    sql = f"""
+        SELECT {COLUMNS}
+        FROM {clinic_store.visits()}
+        WHERE 1=1{where}
+        ORDER BY visit_at IS NULL, visit_at DESC, id DESC
+    """
+    for r in exports.stream_rows(sql, params):
+        yield _row(r)
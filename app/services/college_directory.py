@@ -0,0 +1,203 @@
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from ..database import engine
+
+# دليل الأقسام والكليات في الذاكرة (الشهادات، التحقق، سجل المهارات):
+# - القسم -> اسم الكلية، واسم الكلية -> بيانات الكلية (التواقيع والختم) بقراءتين فقط عند التحميل
+# - أقسام الدورة المستهدفة تُخزن لكل دورة (course_targets) وتُجلب دفعة واحدة للدورات الناقصة
+# - invalidate: بعد الكتابة في admin_departments / admin_colleges ؛ invalidate_course: بعد تعديل أقسام دورة
+# - DIRECTORY_TTL_SECONDS حد أقصى لتأخر التعديلات القادمة من عمليات/عمّال آخرين
+
+DIRECTORY_TTL_SECONDS = float(os.getenv("COLLEGE_DIRECTORY_TTL", "300"))
+BLANK_IMAGE = "/static/blank.png"
+
+class CollegeInfo:
+    """نسخة ثابتة من صف College (نفس أسماء الحقول المستخدمة في القوالب)."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "name_en",
+        "dean_name",
+        "vp_students_name",
+        "dean_sign_path",
+        "vp_students_sign_path",
+        "students_affairs_stamp_path",
+        "is_active",
+    )
+
+    def __init__(self, **kw):
+        for k in self.__slots__:
+            setattr(self, k, kw.get(k))
+
+class _Snapshot:
+    __slots__ = ("loaded_at", "dept_college", "dept_names_by_college", "colleges", "active_by_norm")
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self.dept_college: Dict[str, Optional[str]] = {}
+        self.dept_names_by_college: Dict[str, List[str]] = {}
+        self.colleges: Dict[str, CollegeInfo] = {}
+        self.active_by_norm: Dict[str, CollegeInfo] = {}
+
+_snapshot: Optional[_Snapshot] = None
+_course_targets: Dict[int, List[str]] = {}
+_lock = threading.Lock()
+_metrics = {"loads": 0, "invalidations": 0, "target_loads": 0, "target_hits": 0}
+
+def normalize(s: Optional[str]) -> str:
+    return " ".join((s or "").strip().split())
+
+def _load() -> _Snapshot:
+    snap = _Snapshot()
+    with engine.connect() as conn:
+        # أول صف لكل اسم (بالترتيب حسب id) كما كانت تعيده query(...).first()
+        for name, college in conn.execute(text("SELECT name, college FROM departments ORDER BY id")):
+            if name not in snap.dept_college:
+                snap.dept_college[name] = college
+            if college:
+                snap.dept_names_by_college.setdefault(college, []).append(name)
+        for r in conn.execute(text("""
+            SELECT id, name, name_en, dean_name, vp_students_name, dean_sign_path,
+                   vp_students_sign_path, students_affairs_stamp_path, is_active
+            FROM colleges ORDER BY id
+        """)).mappings():
+            info = CollegeInfo(**r)
+            info.is_active = bool(info.is_active)
+            snap.colleges.setdefault(info.name, info)
+            if info.is_active:
+                snap.active_by_norm.setdefault(normalize(info.name), info)
+    return snap
+
+def _current() -> _Snapshot:
+    global _snapshot
+    snap = _snapshot
+    if snap is not None and time.monotonic() - snap.loaded_at < DIRECTORY_TTL_SECONDS:
+        return snap
+    with _lock:
+        if _snapshot is None or time.monotonic() - _snapshot.loaded_at >= DIRECTORY_TTL_SECONDS:
+            _snapshot = _load()
+            _course_targets.clear()
+            _metrics["loads"] += 1
+        return _snapshot
+
+def invalidate() -> None:
+    """إعادة التحميل عند أول استخدام قادم (بعد تعديل الأقسام أو الكليات)."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+        _course_targets.clear()
+        _metrics["invalidations"] += 1
+
+def invalidate_course(course_id: Optional[int] = None) -> None:
+    """نسيان أقسام دورة (أو كل الدورات) بعد تعديل أهدافها."""
+    with _lock:
+        if course_id is None:
+            _course_targets.clear()
+        else:
+            _course_targets.pop(course_id, None)
+
+# ===== القراءة =====
+
+def has_department(name: Optional[str]) -> bool:
+    return bool(name) and name in _current().dept_college
+
+def department_college(name: Optional[str]) -> Optional[str]:
+    """اسم كلية القسم (None إذا لم يوجد القسم)."""
+    if not name:
+        return None
+    return _current().dept_college.get(name)
+
+def departments_of(college_name: Optional[str]) -> List[str]:
+    """أسماء أقسام الكلية (مطابقة تامة لاسم الكلية)."""
+    if not college_name:
+        return []
+    return list(_current().dept_names_by_college.get(college_name, ()))
+
+def college(name: Optional[str]) -> Optional[CollegeInfo]:
+    """الكلية بالاسم (مطابقة تامة)."""
+    if not name:
+        return None
+    return _current().colleges.get(name)
+
+def active_college_by_normalized(name: Optional[str]) -> Optional[CollegeInfo]:
+    """كلية فعّالة يطابق اسمها بعد توحيد المسافات."""
+    n = normalize(name)
+    return _current().active_by_norm.get(n) if n else None
+
+def college_for_departments(dept_names: Iterable[Optional[str]]) -> Optional[CollegeInfo]:
+    """أول قسم مستهدف له كلية موجودة في جدول الكليات."""
+    snap = _current()
+    for dept_name in dept_names:
+        col_name = snap.dept_college.get(dept_name) if dept_name else None
+        if col_name and col_name in snap.colleges:
+            return snap.colleges[col_name]
+    return None
+
+def course_targets(db: Session, course_ids: Sequence[int]) -> Dict[int, List[str]]:
+    """أسماء الأقسام المستهدفة لكل دورة؛ الناقص يُجلب باستعلام واحد ثم يُخزن."""
+    _current()
+    ids = list(dict.fromkeys(int(i) for i in course_ids if i is not None))
+    with _lock:
+        out = {i: _course_targets[i] for i in ids if i in _course_targets}
+        _metrics["target_hits"] += len(out)
+    missing = [i for i in ids if i not in out]
+    if missing:
+        # نفس شكل تحميل Course.targets (selectin) حتى يكون ترتيب الأقسام هو نفسه في الشهادة وسجل المهارات
+        rows = db.execute(
+            text("""
+                SELECT course_id, department_name FROM course_target_departments
+                WHERE course_id IN :ids
+            """).bindparams(bindparam("ids", expanding=True)),
+            {"ids": missing},
+        ).all()
+        loaded: Dict[int, List[str]] = {i: [] for i in missing}
+        for cid, dept_name in rows:
+            loaded[cid].append(dept_name)
+        with _lock:
+            _course_targets.update(loaded)
+            _metrics["target_loads"] += 1
+        out.update(loaded)
+    return out
+
+def course_college(course: Any, hod_college: Optional[str] = None) -> Optional[CollegeInfo]:
+    """
+    كلية الدورة من أقسامها المستهدفة (course.targets محمّلة مع الدورة)،
+    ثم من hod_college بين الكليات الفعّالة.
+    """
+    targets = getattr(course, "targets", None) or []
+    found = college_for_departments(t.department_name for t in targets)
+    if found is None and hod_college:
+        found = active_college_by_normalized(hod_college)
+    return found
+
+def signatures(col: Optional[CollegeInfo]) -> Optional[Dict[str, str]]:
+    """بيانات التواقيع والختم كما يستخدمها قالب سجل المهارات."""
+    if col is None:
+        return None
+    return {
+        "name": col.name,
+        "dean_name": col.dean_name or "",
+        "vp_name": col.vp_students_name or "",
+        "dean_sign_url": col.dean_sign_path or BLANK_IMAGE,
+        "vp_sign_url": col.vp_students_sign_path or BLANK_IMAGE,
+        "stamp_url": col.students_affairs_stamp_path or BLANK_IMAGE,
+    }
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        snap = _snapshot
+        out["cached_courses"] = len(_course_targets)
+    out["departments"] = len(snap.dept_college) if snap else 0
+    out["colleges"] = len(snap.colleges) if snap else 0
+    out["age_seconds"] = round(time.monotonic() - snap.loaded_at, 1) if snap else None
+    out["ttl_seconds"] = DIRECTORY_TTL_SECONDS
+    return out
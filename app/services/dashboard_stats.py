@@ -0,0 +1,228 @@
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from ..database import engine, is_sqlite
+from . import clinic_store
+
+# إحصائيات لوحة الإدارة (/admin):
+# - compute_global / compute_college: استعلامات تجميعية قليلة (COUNT ... FILTER) بدل ~12 استعلام COUNT
+#   وعدّ الإحالات والإجازات في مرور واحد على الزيارات بدل ثلاثة
+# - get: تخزين مؤقت لكل نطاق ("global" أو "college:<اسم>") بمدة STATS_TTL_SECONDS
+#   بعد انتهاء المدة تُعاد القيمة القديمة فورًا ويُحدَّث النطاق في خيط خلفي (تحديث واحد لكل نطاق)
+# - warm_up: حساب النطاق العام عند الإقلاع في الخلفية حتى لا تدفع أول زيارة للوحة ثمن المسح
+
+STATS_TTL_SECONDS = float(os.getenv("DASHBOARD_STATS_TTL", "60"))
+
+GLOBAL_SCOPE = "global"
+
+_cache: Dict[str, Dict[str, Any]] = {}  # scope -> {"data", "at"}
+_refreshing: set = set()
+_lock = threading.Lock()
+_metrics = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "errors": 0, "last_refresh_ms": 0.0}
+
+def college_scope(college: Optional[str]) -> str:
+    return f"college:{college or ''}"
+
+def _excel_reference():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    import excel_data_reference
+    return excel_data_reference
+
+def _clinic_counts_sql() -> str:
+    if is_sqlite():
+        rec = "rec_json"
+        rest_days = "rest_days IS NOT NULL AND rest_days != ''"
+    else:
+        rec = "rec_json::text"
+        rest_days = "rest_days IS NOT NULL"
+    return f"""
+        SELECT
+            COUNT(*) AS visits,
+            COUNT(*) FILTER (WHERE
+                recommendation = 'referral'
+                OR {rec} LIKE '%"type":"referral"%'
+                OR {rec} LIKE '%"type": "referral"%'
+            ) AS referrals,
+            COUNT(*) FILTER (WHERE
+                {rest_days}
+                OR recommendation = 'rest'
+                OR {rec} LIKE '%"type":"rest"%'
+                OR {rec} LIKE '%"type": "rest"%'
+            ) AS leaves
+        FROM {clinic_store.visits()}
+    """
+
+def compute_global() -> Dict[str, Any]:
+    """إحصائيات لوحة الأدمن العامة (نفس مفاتيح counts في admin/index.html)."""
+    counts: Dict[str, Any] = {}
+    with engine.connect() as conn:
+        # المستخدمون (بما فيهم الأطباء النشطون) في مرور واحد
+        u = conn.execute(text("""
+            SELECT
+                COUNT(*) AS users,
+                COUNT(*) FILTER (WHERE is_admin) AS admins,
+                COUNT(*) FILTER (WHERE is_hod) AS hods,
+                COUNT(*) FILTER (WHERE is_doc AND is_active) AS doctors
+            FROM users
+        """)).mappings().one()
+        counts.update(users=u["users"], admins=u["admins"], hods=u["hods"])
+        doctors = u["doctors"]
+
+        c = conn.execute(text("""
+            SELECT
+                COUNT(*) AS courses,
+                COUNT(*) FILTER (WHERE status = 'published') AS courses_published,
+                (SELECT COUNT(*) FROM departments) AS departments,
+                (SELECT COUNT(*) FROM colleges) AS colleges
+            FROM courses
+        """)).mappings().one()
+        counts.update(c)
+
+        try:
+            counts["enrollments_published"] = conn.execute(text("""
+                SELECT COUNT(*) FROM course_enrollments e
+                JOIN courses c ON c.id = e.course_id
+                WHERE c.status = 'published'
+            """)).scalar() or 0
+        except Exception:
+            conn.rollback()
+            counts["enrollments_published"] = 0
+
+        try:
+            v = conn.execute(text(_clinic_counts_sql())).mappings().one()
+            counts["doctors"] = doctors
+            counts["visits"] = v["visits"] or 0
+            counts["referrals"] = v["referrals"] or 0
+            counts["leaves"] = v["leaves"] or 0
+        except Exception:
+            conn.rollback()
+            try:
+                stats = _excel_reference().get_statistics()
+                counts["doctors"] = 1
+                counts["visits"] = stats.get('total_clinic_patients', 0)
+                counts["referrals"] = int(stats.get('total_clinic_patients', 0) * 0.1)
+                counts["leaves"] = int(stats.get('total_clinic_patients', 0) * 0.05)
+                counts["excel_source"] = True
+            except Exception:
+                counts["doctors"] = doctors
+                counts["visits"] = 0
+                counts["referrals"] = 0
+                counts["leaves"] = 0
+
+    total_courses = counts.get("courses", 0) or 0
+    if total_courses > 0:
+        counts["courses_published_pct"] = int(round((counts.get("courses_published", 0) / total_courses) * 100))
+    else:
+        counts["courses_published_pct"] = 0
+
+    try:
+        ref = _excel_reference()
+        stats = ref.get_statistics()
+        drugs = ref.get_all_drugs()
+        counts["pharmacy_drugs"] = len(drugs)
+        counts["pharmacy_stock"] = sum(d.get('stock_qty', 0) for d in drugs)
+        counts["pharmacy_movements"] = stats.get('drug_movements', 0) if hasattr(stats, 'get') else 0
+    except Exception:
+        counts["pharmacy_drugs"] = 0
+        counts["pharmacy_stock"] = 0
+        counts["pharmacy_movements"] = 0
+    return counts
+
+def compute_college(college: Optional[str]) -> Dict[str, Any]:
+    """إحصائيات لوحة مسؤول الكلية (الدورات عبر ربط الأقسام بدل تحميلها في بايثون)."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT
+                (SELECT COUNT(*) FROM users
+                 WHERE college_admin_college = :college OR hod_college = :college) AS users,
+                (SELECT COUNT(*) FROM departments WHERE college = :college) AS departments,
+                (SELECT COUNT(DISTINCT t.course_id)
+                 FROM course_target_departments t
+                 JOIN departments d ON d.name = t.department_name
+                 JOIN courses c ON c.id = t.course_id
+                 WHERE d.college = :college) AS courses
+        """), {"college": college}).mappings().one()
+    return dict(row)
+
+def _compute(scope: str) -> Dict[str, Any]:
+    if scope == GLOBAL_SCOPE:
+        return compute_global()
+    return compute_college(scope.split(":", 1)[1] or None)
+
+def refresh(scope: str) -> Dict[str, Any]:
+    """إعادة حساب نطاق وتخزينه."""
+    t0 = time.perf_counter()
+    try:
+        data = _compute(scope)
+    except Exception:
+        with _lock:
+            _metrics["errors"] += 1
+        raise
+    with _lock:
+        _cache[scope] = {"data": data, "at": time.monotonic()}
+        _metrics["refreshes"] += 1
+        _metrics["last_refresh_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return data
+
+def _refresh_in_background(scope: str) -> None:
+    def run():
+        try:
+            refresh(scope)
+        except Exception as e:
+            print(f"[dashboard_stats] refresh {scope} failed: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(scope)
+
+    with _lock:
+        if scope in _refreshing:
+            return
+        _refreshing.add(scope)
+    threading.Thread(target=run, name=f"dashboard-stats-{scope}", daemon=True).start()
+
+def get(scope: str = GLOBAL_SCOPE) -> Dict[str, Any]:
+    """
+    إحصائيات النطاق من الذاكرة. القيمة القديمة تُعاد كما هي وتُحدَّث في الخلفية؛
+    الحساب المتزامن فقط إذا لم يُحسب النطاق من قبل.
+    """
+    with _lock:
+        entry = _cache.get(scope)
+        if entry is not None:
+            if time.monotonic() - entry["at"] < STATS_TTL_SECONDS:
+                _metrics["hits"] += 1
+                return dict(entry["data"])
+            _metrics["stale"] += 1
+        else:
+            _metrics["misses"] += 1
+    if entry is not None:
+        _refresh_in_background(scope)
+        return dict(entry["data"])
+    return dict(refresh(scope))
+
+def invalidate(scope: Optional[str] = None) -> None:
+    """تعليم النطاق (أو كل النطاقات) كقديم؛ يُحدَّث في الخلفية عند الطلب التالي."""
+    with _lock:
+        for key, entry in _cache.items():
+            if scope is None or key == scope:
+                entry["at"] = float("-inf")
+
+def warm_up() -> None:
+    """عند الإقلاع: حساب النطاق العام في الخلفية."""
+    _refresh_in_background(GLOBAL_SCOPE)
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        now = time.monotonic()
+        out["ttl_seconds"] = STATS_TTL_SECONDS
+        out["scopes"] = {
+            k: (round(now - v["at"], 1) if v["at"] != float("-inf") else None)
+            for k, v in _cache.items()
+        }
+        return out
@@ -0,0 +1,223 @@
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from ..database import engine, is_sqlite
+
+# خدمة موحدة للبحث عن الأدوية:
+# - PostgreSQL: فهرس GIN بـ pg_trgm على تعبير يجمع الأعمدة الخمسة (LIKE '%tok%' يستخدم الفهرس)
+# - SQLite: جدول ظل FTS5 (tokenize=trigram) متزامن مع drugs عبر triggers
+# - عند تعذر أي منهما (صلاحيات/إصدار قديم) نرجع لـ LIKE/ILIKE كما كان
+
+SEARCH_COLUMNS = ("trade_name", "generic_name", "manufacturer", "strength", "form")
+FTS_TABLE = "drugs_fts"
+TRGM_INDEX = "ix_drugs_search_trgm"
+MIN_TOKEN_LEN = 2
+TRIGRAM_LEN = 3
+
+_TOKEN_SPLIT = re.compile(r"[\s/,\-]+")
+
+_mode: Optional[str] = None  # "fts5" | "trgm" | "like"
+_mode_lock = threading.Lock()
+
+def _table() -> str:
+    return "drugs" if is_sqlite() else "public.drugs"
+
+def _search_expr(alias: str = "") -> str:
+    p = f"{alias}." if alias else ""
+    return "lower(" + " || ' ' || ".join(f"coalesce({p}{c},'')" for c in SEARCH_COLUMNS) + ")"
+
+def tokenize(q: Optional[str]) -> List[str]:
+    """تفكيك النص لرموز (مسافات / سلاش / فاصلة / شرطة) بطول >= 2."""
+    if not q:
+        return []
+    return [t for t in _TOKEN_SPLIT.split(q.strip()) if len(t) >= MIN_TOKEN_LEN]
+
+def _ensure_sqlite(conn) -> str:
+    cols = ", ".join(SEARCH_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": FTS_TABLE}
+    ).first()
+    conn.execute(text(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {cols}, content='drugs', content_rowid='id', tokenize='trigram'
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON drugs BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON drugs BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON drugs BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """))
+    if not exists:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return "fts5"
+
+def _ensure_postgres(conn) -> str:
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {TRGM_INDEX}
+        ON public.drugs USING gin (({_search_expr()}) gin_trgm_ops)
+    """))
+    return "trgm"
+
+def ensure_index() -> str:
+    """
+    إنشاء فهرس البحث إن لم يكن موجودًا (يُستدعى عند الإقلاع).
+    يرجع وضع البحث المستخدم: fts5 / trgm / like.
+    """
+    global _mode
+    with _mode_lock:
+        if _mode is not None:
+            return _mode
+        mode = "like"
+        try:
+            if inspect(engine).has_table("drugs", schema=None if is_sqlite() else "public"):
+                with engine.begin() as conn:
+                    mode = _ensure_sqlite(conn) if is_sqlite() else _ensure_postgres(conn)
+        except Exception as e:
+            print(f"[drug_search] index unavailable, falling back to LIKE: {e}")
+            mode = "like"
+        _mode = mode
+        return _mode
+
+def mode() -> str:
+    return _mode if _mode is not None else ensure_index()
+
+def rebuild() -> None:
+    """إعادة بناء جدول FTS5 بالكامل (بعد استيراد مباشر لجدول drugs مثلًا)."""
+    if mode() == "fts5":
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def _like_condition(alias: str, key: str) -> str:
+    p = f"{alias}." if alias else ""
+    if is_sqlite():
+        return "(" + " OR ".join(f"UPPER(COALESCE({p}{c},'')) LIKE UPPER(:{key})" for c in SEARCH_COLUMNS) + ")"
+    return "(" + " OR ".join(f"COALESCE({p}{c},'') ILIKE :{key}" for c in SEARCH_COLUMNS) + ")"
+
+def _fts_query(tokens: Sequence[str]) -> str:
+    # كل رمز كنص حرفي بين علامتي تنصيص (trigram يطابق أي جزء من الكلمة)
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in tokens)
+
+def _conditions(tokens: Sequence[str], params: Dict[str, Any], prefix: str, alias: str, fts_joined: bool) -> List[str]:
+    """شروط WHERE على جدول drugs (بالاسم المستعار alias) لكل الرموز."""
+    m = mode()
+    conds: List[str] = []
+    if m == "fts5":
+        long_tokens = [t for t in tokens if len(t) >= TRIGRAM_LEN]
+        short_tokens = [t for t in tokens if len(t) < TRIGRAM_LEN]
+        if long_tokens:
+            params[f"{prefix}m"] = _fts_query(long_tokens)
+            if fts_joined:
+                conds.append(f"{FTS_TABLE} MATCH :{prefix}m")
+            else:
+                p = f"{alias}." if alias else ""
+                conds.append(f"{p}id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :{prefix}m)")
+        # رموز من حرفين أقصر من trigram: LIKE مباشر (غير حساس لحالة الأحرف اللاتينية في SQLite
+        # مثل UPPER، وNULL لا يطابق) بدون UPPER/COALESCE لكل عمود
+        p = f"{alias}." if alias else ""
+        for i, t in enumerate(short_tokens):
+            key = f"{prefix}s{i}"
+            params[key] = f"%{t}%"
+            conds.append("(" + " OR ".join(f"{p}{c} LIKE :{key}" for c in SEARCH_COLUMNS) + ")")
+        return conds
+    for i, t in enumerate(tokens):
+        key = f"{prefix}{i}"
+        if m == "trgm":
+            params[key] = f"%{t.lower()}%"
+            conds.append(f"{_search_expr(alias)} LIKE :{key}")
+        else:
+            params[key] = f"%{t}%"
+            conds.append(_like_condition(alias, key))
+    return conds
+
+def id_filter(q: Optional[str], params: Dict[str, Any], column: str = "drug_id", prefix: str = "ds") -> str:
+    """
+    شرط " AND <column> IN (...)" لاستعلامات تحتوي عمود رقم الدواء (مثل سجل الحركات).
+    يرجع "" إذا لم يكن في النص رموز صالحة.
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return ""
+    conds = _conditions(tokens, params, prefix, "d", fts_joined=False)
+    return f" AND {column} IN (SELECT d.id FROM {_table()} d WHERE {' AND '.join(conds)})"
+
+def search(
+    db: Session,
+    q: Optional[str],
+    limit: int = 20,
+    active_only: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    البحث عن الأدوية مرتبة حسب التشابه:
+    - fts5: bm25 من جدول الظل
+    - trgm: word_similarity مع النص المدخل
+    - like: بالاسم التجاري
+    نص من حرف واحد لا يعطي رموزًا: يُفلتر بـ LIKE '%q%' (لا يرجع القائمة كاملة).
+    """
+    tokens = tokenize(q)
+    params: Dict[str, Any] = {"limit": int(limit)}
+    active_sql = " AND d.is_active=TRUE" if active_only else ""
+    select_cols = (
+        "d.id, d.trade_name, d.generic_name, d.strength, d.form, "
+        "COALESCE(d.manufacturer,'') AS manufacturer"
+    )
+
+    if not tokens:
+        # نص بلا رموز بطول >= 2 (حرف واحد مثلًا): نمط LIKE واحد كما كان، وبدون نص: كل الأدوية
+        s = (q or "").strip()
+        like_sql = ""
+        if s:
+            params["q"] = f"%{s}%"
+            like_sql = " AND " + _like_condition("d", "q")
+        sql = f"""
+            SELECT {select_cols}
+            FROM {_table()} d
+            WHERE 1=1{like_sql}{active_sql}
+            ORDER BY d.trade_name
+            LIMIT :limit
+        """
+        return [dict(r) for r in db.execute(text(sql), params).mappings().all()]
+
+    m = mode()
+    if m == "fts5" and any(len(t) >= TRIGRAM_LEN for t in tokens):
+        conds = _conditions(tokens, params, "q", "d", fts_joined=True)
+        sql = f"""
+            SELECT {select_cols}
+            FROM {FTS_TABLE}
+            JOIN drugs d ON d.id = {FTS_TABLE}.rowid
+            WHERE {' AND '.join(conds)}{active_sql}
+            ORDER BY {FTS_TABLE}.rank, d.trade_name
+            LIMIT :limit
+        """
+    else:
+        conds = _conditions(tokens, params, "q", "d", fts_joined=False)
+        order = "d.trade_name"
+        if m == "trgm":
+            params["qfull"] = " ".join(tokens).lower()
+            order = f"word_similarity(:qfull, {_search_expr('d')}) DESC, d.trade_name"
+        sql = f"""
+            SELECT {select_cols}
+            FROM {_table()} d
+            WHERE {' AND '.join(conds)}{active_sql}
+            ORDER BY {order}
+            LIMIT :limit
+        """
+    return [dict(r) for r in db.execute(text(sql), params).mappings().all()]
@@ -0,0 +1,89 @@
+
+import csv
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+
+from ..database import SessionLocal
+from .certificate_batch import iter_file
+
+try:
+    from openpyxl import Workbook
+    HAS_OPENPYXL = True
+except Exception:
+    HAS_OPENPYXL = False
+
+# تصدير كبير بذاكرة ثابتة:
+# - stream_rows: مؤشر من جهة الخادم (stream_results + yield_per) بجلسة خاصة بالتصدير،
+#   لأن جلسة Depends(get_db) تُغلق قبل بدء إرسال StreamingResponse
+# - csv_response: أسطر CSV تُرسل على دفعات
+# - xlsx_response: openpyxl write_only إلى ملف مؤقت ثم يُرسل على دفعات ويُحذف
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "2000"))
+CSV_FLUSH_BYTES = 64 * 1024
+
+def stream_rows(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    yield_per: int = EXPORT_YIELD_PER,
+) -> Iterator[Mapping[str, Any]]:
+    """صفوف الاستعلام واحدًا تلو الآخر (لا تُحمَّل النتيجة كاملة في الذاكرة)."""
+    db = SessionLocal()
+    try:
+        stmt = text(sql).execution_options(stream_results=True, yield_per=yield_per)
+        for r in db.execute(stmt, params or {}).mappings():
+            yield r
+    finally:
+        db.close()
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    buf = io.StringIO(newline="")
+    w = csv.writer(buf)
+    buf.write("\ufeff")  # BOM ليفتح في Excel بالعربية
+    w.writerow(header)
+    for row in rows:
+        w.writerow(row)
+        if buf.tell() >= CSV_FLUSH_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def xlsx_chunks(sheet_title: str, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    if not HAS_OPENPYXL:
+        raise RuntimeError("openpyxl غير مثبت")
+    fd, out = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=sheet_title[:31])
+        ws.append(list(header))
+        for row in rows:
+            ws.append(list(row))
+        wb.save(out)
+    except BaseException:
+        os.unlink(out)
+        raise
+    yield from iter_file(Path(out))
+
+def _attachment(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+def csv_response(filename: str, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> StreamingResponse:
+    return StreamingResponse(
+        csv_chunks(header, rows),
+        media_type="text/csv; charset=utf-8",
+        headers=_attachment(filename),
+    )
+
+def xlsx_response(filename: str, sheet_title: str, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> StreamingResponse:
+    return StreamingResponse(
+        xlsx_chunks(sheet_title, header, rows),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=_attachment(filename),
+    )
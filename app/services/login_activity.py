@@ -0,0 +1,213 @@
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from ..database import engine
+
+# نشاط تسجيل الدخول (/admin/audit):
+# - user_login_stats: ملخص لكل مستخدم (آخر دخول، آخر IP، عدد مرات الدخول) يُحدَّث مع كل دخول
+#   في نفس معاملة login_logs ⇒ صفحة النشاط استعلام واحد مرقّم بدل 2N+1
+# - عند تعذر الملخص نرجع لاستعلام تجميعي بنوافذ (ROW_NUMBER/COUNT OVER) على login_logs
+# - record_logins: كتابة دفعة أحداث دخول (يستدعيه login_log_writer من خيط الكتابة)
+# - سياسة الاحتفاظ (معطّلة افتراضيًا، سجلات تدقيق): LOGIN_LOG_RETENTION_DAYS=365 مثلًا يفعّل
+#   حذف سجلات login_logs الأقدم منها على دفعات أثناء التشغيل؛ للحذف الكامل أول مرة
+#   scripts/purge_login_logs.py --days N (الملخص يحتفظ بالعدد الكلي فلا يتأثر بالحذف)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+LOGIN_LOG_RETENTION_DAYS = int(os.getenv("LOGIN_LOG_RETENTION_DAYS", "0"))  # 0 = بلا حذف (الافتراضي)
+PURGE_BATCH_SIZE = 5000
+PURGE_INTERVAL_SECONDS = 6 * 3600
+
+_rollup_ready = False
+_last_purge = 0.0
+
+_UPSERT_SQL = text("""
+    INSERT INTO user_login_stats (user_id, last_login_at, last_ip, login_count, updated_at)
+    VALUES (:uid, :at, :ip, :n, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_login_at = excluded.last_login_at,
+        last_ip = excluded.last_ip,
+        login_count = user_login_stats.login_count + excluded.login_count,
+        updated_at = excluded.updated_at
+""").bindparams(bindparam("at", type_=DateTime))
+
+_LOG_SQL = text("""
+    INSERT INTO login_logs (user_id, username, login_at, ip_address)
+    VALUES (:uid, :uname, :at, :ip)
+""").bindparams(bindparam("at", type_=DateTime))
+
+def login_event(user_id: int, username: str, ip_address: Optional[str]) -> Dict[str, Any]:
+    """حدث دخول بوقت حدوثه (UTC مثل CURRENT_TIMESTAMP في SQLite)."""
+    return {"uid": user_id, "uname": username, "ip": ip_address, "at": datetime.utcnow()}
+
+def ensure() -> bool:
+    """
+    عند الإقلاع (بعد create_all): فهرس (user_id, login_at) للاستعلام الاحتياطي،
+    وتعبئة الملخص أول مرة إذا كان فارغًا وتوجد سجلات دخول.
+    """
+    global _rollup_ready
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_login_logs_user_login_at ON login_logs (user_id, login_at)"
+            ))
+            empty = conn.execute(text("SELECT 1 FROM user_login_stats LIMIT 1")).first() is None
+            has_logs = conn.execute(text("SELECT 1 FROM login_logs LIMIT 1")).first() is not None
+            if empty and has_logs:
+                _rebuild(conn)
+        _rollup_ready = True
+    except Exception as e:
+        print(f"[login_activity] ensure skipped: {e}")
+        _rollup_ready = False
+    return _rollup_ready
+
+def _rebuild(conn) -> int:
+    conn.execute(text("DELETE FROM user_login_stats"))
+    res = conn.execute(text("""
+        INSERT INTO user_login_stats (user_id, last_login_at, last_ip, login_count, updated_at)
+        SELECT user_id, login_at, ip_address, cnt, CURRENT_TIMESTAMP
+        FROM (
+            SELECT user_id, login_at, ip_address,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY login_at DESC, id DESC) AS rn,
+                   COUNT(*) OVER (PARTITION BY user_id) AS cnt
+            FROM login_logs
+        ) x
+        WHERE rn = 1
+    """))
+    return res.rowcount or 0
+
+def rebuild(db: Session) -> int:
+    """إعادة حساب الملخص من login_logs (العدد يشمل فقط السجلات غير المحذوفة)."""
+    n = _rebuild(db)
+    db.commit()
+    return n
+
+def record_logins(db, events: Iterable[Dict[str, Any]]) -> int:
+    """
+    كتابة دفعة أحداث (login_event) بترتيب حدوثها: أسطر login_logs + ملخص واحد لكل مستخدم.
+    db جلسة أو اتصال؛ لا يعمل commit.
+    """
+    events = list(events)
+    if not events:
+        return 0
+    db.execute(_LOG_SQL, events)
+    if _rollup_ready:
+        per_user: Dict[int, Dict[str, Any]] = {}
+        for ev in events:
+            agg = per_user.setdefault(ev["uid"], {"uid": ev["uid"], "n": 0})
+            agg["n"] += 1
+            agg["at"], agg["ip"] = ev["at"], ev["ip"]
+        db.execute(_UPSERT_SQL, list(per_user.values()))
+    purge_old_logs(db)
+    return len(events)
+
+def record_login(db: Session, user_id: int, username: str, ip_address: Optional[str]) -> None:
+    """تسجيل دخول واحد متزامنًا (لا يعمل commit)."""
+    record_logins(db, [login_event(user_id, username, ip_address)])
+
+_ORDER_SQL = "ORDER BY CASE WHEN last_login_at IS NULL THEN 1 ELSE 0 END, last_login_at DESC, id"
+
+def _rollup_sql() -> str:
+    return f"""
+        SELECT * FROM (
+            SELECT u.id, u.username, u.full_name,
+                   s.last_login_at, s.last_ip, COALESCE(s.login_count, 0) AS login_count
+            FROM users u
+            LEFT JOIN user_login_stats s ON s.user_id = u.id
+        ) a
+        {_ORDER_SQL}
+        LIMIT :limit OFFSET :offset
+    """
+
+def _windowed_sql() -> str:
+    return f"""
+        SELECT * FROM (
+            SELECT u.id, u.username, u.full_name,
+                   l.login_at AS last_login_at, l.ip_address AS last_ip, COALESCE(l.cnt, 0) AS login_count
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, login_at, ip_address, cnt
+                FROM (
+                    SELECT user_id, login_at, ip_address,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY login_at DESC, id DESC) AS rn,
+                           COUNT(*) OVER (PARTITION BY user_id) AS cnt
+                    FROM login_logs
+                ) x
+                WHERE rn = 1
+            ) l ON l.user_id = u.id
+        ) a
+        {_ORDER_SQL}
+        LIMIT :limit OFFSET :offset
+    """
+
+def page(db: Session, page_no: int = 1, per_page: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], int]:
+    """صفحة من نشاط المستخدمين (الأحدث دخولًا أولًا) + إجمالي المستخدمين."""
+    per_page = max(1, min(int(per_page), MAX_PAGE_SIZE))
+    page_no = max(1, int(page_no))
+    params = {"limit": per_page, "offset": (page_no - 1) * per_page}
+    total = db.execute(text("SELECT COUNT(*) FROM users")).scalar() or 0
+
+    rows = None
+    if _rollup_ready:
+        try:
+            rows = db.execute(
+                text(_rollup_sql()).columns(last_login_at=DateTime), params
+            ).mappings().all()
+        except Exception as e:
+            print(f"[login_activity] rollup query failed, using login_logs: {e}")
+            db.rollback()
+    if rows is None:
+        rows = db.execute(
+            text(_windowed_sql()).columns(last_login_at=DateTime), params
+        ).mappings().all()
+
+    return [
+        {
+            "id": r["id"],
+            "username": r["username"],
+            "full_name": r["full_name"],
+            "last_login": r["last_login_at"],
+            "last_ip": r["last_ip"],
+            "login_count": r["login_count"],
+        }
+        for r in rows
+    ], total
+
+def purge_old_logs(
+    db: Session,
+    retain_days: int = LOGIN_LOG_RETENTION_DAYS,
+    batch_size: int = PURGE_BATCH_SIZE,
+    force: bool = False,
+) -> int:
+    """
+    حذف سجلات الدخول الأقدم من retain_days (كل PURGE_INTERVAL_SECONDS على الأكثر).
+    بدون force: دفعة واحدة فقط حتى لا تطول المعاملة الحالية؛ مع force: حتى النهاية مع commit لكل دفعة.
+    """
+    global _last_purge
+    if retain_days <= 0:
+        return 0
+    now = time.monotonic()
+    if not force and now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return 0
+    _last_purge = now
+
+    cutoff = datetime.utcnow() - timedelta(days=retain_days)
+    stmt = text("""
+        DELETE FROM login_logs WHERE id IN (
+            SELECT id FROM login_logs WHERE login_at < :cutoff ORDER BY login_at LIMIT :batch
+        )
+    """).bindparams(bindparam("cutoff", type_=DateTime))
+    deleted = 0
+    while True:
+        n = db.execute(stmt, {"cutoff": cutoff, "batch": batch_size}).rowcount or 0
+        deleted += n
+        if not force or n < batch_size:
+            return deleted
+        db.commit()
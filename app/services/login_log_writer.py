@@ -0,0 +1,158 @@
+
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from ..database import SessionLocal
+from . import login_activity
+
+# كاتب سجلات الدخول على دفعات:
+# - submit: يضع الحدث في طابور بالذاكرة ويرجع فورًا (زمن الدخول لا يشمل كتابة السجل)
+# - خيط واحد يجمع الأحداث ويكتبها بمعاملة واحدة عند LOGIN_LOG_BATCH_SIZE حدث
+#   أو بعد LOGIN_LOG_FLUSH_SECONDS من أول حدث في الدفعة
+# - stop: يفرغ الطابور عند الإيقاف (lifespan في main + atexit احتياطًا)
+# - إذا امتلأ الطابور يُكتب الحدث فورًا على خيط احتياطي (لا يُسقط ولا يحجب الطلب/حلقة الأحداث)
+
+LOGIN_LOG_BATCH_SIZE = int(os.getenv("LOGIN_LOG_BATCH_SIZE", "200"))
+LOGIN_LOG_FLUSH_SECONDS = float(os.getenv("LOGIN_LOG_FLUSH_SECONDS", "1.0"))
+LOGIN_LOG_QUEUE_MAX = int(os.getenv("LOGIN_LOG_QUEUE_MAX", "10000"))
+FLUSH_RETRIES = 3
+
+_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=LOGIN_LOG_QUEUE_MAX)
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_overflow = ThreadPoolExecutor(max_workers=2, thread_name_prefix="login-log-overflow")
+_metrics_lock = threading.Lock()
+_metrics = {
+    "enqueued": 0,
+    "written": 0,
+    "batches": 0,
+    "sync_writes": 0,
+    "failed_flushes": 0,
+    "dropped": 0,
+    "last_batch_size": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+}
+
+def _bump(**values: float) -> None:
+    with _metrics_lock:
+        for k, v in values.items():
+            _metrics[k] += v
+
+def _write(events: List[Dict[str, Any]]) -> None:
+    db = SessionLocal()
+    try:
+        login_activity.record_logins(db, events)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _flush(events: List[Dict[str, Any]]) -> None:
+    for attempt in range(1, FLUSH_RETRIES + 1):
+        t0 = time.perf_counter()
+        try:
+            _write(events)
+        except Exception as e:
+            _bump(failed_flushes=1)
+            print(f"[login_log_writer] flush of {len(events)} events failed (attempt {attempt}): {e}")
+            time.sleep(min(LOGIN_LOG_FLUSH_SECONDS * attempt, 5.0))
+            continue
+        ms = (time.perf_counter() - t0) * 1000.0
+        with _metrics_lock:
+            _metrics["written"] += len(events)
+            _metrics["batches"] += 1
+            _metrics["last_batch_size"] = len(events)
+            _metrics["last_flush_ms"] = round(ms, 3)
+            _metrics["max_flush_ms"] = max(_metrics["max_flush_ms"], round(ms, 3))
+            _metrics["total_flush_ms"] += ms
+        return
+    _bump(dropped=len(events))
+
+def _run() -> None:
+    stopping = False
+    while not stopping:
+        ev = _queue.get()
+        if ev is None:
+            break
+        batch = [ev]
+        deadline = time.monotonic() + LOGIN_LOG_FLUSH_SECONDS
+        while len(batch) < LOGIN_LOG_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                ev = _queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if ev is None:
+                stopping = True
+                break
+            batch.append(ev)
+        _flush(batch)
+    # الإيقاف: كتابة ما تبقى في الطابور
+    rest = []
+    while True:
+        try:
+            ev = _queue.get_nowait()
+        except queue.Empty:
+            break
+        if ev is not None:
+            rest.append(ev)
+    for i in range(0, len(rest), LOGIN_LOG_BATCH_SIZE):
+        _flush(rest[i:i + LOGIN_LOG_BATCH_SIZE])
+
+def _ensure_started() -> None:
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="login-log-writer", daemon=True)
+            _thread.start()
+
+def submit(user_id: int, username: str, ip_address: Optional[str]) -> None:
+    """تسجيل حدث دخول (يُكتب لاحقًا مع الدفعة)."""
+    ev = login_activity.login_event(user_id, username, ip_address)
+    _ensure_started()
+    try:
+        _queue.put_nowait(ev)
+        _bump(enqueued=1)
+    except queue.Full:
+        _bump(sync_writes=1)
+        _overflow.submit(_flush, [ev])
+
+def stop(timeout: float = 10.0) -> None:
+    """إيقاف الخيط بعد كتابة كل الأحداث المعلّقة."""
+    global _thread
+    with _thread_lock:
+        t = _thread
+        _thread = None
+    if t is None or not t.is_alive():
+        return
+    try:
+        _queue.put(None, timeout=timeout)
+    except queue.Full:
+        pass  # طابور ممتلئ: الخيط يكتب ما يلحقه خلال مهلة join
+    t.join(timeout)
+
+atexit.register(stop)
+
+def metrics() -> Dict[str, Any]:
+    with _metrics_lock:
+        out = dict(_metrics)
+    total_ms = out.pop("total_flush_ms")
+    out["avg_flush_ms"] = round(total_ms / out["batches"], 3) if out["batches"] else 0.0
+    out["queue_depth"] = _queue.qsize()
+    out["queue_max"] = LOGIN_LOG_QUEUE_MAX
+    out["batch_size"] = LOGIN_LOG_BATCH_SIZE
+    out["flush_seconds"] = LOGIN_LOG_FLUSH_SECONDS
+    return out
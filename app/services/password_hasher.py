@@ -0,0 +1,140 @@
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from .. import security
+from ..database import SessionLocal
+
+# تنفيذ bcrypt خارج حلقة الأحداث وخارج threadpool الخاص بـ AnyIO:
+# - مجمّع خيوط مخصص (HASH_WORKERS) مع حد للطلبات المعلّقة (HASH_MAX_PENDING = قيد التنفيذ + الانتظار)
+# - عند تجاوز الحد: HashingBusy فورًا (الدخول يرجع 503) بدل تكديس الطلبات وتعطيل بقية الصفحات
+# - rehash_in_background: إعادة تهشير كلمة المرور بالتكلفة الحالية بعد دخول ناجح
+#   (فقط إذا كان المجمّع غير مزدحم؛ وإلا تُؤجل لدخول لاحق)
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(2, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+
+class HashingBusy(Exception):
+    """طابور التهشير ممتلئ."""
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_lock = threading.Lock()
+_pending = 0
+_metrics = {
+    "submitted": 0,
+    "rejected": 0,
+    "completed": 0,
+    "rehashed": 0,
+    "rehash_skipped": 0,
+    "max_pending_seen": 0,
+    "total_wait_ms": 0.0,
+    "total_run_ms": 0.0,
+    "max_wait_ms": 0.0,
+}
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, HASH_WORKERS), thread_name_prefix="bcrypt")
+        return _pool
+
+def _submit(fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+    global _pending
+    with _lock:
+        if _pending >= HASH_MAX_PENDING:
+            _metrics["rejected"] += 1
+            raise HashingBusy()
+        _pending += 1
+        _metrics["submitted"] += 1
+        _metrics["max_pending_seen"] = max(_metrics["max_pending_seen"], _pending)
+    queued_at = time.perf_counter()
+
+    def run():
+        global _pending
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            done = time.perf_counter()
+            with _lock:
+                _pending -= 1
+                wait_ms = (started - queued_at) * 1000.0
+                _metrics["completed"] += 1
+                _metrics["total_wait_ms"] += wait_ms
+                _metrics["total_run_ms"] += (done - started) * 1000.0
+                _metrics["max_wait_ms"] = max(_metrics["max_wait_ms"], round(wait_ms, 3))
+
+    try:
+        return _get_pool().submit(run)
+    except BaseException:
+        with _lock:
+            _pending -= 1
+        raise
+
+async def verify(plain_password: str, password_hash: str) -> bool:
+    """security.verify_password على مجمّع التهشير (HashingBusy إذا كان ممتلئًا)."""
+    return await asyncio.wrap_future(_submit(security.verify_password, plain_password, password_hash))
+
+async def hash_password(password: str) -> str:
+    """security.hash_password على مجمّع التهشير (HashingBusy إذا كان ممتلئًا)."""
+    return await asyncio.wrap_future(_submit(security.hash_password, password))
+
+def _rehash(user_id: int, plain_password: str, old_hash: str) -> None:
+    new_hash = security.hash_password(plain_password)
+    db = SessionLocal()
+    try:
+        # لا نكتب فوق كلمة مرور تغيّرت في هذه الأثناء
+        n = db.execute(
+            text("UPDATE users SET password_hash=:new WHERE id=:id AND password_hash=:old"),
+            {"new": new_hash, "id": user_id, "old": old_hash},
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if n:
+        with _lock:
+            _metrics["rehashed"] += 1
+
+def rehash_in_background(user_id: int, plain_password: str, old_hash: str) -> bool:
+    """جدولة إعادة التهشير إذا اختلفت التكلفة المخزنة (لا ينتظر النتيجة)."""
+    if not security.needs_rehash(old_hash):
+        return False
+    with _lock:
+        busy = _pending >= max(1, HASH_MAX_PENDING // 2)
+        if busy:
+            _metrics["rehash_skipped"] += 1
+    if busy:
+        return False
+    try:
+        fut = _submit(_rehash, user_id, plain_password, old_hash)
+    except HashingBusy:
+        return False
+
+    def report(f: "Future[Any]") -> None:
+        if f.exception() is not None:
+            print(f"[password_hasher] rehash user {user_id} failed: {f.exception()}")
+
+    fut.add_done_callback(report)
+    return True
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        out["pending"] = _pending
+    total_wait = out.pop("total_wait_ms")
+    total_run = out.pop("total_run_ms")
+    n = out["completed"]
+    out["avg_wait_ms"] = round(total_wait / n, 3) if n else 0.0
+    out["avg_run_ms"] = round(total_run / n, 3) if n else 0.0
+    out["workers"] = HASH_WORKERS
+    out["max_pending"] = HASH_MAX_PENDING
+    out["bcrypt"] = dict(security.BCRYPT_CALIBRATION)
+    return out
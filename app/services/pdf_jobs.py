@@ -0,0 +1,283 @@
+
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Annotated, Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+from pydantic.fields import FieldInfo
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from ..database import SessionLocal, engine
+from ..models import PdfJob
+
+# مهام توليد PDF في الخلفية (بدون وسيط خارجي): جدول pdf_jobs + process pool محدود
+JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "2"))
+JOB_MAX_PER_USER = int(os.getenv("PDF_JOB_MAX_PER_USER", "3"))
+JOB_TTL_MINUTES = int(os.getenv("PDF_JOB_TTL_MINUTES", "60"))
+JOB_TIMEOUT_MINUTES = int(os.getenv("PDF_JOB_TIMEOUT_MINUTES", "10"))
+JOB_DIR = Path(os.getenv("PDF_JOB_DIR", "cache/pdf_jobs"))
+CLEANUP_INTERVAL_SECONDS = 60
+
+ACTIVE_STATUSES = ("queued", "running")
+# معاملات تحقنها المهمة نفسها (لا تأتي من query string)
+INJECTED_PARAMS = ("request", "db", "user", "download")
+
+class JobKind:
+    """نوع مهمة: الدالة (module:function) ودالة الصلاحية التي تُطبق عند الإرسال."""
+
+    __slots__ = ("target", "check")
+
+    def __init__(self, target: str, check: Optional[Callable[[Any], Any]] = None):
+        self.target = target
+        self.check = check
+
+KINDS: Dict[str, JobKind] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_last_cleanup = 0.0
+
+def register(kind: str, target: str, check: Optional[Callable[[Any], Any]] = None) -> None:
+    """تسجيل نوع مهمة؛ target بصيغة "app.routers.hod:certificate_print_pdf"."""
+    KINDS[kind] = JobKind(target, check)
+
+def _init_worker() -> None:
+    # العملية الابنة لا تشارك اتصالات الأب (fork)
+    engine.dispose(close=False)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, JOB_WORKERS), initializer=_init_worker)
+        return _pool
+
+def _resolve(target: str) -> Callable:
+    mod, _, name = target.partition(":")
+    return getattr(importlib.import_module(mod), name)
+
+def bind_params(fn: Callable, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    معاملات دالة المسار من params حسب توقيعها: المطلوب يجب أن يكون موجودًا، والقيم تُحوَّل
+    وتُتحقق بنوعها وقيود Query/Path (مثل ge=1)؛ الافتراضي من FieldInfo يُستبدل بقيمته.
+    ValueError برسالة تُعرض للمستخدم عند نقص أو خطأ.
+    """
+    kwargs: Dict[str, Any] = {}
+    missing, invalid = [], []
+    for name, p in inspect.signature(fn).parameters.items():
+        if name in INJECTED_PARAMS:
+            continue
+        default = p.default
+        metadata = []
+        if isinstance(default, FieldInfo):
+            metadata = list(default.metadata)
+            default = inspect.Parameter.empty if default.is_required() else default.get_default(call_default_factory=True)
+        if name not in params:
+            if default is inspect.Parameter.empty:
+                missing.append(name)
+            else:
+                kwargs[name] = default
+            continue
+        annotation = str if p.annotation is inspect.Parameter.empty else p.annotation
+        try:
+            kwargs[name] = TypeAdapter(Annotated[(annotation, *metadata)] if metadata else annotation).validate_python(params[name])
+        except ValidationError:
+            invalid.append(name)
+    if missing or invalid:
+        parts = []
+        if missing:
+            parts.append("معاملات ناقصة: " + ", ".join(missing))
+        if invalid:
+            parts.append("قيم غير صالحة: " + ", ".join(invalid))
+        raise ValueError("؛ ".join(parts))
+    return kwargs
+
+def _fake_request(user: Dict[str, Any]) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [],
+        "session": {"user": user},
+        "state": {},
+    })
+
+async def _collect_body(resp) -> bytes:
+    path = getattr(resp, "path", None)
+    if path:
+        return Path(path).read_bytes()
+    iterator = getattr(resp, "body_iterator", None)
+    if iterator is not None:
+        chunks = []
+        async for chunk in iterator:
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        return b"".join(chunks)
+    return bytes(resp.body)
+
+def _filename_from(resp, fallback: str) -> str:
+    disp = resp.headers.get("content-disposition", "") if hasattr(resp, "headers") else ""
+    m = re.search(r'filename="?([^";]+)"?', disp)
+    return m.group(1) if m else fallback
+
+def _run_job(job_id: str) -> None:
+    """يعمل داخل عملية من الـ pool: ينفذ دالة المسار الأصلية ويكتب الملف الناتج."""
+    from ..deps_auth import CurrentUser
+
+    db = SessionLocal()
+    try:
+        job = db.get(PdfJob, job_id)
+        if job is None or job.status != "queued":
+            return
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        try:
+            fn = _resolve(KINDS[job.kind].target)
+            params = json.loads(job.params_json or "{}")
+            user_data = json.loads(job.user_json or "{}")
+            user = CurrentUser(**user_data)
+
+            kwargs = bind_params(fn, params)
+            injected = {"request": _fake_request(user_data), "db": db, "user": user, "download": 1}
+            for name in inspect.signature(fn).parameters:
+                if name in injected:
+                    kwargs[name] = injected[name]
+
+            resp = fn(**kwargs)
+            data = asyncio.run(_collect_body(resp))
+            if getattr(resp, "status_code", 200) >= 400:
+                raise RuntimeError(data.decode("utf-8", "replace")[:500])
+
+            JOB_DIR.mkdir(parents=True, exist_ok=True)
+            out = JOB_DIR / f"{job_id}.pdf"
+            out.write_bytes(data)
+
+            job.artifact_path = str(out)
+            job.filename = _filename_from(resp, f"{job.kind}_{job_id}.pdf")
+            job.status = "done"
+        except HTTPException as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e.detail)
+        except Exception as e:
+            traceback.print_exc()
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+def submit(db: Session, kind: str, params: Dict[str, Any], user) -> PdfJob:
+    """إنشاء مهمة جديدة (مع حد للمهام النشطة لكل مستخدم) وإرسالها للـ pool."""
+    spec = KINDS.get(kind)
+    if spec is None:
+        raise HTTPException(404, "نوع المهمة غير معروف")
+    if spec.check is not None:
+        spec.check(user)
+    try:
+        bind_params(_resolve(spec.target), params)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    cleanup(db)
+
+    active = (
+        db.query(func.count(PdfJob.id))
+        .filter(PdfJob.user_id == user.id, PdfJob.status.in_(ACTIVE_STATUSES))
+        .scalar()
+    ) or 0
+    if active >= JOB_MAX_PER_USER:
+        raise HTTPException(429, "لديك مهام قيد التنفيذ، الرجاء الانتظار حتى تنتهي")
+
+    job = PdfJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params_json=json.dumps(params, ensure_ascii=False),
+        user_id=user.id,
+        user_json=json.dumps(user.model_dump(), ensure_ascii=False),
+        status="queued",
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    _get_pool().submit(_run_job, job.id)
+    return job
+
+def get_for_user(db: Session, job_id: str, user) -> PdfJob:
+    job = db.get(PdfJob, job_id)
+    if job is None or (job.user_id != user.id and not user.is_admin):
+        raise HTTPException(404, "المهمة غير موجودة")
+    return job
+
+def to_dict(job: PdfJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "filename": job.filename,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": f"/jobs/{job.id}",
+        "download_url": f"/jobs/{job.id}/download" if job.status == "done" else None,
+    }
+
+def cleanup(db: Session, force: bool = False) -> int:
+    """
+    حذف المهام المنتهية الأقدم من JOB_TTL_MINUTES مع ملفاتها،
+    وتعليم المهام العالقة (أقدم من JOB_TIMEOUT_MINUTES) كفاشلة.
+    """
+    global _last_cleanup
+    now = time.monotonic()
+    if not force and now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+        return 0
+    _last_cleanup = now
+
+    utcnow = datetime.utcnow()
+    expired = (
+        db.query(PdfJob)
+        .filter(
+            PdfJob.status.in_(("done", "failed")),
+            PdfJob.finished_at < utcnow - timedelta(minutes=JOB_TTL_MINUTES),
+        )
+        .all()
+    )
+    for job in expired:
+        if job.artifact_path:
+            try:
+                os.unlink(job.artifact_path)
+            except OSError:
+                pass
+        db.delete(job)
+
+    (
+        db.query(PdfJob)
+        .filter(
+            PdfJob.status.in_(ACTIVE_STATUSES),
+            PdfJob.created_at < utcnow - timedelta(minutes=JOB_TIMEOUT_MINUTES),
+        )
+        .update(
+            {PdfJob.status: "failed", PdfJob.error: "انتهت مهلة المهمة", PdfJob.finished_at: utcnow},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return len(expired)
@@ -0,0 +1,145 @@
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import qrcode
+import qrcode.image.svg
+
+from .settings import PUBLIC_BASE_URL
+
+# صور QR للشهادات تُولَّد عند الطلب من رمز الشهادة (المحتوى = رابط صفحة التحقق):
+# - LRU في الذاكرة لآخر الصور (QR_CACHE_SIZE) لأن التوليد ~10ms
+# - المسار العام /verify/{code}/qr.png (أو .svg) مع ETag و Cache-Control
+# - الملفات المحفوظة (ترحيل الصور القديمة، أو QR_PERSIST=1) في QR_STORAGE_DIR بتقسيم مجزّأ:
+#   <sha256[:2]>/<sha256[2:4]>/<code>.png بدل مجلد static/barcodes المسطح
+# - PDF: link_callback يحوّل رابط QR (والروابط القديمة المرحّلة) إلى data URI
+
+QR_STORAGE_DIR = Path(os.getenv("QR_STORAGE_DIR", "cache/qr"))
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "5000"))
+QR_PERSIST = os.getenv("QR_PERSIST", "0").strip().lower() in ("1", "true", "yes", "on")
+LEGACY_DIR = Path("app/static/barcodes")
+LEGACY_PREFIX = "/static/barcodes/"
+CACHE_CONTROL = "public, max-age=86400"
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_metrics = {"hits": 0, "file_hits": 0, "rendered": 0, "persisted": 0, "render_ms_total": 0.0}
+
+def verify_url(code: str) -> str:
+    """الرابط المشفّر داخل الصورة."""
+    return f"{PUBLIC_BASE_URL}/verify/{code}"
+
+def url_for(code: str, fmt: str = "png") -> str:
+    """رابط الصورة داخل التطبيق (يُخزن في certificate_verifications.barcode_path)."""
+    return f"/verify/{quote(code, safe='')}/qr.{fmt}"
+
+def storage_path(code: str) -> Path:
+    h = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    return QR_STORAGE_DIR / h[:2] / h[2:4] / f"{code}.png"
+
+def etag(code: str, fmt: str) -> str:
+    raw = f"{PUBLIC_BASE_URL}\x1f{code}\x1f{fmt}"
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+def _render(code: str, fmt: str) -> bytes:
+    t0 = time.perf_counter()
+    if fmt == "svg":
+        img = qrcode.make(verify_url(code), image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        img = qrcode.make(verify_url(code))
+    buf = io.BytesIO()
+    img.save(buf)
+    ms = (time.perf_counter() - t0) * 1000.0
+    with _lock:
+        _metrics["rendered"] += 1
+        _metrics["render_ms_total"] += ms
+    return buf.getvalue()
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def get(code: str, fmt: str = "png") -> bytes:
+    """محتوى الصورة: الذاكرة، ثم الملف المحفوظ (PNG فقط)، ثم التوليد."""
+    if fmt not in FORMATS:
+        raise ValueError(f"صيغة QR غير مدعومة: {fmt}")
+    key = (code, fmt)
+    with _lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+            _metrics["hits"] += 1
+            return data
+
+    data = None
+    if fmt == "png":
+        try:
+            data = storage_path(code).read_bytes()
+            with _lock:
+                _metrics["file_hits"] += 1
+        except OSError:
+            pass
+    if data is None:
+        data = _render(code, fmt)
+        if fmt == "png" and QR_PERSIST:
+            _write(storage_path(code), data)
+            with _lock:
+                _metrics["persisted"] += 1
+
+    if QR_CACHE_SIZE > 0:
+        with _lock:
+            _cache[key] = data
+            _cache.move_to_end(key)
+            while len(_cache) > QR_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data
+
+def ensure(code: str) -> str:
+    """رابط صورة الشهادة؛ تُحفظ على القرص فقط مع QR_PERSIST=1 (وإلا تُولَّد عند أول طلب)."""
+    if QR_PERSIST and not storage_path(code).exists():
+        get(code, "png")
+    return url_for(code)
+
+def code_from_uri(uri: str) -> Optional[str]:
+    """رمز الشهادة من رابط QR (الجديد /verify/{code}/qr.png أو القديم /static/barcodes/{code}.png)."""
+    path = uri.split("?", 1)[0]
+    if path.startswith("/verify/") and path.endswith("/qr.png"):
+        code = path[len("/verify/"):-len("/qr.png")]
+    elif path.startswith(LEGACY_PREFIX) and path.endswith(".png"):
+        code = path[len(LEGACY_PREFIX):-len(".png")]
+    else:
+        return None
+    code = unquote(code)
+    return code if code and "/" not in code else None
+
+def data_uri(uri: str) -> Optional[str]:
+    """data URI لصورة QR (لـ xhtml2pdf)؛ None إذا لم يكن الرابط رابط QR أو كان ملفًا قديمًا موجودًا."""
+    code = code_from_uri(uri)
+    if code is None:
+        return None
+    if uri.startswith(LEGACY_PREFIX) and (LEGACY_DIR / f"{code}.png").exists():
+        return None
+    return "data:image/png;base64," + base64.b64encode(get(code, "png")).decode("ascii")
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        out["cached"] = len(_cache)
+    total = out.pop("render_ms_total")
+    out["avg_render_ms"] = round(total / out["rendered"], 3) if out["rendered"] else 0.0
+    out["max_cached"] = QR_CACHE_SIZE
+    out["persist"] = QR_PERSIST
+    out["storage_dir"] = str(QR_STORAGE_DIR)
+    return out
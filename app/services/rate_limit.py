@@ -0,0 +1,100 @@
+
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# تحديد معدل الطلبات بدلو رموز (token bucket) لكل مفتاح (عادة عنوان IP):
+# - rate رمز/ثانية مع سعة burst؛ كل طلب يستهلك رمزًا
+# - المفاتيح مرتبة حسب آخر استخدام؛ عند تجاوز max_keys تُحذف الأقدم (دلوها ممتلئ غالبًا)
+# - rate <= 0 يعطّل التحديد
+# - client_ip: عنوان العميل خلف بروكسي موثوق (X-Forwarded-For) وإلا عنوان الاتصال
+
+class TokenBucketLimiter:
+    """دلو رموز لكل مفتاح في ذاكرة العملية."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_keys = max(1, int(max_keys))
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"allowed": 0, "throttled": 0, "evicted": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, key: str) -> Tuple[bool, float]:
+        """(مسموح؟, ثوانٍ حتى توفر رمز عند الرفض)."""
+        if not self.enabled:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            ok = tokens >= 1.0
+            if ok:
+                tokens -= 1.0
+                self._metrics["allowed"] += 1
+            else:
+                self._metrics["throttled"] += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self._metrics["evicted"] += 1
+        return ok, 0.0 if ok else (1.0 - tokens) / self.rate
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._metrics)
+            out["keys"] = len(self._buckets)
+        out["rate"] = self.rate
+        out["burst"] = self.burst
+        return out
+
+ANY_PEER = "*"
+
+def parse_networks(spec: str) -> List[Any]:
+    """
+    قائمة البروكسيات الموثوقة من نص مثل "10.0.0.0/8, 127.0.0.1".
+    "*" = أي عنوان اتصال مباشر هو البروكسي (التطبيق لا يُصل إليه إلا عبره)؛ يوثق قفزة واحدة فقط.
+    """
+    nets: List[Any] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part == ANY_PEER:
+            nets.append(ANY_PEER)
+            continue
+        try:
+            nets.append(ipaddress.ip_network(part, strict=False))
+        except ValueError:
+            print(f"[rate_limit] ignoring invalid proxy address: {part}")
+    return nets
+
+def _trusted(host: Optional[str], nets: List[Any], any_peer: bool = False) -> bool:
+    if not host or not nets:
+        return False
+    if any_peer and ANY_PEER in nets:
+        return True
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(n != ANY_PEER and addr.version == n.version and addr in n for n in nets)
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str], trusted: List[Any]) -> str:
+    """
+    عنوان العميل: إذا جاء الاتصال من بروكسي موثوق نمشي X-Forwarded-For من اليمين
+    متخطين البروكسيات الموثوقة، وأول عنوان غير موثوق هو العميل (ما على يساره يمكن تزويره).
+    """
+    if not forwarded_for or not _trusted(peer, trusted, any_peer=True):
+        return peer or "-"
+    hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, trusted):
+            return hop
+    return hops[0] if hops else (peer or "-")
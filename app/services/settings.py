@@ -1,13 +1,122 @@
 
 import json
 import os
-from typing import Any, Optional
+import threading
+import time
+from typing import Any, Dict, Optional
 from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from ..database import SessionLocal
 from ..models import SystemSetting
 
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "https://guidxus-main-production.up.railway.app").rstrip("/")
 
+# مفتاح رقم نسخة الكاش (يرفعه admin_settings._bust_settings_cache بعد كل حفظ)
+CACHE_VERSION_KEY = "settings.cache_version"
+# كل كم ثانية نتحقق من رقم النسخة في قاعدة البيانات (للتزامن بين عمليات uvicorn)
+CACHE_CHECK_SECONDS = float(os.getenv("SETTINGS_CACHE_CHECK_SECONDS", "5"))
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+
+class SettingsSnapshot:
+    """نسخة في الذاكرة من جدول system_settings محمّلة باستعلام واحد."""
+
+    __slots__ = ("values", "version", "checked_at")
+
+    def __init__(self, values: Dict[str, Optional[str]], version: int, checked_at: float):
+        self.values = values
+        self.version = version
+        self.checked_at = checked_at
+
+    def get_str(self, key: str, default: str = "") -> str:
+        v = self.values.get(key)
+        return v if v is not None else default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        v = self.values.get(key)
+        if v is None:
+            return default
+        return str(v).strip().lower() in _TRUE_VALUES
+
+    def get_json(self, key: str, default: Any = None) -> Any:
+        v = self.values.get(key)
+        if v is None:
+            return [] if default is None else default
+        try:
+            return json.loads(v)
+        except Exception:
+            return [] if default is None else default
+
+_snapshot: Optional[SettingsSnapshot] = None
+_lock = threading.Lock()
+
+def _parse_version(v: Optional[str]) -> int:
+    try:
+        return int(str(v).strip())
+    except Exception:
+        return 0
+
+def _load_snapshot(db: Session) -> SettingsSnapshot:
+    rows = db.execute(select(SystemSetting.key, SystemSetting.value)).all()
+    values = {k: v for k, v in rows}
+    return SettingsSnapshot(values, _parse_version(values.get(CACHE_VERSION_KEY)), time.monotonic())
+
+def _read_version(db: Session) -> int:
+    return _parse_version(_get_value(db, CACHE_VERSION_KEY))
+
+def _refresh(db: Session) -> SettingsSnapshot:
+    global _snapshot
+    with _lock:
+        snap = _snapshot
+        now = time.monotonic()
+        if snap is not None and now - snap.checked_at < CACHE_CHECK_SECONDS:
+            return snap
+        if snap is not None and _read_version(db) == snap.version:
+            snap.checked_at = now
+            return snap
+        _snapshot = _load_snapshot(db)
+        return _snapshot
+
+def cached_snapshot() -> Optional[SettingsSnapshot]:
+    """النسخة الحالية إذا لم يحن موعد التحقق (بدون قاعدة بيانات)، وإلا None."""
+    snap = _snapshot
+    if snap is not None and time.monotonic() - snap.checked_at < CACHE_CHECK_SECONDS:
+        return snap
+    return None
+
+def get_snapshot(db: Optional[Session] = None) -> SettingsSnapshot:
+    """
+    يرجع نسخة الإعدادات من الذاكرة.
+    - لا يلمس قاعدة البيانات إلا إذا مرّ CACHE_CHECK_SECONDS منذ آخر تحقق.
+    - عند التحقق يقرأ cache_version فقط، ويعيد التحميل الكامل إذا تغيّر.
+    - إذا لم يُمرَّر db يفتح جلسة مؤقتة عند الحاجة فقط؛ إذا فشلت (تجمّع الاتصالات مستنفد مثلًا)
+      تُستخدم النسخة السابقة حتى التحقق التالي.
+    """
+    snap = cached_snapshot()
+    if snap is not None:
+        return snap
+    if db is not None:
+        return _refresh(db)
+    own = SessionLocal()
+    try:
+        return _refresh(own)
+    except SQLAlchemyError as e:
+        stale = _snapshot
+        if stale is None:
+            raise
+        print(f"[settings] refresh failed, using cached snapshot: {e.__class__.__name__}")
+        stale.checked_at = time.monotonic()
+        return stale
+    finally:
+        own.close()
+
+def invalidate_cache() -> None:
+    """يفرّغ الكاش المحلي؛ العمليات الأخرى تلتقط التغيير عبر cache_version."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
 def _get_value(db: Session, key: str) -> Optional[str]:
     return db.execute(
         select(SystemSetting.value).where(SystemSetting.key == key)
@@ -19,23 +128,13 @@ def _get_row(db: Session, key: str) -> Optional[SystemSetting]:
     ).scalar_one_or_none()
 
 def get_str(db: Session, key: str, default: str = "") -> str:
-    v = _get_value(db, key)
-    return v if v is not None else default
+    return get_snapshot(db).get_str(key, default)
 
 def get_bool(db: Session, key: str, default: bool = False) -> bool:
-    v = _get_value(db, key)
-    if v is None:
-        return default
-    return str(v).strip().lower() in {"1", "true", "yes", "on"}
+    return get_snapshot(db).get_bool(key, default)
 
 def get_json(db: Session, key: str, default: Any = None) -> Any:
-    v = _get_value(db, key)
-    if v is None:
-        return [] if default is None else default
-    try:
-        return json.loads(v)
-    except Exception:
-        return [] if default is None else default
+    return get_snapshot(db).get_json(key, default)
 
 def set_str(db: Session, key: str, value: str) -> None:
     row = _get_row(db, key)
@@ -45,9 +144,10 @@ def set_str(db: Session, key: str, value: str) -> None:
     else:
         row.value = str(value)
     db.commit()
+    invalidate_cache()
 
 def set_bool(db: Session, key: str, value: bool) -> None:
     set_str(db, key, "1" if value else "0")
 
 def set_json(db: Session, key: str, value: Any) -> None:
-    set_str(db, key, json.dumps(value, ensure_ascii=False))
\ No newline at end of file
+    set_str(db, key, json.dumps(value, ensure_ascii=False))
@@ -0,0 +1,219 @@
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Date, text
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from . import college_directory
+from .rate_limit import TokenBucketLimiter, client_ip, parse_networks
+
+# مسار القراءة للتحقق العام من الشهادات (/verify/{code} و /verify/api/verify):
+# - LRU للشهادات المعروفة (VERIFY_CACHE_SIZE، صلاحية VERIFY_CACHE_TTL): صف التحقق + حقول الدورة
+# - كاش سلبي للرموز غير الموجودة (VERIFY_NEGATIVE_SIZE، صلاحية VERIFY_NEGATIVE_TTL) حتى لا يكلّف التخمين استعلامًا
+# - forget / forget_many بعد إدراج سجل تحقق (نسخة جديدة أو إصدار)، forget_course بعد تعديل الدورة
+# - الكلية والتواقيع تُحسب عند كل طلب من college_directory (في الذاكرة)؛ الصلاحية تحد تأخر العمّال الآخرين
+# - limiter: دلو رموز لكل IP على مسارات التحقق؛ معطّل افتراضيًا (VERIFY_RATE_PER_SEC=0).
+#   خلف بروكسي (Railway) كل الطلبات تأتي من عنوانه: فعّله مع VERIFY_TRUSTED_PROXIES
+#   (عناوين/شبكات البروكسي، أو "*" إذا لم يكن التطبيق مكشوفًا إلا عبره) ليُؤخذ العميل من X-Forwarded-For
+
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "50000"))
+VERIFY_CACHE_TTL_SECONDS = float(os.getenv("VERIFY_CACHE_TTL", "300"))
+VERIFY_NEGATIVE_SIZE = int(os.getenv("VERIFY_NEGATIVE_SIZE", "100000"))
+VERIFY_NEGATIVE_TTL_SECONDS = float(os.getenv("VERIFY_NEGATIVE_TTL", "60"))
+VERIFY_RATE_PER_SEC = float(os.getenv("VERIFY_RATE_PER_SEC", "0"))
+VERIFY_BURST = float(os.getenv("VERIFY_BURST", "30"))
+MAX_CODE_LENGTH = 200  # certificate_verifications.certificate_code VARCHAR(200)
+
+# ترويسات HTTP: صفحة التحقق عامة (لا تعتمد على الجلسة)
+CACHE_CONTROL = f"public, max-age={int(VERIFY_CACHE_TTL_SECONDS)}"
+NEGATIVE_CACHE_CONTROL = f"public, max-age={int(VERIFY_NEGATIVE_TTL_SECONDS)}"
+
+SQL_VERIFY = text("""
+    SELECT
+      cv.course_id, cv.trainee_no, cv.trainee_name, cv.course_title, cv.hours,
+      cv.start_date, cv.end_date, cv.certificate_code, cv.copy_no, cv.barcode_path,
+      cv.created_at AS issued_at,
+      c.provider AS college_name,
+      c.id AS c_id, c.title AS c_title, c.hours AS c_hours,
+      c.start_date AS c_start_date, c.end_date AS c_end_date
+    FROM certificate_verifications cv
+    LEFT JOIN courses c ON cv.course_id = c.id
+    WHERE cv.certificate_code = :code
+    ORDER BY cv.copy_no DESC
+    LIMIT 1
+""").columns(c_start_date=Date, c_end_date=Date)  # القالب يستدعي strftime على تواريخ الدورة
+
+class VerifiedCourse:
+    """حقول الدورة التي يستخدمها قالب الشهادة."""
+
+    __slots__ = ("id", "title", "hours", "start_date", "end_date", "provider")
+
+    def __init__(self, **kw):
+        for k in self.__slots__:
+            setattr(self, k, kw.get(k))
+
+class VerifiedCertificate:
+    """آخر نسخة من الشهادة: صف SQL_VERIFY + الدورة (None إذا حُذفت) + أقسامها المستهدفة."""
+
+    __slots__ = ("row", "course", "target_departments")
+
+    def __init__(self, row: Dict[str, Any], course: Optional[VerifiedCourse], target_departments: Tuple[str, ...]):
+        self.row = row
+        self.course = course
+        self.target_departments = target_departments
+
+class _TTLCache:
+    """LRU محدود الحجم مع صلاحية لكل عنصر."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, now: float):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] <= now:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item
+
+    def put(self, key: str, value: Any, now: float) -> int:
+        if self.max_size <= 0:
+            return 0
+        self._items[key] = (now + self.ttl, value)
+        self._items.move_to_end(key)
+        evicted = 0
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def pop(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def drop_where(self, predicate) -> int:
+        stale = [k for k, (_, v) in self._items.items() if predicate(v)]
+        for k in stale:
+            del self._items[k]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+_lock = threading.Lock()
+_positive = _TTLCache(VERIFY_CACHE_SIZE, VERIFY_CACHE_TTL_SECONDS)
+_negative = _TTLCache(VERIFY_NEGATIVE_SIZE, VERIFY_NEGATIVE_TTL_SECONDS)
+limiter = TokenBucketLimiter(VERIFY_RATE_PER_SEC, VERIFY_BURST)
+TRUSTED_PROXIES = parse_networks(os.getenv("VERIFY_TRUSTED_PROXIES", ""))
+_metrics = {"hits": 0, "negative_hits": 0, "misses": 0, "negative_misses": 0, "evictions": 0, "forgotten": 0}
+
+def _load(db: Session, code: str) -> Optional[VerifiedCertificate]:
+    row = db.execute(SQL_VERIFY, {"code": code}).mappings().first()
+    if not row:
+        return None
+    row = dict(row)
+    course = None
+    targets: Tuple[str, ...] = ()
+    if row["c_id"] is not None:
+        course = VerifiedCourse(
+            id=row["c_id"],
+            title=row["c_title"],
+            hours=row["c_hours"],
+            start_date=row["c_start_date"],
+            end_date=row["c_end_date"],
+            provider=row["college_name"],
+        )
+        targets = tuple(college_directory.course_targets(db, [course.id]).get(course.id, ()))
+    for k in ("c_id", "c_title", "c_hours", "c_start_date", "c_end_date"):
+        row.pop(k)
+    return VerifiedCertificate(row, course, targets)
+
+def lookup(db: Session, code: str) -> Optional[VerifiedCertificate]:
+    """آخر نسخة من الشهادة بالرمز، أو None إذا لم توجد (تُخزن النتيجتان)."""
+    if not code or len(code) > MAX_CODE_LENGTH:
+        return None
+    now = time.monotonic()
+    with _lock:
+        item = _positive.get(code, now)
+        if item is not None:
+            _metrics["hits"] += 1
+            return item[1]
+        if _negative.get(code, now) is not None:
+            _metrics["negative_hits"] += 1
+            return None
+    rec = _load(db, code)
+    now = time.monotonic()
+    with _lock:
+        if rec is None:
+            _metrics["negative_misses"] += 1
+            _metrics["evictions"] += _negative.put(code, True, now)
+        else:
+            _metrics["misses"] += 1
+            _negative.pop(code)
+            _metrics["evictions"] += _positive.put(code, rec, now)
+    return rec
+
+def forget(code: Optional[str]) -> None:
+    """بعد إدراج سجل تحقق لهذا الرمز (نسخة جديدة أو إصدار أول)."""
+    if code:
+        forget_many([code])
+
+def forget_many(codes: Iterable[str]) -> None:
+    with _lock:
+        for code in codes:
+            _positive.pop(code)
+            _negative.pop(code)
+            _metrics["forgotten"] += 1
+
+def forget_course(course_id: int) -> None:
+    """بعد تعديل بيانات الدورة (العنوان، الساعات، التواريخ، الأقسام)."""
+    with _lock:
+        _metrics["forgotten"] += _positive.drop_where(
+            lambda rec: rec.course is not None and rec.course.id == course_id
+        )
+
+def client_key(request: Request) -> str:
+    """مفتاح حد المعدل: عنوان العميل الحقيقي (X-Forwarded-For من بروكسي موثوق فقط)."""
+    peer = request.client.host if request.client else None
+    return client_ip(peer, request.headers.get("x-forwarded-for"), TRUSTED_PROXIES)
+
+def etag(*parts: Any) -> str:
+    """ETag ضعيف من القيم التي تحدد محتوى الاستجابة."""
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return 'W/"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+def not_modified(request: Request, tag: str) -> bool:
+    """هل يطابق If-None-Match الـ ETag الحالي؟"""
+    inm = request.headers.get("if-none-match") or ""
+    if not inm:
+        return False
+    if inm.strip() == "*":
+        return True
+    weak = tag[2:] if tag.startswith("W/") else tag
+    for t in inm.split(","):
+        t = t.strip()
+        if (t[2:] if t.startswith("W/") else t) == weak:
+            return True
+    return False
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        out["size"] = len(_positive)
+        out["negative_size"] = len(_negative)
+    lookups = out["hits"] + out["negative_hits"] + out["misses"] + out["negative_misses"]
+    out["hit_ratio"] = round((out["hits"] + out["negative_hits"]) / lookups, 4) if lookups else 0.0
+    out["max_size"] = VERIFY_CACHE_SIZE
+    out["negative_max_size"] = VERIFY_NEGATIVE_SIZE
+    out["ttl_seconds"] = VERIFY_CACHE_TTL_SECONDS
+    out["negative_ttl_seconds"] = VERIFY_NEGATIVE_TTL_SECONDS
+    return out
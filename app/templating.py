@@ -0,0 +1,20 @@
+from typing import Any, Dict
+
+from starlette.requests import Request
+
+from .services import settings as S
+
+def ui_context(request: Request) -> Dict[str, Any]:
+    """
+    Context processor لكل القوالب:
+    - current_user من request.state (يضبطه SessionHelperMiddleware ثم get_current_user).
+    - اسم النظام والتذييل والشعار من كاش الإعدادات (بدون جلسة قاعدة بيانات).
+    """
+    cfg = S.get_snapshot()
+    return {
+        "current_user": getattr(request.state, "current_user", None),
+        "app_name": cfg.get_str("app.name", "Training Courses System"),
+        "ui_footer": cfg.get_str("ui.footer_text", ""),
+        "ui_logo_url": cfg.get_str("ui.logo_url", ""),
+        "ui_favicon_url": cfg.get_str("ui.favicon_url", ""),
+    }
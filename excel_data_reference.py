@@ -1,52 +1,408 @@
 """
 سكريبت متقدم لتحميل بيانات ملف الإكسيل وربطها بقاعدة البيانات
 يوفر دالات للبحث عن بيانات المتدربين والأدوية والمرضى من الإكسيل
+
+- ملف الإكسيل يُحوّل مرة واحدة إلى نسخة عمودية (snapshot) في cache/excel_snapshot
+  مفتاحها mtime/الحجم/sha256 للملف، وكل ورقة تُحمّل منها عند أول استخدام فقط.
+  تتجدد النسخة تلقائيًا عند تغيّر ملف الإكسيل، ويمكن فرض ذلك عبر reload_excel_data().
+- الصفوف تُحوّل مرة واحدة إلى قوائم قواميس، والبحث بالمساواة يتم عبر فهارس
+  (hash) تُبنى عند أول استخدام لكل عمود، فلا يُمسح العمود كاملًا مع كل طلب.
 """
 
 import pandas as pd
+import hashlib
 import json
+import os
+import shutil
+import threading
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List
+
+try:
+    import pyarrow.feather as _feather
+    HAS_FEATHER = True
+except Exception:
+    HAS_FEATHER = False
 
 # قراءة ملف الإكسيل مرة واحدة
 EXCEL_FILE = 'used_tables_export.xlsx'
 
-# تخزين البيانات في الذاكرة
+# النسخة العمودية: Feather (قابلة للـ memory-map) إن توفرت pyarrow، وإلا pickle لكل ورقة
+SNAPSHOT_DIR = os.getenv('EXCEL_SNAPSHOT_DIR', os.path.join('cache', 'excel_snapshot'))
+SNAPSHOT_CHECK_SECONDS = float(os.getenv('EXCEL_SNAPSHOT_CHECK_SECONDS', '5'))
+# أوراق فشلت قراءتها: تُعاد محاولتها بعد هذه المدة (تتضاعف حتى ساعة)، أو فورًا عند تغيّر الملف/إعادة التحميل
+SNAPSHOT_RETRY_SECONDS = float(os.getenv('EXCEL_SNAPSHOT_RETRY_SECONDS', '60'))
+SNAPSHOT_RETRY_MAX_SECONDS = 3600.0
+
+SHEETS = {
+    'students': 'sf01',
+    'drugs': 'drugs',
+    'clinic_patients': 'clinic_patients',
+    'courses': 'courses',
+    'departments': 'departments',
+    'colleges': 'colleges',
+    'users': 'users',
+    'drug_movements': 'drug_movements',
+    'locations': 'locations',
+}
+
+# تخزين البيانات في الذاكرة (تُملأ ورقة بورقة)
 _excel_data_cache = {}
 
+# نسخة فيها أخطاء أوراق تُستخدم (الأوراق السليمة تُخدم) لكن لا تُحفظ على القرص؛
+# retry_at/retry_delay: موعد إعادة قراءة الأوراق الفاشلة فقط
+_snapshot: Dict[str, Any] = {'manifest': None, 'checked_at': 0.0, 'retry_at': 0.0, 'retry_delay': 0.0}
+_snapshot_lock = threading.RLock()
+
+# الصفوف كقواميس لكل ورقة، والفهارس: (ورقة, عمود) -> {قيمة مطبّعة: [صفوف]}
+_records: Dict[str, List[Dict[str, Any]]] = {}
+_indexes: Dict[tuple, Dict[Any, List[Dict[str, Any]]]] = {}
+_derived: Dict[str, Any] = {}
+_index_lock = threading.RLock()
+
+# التطبيع يحاكي astype(str).str.strip() مع بقاء القيم الفارغة (NaN) بدون مطابقة
+def _text(v) -> Optional[str]:
+    return None if _is_missing(v) else str(v)
+
+def _norm(v) -> Optional[str]:
+    return None if _is_missing(v) else str(v).strip()
+
+def _norm_lower(v) -> Optional[str]:
+    return None if _is_missing(v) else str(v).strip().lower()
+
+def _raw(v):
+    # مطابقة == كما في pandas: القيم الفارغة (NaN) لا تطابق شيئًا
+    return None if _is_missing(v) else v
+
+def _is_missing(v) -> bool:
+    try:
+        return bool(pd.isna(v))
+    except (TypeError, ValueError):
+        return False
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _manifest_path() -> str:
+    return os.path.join(SNAPSHOT_DIR, 'manifest.json')
+
+def _read_manifest() -> Optional[Dict[str, Any]]:
+    try:
+        with open(_manifest_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _complete(m: Optional[Dict[str, Any]]) -> bool:
+    """نسخة صالحة: كل الأوراق قُرئت بدون خطأ."""
+    return m is not None and not any(v.get('error') for v in m.get('sheets', {}).values())
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _write_sheet(df: pd.DataFrame, base: str) -> str:
+    """حفظ ورقة واحدة؛ يرجع اسم الملف."""
+    df = df.reset_index(drop=True)
+    if HAS_FEATHER:
+        try:
+            path = base + '.feather'
+            # بدون ضغط حتى يمكن قراءتها بـ memory_map
+            _feather.write_feather(df, path + '.tmp', compression='uncompressed')
+            os.replace(path + '.tmp', path)
+            return os.path.basename(path)
+        except Exception:
+            # أعمدة بأنواع مختلطة أو أسماء غير نصية: نرجع لـ pickle
+            pass
+    path = base + '.pkl'
+    df.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return os.path.basename(path)
+
+def _build_snapshot(st: os.stat_result, sha256: str, reuse: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    قراءة ملف الإكسيل مرة واحدة (فتح واحد للـ workbook) وكتابة كل ورقة كملف مستقل.
+    reuse: نسخة سابقة لنفس المحتوى؛ أوراقها السليمة تُؤخذ كما هي ولا يُعاد إلا ما فشل.
+    """
+    t0 = time.perf_counter()
+    version = sha256[:16]
+    out_dir = os.path.join(SNAPSHOT_DIR, version)
+    os.makedirs(out_dir, exist_ok=True)
+
+    sheets: Dict[str, Any] = {}
+    if reuse is not None and reuse.get('version') == version:
+        for key, entry in reuse.get('sheets', {}).items():
+            if key in SHEETS and entry.get('file') and not entry.get('error') \
+                    and os.path.exists(os.path.join(out_dir, entry['file'])):
+                sheets[key] = entry
+    xls = None
+    if len(sheets) < len(SHEETS):
+        try:
+            xls = pd.ExcelFile(EXCEL_FILE)
+        except Exception as e:
+            print(f"[-] Error loading Excel file: {str(e)}")
+    for key, sheet_name in SHEETS.items():
+        if key in sheets:
+            continue
+        try:
+            if xls is None:
+                raise RuntimeError('workbook not readable')
+            df = xls.parse(sheet_name)
+            sheets[key] = {'file': _write_sheet(df, os.path.join(out_dir, key)), 'rows': len(df)}
+        except Exception as e:
+            print(f"[-] Failed to load {key}: {str(e)}")
+            sheets[key] = {'file': None, 'rows': 0, 'error': str(e)}
+    if xls is not None:
+        xls.close()
+
+    manifest = {
+        'mtime_ns': st.st_mtime_ns,
+        'size': st.st_size,
+        'sha256': sha256,
+        'version': version,
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'build_ms': round((time.perf_counter() - t0) * 1000.0, 1),
+        'sheets': sheets,
+    }
+    if not _complete(manifest):
+        # لا نحفظ manifest فيه أخطاء (عمليات أخرى/إعادة التشغيل تعيد المحاولة)، ونُبقي النسخ القديمة
+        failed = sorted(k for k, v in sheets.items() if v.get('error'))
+        print(f"[-] Excel snapshot {version} partial (not saved), failed sheets: {', '.join(failed)}")
+        return manifest
+    _write_json_atomic(_manifest_path(), manifest)
+
+    # حذف النسخ القديمة (العمليات الأخرى تنتقل للنسخة الجديدة عند الفحص التالي)
+    for name in os.listdir(SNAPSHOT_DIR):
+        old = os.path.join(SNAPSHOT_DIR, name)
+        if name != version and os.path.isdir(old):
+            shutil.rmtree(old, ignore_errors=True)
+    print(f"[+] Excel snapshot {version} built in {manifest['build_ms']}ms")
+    return manifest
+
+def _ensure_snapshot(force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    يرجع manifest النسخة الحالية، ويعيد بناءها إذا تغيّر ملف الإكسيل.
+    الفحص (stat) يتم مرة كل SNAPSHOT_CHECK_SECONDS، والـ sha256 فقط عند تغيّر mtime/الحجم.
+    إذا فشلت قراءة ورقة تُستخدم النسخة الجزئية (الأوراق الأخرى تعمل) وتُعاد قراءة الأوراق
+    الفاشلة فقط بعد SNAPSHOT_RETRY_SECONDS (مع مضاعفة)، أو عند تغيّر الملف أو force.
+    """
+    current = _snapshot['manifest']
+    if not force and _snapshot['checked_at'] and time.monotonic() - _snapshot['checked_at'] < SNAPSHOT_CHECK_SECONDS:
+        return current
+    with _snapshot_lock:
+        current = _snapshot['manifest']
+        now = time.monotonic()
+        if not force and _snapshot['checked_at'] and now - _snapshot['checked_at'] < SNAPSHOT_CHECK_SECONDS:
+            return current
+        _snapshot['checked_at'] = now
+
+        try:
+            st = os.stat(EXCEL_FILE)
+        except OSError:
+            # الملف غير موجود: نُبقي ما في الذاكرة (أو النسخة المحفوظة إن وُجدت)
+            if current is None:
+                on_disk = _read_manifest()
+                current = on_disk if _complete(on_disk) else None
+                _snapshot['manifest'] = current
+            return current
+
+        def same_file(m):
+            return m is not None and m.get('mtime_ns') == st.st_mtime_ns and m.get('size') == st.st_size
+
+        if not force and same_file(current):
+            if _complete(current) or now < _snapshot['retry_at']:
+                return current
+            # نفس الملف وبعض الأوراق فشلت: إعادة قراءتها فقط
+            manifest = _build_snapshot(st, current['sha256'], reuse=current)
+        else:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            on_disk = _read_manifest()
+            if not force and _complete(on_disk) and same_file(on_disk):
+                manifest = on_disk
+            else:
+                sha256 = _file_sha256(EXCEL_FILE)
+                if not force and _complete(on_disk) and on_disk.get('sha256') == sha256:
+                    # تغيّر mtime فقط (نسخ/لمس الملف) والمحتوى نفسه
+                    on_disk.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                    _write_json_atomic(_manifest_path(), on_disk)
+                    manifest = on_disk
+                else:
+                    manifest = _build_snapshot(st, sha256)
+
+        if _complete(manifest):
+            _snapshot['retry_delay'] = 0.0
+        else:
+            delay = _snapshot['retry_delay']
+            delay = SNAPSHOT_RETRY_SECONDS if not delay else min(delay * 2, SNAPSHOT_RETRY_MAX_SECONDS)
+            _snapshot['retry_delay'] = delay
+            _snapshot['retry_at'] = time.monotonic() + delay
+
+        if current is None or current.get('version') != manifest.get('version') \
+                or current.get('built_at') != manifest.get('built_at'):
+            _excel_data_cache.clear()
+            reset_indexes()
+        _snapshot['manifest'] = manifest
+        return manifest
+
+def _read_sheet(manifest: Optional[Dict[str, Any]], key: str) -> pd.DataFrame:
+    entry = (manifest or {}).get('sheets', {}).get(key) or {}
+    fname = entry.get('file')
+    if not fname:
+        return pd.DataFrame()
+    path = os.path.join(SNAPSHOT_DIR, manifest['version'], fname)
+    try:
+        if fname.endswith('.feather'):
+            return _feather.read_feather(path, memory_map=True)
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"[-] Failed to load {key}: {str(e)}")
+        return pd.DataFrame()
+
+def _sheet(key: str) -> pd.DataFrame:
+    """ورقة واحدة من النسخة العمودية (تُحمّل عند أول استخدام)."""
+    manifest = _ensure_snapshot()
+    df = _excel_data_cache.get(key)
+    if df is None:
+        with _snapshot_lock:
+            df = _excel_data_cache.get(key)
+            if df is None:
+                df = _read_sheet(manifest, key)
+                _excel_data_cache[key] = df
+    return df
+
 def load_excel_data():
     """تحميل جميع بيانات الإكسيل في الذاكرة"""
-    global _excel_data_cache
-    
-    if _excel_data_cache:
-        return _excel_data_cache
-    
     try:
-        sheets = {
-            'students': 'sf01',
-            'drugs': 'drugs',
-            'clinic_patients': 'clinic_patients',
-            'courses': 'courses',
-            'departments': 'departments',
-            'colleges': 'colleges',
-            'users': 'users',
-            'drug_movements': 'drug_movements',
-            'locations': 'locations',
-        }
-        
-        for key, sheet_name in sheets.items():
-            try:
-                _excel_data_cache[key] = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
-                print(f"[+] Loaded {key}: {len(_excel_data_cache[key])} records")
-            except Exception as e:
-                print(f"[-] Failed to load {key}: {str(e)}")
-                _excel_data_cache[key] = pd.DataFrame()
-        
+        for key in SHEETS:
+            _sheet(key)
+        build_indexes()
         return _excel_data_cache
     except Exception as e:
         print(f"[-] Error loading Excel file: {str(e)}")
         return {}
 
+def reload_excel_data() -> Dict[str, Any]:
+    """إعادة بناء النسخة العمودية من ملف الإكسيل فورًا (لنقطة الأدمن)."""
+    # الأوراق التي فشلت تظهر مع error في النتيجة
+    return snapshot_info(_ensure_snapshot(force=True))
+
+def snapshot_info(manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    m = manifest if manifest is not None else _ensure_snapshot()
+    if m is None:
+        return {'loaded': False, 'excel_file': EXCEL_FILE}
+    return {
+        'loaded': True,
+        'excel_file': EXCEL_FILE,
+        'version': m.get('version'),
+        'built_at': m.get('built_at'),
+        'build_ms': m.get('build_ms'),
+        'format': 'feather' if HAS_FEATHER else 'pickle',
+        'sheets': {k: {'rows': v.get('rows', 0), 'error': v.get('error')} for k, v in m.get('sheets', {}).items()},
+        'in_memory': sorted(_excel_data_cache),
+    }
+
+def reset_indexes() -> None:
+    """مسح الصفوف والفهارس المشتقة (بعد تغيير _excel_data_cache)."""
+    with _index_lock:
+        _records.clear()
+        _indexes.clear()
+        _derived.clear()
+
+# الفهارس التي تُبنى مسبقًا مع load_excel_data (بقية الأعمدة تُفهرس عند أول استخدام)
+_PREBUILT_INDEXES = (
+    ('students', 'student_id', _norm),
+    ('students', 'College', _norm),
+    ('students', 'Major', _norm),
+    ('drugs', 'trade_name', _norm_lower),
+    ('drugs', 'generic_name', _norm_lower),
+    ('drugs', 'id', _norm),
+    ('clinic_patients', 'trainee_no', _norm),
+)
+
+def build_indexes() -> None:
+    """تطبيع الأوراق المحمّلة وبناء الفهارس الأساسية مرة واحدة."""
+    for sheet, column, norm in _PREBUILT_INDEXES:
+        _index(sheet, column, norm)
+
+def _rows(sheet: str) -> List[Dict[str, Any]]:
+    """صفوف الورقة كقواميس (تُحوّل مرة واحدة)."""
+    _ensure_snapshot()
+    rows = _records.get(sheet)
+    if rows is not None:
+        return rows
+    df = _sheet(sheet)
+    with _index_lock:
+        rows = _records.get(sheet)
+        if rows is None:
+            rows = df.to_dict('records') if len(df) else []
+            _records[sheet] = rows
+    return rows
+
+def _has_column(sheet: str, column: str) -> bool:
+    return column in _sheet(sheet).columns
+
+def _index(sheet: str, column: str, norm: Callable[[Any], Any]) -> Dict[Any, List[Dict[str, Any]]]:
+    """فهرس hash لعمود: القيمة المطبّعة -> الصفوف بترتيبها في الورقة."""
+    _ensure_snapshot()
+    key = (sheet, column, norm)
+    idx = _indexes.get(key)
+    if idx is not None:
+        return idx
+    rows = _rows(sheet)
+    has_column = _has_column(sheet, column)
+    with _index_lock:
+        idx = _indexes.get(key)
+        if idx is None:
+            idx = {}
+            if has_column:
+                for row in rows:
+                    k = norm(row.get(column))
+                    if k is not None:
+                        idx.setdefault(k, []).append(row)
+            _indexes[key] = idx
+    return idx
+
+def _find(sheet: str, column: str, norm: Callable[[Any], Any], value) -> List[Dict[str, Any]]:
+    return _index(sheet, column, norm).get(norm(value), [])
+
+def _first(sheet: str, column: str, norm: Callable[[Any], Any], value) -> Optional[Dict[str, Any]]:
+    found = _find(sheet, column, norm, value)
+    return dict(found[0]) if found else None
+
+def _copies(rows: List[Dict[str, Any]]) -> list:
+    # نسخ سطحية حتى لا يعدّل المستدعي الصفوف المشتركة في الفهارس
+    return [dict(r) for r in rows]
+
+def _search_text(v, lower: bool) -> str:
+    t = _text(v) or ''
+    return t.lower() if lower else t
+
+def _search(sheet: str, columns: List[tuple], query: str) -> list:
+    """
+    بحث جزئي (contains) على أعمدة نصية مطبّعة مسبقًا.
+    columns: [(اسم العمود, lower?)]
+    """
+    if not query:
+        return _copies(_rows(sheet))
+    cache_key = ('search', sheet, tuple(columns))
+    haystack = _derived.get(cache_key)
+    if haystack is None:
+        rows = _rows(sheet)
+        cols = [(c, low) for c, low in columns if _has_column(sheet, c)]
+        haystack = [
+            (tuple(_search_text(row.get(c), low) for c, low in cols), row)
+            for row in rows
+        ]
+        _derived[cache_key] = haystack
+    return [dict(row) for texts, row in haystack if any(query in t for t in texts)]
+
 def get_student_by_id(student_id: str) -> Optional[Dict[str, Any]]:
     """
     البحث عن بيانات المتدرب من خلال رقمه
@@ -57,18 +413,7 @@ def get_student_by_id(student_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         قاموس ببيانات المتدرب أو None
     """
-    if 'students' not in _excel_data_cache:
-        load_excel_data()
-    
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    
-    # البحث عن المتدرب
-    result = students[students['student_id'].astype(str).str.strip() == str(student_id).strip()]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('students', 'student_id', _norm, student_id)
 
 def get_student_data_as_json(student_id: str) -> Optional[str]:
     """الحصول على بيانات المتدرب بصيغة JSON"""
@@ -81,29 +426,11 @@ def get_student_data_as_json(student_id: str) -> Optional[str]:
 
 def get_students_by_college(college_name: str) -> list:
     """الحصول على جميع متدربي كلية معينة"""
-    if 'students' not in _excel_data_cache:
-        load_excel_data()
-    
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    
-    if 'College' not in students.columns:
-        return []
-    
-    result = students[students['College'].astype(str).str.strip() == college_name.strip()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('students', 'College', _norm, college_name))
 
 def get_students_by_major(major_name: str) -> list:
     """الحصول على جميع المتدربين ذوي تخصص معين"""
-    if 'students' not in _excel_data_cache:
-        load_excel_data()
-    
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    
-    if 'Major' not in students.columns:
-        return []
-    
-    result = students[students['Major'].astype(str).str.strip() == major_name.strip()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('students', 'Major', _norm, major_name))
 
 def get_drug_by_name(trade_name: str) -> Optional[Dict[str, Any]]:
     """
@@ -115,39 +442,15 @@ def get_drug_by_name(trade_name: str) -> Optional[Dict[str, Any]]:
     Returns:
         قاموس ببيانات الدواء أو None
     """
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    
-    result = drugs[drugs['trade_name'].astype(str).str.strip().str.lower() == trade_name.strip().lower()]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('drugs', 'trade_name', _norm_lower, trade_name)
 
 def get_drug_by_generic_name(generic_name: str) -> Optional[Dict[str, Any]]:
     """البحث عن دواء باسمه العام"""
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    
-    result = drugs[drugs['generic_name'].astype(str).str.strip().str.lower() == generic_name.strip().lower()]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('drugs', 'generic_name', _norm_lower, generic_name)
 
 def get_all_drugs() -> list:
     """الحصول على قائمة جميع الأدوية"""
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    return [row.to_dict() for _, row in drugs.iterrows()]
+    return _copies(_rows('drugs'))
 
 def get_drug_by_code(drug_code: str) -> Optional[Dict[str, Any]]:
     """
@@ -159,18 +462,8 @@ def get_drug_by_code(drug_code: str) -> Optional[Dict[str, Any]]:
     Returns:
         قاموس ببيانات الدواء أو None
     """
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    
     # البحث عن الدواء - المحاولة عن طريق id أولاً
-    result = drugs[drugs['id'].astype(str).str.strip() == str(drug_code).strip()]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('drugs', 'id', _norm, drug_code)
 
 def get_drug_stock(drug_code: str) -> Optional[Dict[str, Any]]:
     """
@@ -207,51 +500,19 @@ def get_clinic_patient_by_trainee_no(trainee_no: str) -> Optional[Dict[str, Any]
     Returns:
         قاموس ببيانات المريض أو None
     """
-    if 'clinic_patients' not in _excel_data_cache:
-        load_excel_data()
-    
-    patients = _excel_data_cache.get('clinic_patients', pd.DataFrame())
-    
-    result = patients[patients['trainee_no'].astype(str).str.strip() == str(trainee_no).strip()]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('clinic_patients', 'trainee_no', _norm, trainee_no)
 
 def get_clinic_patients_by_college(college: str) -> list:
     """الحصول على جميع مرضى كلية معينة"""
-    if 'clinic_patients' not in _excel_data_cache:
-        load_excel_data()
-    
-    patients = _excel_data_cache.get('clinic_patients', pd.DataFrame())
-    
-    result = patients[patients['college'].astype(str).str.strip() == college.strip()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('clinic_patients', 'college', _norm, college))
 
 def get_drug_movements_for_drug(drug_id: int) -> list:
     """الحصول على حركات الأدوية لدواء معين"""
-    if 'drug_movements' not in _excel_data_cache:
-        load_excel_data()
-    
-    movements = _excel_data_cache.get('drug_movements', pd.DataFrame())
-    
-    result = movements[movements['drug_id'] == drug_id]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('drug_movements', 'drug_id', _raw, drug_id))
 
 def get_course_by_id(course_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على بيانات الدورة"""
-    if 'courses' not in _excel_data_cache:
-        load_excel_data()
-    
-    courses = _excel_data_cache.get('courses', pd.DataFrame())
-    
-    result = courses[courses['id'] == course_id]
-    
-    if len(result) > 0:
-        return result.iloc[0].to_dict()
-    
-    return None
+    return _first('courses', 'id', _raw, course_id)
 
 def search_students(query: str) -> list:
     """
@@ -263,19 +524,10 @@ def search_students(query: str) -> list:
     Returns:
         قائمة بنتائج البحث
     """
-    if 'students' not in _excel_data_cache:
-        load_excel_data()
-    
-    students = _excel_data_cache.get('students', pd.DataFrame())
     query = query.strip().lower()
     
     # البحث في الاسم أو رقم المتدرب
-    results = students[
-        (students['student_Name'].astype(str).str.lower().str.contains(query)) |
-        (students['student_id'].astype(str).str.contains(query))
-    ]
-    
-    return [row.to_dict() for _, row in results.iterrows()]
+    return _search('students', [('student_Name', True), ('student_id', False)], query)
 
 def search_drugs(query: str) -> list:
     """
@@ -287,18 +539,8 @@ def search_drugs(query: str) -> list:
     Returns:
         قائمة بالأدوية المطابقة
     """
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
     query = query.strip().lower()
-    
-    result = drugs[
-        (drugs['trade_name'].astype(str).str.lower().str.contains(query, na=False)) |
-        (drugs['generic_name'].astype(str).str.lower().str.contains(query, na=False))
-    ]
-    
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _search('drugs', [('trade_name', True), ('generic_name', True)], query)
 
 def get_drugs_by_status(is_active: bool = True) -> list:
     """
@@ -310,13 +552,23 @@ def get_drugs_by_status(is_active: bool = True) -> list:
     Returns:
         قائمة بالأدوية
     """
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    
-    result = drugs[drugs['is_active'] == is_active]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('drugs', 'is_active', _raw, is_active))
+
+def _le(a, b) -> bool:
+    # مقارنة <= كما في pandas: القيم الفارغة تعطي False
+    if _is_missing(a) or _is_missing(b):
+        return False
+    try:
+        return a <= b
+    except TypeError:
+        return False
+
+def _low_stock_rows() -> List[Dict[str, Any]]:
+    rows = _derived.get('low_stock')
+    if rows is None:
+        rows = [r for r in _rows('drugs') if _le(r.get('stock_qty'), r.get('reorder_level'))]
+        _derived['low_stock'] = rows
+    return rows
 
 def get_low_stock_drugs(threshold: int = None) -> list:
     """
@@ -328,17 +580,10 @@ def get_low_stock_drugs(threshold: int = None) -> list:
     Returns:
         قائمة بالأدوية ذات المخزون المنخفض
     """
-    if 'drugs' not in _excel_data_cache:
-        load_excel_data()
-    
-    drugs = _excel_data_cache.get('drugs', pd.DataFrame())
-    
     if threshold is not None:
-        result = drugs[drugs['stock_qty'] <= threshold]
-    else:
-        result = drugs[drugs['stock_qty'] <= drugs['reorder_level']]
-    
-    return [row.to_dict() for _, row in result.iterrows()]
+        rows = [r for r in _rows('drugs') if _le(r.get('stock_qty'), threshold)]
+        return _copies(rows)
+    return _copies(_low_stock_rows())
 
 def search_clinic_patients(query: str) -> list:
     """
@@ -350,18 +595,8 @@ def search_clinic_patients(query: str) -> list:
     Returns:
         قائمة بنتائج البحث
     """
-    if 'clinic_patients' not in _excel_data_cache:
-        load_excel_data()
-    
-    patients = _excel_data_cache.get('clinic_patients', pd.DataFrame())
     query = query.strip().lower()
-    
-    result = patients[
-        (patients['full_name'].astype(str).str.lower().str.contains(query, na=False)) |
-        (patients['trainee_no'].astype(str).str.contains(query, na=False))
-    ]
-    
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _search('clinic_patients', [('full_name', True), ('trainee_no', False)], query)
 
 def get_students_by_status(status: str) -> list:
     """
@@ -373,13 +608,7 @@ def get_students_by_status(status: str) -> list:
     Returns:
         قائمة بالمتدربين
     """
-    if 'students' not in _excel_data_cache:
-        load_excel_data()
-    
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    
-    result = students[students['Status'].astype(str).str.strip().str.lower() == status.strip().lower()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('students', 'Status', _norm_lower, status))
 
 def get_departments_by_college(college_name: str) -> list:
     """
@@ -391,13 +620,7 @@ def get_departments_by_college(college_name: str) -> list:
     Returns:
         قائمة بالأقسام
     """
-    if 'departments' not in _excel_data_cache:
-        load_excel_data()
-    
-    departments = _excel_data_cache.get('departments', pd.DataFrame())
-    
-    result = departments[departments['college_id'].astype(str) == college_name.strip()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('departments', 'college_id', _text, college_name.strip()))
 
 def get_courses_by_department(department_name: str) -> list:
     """
@@ -409,75 +632,54 @@ def get_courses_by_department(department_name: str) -> list:
     Returns:
         قائمة بالدورات
     """
-    if 'courses' not in _excel_data_cache:
-        load_excel_data()
-    
-    courses = _excel_data_cache.get('courses', pd.DataFrame())
-    
-    result = courses[courses['department_id'].astype(str).str.strip().str.lower() == department_name.strip().lower()]
-    return [row.to_dict() for _, row in result.iterrows()]
+    return _copies(_find('courses', 'department_id', _norm_lower, department_name))
 
 def get_all_colleges() -> list:
     """الحصول على جميع الكليات"""
-    if 'colleges' not in _excel_data_cache:
-        load_excel_data()
-    
-    colleges = _excel_data_cache.get('colleges', pd.DataFrame())
-    return [row.to_dict() for _, row in colleges.iterrows()]
+    return _copies(_rows('colleges'))
 
 def get_all_departments() -> list:
     """الحصول على جميع الأقسام"""
-    if 'departments' not in _excel_data_cache:
-        load_excel_data()
-    
-    departments = _excel_data_cache.get('departments', pd.DataFrame())
-    return [row.to_dict() for _, row in departments.iterrows()]
+    return _copies(_rows('departments'))
 
 def get_statistics() -> Dict[str, int]:
     """الحصول على إحصائيات البيانات الموجودة في الإكسيل"""
     load_excel_data()
     
-    drugs_df = _excel_data_cache.get('drugs', pd.DataFrame())
-    
     return {
-        'total_students': len(_excel_data_cache.get('students', pd.DataFrame())),
-        'total_drugs': len(drugs_df),
-        'total_active_drugs': len(drugs_df[drugs_df['is_active'] == True]),
-        'total_low_stock_drugs': len(drugs_df[drugs_df['stock_qty'] <= drugs_df['reorder_level']]),
-        'total_clinic_patients': len(_excel_data_cache.get('clinic_patients', pd.DataFrame())),
-        'total_courses': len(_excel_data_cache.get('courses', pd.DataFrame())),
-        'total_departments': len(_excel_data_cache.get('departments', pd.DataFrame())),
-        'total_colleges': len(_excel_data_cache.get('colleges', pd.DataFrame())),
-        'total_users': len(_excel_data_cache.get('users', pd.DataFrame())),
+        'total_students': len(_rows('students')),
+        'total_drugs': len(_rows('drugs')),
+        'total_active_drugs': len(_find('drugs', 'is_active', _raw, True)),
+        'total_low_stock_drugs': len(_low_stock_rows()),
+        'total_clinic_patients': len(_rows('clinic_patients')),
+        'total_courses': len(_rows('courses')),
+        'total_departments': len(_rows('departments')),
+        'total_colleges': len(_rows('colleges')),
+        'total_users': len(_rows('users')),
     }
 
 def get_statistics_by_college(college_name: str) -> Dict[str, int]:
     """الحصول على إحصائيات حسب الكلية"""
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    clinic_patients = _excel_data_cache.get('clinic_patients', pd.DataFrame())
-    
-    college_students = students[students['College'].astype(str).str.strip() == college_name.strip()]
-    college_patients = clinic_patients[clinic_patients['college'].astype(str).str.strip() == college_name.strip()]
+    college_students = _find('students', 'College', _norm, college_name)
+    college_patients = _find('clinic_patients', 'college', _norm, college_name)
     
     return {
         'students_count': len(college_students),
         'clinic_patients_count': len(college_patients),
-        'majors': college_students['Major'].unique().tolist() if len(college_students) > 0 else [],
+        'majors': list(dict.fromkeys(r.get('Major') for r in college_students)),
     }
 
 def get_statistics_by_department(department_name: str) -> Dict[str, int]:
     """الحصول على إحصائيات حسب القسم"""
-    students = _excel_data_cache.get('students', pd.DataFrame())
-    clinic_patients = _excel_data_cache.get('clinic_patients', pd.DataFrame())
-    
-    dept_students = students[students['Department'].astype(str).str.strip() == department_name.strip()]
-    dept_patients = clinic_patients[clinic_patients['department'].astype(str).str.strip() == department_name.strip()]
+    dept_students = _find('students', 'Department', _norm, department_name)
+    dept_patients = _find('clinic_patients', 'department', _norm, department_name)
     
     return {
         'students_count': len(dept_students),
         'clinic_patients_count': len(dept_patients),
     }
 
+
 if __name__ == "__main__":
     print("=" * 60)
     print("Excel Data Reference Module")
@@ -0,0 +1,186 @@
+"""
+قياس أثر فصل clinic_patients إلى clinic_patient_profiles + clinic_visits.
+
+ينشئ قاعدة SQLite مؤقتة بجدول clinic_patients القديم (--visits زيارة، --patients ملف،
+مختلطة في نفس الجدول كما في الإنتاج) ثم يقيس عبر نفس كود التطبيق:
+- search: بحث الملفات (clinic_summary.search + آخر الزيارات للنتائج)
+- patient visits: آخر زيارات مراجع واحد
+- visits list: زيارات آخر 30 يومًا، الأحدث أولًا (أول 50)
+- dashboard counts: عدد الزيارات / الإحالات / الإجازات
+قبل (legacy) وبعد الترحيل على دفعات + cutover (split).
+
+الاستخدام:
+    python scripts/bench_clinic_storage.py --visits 1000000 --patients 50000 -n 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# قاعدة مؤقتة: app.database يستخدم sqlite:///app.db نسبةً لمجلد العمل
+_tmp = tempfile.mkdtemp(prefix="bench_clinic_")
+os.chdir(_tmp)
+for _k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+    os.environ.pop(_k, None)
+
+from sqlalchemy import text  # noqa: E402
+
+# يسجّل جداول النماذج في Base.metadata قبل create_all
+from app import models  # noqa: E402, F401
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.services import clinic_store, clinic_summary  # noqa: E402
+
+LEGACY_DDL = """
+    CREATE TABLE clinic_patients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record_kind TEXT NOT NULL DEFAULT 'patient',
+        patient_type TEXT, trainee_no TEXT, full_name TEXT, national_id TEXT, mobile TEXT,
+        major TEXT, college TEXT, birth_date TEXT, department TEXT, gender TEXT, address TEXT,
+        email TEXT, visit_date TEXT, visit_reason TEXT, diagnosis TEXT, treatment TEXT, notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_by INTEGER, updated_at TIMESTAMP,
+        visit_at TIMESTAMP, employee_no TEXT, temp_c REAL, bp_systolic INTEGER, bp_diastolic INTEGER,
+        pulse_bpm INTEGER, resp_rpm INTEGER, weight_kg REAL, height_cm REAL, bmi REAL, glucose_mg REAL,
+        o2_sat INTEGER, chronic_json TEXT, complaint TEXT, recommendation TEXT, rec_detail TEXT,
+        rest_days INTEGER, rec_json TEXT, rx_json TEXT
+    )
+"""
+
+# عدد الملفات: 90% متدربون (رقم 441000000 + k) و10% موظفون (5000 + k)
+_PATIENT_NO = """
+    CASE WHEN {k} % 10 = 0 THEN 'employee' ELSE 'trainee' END AS patient_type,
+    CASE WHEN {k} % 10 = 0 THEN NULL ELSE CAST(441000000 + {k} AS TEXT) END AS trainee_no,
+    CASE WHEN {k} % 10 = 0 THEN CAST(5000 + {k} AS TEXT) ELSE NULL END AS employee_no
+"""
+
+def _fill(patients: int, visits: int, rounds: int = 10) -> None:
+    """ملفات وزيارات متداخلة في نفس الجدول (على rounds دفعات)."""
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_DDL))
+    p_step, v_step = patients // rounds, visits // rounds
+    for r in range(rounds):
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                WITH RECURSIVE seq(k) AS (SELECT :a UNION ALL SELECT k + 1 FROM seq WHERE k < :b)
+                INSERT INTO clinic_patients (record_kind, patient_type, trainee_no, employee_no,
+                                             full_name, national_id, mobile, major, college, birth_date)
+                SELECT 'profile', {_PATIENT_NO.format(k='k')},
+                       'مراجع ' || k, CAST(1000000000 + k AS TEXT), '05' || (10000000 + k),
+                       'تخصص ' || (k % 40), 'كلية ' || (k % 12), '2003-01-01'
+                FROM seq
+            """), {"a": r * p_step + 1, "b": (r + 1) * p_step})
+            conn.execute(text(f"""
+                WITH RECURSIVE seq(i) AS (SELECT :a UNION ALL SELECT i + 1 FROM seq WHERE i < :b),
+                     v AS (SELECT i, 1 + ABS(RANDOM()) % :p AS k FROM seq)
+                INSERT INTO clinic_patients (record_kind, patient_type, trainee_no, employee_no, full_name,
+                                             visit_at, complaint, diagnosis, recommendation, rest_days,
+                                             chronic_json, temp_c, college)
+                SELECT 'visit', {_PATIENT_NO.format(k='k')}, 'مراجع ' || k,
+                       DATETIME('now', '-' || (ABS(RANDOM()) % (3 * 365 * 24 * 60)) || ' minutes'),
+                       'شكوى', 'تشخيص ' || (i % 97),
+                       CASE ABS(RANDOM()) % 10 WHEN 0 THEN 'referral' WHEN 1 THEN 'rest' ELSE 'none' END,
+                       NULL, '["ضغط"]', 37.0, 'كلية ' || (k % 12)
+                FROM v
+            """), {"a": r * v_step + 1, "b": (r + 1) * v_step, "p": patients})
+
+def _time(fn, n: int):
+    fn()
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def _cases(db, patients: int):
+    queries = ["مراجع 4217", "441012345", "5000", "1000031337", "0510002468"]
+    state = {"i": 0}
+
+    def search():
+        q = queries[state["i"] % len(queries)]
+        state["i"] += 1
+        nd = q if q.isdigit() else None
+        rows = clinic_summary.search(db, q, nd, limit=20)
+        keys = [(r["patient_type"], r["trainee_no"] or r["employee_no"]) for r in rows]
+        clinic_summary.recent_visits(db, keys)
+
+    def patient_visits():
+        k = 1 + (state["i"] * 7919) % patients
+        state["i"] += 1
+        key = ("employee", str(5000 + k)) if k % 10 == 0 else ("trainee", str(441000000 + k))
+        clinic_summary.recent_visits(db, [key], per_patient=20)
+
+    def visits_list():
+        db.execute(text(f"""
+            SELECT id, trainee_no, full_name, college, complaint, diagnosis, created_at, visit_at, chronic_json
+            FROM {clinic_store.visits()}
+            WHERE visit_at >= DATETIME('now', '-30 days')
+            ORDER BY visit_at DESC
+            LIMIT 50
+        """)).fetchall()
+
+    def dashboard():
+        v = clinic_store.visits()
+        for where in ("", " WHERE recommendation='referral'", " WHERE recommendation='rest'"):
+            db.execute(text(f"SELECT COUNT(*) FROM {v}{where}")).scalar()
+
+    return [
+        ("search", search),
+        ("patient visits", patient_visits),
+        ("visits list", visits_list),
+        ("dashboard counts", dashboard),
+    ]
+
+def _run(patients: int, n: int):
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    db = SessionLocal()
+    try:
+        return {name: _time(fn, n) for name, fn in _cases(db, patients)}
+    finally:
+        db.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--visits", type=int, default=1_000_000)
+    ap.add_argument("--patients", type=int, default=50_000)
+    ap.add_argument("--batch-size", type=int, default=20_000)
+    ap.add_argument("-n", type=int, default=50)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    _fill(args.patients, args.visits)
+    Base.metadata.create_all(bind=engine)
+    print(f"visits={args.visits} patients={args.patients} fill={time.perf_counter() - t0:.1f}s")
+
+    clinic_store.ensure()
+    db = SessionLocal()
+    try:
+        clinic_summary.rebuild(db)
+    finally:
+        db.close()
+    before = _run(args.patients, args.n)
+
+    t0 = time.perf_counter()
+    copied = clinic_store.migrate_batches(args.batch_size)
+    batches_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    clinic_store.cutover()
+    cutover_ms = (time.perf_counter() - t0) * 1000.0
+    print(f"migration: {copied['visit']} visits + {copied['profile']} profiles in {batches_s:.1f}s "
+          f"(batch {args.batch_size}), cutover {cutover_ms:.0f}ms, mode={clinic_store.mode(force=True)}")
+    after = _run(args.patients, args.n)
+
+    print(f"{'query':<18}{'before p50':>12}{'before p95':>12}{'after p50':>12}{'after p95':>12}")
+    for name in before:
+        b50, b95 = before[name]
+        a50, a95 = after[name]
+        print(f"{name:<18}{b50:>10.2f}ms{b95:>10.2f}ms{a50:>10.2f}ms{a95:>10.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+اختبار حمل لتجمّع اتصالات قاعدة البيانات (app.database) حتى الاستنفاد.
+
+كل عامل (خيط) يحاكي طلبًا: يحجز اتصالًا، ينفذ استعلامًا، ويبقيه --hold-ms (عرض القالب مثلًا)
+ثم يعيده. تُشغَّل مراحل بتوازي متزايد نسبةً لسعة التجمّع (DB_POOL_SIZE + DB_MAX_OVERFLOW):
+- حتى السعة: بدون انتظار تقريبًا
+- فوق السعة: الطلبات تنتظر في طابور التجمّع (زمن الانتظار يظهر في p95/p99)
+- الاستنفاد: اتصالات محجوزة أطول من DB_POOL_TIMEOUT ⇒ TimeoutError، وعبر التطبيق 503 مع Retry-After
+
+بدون DB_* تُستخدم قاعدة SQLite مؤقتة؛ مع DB_* (PostgreSQL) يُختبر الخادم الفعلي.
+
+الاستخدام:
+    python scripts/bench_db_pool.py --pool-size 5 --max-overflow 5 --timeout 1 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _parse():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pool-size", type=int, default=5)
+    ap.add_argument("--max-overflow", type=int, default=5)
+    ap.add_argument("--timeout", type=float, default=1.0, help="DB_POOL_TIMEOUT بالثواني")
+    ap.add_argument("--hold-ms", type=float, default=20.0, help="مدة حجز الاتصال في كل طلب")
+    ap.add_argument("--seconds", type=float, default=5.0, help="مدة كل مرحلة")
+    ap.add_argument("--phases", default="0.5,1,2,4", help="التوازي كمضاعفات لسعة التجمّع")
+    return ap.parse_args()
+
+ARGS = _parse()
+
+os.environ["DB_POOL_SIZE"] = str(ARGS.pool_size)
+os.environ["DB_MAX_OVERFLOW"] = str(ARGS.max_overflow)
+os.environ["DB_POOL_TIMEOUT"] = str(ARGS.timeout)
+os.environ.setdefault("VERIFY_CACHE_SIZE", "0")
+os.environ.setdefault("VERIFY_NEGATIVE_SIZE", "0")
+os.environ.setdefault("VERIFY_RATE_PER_SEC", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+if not all(os.getenv(k) for k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT")):
+    # قاعدة مؤقتة: app.database يستخدم sqlite:///app.db نسبةً لمجلد العمل
+    _tmp = tempfile.mkdtemp(prefix="bench_db_pool_")
+    os.symlink(os.path.join(ROOT, "app"), os.path.join(_tmp, "app"))
+    os.chdir(_tmp)
+
+from sqlalchemy import exc, text  # noqa: E402
+
+from app.database import engine, pool_metrics  # noqa: E402
+
+CAPACITY = ARGS.pool_size + ARGS.max_overflow
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def _phase(concurrency: int, seconds: float, hold_s: float) -> None:
+    waits, errors = [], {"timeouts": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    before = pool_metrics()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    wait = time.perf_counter() - t0
+                    conn.execute(text("SELECT 1")).scalar()
+                    time.sleep(hold_s)
+            except exc.TimeoutError:
+                with lock:
+                    errors["timeouts"] += 1
+                    waits.append((time.perf_counter() - t0) * 1000.0)
+                continue
+            with lock:
+                waits.append(wait * 1000.0)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    after = pool_metrics()
+    served = len(waits) - errors["timeouts"]
+    print(f"concurrency {concurrency:>3} (capacity {CAPACITY}): {served / elapsed:7.0f} req/s  "
+          f"wait ms p50 {statistics.median(waits) if waits else 0:7.2f}  p95 {_pct(waits, 0.95):7.2f}  "
+          f"p99 {_pct(waits, 0.99):7.2f}  timeouts {errors['timeouts']}  "
+          f"peak_in_use {after['peak_in_use']}  connects +{after['connects'] - before['connects']}")
+
+async def _asgi_get(app, path: str, query: str):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench.local")],
+        "client": ("192.0.2.1", 40000), "server": ("bench.local", 80),
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+            status["headers"] = dict(message.get("headers") or [])
+
+    await app(scope, receive, send)
+    return status.get("code"), status.get("headers", {})
+
+async def _exhausted_request() -> None:
+    """كل الاتصالات محجوزة ⇒ طلب حقيقي عبر التطبيق ينتظر DB_POOL_TIMEOUT ثم 503."""
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        held = [engine.connect() for _ in range(CAPACITY)]
+        try:
+            t0 = time.perf_counter()
+            code, headers = await _asgi_get(app, "/verify/api/verify", "code=0-0-0")
+            print(f"app request with pool exhausted: {code} Retry-After={headers.get(b'retry-after', b'').decode()} "
+                  f"after {(time.perf_counter() - t0) * 1000.0:.0f}ms (timeout {ARGS.timeout}s)")
+        finally:
+            for conn in held:
+                conn.close()
+        code, _ = await _asgi_get(app, "/verify/api/verify", "code=0-0-0")
+        print(f"app request after release: {code}")
+
+def main():
+    print(f"{engine.url.get_backend_name()}: pool_size {ARGS.pool_size}, max_overflow {ARGS.max_overflow}, "
+          f"timeout {ARGS.timeout}s, hold {ARGS.hold_ms}ms")
+    for mult in (float(m) for m in ARGS.phases.split(",")):
+        _phase(max(1, int(CAPACITY * mult)), ARGS.seconds, ARGS.hold_ms / 1000.0)
+
+    # الاستنفاد: حجز أطول من المهلة وتوازي ضعف السعة ⇒ نصف الطلبات تقريبًا تنتهي بـ TimeoutError
+    _phase(CAPACITY * 2, ARGS.timeout * 3, ARGS.timeout * 1.5)
+
+    asyncio.run(_exhausted_request())
+    print(f"db_pool: {pool_metrics()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+قياس زمن الإكمال التلقائي لبحث الأدوية (drug_search) على كتالوج اصطناعي.
+
+ينشئ قاعدة SQLite مؤقتة بعدد --drugs من الأدوية ثم يقارن:
+- like: المسار القديم (LIKE '%tok%' على خمسة أعمدة، مسح كامل)
+- fts5: جدول الظل FTS5 (trigram) مع ترتيب bm25
+
+الاستعلامات تحاكي الكتابة حرفًا بحرف (am, amo, amox, amoxi ...).
+على PostgreSQL يُقاس نفس المسار بتشغيل التطبيق على القاعدة الفعلية (وضع trgm).
+
+الاستخدام:
+    python scripts/bench_drug_search.py --drugs 50000 -n 300
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# قاعدة مؤقتة: app.database يستخدم sqlite:///app.db نسبةً لمجلد العمل
+_tmp = tempfile.mkdtemp(prefix="bench_drugs_")
+os.chdir(_tmp)
+for _k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+    os.environ.pop(_k, None)
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.services import drug_search  # noqa: E402
+
+SYLLABLES = ["am", "ox", "ci", "lin", "par", "ace", "ta", "mol", "ibu", "pro", "fen", "met", "for",
+             "min", "az", "ith", "ro", "my", "cin", "clo", "pid", "ogr", "el", "ator", "va", "sta"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Cream", "Drops"]
+MAKERS = ["Pfizer", "Novartis", "SPIMACO", "Jamjoom", "Tabuk", "Hikma", "GSK", "Sanofi"]
+
+def _name(rnd):
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize()
+
+def _create_catalog(n: int) -> list:
+    rnd = random.Random(11)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE drugs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                drug_code TEXT UNIQUE NOT NULL,
+                trade_name TEXT NOT NULL,
+                generic_name TEXT,
+                strength TEXT,
+                form TEXT,
+                unit TEXT,
+                reorder_level INTEGER DEFAULT 0,
+                is_active BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                manufacturer TEXT, created_by INTEGER, updated_by INTEGER, updated_at TIMESTAMP
+            )
+        """))
+        rows = [
+            {
+                "c": f"D{i:06d}",
+                "t": _name(rnd),
+                "g": _name(rnd).lower(),
+                "s": f"{rnd.choice([5, 10, 20, 50, 100, 250, 500])}mg",
+                "f": rnd.choice(FORMS),
+                "m": rnd.choice(MAKERS),
+                "a": 1 if rnd.random() < 0.9 else 0,
+            }
+            for i in range(n)
+        ]
+        conn.execute(text("""
+            INSERT INTO drugs (drug_code, trade_name, generic_name, strength, form, manufacturer, is_active)
+            VALUES (:c, :t, :g, :s, :f, :m, :a)
+        """), rows)
+    # استعلامات "كتابة تدريجية" من أسماء موجودة
+    queries = []
+    for r in rnd.sample(rows, 60):
+        word = r["t"].lower()
+        for k in range(2, min(len(word), 7) + 1):
+            queries.append(word[:k])
+        queries.append(f"{word[:5]} {r['s']}")
+    return queries
+
+def _bench(mode: str, queries: list, n: int):
+    drug_search._mode = mode
+    db = SessionLocal()
+    try:
+        for q in queries[:20]:
+            drug_search.search(db, q, limit=20)
+        samples = []
+        for i in range(n):
+            q = queries[i % len(queries)]
+            t0 = time.perf_counter()
+            drug_search.search(db, q, limit=20)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    finally:
+        db.close()
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def _check_same_results(queries: list) -> int:
+    """نفس مجموعة النتائج في الوضعين (بدون حد)."""
+    db = SessionLocal()
+    mismatches = 0
+    try:
+        for q in queries[:40]:
+            drug_search._mode = "like"
+            a = {r["id"] for r in drug_search.search(db, q, limit=1_000_000)}
+            drug_search._mode = "fts5"
+            b = {r["id"] for r in drug_search.search(db, q, limit=1_000_000)}
+            mismatches += a != b
+    finally:
+        db.close()
+    return mismatches
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--drugs", type=int, default=50_000)
+    ap.add_argument("-n", type=int, default=300)
+    args = ap.parse_args()
+
+    queries = _create_catalog(args.drugs)
+    t0 = time.perf_counter()
+    mode = drug_search.ensure_index()
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    print(f"drugs={args.drugs}  index={mode}  build={build_ms:.0f}ms  queries={len(queries)}")
+    if mode != "fts5":
+        print("FTS5/trigram غير متاح في نسخة SQLite هذه؛ لا مقارنة.")
+        return
+
+    print(f"result-set mismatches like vs fts5: {_check_same_results(queries)}")
+    print(f"{'mode':<8}{'p50':>10}{'p95':>10}")
+    for m in ("like", "fts5"):
+        p50, p95 = _bench(m, queries, args.n)
+        print(f"{m:<8}{p50:>8.2f}ms{p95:>8.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+قياس زمن البحث في بيانات الإكسيل (excel_data_reference) على ورقة sf01 اصطناعية.
+
+يقارن:
+- قبل: مسح العمود كاملًا بـ astype(str).str.strip() مع كل طلب ثم iterrows().
+- بعد: الفهارس (hash) المبنية مرة واحدة في excel_data_reference.
+
+الاستخدام:
+    python scripts/bench_excel_directory.py --rows 200000 -n 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import excel_data_reference as edr  # noqa: E402
+
+def _synthetic_students(rows: int) -> pd.DataFrame:
+    rnd = random.Random(42)
+    colleges = [f"الكلية التقنية {i}" for i in range(30)]
+    majors = [f"تخصص {i}" for i in range(300)]
+    return pd.DataFrame({
+        "student_id": [2100000 + i for i in range(rows)],
+        "student_Name": [f"متدرب {i}" for i in range(rows)],
+        "College": [rnd.choice(colleges) for _ in range(rows)],
+        "Major": [rnd.choice(majors) for _ in range(rows)],
+        "Department": [f"قسم {rnd.randint(0, 60)}" for _ in range(rows)],
+        "Status": [rnd.choice(["Active", "Graduated", "Withdrawn"]) for _ in range(rows)],
+        "Mobile": [f"05{rnd.randint(10000000, 99999999)}" for _ in range(rows)],
+    })
+
+# المسار القديم كما كان في excel_data_reference قبل الفهرسة
+def _old_student_by_id(df, student_id):
+    result = df[df["student_id"].astype(str).str.strip() == str(student_id).strip()]
+    return result.iloc[0].to_dict() if len(result) > 0 else None
+
+def _old_students_by_college(df, college):
+    result = df[df["College"].astype(str).str.strip() == college.strip()]
+    return [row.to_dict() for _, row in result.iterrows()]
+
+def _old_students_by_major(df, major):
+    result = df[df["Major"].astype(str).str.strip() == major.strip()]
+    return [row.to_dict() for _, row in result.iterrows()]
+
+def _time(fn, args_list, n):
+    samples = []
+    for i in range(n):
+        args = args_list[i % len(args_list)]
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("-n", type=int, default=200, help="عدد الاستعلامات للمسار الجديد")
+    ap.add_argument("--old-n", type=int, default=10, help="عدد الاستعلامات للمسار القديم (بطيء)")
+    args = ap.parse_args()
+
+    df = _synthetic_students(args.rows)
+    # بدون ملف إكسيل حقيقي: الأوراق تُحقن مباشرة في الذاكرة
+    edr.EXCEL_FILE = os.path.join(tempfile.mkdtemp(prefix="bench_excel_"), "missing.xlsx")
+    edr.SNAPSHOT_DIR = os.path.dirname(edr.EXCEL_FILE)
+    edr._excel_data_cache.clear()
+    edr._excel_data_cache.update({"students": df, "drugs": pd.DataFrame(), "clinic_patients": pd.DataFrame()})
+    edr.reset_indexes()
+
+    t0 = time.perf_counter()
+    edr.build_indexes()
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    rnd = random.Random(7)
+    ids = [(str(2100000 + rnd.randrange(args.rows)),) for _ in range(50)]
+    colleges = [(c,) for c in df["College"].unique()[:10]]
+    majors = [(m,) for m in df["Major"].unique()[:10]]
+
+    cases = [
+        ("get_student_by_id", _old_student_by_id, edr.get_student_by_id, ids),
+        ("get_students_by_college", _old_students_by_college, edr.get_students_by_college, colleges),
+        ("get_students_by_major", _old_students_by_major, edr.get_students_by_major, majors),
+    ]
+
+    print(f"rows={args.rows}  index build={build_ms:.0f}ms")
+    print(f"{'lookup':<26}{'before p50':>12}{'before p95':>12}{'after p50':>12}{'after p95':>12}")
+    for name, old_fn, new_fn, arg_list in cases:
+        b50, b95 = _time(lambda *a: old_fn(df, *a), arg_list, args.old_n)
+        a50, a95 = _time(new_fn, arg_list, args.n)
+        print(f"{name:<26}{b50:>10.2f}ms{b95:>10.2f}ms{a50:>10.3f}ms{a95:>10.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+قياس زمن الطلب عبر طبقات الـ middleware (داخل العملية، بدون شبكة).
+
+يستدعي تطبيق ASGI مباشرة لمسار ملف ثابت ومسار /hod/courses
+(الذي يعيد تحويلًا لصفحة الدخول بدون جلسة، لكنه يمر بكل الطبقات).
+
+الاستخدام:
+    python scripts/bench_middleware.py -n 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app  # noqa: E402
+
+def _scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+async def _one(path: str) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(_scope(path), receive, send)
+    return status
+
+async def _bench(path: str, n: int):
+    for _ in range(min(50, n)):
+        await _one(path)
+    samples = []
+    status = 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        status = await _one(path)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return status, statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=2000)
+    ap.add_argument("--paths", nargs="*", default=["/static/css/app.css", "/hod/courses"])
+    args = ap.parse_args()
+
+    for path in args.paths:
+        status, mean, p50, p95 = asyncio.run(_bench(path, args.n))
+        print(f"{path:<28} status={status} n={args.n} mean={mean:.3f}ms p50={p50:.3f}ms p95={p95:.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+قياس ذاكرة وزمن تصدير سجل حركات الصيدلية (movements_log?export=csv|xlsx).
+
+ينشئ قاعدة SQLite مؤقتة بعدد --rows حركة (نصفها drug_transactions ونصفها drug_stock_movements) ثم يقارن:
+- قبل: fetchall() لكل الصفوف + كتابة CSV كاملًا في StringIO
+- بعد: exports.stream_rows (مؤشر من جهة الخادم) + csv_chunks / xlsx_chunks
+الذاكرة = ذروة tracemalloc أثناء التصدير.
+
+الاستخدام:
+    python scripts/bench_movements_export.py --rows 200000
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# قاعدة مؤقتة: app.database يستخدم sqlite:///app.db نسبةً لمجلد العمل
+_tmp = tempfile.mkdtemp(prefix="bench_movements_")
+os.chdir(_tmp)
+for _k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+    os.environ.pop(_k, None)
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.routers import pharmacy  # noqa: E402
+from app.services import exports  # noqa: E402
+
+DDL = [
+    """CREATE TABLE drugs (id INTEGER PRIMARY KEY, drug_code TEXT, trade_name TEXT, generic_name TEXT,
+                           strength TEXT, form TEXT, manufacturer TEXT)""",
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, full_name TEXT)",
+    """CREATE TABLE drug_stock_movements (id INTEGER PRIMARY KEY AUTOINCREMENT, drug_code TEXT NOT NULL,
+           drug_name TEXT, movement_type TEXT NOT NULL, quantity_change INTEGER NOT NULL, box_id INTEGER,
+           notes TEXT, created_by INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE drug_transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, drug_id INTEGER NOT NULL,
+           drug_code TEXT, transaction_type TEXT NOT NULL, quantity_change INTEGER NOT NULL, source TEXT,
+           destination TEXT, notes TEXT, created_by INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           expiry_date DATE DEFAULT NULL)""",
+]
+
+def _fill(rows: int) -> None:
+    with engine.begin() as conn:
+        for ddl in DDL:
+            conn.execute(text(ddl))
+        conn.execute(text("""
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < 500)
+            INSERT INTO drugs (id, drug_code, trade_name, generic_name, strength, form)
+            SELECT i, 'D' || i, 'Drug ' || i, 'generic ' || i, '500mg', 'Tablet' FROM seq
+        """))
+        conn.execute(text("INSERT INTO users (id, full_name) VALUES (1, 'صيدلي')"))
+        conn.execute(text("""
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :n)
+            INSERT INTO drug_transactions (drug_id, transaction_type, quantity_change, notes, created_by, created_at)
+            SELECT 1 + i % 500, 'warehouse_to_box', 1 + i % 7, 'ملاحظة ' || i, 1,
+                   DATETIME('now', '-' || (i % 100000) || ' minutes')
+            FROM seq
+        """), {"n": rows // 2})
+        conn.execute(text("""
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :n)
+            INSERT INTO drug_stock_movements (drug_code, drug_name, movement_type, quantity_change, notes,
+                                              created_by, created_at)
+            SELECT 'D' || (1 + i % 500), 'Drug', CASE WHEN i % 2 THEN 'in' ELSE 'out' END, 1 + i % 5, NULL, 1,
+                   DATETIME('now', '-' || (i % 100000) || ' minutes')
+            FROM seq
+        """), {"n": rows - rows // 2})
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), size
+
+def _old_csv():
+    db = SessionLocal()
+    try:
+        rows = db.execute(text(pharmacy._movements_sql("WHERE 1=1")), {}).mappings().all()
+        buf = io.StringIO(newline="")
+        w = csv.writer(buf)
+        w.writerow(pharmacy.MOVEMENTS_EXPORT_HEADER)
+        for r in rows:
+            w.writerow(pharmacy._movement_export_row(r))
+        return len(("\ufeff" + buf.getvalue()).encode("utf-8"))
+    finally:
+        db.close()
+
+def _new(fmt: str):
+    def run():
+        rows = (pharmacy._movement_export_row(r)
+                for r in exports.stream_rows(pharmacy._movements_sql("WHERE 1=1"), {}))
+        if fmt == "xlsx":
+            chunks = exports.xlsx_chunks("movements", pharmacy.MOVEMENTS_EXPORT_HEADER, rows)
+        else:
+            chunks = exports.csv_chunks(pharmacy.MOVEMENTS_EXPORT_HEADER, rows)
+        return sum(len(c) for c in chunks)
+    return run
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--skip-xlsx", action="store_true")
+    args = ap.parse_args()
+
+    _fill(args.rows)
+    print(f"rows={args.rows}")
+    print(f"{'export':<14}{'time':>10}{'peak mem':>12}{'bytes':>14}")
+    cases = [("before csv", _old_csv), ("after csv", _new("csv"))]
+    if not args.skip_xlsx and exports.HAS_OPENPYXL:
+        cases.append(("after xlsx", _new("xlsx")))
+    for name, fn in cases:
+        elapsed, peak_mb, size = _measure(fn)
+        print(f"{name:<14}{elapsed:>9.1f}s{peak_mb:>10.1f}MB{size:>14,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+قياس زمن تصيير HTML لقوالب التقارير (إشعار الراحة، الإحالة، سجل المهارات).
+
+يقارن:
+- قبل: jinja2.Template(source).render(...) في كل طلب (ترجمة القالب مع كل استدعاء).
+- بعد: renderer.render_html(name, ...) من Environment المشترك (render فقط).
+- الإقلاع: ترجمة القوالب في Environment جديد بدون/مع bytecode cache.
+
+القياس على مرحلة Jinja فقط؛ مرحلة xhtml2pdf لم تتغير.
+
+الاستخدام:
+    python scripts/bench_report_templates.py -n 500
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import ChoiceLoader, DictLoader, Environment, FileSystemBytecodeCache, Template  # noqa: E402
+
+from app.reports import renderer  # noqa: E402
+from app.reports.referral_notice_template import REFERRAL_NOTICE_HTML  # noqa: E402
+from app.reports.rest_notice_template import REST_NOTICE_HTML  # noqa: E402
+from app.reports.skills_record_pdf_template import SKILLS_RECORD_PDF_HTML  # noqa: E402
+
+def _shape(s):
+    return s or ""
+
+PATIENT = {
+    "patient_type": "trainee",
+    "full_name": "متدرب تجريبي",
+    "trainee_no": "443100200",
+    "employee_no": None,
+    "national_id": "1000000000",
+    "mobile": "0500000000",
+    "major": "تقنية",
+    "birth_date": "2003-01-01",
+    "age": 22,
+}
+
+COMMON = {
+    "patient": PATIENT,
+    "visit_date": "2025-01-01",
+    "doctor_name": "د. اختبار",
+    "created_by_name": "د. اختبار",
+    "logo_src": None,
+    "shape": _shape,
+    "font_ready_css": "",
+}
+
+CASES = {
+    "rest_notice": (
+        REST_NOTICE_HTML,
+        dict(COMMON, rest_days=2, visit={"chronic_json": '["ضغط"]'}),
+    ),
+    "referral_notice": (
+        REFERRAL_NOTICE_HTML,
+        dict(
+            COMMON,
+            referral_to="مستشفى",
+            referral_summary="ملخص",
+            diagnosis="تشخيص",
+            temp_c=37.0,
+            bp_systolic=120,
+            bp_diastolic=80,
+            pulse_bpm=70,
+            chronic_json='["سكر"]',
+            complaint="صداع",
+            treatment_given="باراسيتامول",
+            notes="",
+        ),
+    ),
+    "skills_record": (
+        SKILLS_RECORD_PDF_HTML,
+        {
+            "trainee": {
+                "trainee_no": "443100200",
+                "trainee_name": "متدرب تجريبي",
+                "total_hours": 40,
+                "courses": [
+                    {"title": f"دورة {i}", "hours": 4, "start_date": "2025-01-01", "end_date": "2025-01-02"}
+                    for i in range(10)
+                ],
+            },
+            "logo_src": None,
+            "generated_date": "2025-01-01",
+            "generated_by": "bench",
+            "colleges": [],
+            "shape": _shape,
+            "font_ready_css": "",
+        },
+    ),
+}
+
+def _time(fn, n: int):
+    for _ in range(min(20, n)):
+        fn()
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def _cold_compile(cache_dir):
+    env = Environment(
+        loader=ChoiceLoader([DictLoader({k: v[0] for k, v in CASES.items()})]),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir) if cache_dir else None,
+    )
+    t0 = time.perf_counter()
+    for name in CASES:
+        env.get_template(name)
+    return (time.perf_counter() - t0) * 1000.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=500)
+    args = ap.parse_args()
+
+    renderer.precompile()
+    print(f"{'template':<18}{'before p50':>12}{'before p95':>12}{'after p50':>12}{'after p95':>12}{'speedup':>10}")
+    for name, (source, ctx) in CASES.items():
+        b50, b95 = _time(lambda: Template(source).render(**ctx), args.n)
+        a50, a95 = _time(lambda: renderer.render_html(name, ctx), args.n)
+        print(f"{name:<18}{b50:>10.3f}ms{b95:>10.3f}ms{a50:>10.3f}ms{a95:>10.3f}ms{b50 / a50:>9.1f}x")
+
+    tmp = tempfile.mkdtemp(prefix="jinja_bcc_")
+    try:
+        no_cache = _cold_compile(None)
+        _cold_compile(tmp)  # تعبئة الكاش
+        with_cache = _cold_compile(tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"\ncold compile (3 templates): no bytecode cache {no_cache:.2f}ms, with bytecode cache {with_cache:.2f}ms")
+
+if __name__ == "__main__":
+    main()
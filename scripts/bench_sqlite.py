@@ -0,0 +1,183 @@
+"""
+مقارنة أداء SQLite الافتراضي مع ملف SQLITE_PROFILE=performance (مع قفل الكاتب الواحد وبدونه)
+تحت حمل مختلط قراءة/كتابة.
+
+كل تشغيل في عملية مستقلة وقاعدة مؤقتة بنفس البيانات. العمّال (خيوط، كل طلب جلسة SessionLocal
+مثل get_db) ينفذون لمدة --seconds:
+- قراءة: التحقق من شهادة بالرمز، قائمة متدربي دورة، آخر زيارات العيادة
+- كتابة (بنسبة --writes): سجل دخول، تبديل حضور متدرب، زيارة عيادة جديدة
+ويُطبع لكل ملف: الطلبات/ثانية، زمن القراءة والكتابة (p50/p99)، وأخطاء "database is locked".
+
+الاستخدام:
+    python scripts/bench_sqlite.py --seconds 10 --concurrency 12 --writes 0.2
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# default: بدون SQLITE_PROFILE؛ performance: PRAGMA + كاتب واحد؛ wal-only: PRAGMA بدون قفل الكاتب
+PROFILES = ("default", "performance", "wal-only")
+
+def _parse():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--concurrency", type=int, default=12, help="أقل من سعة التجمّع حتى لا يُقاس انتظاره")
+    ap.add_argument("--writes", type=float, default=0.2, help="نسبة طلبات الكتابة")
+    ap.add_argument("--courses", type=int, default=500)
+    ap.add_argument("--trainees", type=int, default=40, help="متدربون لكل دورة")
+    ap.add_argument("--visits", type=int, default=50_000)
+    ap.add_argument("--run", choices=PROFILES, help=argparse.SUPPRESS)
+    return ap.parse_args()
+
+ARGS = _parse()
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def _populate(engine, text, models):
+    rnd = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), {"id": 1, "full_name": "bench", "username": "bench",
+                                                       "password_hash": "x"})
+        conn.execute(text("""
+            INSERT INTO courses (id, title, provider, hours, mode, start_date, end_date, status)
+            VALUES (:id, :t, 'كلية الحاسبات', 10, 'onsite', '2025-01-05', '2025-01-09', 'finished')
+        """), [{"id": c, "t": f"دورة {c}"} for c in range(1, ARGS.courses + 1)])
+        conn.execute(text("""
+            INSERT INTO course_enrollments (course_id, trainee_no, trainee_name, status, present)
+            VALUES (:c, :t, 'متدرب', 'registered', 0)
+        """), [{"c": c, "t": str(440000000 + c * 1000 + i)}
+               for c in range(1, ARGS.courses + 1) for i in range(ARGS.trainees)])
+        conn.execute(text("""
+            INSERT INTO certificate_verifications (course_id, trainee_no, trainee_name, course_title, hours,
+                                                   certificate_code, copy_no)
+            SELECT course_id, trainee_no, trainee_name, 'دورة', 10, id || '-' || trainee_no || '-' || course_id, 1
+            FROM course_enrollments
+        """))
+        conn.execute(text("""
+            INSERT INTO clinic_visits (patient_type, trainee_no, full_name, visit_at, visit_date, complaint)
+            VALUES ('trainee', :t, 'مراجع', :at, :d, 'صداع')
+        """), [{"t": str(440000000 + rnd.randrange(ARGS.courses * 1000)),
+                "at": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} 09:{i % 60:02d}:00",
+                "d": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"} for i in range(ARGS.visits)])
+
+def _run(profile: str) -> None:
+    tmp = tempfile.mkdtemp(prefix=f"bench_sqlite_{profile}_")
+    os.symlink(os.path.join(ROOT, "app"), os.path.join(tmp, "app"))
+    os.chdir(tmp)
+    sys.path.insert(0, ROOT)
+    for k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+        os.environ.pop(k, None)
+    os.environ["SQLITE_PROFILE"] = "" if profile == "default" else "performance"
+    os.environ["SQLITE_SINGLE_WRITER"] = "0" if profile == "wal-only" else "1"
+
+    from sqlalchemy import exc, text
+
+    from app.database import Base, SessionLocal, engine, sqlite_metrics
+    from app import models
+
+    Base.metadata.create_all(bind=engine)
+    _populate(engine, text, models)
+    n_enroll = ARGS.courses * ARGS.trainees
+
+    def read(db, rnd):
+        op = rnd.randrange(3)
+        if op == 0:
+            eid = rnd.randint(1, n_enroll)
+            db.execute(text("SELECT * FROM certificate_verifications WHERE certificate_code = "
+                            "(SELECT certificate_code FROM certificate_verifications WHERE id = :i)"), {"i": eid}).all()
+        elif op == 1:
+            db.execute(text("SELECT trainee_no, trainee_name, present FROM course_enrollments "
+                            "WHERE course_id = :c ORDER BY trainee_no"), {"c": rnd.randint(1, ARGS.courses)}).all()
+        else:
+            db.execute(text("SELECT id, full_name, visit_at FROM clinic_visits "
+                            "ORDER BY visit_at DESC, id DESC LIMIT 50")).all()
+
+    def write(db, rnd):
+        op = rnd.randrange(3)
+        if op == 0:
+            db.execute(text("INSERT INTO login_logs (user_id, username, ip_address) VALUES (1, 'bench', :ip)"),
+                       {"ip": f"10.0.0.{rnd.randrange(250)}"})
+        elif op == 1:
+            # قراءة ثم كتابة في نفس المعاملة (مثل تبديل الحضور)
+            eid = rnd.randint(1, n_enroll)
+            present = db.execute(text("SELECT present FROM course_enrollments WHERE id = :i"), {"i": eid}).scalar()
+            db.execute(text("UPDATE course_enrollments SET present = :p WHERE id = :i"),
+                       {"p": not present, "i": eid})
+        else:
+            db.execute(text("""
+                INSERT INTO clinic_visits (patient_type, trainee_no, full_name, visit_at, visit_date, complaint)
+                VALUES ('trainee', :t, 'مراجع', CURRENT_TIMESTAMP, date('now'), 'حرارة')
+            """), {"t": str(440000000 + rnd.randrange(n_enroll))})
+        db.commit()
+
+    lat = {"read": [], "write": []}
+    errors = {"locked": 0, "timeout": 0, "other": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + ARGS.seconds
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        while time.perf_counter() < deadline:
+            kind = "write" if rnd.random() < ARGS.writes else "read"
+            t0 = time.perf_counter()
+            db = SessionLocal()
+            try:
+                (write if kind == "write" else read)(db, rnd)
+            except exc.TimeoutError:
+                with lock:
+                    errors["timeout"] += 1
+                continue
+            except exc.OperationalError as e:
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+                continue
+            finally:
+                db.close()
+            with lock:
+                lat[kind].append((time.perf_counter() - t0) * 1000.0)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(ARGS.concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with engine.connect() as conn:
+        mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    total = len(lat["read"]) + len(lat["write"])
+    print(f"{profile:<12} journal={mode:<6} {total / elapsed:7.0f} req/s  "
+          f"reads {len(lat['read']) / elapsed:6.0f}/s p50 {statistics.median(lat['read']) if lat['read'] else 0:6.2f} "
+          f"p99 {_pct(lat['read'], 0.99):7.2f}ms  "
+          f"writes {len(lat['write']) / elapsed:5.0f}/s p50 {statistics.median(lat['write']) if lat['write'] else 0:6.2f} "
+          f"p99 {_pct(lat['write'], 0.99):7.2f}ms  errors {errors}")
+    if profile == "performance":
+        m = sqlite_metrics()
+        print(f"{'':<12} writer lock: acquired {m['acquired']}, waited {m['waited']}, "
+              f"avg wait {m['avg_wait_ms']}ms, max wait {m['wait_ms_max']}ms, timeouts {m['timeouts']}")
+
+def main():
+    if ARGS.run:
+        _run(ARGS.run)
+        return
+    print(f"{ARGS.concurrency} workers, {ARGS.writes:.0%} writes, {ARGS.seconds}s per profile")
+    argv = [a for a in sys.argv[1:]]
+    for profile in PROFILES:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), *argv, "--run", profile],
+                             capture_output=True, text=True, encoding="utf-8")
+        sys.stdout.write("".join(l + "\n" for l in out.stdout.splitlines() if not l.startswith("🔗")))
+        if out.returncode:
+            sys.stdout.write(out.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+اختبار حمل لمسارات التحقق العامة (/verify/{code} و /verify/api/verify) على جدول شهادات كبير.
+
+ينشئ قاعدة SQLite مؤقتة فيها --certs سجل تحقق (افتراضيًا 500 ألف) ثم يرسل طلبات ASGI
+مباشرة إلى التطبيق (كل الـ middleware والقوالب، بدون شبكة) لمدة --seconds بتوازي --concurrency:
+- رموز صحيحة: 90% من مجموعة "ساخنة" (--hot) و10% موزعة على كل الجدول
+- رموز عشوائية غير موجودة بنسبة --unknown (محاكاة التخمين)
+- عناوين IP من مجموعة بحجم --ips ؛ ثم مرحلة قصيرة لعنوان واحد يتجاوز الحد (429)
+
+--no-cache يعطّل LRU والكاش السلبي للمقارنة مع المسار القديم (استعلام لكل طلب).
+
+الاستخدام:
+    python scripts/bench_verify.py --certs 500000 --seconds 20 --concurrency 32
+    python scripts/bench_verify.py --certs 500000 --seconds 20 --no-cache
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _parse():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--certs", type=int, default=500_000)
+    ap.add_argument("--courses", type=int, default=2_000)
+    ap.add_argument("--seconds", type=float, default=20.0)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--hot", type=int, default=2_000, help="عدد الشهادات الأكثر مسحًا")
+    ap.add_argument("--unknown", type=float, default=0.2, help="نسبة الرموز غير الموجودة")
+    ap.add_argument("--api", type=float, default=0.1, help="نسبة طلبات /verify/api/verify")
+    ap.add_argument("--ips", type=int, default=5_000)
+    ap.add_argument("--no-cache", action="store_true")
+    return ap.parse_args()
+
+ARGS = _parse()
+
+# قاعدة مؤقتة: app.database يستخدم sqlite:///app.db نسبةً لمجلد العمل
+_tmp = tempfile.mkdtemp(prefix="bench_verify_")
+os.symlink(os.path.join(ROOT, "app"), os.path.join(_tmp, "app"))
+os.chdir(_tmp)
+for _k in ("DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+    os.environ.pop(_k, None)
+if ARGS.no_cache:
+    os.environ["VERIFY_CACHE_SIZE"] = "0"
+    os.environ["VERIFY_NEGATIVE_SIZE"] = "0"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# الحد معطّل افتراضيًا؛ يُفعَّل هنا لقياس مرحلة 429
+os.environ.setdefault("VERIFY_RATE_PER_SEC", "5")
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import verify_cache  # noqa: E402
+
+def _populate(n_certs: int, n_courses: int) -> list:
+    rnd = random.Random(7)
+    colleges = ["كلية الحاسبات", "كلية الهندسة", "كلية الإدارة", "كلية العلوم"]
+    with engine.begin() as conn:
+        for i, name in enumerate(colleges, start=1):
+            conn.execute(text("""
+                INSERT INTO colleges (id, name, name_en, name_print_ar, dean_name, vp_students_name,
+                                      vp_trainers_name, dean_sign_path, is_active)
+                VALUES (:id, :n, :en, :n, 'العميد', 'الوكيل', 'وكيل المدربين', :sign, 1)
+            """), {"id": i, "n": name, "en": f"College {i}", "sign": f"/static/uploads/colleges/{i}/dean.png"})
+        depts = [(f"قسم {j}", colleges[j % len(colleges)]) for j in range(40)]
+        conn.execute(text("INSERT INTO departments (name, college, is_active) VALUES (:n, :c, 1)"),
+                     [{"n": n, "c": c} for n, c in depts])
+        conn.execute(text("""
+            INSERT INTO courses (id, title, provider, hours, mode, start_date, end_date, status)
+            VALUES (:id, :t, :p, :h, 'onsite', '2025-01-05', '2025-01-09', 'finished')
+        """), [{"id": c, "t": f"دورة {c}", "p": rnd.choice(colleges), "h": rnd.choice([6, 10, 12, 20])}
+               for c in range(1, n_courses + 1)])
+        conn.execute(text("INSERT INTO course_target_departments (course_id, department_name) VALUES (:c, :d)"),
+                     [{"c": c, "d": rnd.choice(depts)[0]} for c in range(1, n_courses + 1)])
+        codes = []
+        batch = []
+        for i in range(1, n_certs + 1):
+            cid = rnd.randint(1, n_courses)
+            tno = str(440000000 + i)
+            code = f"{i}-{tno}-{cid}"
+            codes.append(code)
+            batch.append({"cid": cid, "tno": tno, "code": code})
+            if len(batch) == 20_000:
+                _insert_certs(conn, batch)
+                batch = []
+        if batch:
+            _insert_certs(conn, batch)
+    return codes
+
+def _insert_certs(conn, batch):
+    conn.execute(text("""
+        INSERT INTO certificate_verifications (course_id, trainee_no, trainee_name, course_title, hours,
+                                               start_date, end_date, certificate_code, copy_no)
+        VALUES (:cid, :tno, 'متدرب', 'دورة', 10, '2025-01-05', '2025-01-09', :code, 1)
+    """), batch)
+
+async def _call(path: str, query: str, ip: str, headers=()):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench.local")] + list(headers),
+        "client": (ip, 40000), "server": ("bench.local", 80),
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+            status["headers"] = dict(message.get("headers") or [])
+
+    await app(scope, receive, send)
+    return status.get("code"), status.get("headers", {})
+
+def _pick(rnd: random.Random, codes: list):
+    if rnd.random() < ARGS.unknown:
+        code = f"{rnd.randint(1, 10**9)}-{rnd.randint(10**8, 10**9)}-{rnd.randint(1, 9999)}"
+    elif rnd.random() < 0.9:
+        code = codes[rnd.randrange(min(ARGS.hot, len(codes)))]
+    else:
+        code = rnd.choice(codes)
+    if rnd.random() < ARGS.api:
+        return "/verify/api/verify", f"code={code}"
+    return f"/verify/{code}", ""
+
+async def _load(codes: list, seconds: float):
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + seconds
+
+    async def worker(seed: int):
+        rnd = random.Random(seed)
+        while time.perf_counter() < deadline:
+            path, query = _pick(rnd, codes)
+            ip = f"10.{rnd.randrange(ARGS.ips) // 250}.{rnd.randrange(ARGS.ips) % 250}.1"
+            t0 = time.perf_counter()
+            code, _ = await _call(path, query, ip)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(ARGS.concurrency)))
+    return latencies, statuses, time.perf_counter() - t0
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def main():
+    async with app.router.lifespan_context(app):
+        t0 = time.perf_counter()
+        codes = _populate(ARGS.certs, ARGS.courses)
+        print(f"populated {len(codes)} certificates / {ARGS.courses} courses in {time.perf_counter() - t0:.1f}s "
+              f"(cache {'off' if ARGS.no_cache else 'on'})")
+
+        # صحة المسار: 200 ثم 304 مع If-None-Match، و404 للرمز المجهول
+        st, hdrs = await _call(f"/verify/{codes[0]}", "", "192.0.2.1")
+        etag = hdrs.get(b"etag", b"")
+        st304, _ = await _call(f"/verify/{codes[0]}", "", "192.0.2.1", [(b"if-none-match", etag)])
+        st404, _ = await _call("/verify/0-0-0", "", "192.0.2.1")
+        print(f"check: page {st} etag={etag.decode()} cache-control={hdrs.get(b'cache-control', b'').decode()} "
+              f"-> revalidate {st304}, unknown {st404}")
+
+        latencies, statuses, elapsed = await _load(codes, ARGS.seconds)
+        n = len(latencies)
+        print(f"load: {n} requests in {elapsed:.1f}s = {n / elapsed:.0f} req/s "
+              f"(concurrency {ARGS.concurrency}, {ARGS.unknown:.0%} unknown codes, {ARGS.ips} IPs)")
+        print(f"  latency ms: p50 {statistics.median(latencies):.2f}  p95 {_pct(latencies, 0.95):.2f}  "
+              f"p99 {_pct(latencies, 0.99):.2f}")
+        print(f"  statuses: {dict(sorted(statuses.items()))}")
+        print(f"  verify_cache: {verify_cache.metrics()}")
+
+        # عنوان واحد يتجاوز الحد
+        codes_by_status = {}
+        for _ in range(200):
+            st, _ = await _call(f"/verify/{codes[1]}", "", "198.51.100.7")
+            codes_by_status[st] = codes_by_status.get(st, 0) + 1
+        print(f"single IP burst of 200: {dict(sorted(codes_by_status.items()))} "
+              f"(rate {verify_cache.VERIFY_RATE_PER_SEC}/s, burst {verify_cache.VERIFY_BURST:.0f})")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+فحص ذاكرة المستخدم الحالي (deps_auth.get_current_user):
+1) تعطيل المستخدم عبر admin_users.user_toggle_active يُرفض فورًا (bump_user_version)
+2) تعديل مباشر في القاعدة (عملية/عامل آخر) يُرفض بعد انتهاء USER_CACHE_TTL فقط
+3) الطلبات المتكررة تُخدم من الذاكرة (hits)
+
+ينشئ مستخدمًا مؤقتًا ويحذفه في النهاية.
+
+الاستخدام:
+    python scripts/check_user_cache.py [--ttl 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+from app import deps_auth  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User  # noqa: E402
+from app.routers import admin_users  # noqa: E402
+from app.security import hash_password  # noqa: E402
+
+def _request(user_id: int) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [], "session": {"user": {"id": user_id}}, "state": {},
+    })
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ttl", type=float, default=0.5)
+    args = ap.parse_args()
+    deps_auth.USER_CACHE_TTL_SECONDS = args.ttl
+
+    Base.metadata.create_all(bind=engine, tables=[User.__table__])
+    db = SessionLocal()
+    user = User(
+        username=f"cache_check_{os.getpid()}",
+        full_name="cache check",
+        password_hash=hash_password("x"),
+        must_change_password=False,
+    )
+    db.add(user)
+    db.commit()
+    uid = user.id
+    try:
+        before = deps_auth.user_cache_metrics()
+        for _ in range(5):
+            assert deps_auth.get_current_user(_request(uid), db) is not None
+        after = deps_auth.user_cache_metrics()
+        assert after["misses"] - before["misses"] == 1, after
+        assert after["hits"] - before["hits"] == 4, after
+        print("1) cached: 1 miss + 4 hits")
+
+        admin_users.user_toggle_active(uid, admin=None, db=db)
+        assert deps_auth.get_current_user(_request(uid), db) is None
+        print("2) deactivated via admin_users: rejected on the next request")
+
+        admin_users.user_toggle_active(uid, admin=None, db=db)
+        assert deps_auth.get_current_user(_request(uid), db) is not None
+        # تعطيل من "عملية أخرى": بلا bump ⇒ يبقى مقبولًا حتى انتهاء TTL
+        db.query(User).filter(User.id == uid).update({User.is_active: False})
+        db.commit()
+        still = deps_auth.get_current_user(_request(uid), db) is not None
+        time.sleep(args.ttl + 0.05)
+        assert deps_auth.get_current_user(_request(uid), db) is None
+        print(f"3) deactivated directly: {'accepted' if still else 'rejected'} before TTL, "
+              f"rejected after {args.ttl}s")
+        print("OK", deps_auth.user_cache_metrics())
+    finally:
+        db.query(User).filter(User.id == uid).delete()
+        db.commit()
+        deps_auth.bump_user_version(uid)
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+ترحيل clinic_patients (ملفات + زيارات في جدول واحد) إلى clinic_patient_profiles و clinic_visits.
+
+المراحل:
+1) النسخ على دفعات (التطبيق يعمل أثناءها على الجدول القديم؛ قابل للإيقاف والاستئناف):
+       python scripts/migrate_clinic_storage.py --batch-size 5000 --pause 0.05
+2) التحويل (معاملة قصيرة: نسخ المتبقي، مزامنة الملفات، إعادة تسمية القديم إلى
+   clinic_patients_legacy، وإنشاء view التوافق clinic_patients):
+       python scripts/migrate_clinic_storage.py --cutover
+   العمليات الأخرى تنتقل للجداول الجديدة خلال CLINIC_STORE_CHECK_SECONDS (أو عند أول إدراج).
+   بعد التحويل تُنسخ أي صفوف متأخرة (--sweep يعمل تلقائيًا بعد الانتظار).
+
+الجدول القديم لا يُحذف؛ احذفه يدويًا بعد التأكد.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402
+from app.services import clinic_store, clinic_summary  # noqa: E402
+
+def _progress(kind: str, copied: int, upper: int) -> None:
+    print(f"  {kind:<8} copied={copied:<10} up to id={upper}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch-size", type=int, default=clinic_store.MIGRATION_BATCH_SIZE)
+    ap.add_argument("--pause", type=float, default=0.0, help="ثوانٍ بين الدفعات لتخفيف الضغط")
+    ap.add_argument("--cutover", action="store_true", help="نسخ المتبقي ثم التحويل للجداول الجديدة")
+    ap.add_argument("--sweep", action="store_true", help="نسخ الصفوف المتأخرة فقط (بعد التحويل)")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[
+        models.ClinicPatientProfile.__table__,
+        models.ClinicVisit.__table__,
+        models.ClinicPatientSummary.__table__,
+    ])
+    print(f"mode: {clinic_store.mode(force=True)}")
+
+    if args.sweep:
+        print(f"sweep: {clinic_store.sweep()} rows")
+        return
+
+    t0 = time.perf_counter()
+    copied = clinic_store.migrate_batches(args.batch_size, args.pause, _progress)
+    print(f"batches: profiles={copied['profile']} visits={copied['visit']} in {time.perf_counter() - t0:.1f}s")
+
+    if args.cutover:
+        t0 = time.perf_counter()
+        counts = clinic_store.cutover()
+        print(f"cutover: profiles={counts['profile']} visits={counts['visit']} in {(time.perf_counter() - t0) * 1000:.0f}ms")
+        print(f"waiting {clinic_store.MODE_CHECK_SECONDS:.0f}s for other workers before sweep ...")
+        time.sleep(clinic_store.MODE_CHECK_SECONDS)
+        print(f"sweep: {clinic_store.sweep()} rows")
+        # last_visit_id يبقى صحيحًا (نفس أرقام الزيارات)، لكن إعادة الحساب رخيصة وتضمن التطابق
+        db = SessionLocal()
+        try:
+            print(f"clinic_patient_summary: {clinic_summary.rebuild(db)} rows")
+        finally:
+            db.close()
+    print(f"mode: {clinic_store.mode(force=True)}")
+
+if __name__ == "__main__":
+    main()
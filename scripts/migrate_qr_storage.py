@@ -0,0 +1,95 @@
+"""
+ترحيل صور QR القديمة من المجلد المسطح app/static/barcodes/ إلى التخزين المجزّأ
+(QR_STORAGE_DIR/<sha256[:2]>/<sha256[2:4]>/<code>.png) وتحديث certificate_verifications.barcode_path
+من /static/barcodes/<code>.png إلى /verify/<code>/qr.png.
+
+الصور تُولَّد عند الطلب من رمز الشهادة، لذلك الترحيل آمن لو فُقد ملف: يُعاد توليده عند أول طلب.
+إعادة التشغيل آمنة (الملفات المنقولة والصفوف المحدّثة تُتخطى).
+
+الاستخدام:
+    python scripts/migrate_qr_storage.py [--dry-run] [--copy] [--batch-size 5000]
+
+--copy: نسخ الملفات بدل نقلها (يبقى المجلد القديم كما هو).
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.services import qr_assets  # noqa: E402
+
+def _move_files(copy: bool, dry_run: bool) -> tuple:
+    moved = skipped = 0
+    if not qr_assets.LEGACY_DIR.exists():
+        return moved, skipped
+    with os.scandir(qr_assets.LEGACY_DIR) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.endswith(".png"):
+                continue
+            code = entry.name[:-len(".png")]
+            dest = qr_assets.storage_path(code)
+            if dest.exists():
+                skipped += 1
+                if not copy and not dry_run:
+                    os.remove(entry.path)
+                continue
+            moved += 1
+            if dry_run:
+                continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            if copy:
+                shutil.copy2(entry.path, dest)
+            else:
+                shutil.move(entry.path, dest)
+    return moved, skipped
+
+def _update_rows(batch_size: int, dry_run: bool) -> int:
+    db = SessionLocal()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.execute(text("""
+                SELECT id, certificate_code FROM certificate_verifications
+                WHERE id > :last AND barcode_path LIKE :legacy
+                ORDER BY id
+                LIMIT :n
+            """), {"last": last_id, "legacy": qr_assets.LEGACY_PREFIX + "%", "n": batch_size}).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updated += len(rows)
+            if dry_run:
+                continue
+            db.execute(
+                text("UPDATE certificate_verifications SET barcode_path = :url WHERE id = :id"),
+                [{"id": rid, "url": qr_assets.url_for(code)} for rid, code in rows],
+            )
+            db.commit()
+    finally:
+        db.close()
+    return updated
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--copy", action="store_true")
+    ap.add_argument("--batch-size", type=int, default=5000)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    moved, skipped = _move_files(args.copy, args.dry_run)
+    print(f"files: {moved} {'copied' if args.copy else 'moved'} to {qr_assets.QR_STORAGE_DIR}, "
+          f"{skipped} already there{' (dry run)' if args.dry_run else ''}")
+    updated = _update_rows(args.batch_size, args.dry_run)
+    print(f"certificate_verifications: {updated} barcode_path rows -> /verify/<code>/qr.png"
+          f"{' (dry run)' if args.dry_run else ''} in {(time.perf_counter() - t0) * 1000.0:.0f}ms")
+
+if __name__ == "__main__":
+    main()
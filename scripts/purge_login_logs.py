@@ -0,0 +1,48 @@
+"""
+حذف سجلات الدخول (login_logs) الأقدم من مدة الاحتفاظ على دفعات.
+
+الحذف معطّل افتراضيًا. مع LOGIN_LOG_RETENTION_DAYS يحذف التطبيق دفعة واحدة كل بضع ساعات
+أثناء التشغيل؛ هذا السكربت للحذف الكامل (أول تفعيل للسياسة أو من cron)، و--days إلزامي
+إذا لم يُضبط LOGIN_LOG_RETENTION_DAYS. الملخص user_login_stats يحتفظ بعدد مرات الدخول الكلي.
+
+الاستخدام:
+    python scripts/purge_login_logs.py --days 365 [--batch-size 5000] [--rebuild-rollup]
+
+--rebuild-rollup: إعادة حساب الملخص من login_logs قبل الحذف (العدد يصبح عدد السجلات الموجودة فقط).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.services import login_activity  # noqa: E402
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=login_activity.LOGIN_LOG_RETENTION_DAYS or None,
+                    required=not login_activity.LOGIN_LOG_RETENTION_DAYS)
+    ap.add_argument("--batch-size", type=int, default=login_activity.PURGE_BATCH_SIZE)
+    ap.add_argument("--rebuild-rollup", action="store_true")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[models.UserLoginStats.__table__])
+    login_activity.ensure()
+    db = SessionLocal()
+    try:
+        if args.rebuild_rollup:
+            n = login_activity.rebuild(db)
+            print(f"user_login_stats: {n} rows")
+        t0 = time.perf_counter()
+        deleted = login_activity.purge_old_logs(db, args.days, args.batch_size, force=True)
+        db.commit()
+        print(f"login_logs: deleted {deleted} rows older than {args.days} days "
+              f"in {(time.perf_counter() - t0) * 1000.0:.0f}ms")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
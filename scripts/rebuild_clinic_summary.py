@@ -0,0 +1,30 @@
+"""
+إعادة حساب جدول ملخص زيارات المراجعين (clinic_patient_summary) من clinic_patients.
+
+يُستخدم بعد استيراد/تعديل زيارات مباشرة في القاعدة؛ الإقلاع يعبئ الجدول تلقائيًا فقط إذا كان فارغًا.
+
+الاستخدام:
+    python scripts/rebuild_clinic_summary.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.services import clinic_summary  # noqa: E402
+
+def main():
+    Base.metadata.create_all(bind=engine, tables=[models.ClinicPatientSummary.__table__])
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        n = clinic_summary.rebuild(db)
+        print(f"clinic_patient_summary: {n} rows in {(time.perf_counter() - t0) * 1000.0:.0f}ms")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()